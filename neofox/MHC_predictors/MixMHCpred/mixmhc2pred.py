@@ -17,10 +17,11 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List
+from typing import List, Dict, FrozenSet
 from pandas.errors import EmptyDataError
 
 from neofox.helpers.epitope_helper import EpitopeHelper
+from neofox.helpers.prediction_cache import PredictionCache, MIXMHC2PRED
 from neofox.model.mhc_parser import MhcParser, get_alleles_by_gene
 
 from neofox.references.references import DependenciesConfiguration, MhcDatabase, \
@@ -28,6 +29,7 @@
                                         ORGANISM_MUS_MUSCULUS
 
 from neofox.helpers.runner import Runner
+from neofox.references.allele_registry import AlleleRegistry
 
 from neofox.model.neoantigen import Annotation, Mhc2, Mhc2GeneName, MhcAllele, PredictedEpitope, Mhc2Isoform, \
     Neoantigen
@@ -55,29 +57,30 @@ def __init__(self, runner: Runner, configuration: DependenciesConfiguration, mhc
         self.mhc_parser = mhc_parser
         self.references = references
         self.organism = references.organism
+        self.allele_registry = AlleleRegistry.get_allele_registry(mhc_parser)
         self.available_alleles = self._load_available_alleles()
+        self.prediction_cache = PredictionCache.get_prediction_cache(configuration.cache_folder)
+        if self.prediction_cache is not None:
+            self.version = "{}:{}".format(PredictionCache.get_version(configuration.mix_mhc2_pred), self.organism)
 
-        self.results = None
 
-    def _load_available_alleles(self):
+    def _load_available_alleles(self) -> FrozenSet[str]:
         """
-        loads file with available HLA II allels for MixMHC2pred prediction, returns set
+        returns the available HLA II alleles for MixMHC2pred prediction, the file is loaded once per process
         :return:
         """
+        alleles = frozenset()
         if self.organism == ORGANISM_HOMO_SAPIENS:
-            alleles = pd.read_csv(
-                self.configuration.mix_mhc2_pred_human_alleles_list, skiprows=2, sep="\t"
-            )
+            alleles = AlleleRegistry.get_supported_alleles(
+                self.configuration.mix_mhc2_pred_human_alleles_list, column="AlleleName", skiprows=2)
         elif self.organism == ORGANISM_MUS_MUSCULUS:
             if self.references.mixmhc2pred_alleles_list is not None:
-                alleles = pd.read_csv(
-                    self.references.mixmhc2pred_alleles_list, skiprows=2, sep="\t"
-                )
+                alleles = AlleleRegistry.get_supported_alleles(
+                    self.references.mixmhc2pred_alleles_list, column="AlleleName", skiprows=2)
             else:
                 logger.error("The PWMdef for Mouse was not downloaded.")
 
-        return list(alleles["AlleleName"])
-
+        return alleles
 
     @staticmethod
     def _combine_dq_dp_alleles(alpha_alleles: List[str], beta_alleles: List[str]):
@@ -99,28 +102,6 @@ def _combine_dq_dp_alleles(alpha_alleles: List[str], beta_alleles: List[str]):
         ]
         return alleles_pairs + alleles_triplets
 
-    @staticmethod
-    def _get_mixmhc2_allele_human_representation(hla_alleles: List[MhcAllele]):
-        # alleles: hla_alleles
-        return list(
-            map(
-                lambda x: "{gene}_{group}_{protein}".format(
-                    gene=x.gene, group=x.group, protein=x.protein
-                ),
-                hla_alleles,
-            )
-        )
-
-    @staticmethod
-    def _get_mixmhc2_isoform_human_representation(isoform: Mhc2Isoform):
-
-        beta_chain = MixMHC2pred._get_mixmhc2_allele_human_representation([isoform.beta_chain])[0]
-        if isoform.alpha_chain is not None and isoform.alpha_chain.name:
-            # for DR only beta chain is provided
-            alpha_chain = MixMHC2pred._get_mixmhc2_allele_human_representation([isoform.alpha_chain])[0]
-            return "{alpha}__{beta}".format(alpha=alpha_chain, beta=beta_chain)
-        return beta_chain
-
     def transform_hla_ii_alleles_for_prediction(self, mhc: List[Mhc2]) -> List[str]:
         """
         prepares list of HLA II alleles for prediction in required format
@@ -131,38 +112,24 @@ def transform_hla_ii_alleles_for_prediction(self, mhc: List[Mhc2]) -> List[str]:
         dqa1_alleles = get_alleles_by_gene(mhc, Mhc2GeneName.DQA1)
         dqb1_alleles = get_alleles_by_gene(mhc, Mhc2GeneName.DQB1)
 
+        represent = self.allele_registry.get_mixmhc2pred_representation
         dp_allele_combinations = self._combine_dq_dp_alleles(
-            alpha_alleles=self._get_mixmhc2_allele_human_representation(dpa1_alleles),
-            beta_alleles=self._get_mixmhc2_allele_human_representation(dpb1_alleles)
+            alpha_alleles=[represent(a) for a in dpa1_alleles],
+            beta_alleles=[represent(a) for a in dpb1_alleles]
         )
         dq_allele_combinations = self._combine_dq_dp_alleles(
-            alpha_alleles=self._get_mixmhc2_allele_human_representation(dqa1_alleles),
-            beta_alleles=self._get_mixmhc2_allele_human_representation(dqb1_alleles)
+            alpha_alleles=[represent(a) for a in dqa1_alleles],
+            beta_alleles=[represent(a) for a in dqb1_alleles]
         )
 
         return [
             a
-            for a in self._get_mixmhc2_allele_human_representation(drb1_alleles)
+            for a in [represent(a) for a in drb1_alleles]
             + dq_allele_combinations
             + dp_allele_combinations
             if a in self.available_alleles
         ]
 
-    @staticmethod
-    def _get_mixmhc2_allele_mouse_representation(h2_alleles: List[MhcAllele]):
-        return list(
-            map(
-                lambda x: "H2_{gene}a_{protein}__H2_{gene}b_{protein}".format(
-                    gene=x.gene[-1], protein=x.protein
-                ),
-                h2_alleles,
-            )
-        )
-
-    def _get_mixmhc2_isoform_mouse_representation(isoform: Mhc2Isoform):
-        if isoform is not None:
-            return "H2_{gene}a_{protein}__H2_{gene}b_{protein}".format(gene=isoform[-3], protein=isoform[-1])
-
     def transform_h2_alleles_for_prediction(self, mhc:List[Mhc2]) -> List[str]:
         """
         prepares list of H2 alleles for prediction in required format
@@ -172,7 +139,8 @@ def transform_h2_alleles_for_prediction(self, mhc:List[Mhc2]) -> List[str]:
         h2e_alleles = get_alleles_by_gene(mhc, Mhc2GeneName.H2E)
 
         return [
-            a for i in (h2a_alleles, h2e_alleles) for a in self._get_mixmhc2_allele_mouse_representation(i)  if a in self.available_alleles
+            a for i in (h2a_alleles, h2e_alleles) for a in map(self.allele_registry.get_mixmhc2pred_representation, i)
+            if a in self.available_alleles
         ]
 
     def _parse_mixmhc2pred_output(self, filename: str) -> List[PredictedEpitope]:
@@ -198,6 +166,18 @@ def _parse_mixmhc2pred_output(self, filename: str) -> List[PredictedEpitope]:
         return parsed_results
 
     def _mixmhc2prediction(self, isoforms: List[str], potential_ligand_sequences: List[str]) -> List[PredictedEpitope]:
+        if self.prediction_cache is None:
+            return self._run_mixmhc2pred(isoforms, potential_ligand_sequences)
+        # NOTE: MixMHC2pred returns only the best isoform for every peptide, thus predictions are cached for the
+        # whole set of isoforms
+        isoforms_key = " ".join(isoforms)
+        predictions = self.prediction_cache.predict(
+            MIXMHC2PRED, self.version, [isoforms_key], potential_ligand_sequences,
+            run=lambda keys, peptides: {
+                (isoforms_key, p.mutated_peptide): p for p in self._run_mixmhc2pred(isoforms, peptides)})
+        return [p for p in predictions.values() if p is not None]
+
+    def _run_mixmhc2pred(self, isoforms: List[str], potential_ligand_sequences: List[str]) -> List[PredictedEpitope]:
         tmptxt = intermediate_files.create_temp_mixmhc2pred(potential_ligand_sequences, prefix="tmp_sequence_")
         outtmp = intermediate_files.create_temp_file(prefix="mixmhc2pred", suffix=".txt")
 
@@ -221,15 +201,14 @@ def _mixmhc2prediction(self, isoforms: List[str], potential_ligand_sequences: Li
         os.remove(tmptxt)
         return results
 
-    def run(self, mhc: List[Mhc2], neoantigen: Neoantigen, uniprot):
+    def run(self, mhc: List[Mhc2], neoantigen: Neoantigen, uniprot) -> List[PredictedEpitope]:
         """
         Runs MixMHC2pred:
         prediction for peptides of length 12 to 21 based on Racle, J., et al., Nat. Biotech. (2023).
         Machine learning predictions of MHC-II specificities reveal alternative binding mode of class II epitopes.
+        Returns the predictions of all epitopes of the neoantigen or None if MixMHC2pred could not run on it
         """
-        # TODO: get rid of this
-        self.results = None
-
+        results = None
         potential_ligand_sequences = EpitopeHelper.generate_nmers(
             neoantigen=neoantigen, lengths=[12, 13, 14, 15, 16, 17, 18, 19, 20, 21], uniprot=uniprot)
 
@@ -240,32 +219,36 @@ def run(self, mhc: List[Mhc2], neoantigen: Neoantigen, uniprot):
                 mhc2_alleles = self.transform_h2_alleles_for_prediction(mhc)
 
             if len(mhc2_alleles) > 0:
-                self.results = self._mixmhc2prediction(
+                results = self._mixmhc2prediction(
                     isoforms=mhc2_alleles, potential_ligand_sequences=potential_ligand_sequences)
             else:
                 logger.warning("None of the MHC II alleles are supported by MixMHC2pred")
+        return results
 
     def run_peptide(self, peptide: str, isoform: Mhc2Isoform) -> PredictedEpitope:
         """
         Performs MixMHC2pred prediction for desired hla allele and writes result to temporary file.
         """
-        result = None
-        if self.organism == ORGANISM_HOMO_SAPIENS:
-            isoform_representation = self._get_mixmhc2_isoform_human_representation(isoform)
-        else:
-            isoform_representation = self._get_mixmhc2_isoform_mouse_representation(isoform)
+        return self.run_peptides([peptide], isoform).get(peptide)
+
+    def run_peptides(self, peptides: List[str], isoform: Mhc2Isoform) -> Dict[str, PredictedEpitope]:
+        """
+        Performs MixMHC2pred prediction once on multiple peptides for the same isoform, the results are indexed by
+        peptide
+        """
+        results = {}
+        isoform_representation = self.allele_registry.get_mixmhc2pred_isoform_representation(isoform)
         if isoform_representation in self.available_alleles:
-            results = self._mixmhc2prediction(
+            results = {p.mutated_peptide: p for p in self._mixmhc2prediction(
                 isoforms=[isoform_representation],
-                potential_ligand_sequences=[peptide])
-            if results:
-                result = results[0]
+                potential_ligand_sequences=peptides)}
         else:
             logger.warning("%s is not available in the available alleles." % isoform_representation)
-        return result
+        return results
 
-    def get_annotations(self) -> List[Annotation]:
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.results)
+    @staticmethod
+    def get_annotations(results: List[PredictedEpitope]) -> List[Annotation]:
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         return [
             AnnotationFactory.build_annotation(
                 value=best_result.mutated_peptide, name="MixMHC2pred_bestRank_peptide"
@@ -17,8 +17,9 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List
+from typing import List, Dict
 from neofox.helpers.epitope_helper import EpitopeHelper
+from neofox.helpers.prediction_cache import PredictionCache, MIXMHCPRED
 from neofox.helpers.runner import Runner
 from neofox.helpers.mhc_helper import MixMhcHelper
 from neofox.model.mhc_parser import MhcParser
@@ -41,13 +42,24 @@ def __init__(self, runner: Runner, configuration: DependenciesConfiguration, mhc
         self.configuration = configuration
         self.mhc_parser = mhc_parser
         self.parsed_mhc_alleles = MixMhcHelper(mhc_parser)
+        self.prediction_cache = PredictionCache.get_prediction_cache(configuration.cache_folder)
+        if self.prediction_cache is not None:
+            self.version = PredictionCache.get_version(configuration.mix_mhc_pred)
 
-        self.results = None
 
     def _mixmhcprediction(self, mhc_alleles: List[str], potential_ligand_sequences) -> List[PredictedEpitope]:
         """
         Performs MixMHCpred prediction for desired hla allele and writes result to temporary file.
         """
+        if self.prediction_cache is None:
+            return self._run_mixmhcpred(mhc_alleles, potential_ligand_sequences)
+        predictions = self.prediction_cache.predict(
+            MIXMHCPRED, self.version, mhc_alleles, potential_ligand_sequences,
+            run=lambda alleles, peptides: MixMhcHelper.get_predictions_by_allele_and_peptide(
+                self._run_mixmhcpred(alleles, peptides)))
+        return [p for p in predictions.values() if p is not None]
+
+    def _run_mixmhcpred(self, mhc_alleles: List[str], potential_ligand_sequences) -> List[PredictedEpitope]:
         outtmp = intermediate_files.create_temp_file(prefix="mixmhcpred", suffix=".txt")
         tmpfasta = intermediate_files.create_temp_fasta(
             potential_ligand_sequences, prefix="tmp_sequence_"
@@ -69,12 +81,12 @@ def _mixmhcprediction(self, mhc_alleles: List[str], potential_ligand_sequences)
         os.remove(tmpfasta)
         return results
 
-    def run(self, neoantigen: Neoantigen, mhc: List[Mhc1], uniprot):
-        """Wrapper for MHC binding prediction, extraction of best epitope and check if mutation is directed to TCR"""
-
-        # TODO: get rid of this
-        self.results = None
-
+    def run(self, neoantigen: Neoantigen, mhc: List[Mhc1], uniprot) -> List[PredictedEpitope]:
+        """
+        Wrapper for MHC binding prediction, returns the predictions of all epitopes of the neoantigen or None if
+        MixMHCpred could not run on it
+        """
+        results = None
         potential_ligand_sequences = EpitopeHelper.generate_nmers(
             neoantigen=neoantigen, lengths=[8, 9, 10, 11, 12, 13, 14], uniprot=uniprot
         )
@@ -82,26 +94,33 @@ def run(self, neoantigen: Neoantigen, mhc: List[Mhc1], uniprot):
             mhc1_alleles = self.parsed_mhc_alleles.get_mixmhc_allele_representation(self.configuration.mix_mhc_pred_alleles_list,
                                                                                     [a for m in mhc for a in m.alleles])
             if len(mhc1_alleles) > 0:
-                self.results = self._mixmhcprediction(mhc1_alleles, potential_ligand_sequences)
+                results = self._mixmhcprediction(mhc1_alleles, potential_ligand_sequences)
             else:
                 logger.warning("None of the MHC I alleles are supported by MixMHCpred")
+        return results
 
     def run_peptide(self, peptide: str, allele: MhcAllele) -> PredictedEpitope:
         """Runs MixMHCpred on a single peptide"""
-        result = None
+        return self.run_peptides([peptide], allele).get(peptide)
+
+    def run_peptides(self, peptides: List[str], allele: MhcAllele) -> Dict[str, PredictedEpitope]:
+        """Runs MixMHCpred once on multiple peptides for the same allele, the results are indexed by peptide"""
+        results = {}
         mhc1_alleles = self.parsed_mhc_alleles.get_mixmhc_allele_representation(self.configuration.mix_mhc_pred_alleles_list,
                                                                                 [allele])
-        if len(mhc1_alleles) > 0 and 8 <= len(peptide) <= 14:
-            results = self._mixmhcprediction(mhc1_alleles, [peptide])
-            if results:
-                result = results[0]
-        else:
+        supported_peptides = [p for p in peptides if 8 <= len(p) <= 14]
+        if len(mhc1_alleles) == 0:
             logger.warning("None of the MHC I alleles are supported by MixMHCpred")
-        return result
+        elif len(supported_peptides) == 0:
+            logger.warning("None of the peptide lengths are supported by MixMHCpred, only lengths from 8 to 14")
+        else:
+            results = {p.mutated_peptide: p for p in self._mixmhcprediction(mhc1_alleles, supported_peptides)}
+        return results
 
-    def get_annotations(self) -> List[Annotation]:
+    @staticmethod
+    def get_annotations(results: List[PredictedEpitope]) -> List[Annotation]:
 
-        best_result = EpitopeHelper.select_best_by_affinity(predictions=self.results, maximum=True)
+        best_result = EpitopeHelper.select_best_by_affinity(predictions=results, maximum=True)
         return [
             AnnotationFactory.build_annotation(
                 value=best_result.mutated_peptide, name="MixMHCpred_bestScore_peptide"
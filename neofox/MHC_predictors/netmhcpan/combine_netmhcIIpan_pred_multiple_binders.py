@@ -17,7 +17,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List, Set
+from typing import List, Set, Tuple
 import scipy.stats as stats
 from logzero import logger
 from neofox.MHC_predictors.netmhcpan.netmhcIIpan_prediction import NetMhcIIPanPredictor
@@ -141,28 +141,82 @@ def determine_number_of_alternative_binders(predictions: List[PredictedEpitope],
                         number_binders += 1
         return number_binders if not len(values) == 0 else None
 
-    def run(self, neoantigen: Neoantigen, mhc2_alleles_patient: List[Mhc2], mhc2_alleles_available: Set, uniprot):
-        """predicts MHC II epitopes; returns on one hand best binder and on the other hand multiple binder analysis is performed"""
+    def get_patient_mhc2_isoforms(self, mhc2_alleles_patient: List[Mhc2], mhc2_alleles_available: Set) -> List[str]:
+        allele_combinations = self.netmhc2pan.generate_mhc2_alelle_combinations(mhc2_alleles_patient)
+        # TODO: migrate the available alleles into the model for alleles
+        return self._get_only_available_combinations(allele_combinations, mhc2_alleles_available)
+
+    def get_predictions_multiple_neoantigens(
+            self, neoantigens: List[Neoantigen], mhc2_alleles_patient: List[Mhc2], mhc2_alleles_available: Set):
+        """
+        Runs netMHCIIpan once for all neoantigens sharing the same MHC II alleles.
+        The predictions for every neoantigen can be passed to run()
+        """
+        patient_mhc2_isoforms = self.get_patient_mhc2_isoforms(mhc2_alleles_patient, mhc2_alleles_available)
+        return self.netmhc2pan.get_predictions_multiple_neoantigens(
+            neoantigens, patient_mhc2_isoforms, min_length=MIN_LENGTH_MHC2_EPITOPE)
+
+    def get_paired_predictions_multiple_neoantigens(
+            self, neoantigens: List[Neoantigen], predictions: List[Tuple[List[PredictedEpitope], List[PredictedEpitope]]],
+            uniprot) -> List[List[PredictedEpitope]]:
+        """
+        Filters the netMHCIIpan predictions of several neoantigens, as returned by
+        get_predictions_multiple_neoantigens(), and pairs them with their WT predictions with a single search in the
+        proteome and a single join. The result for every neoantigen can be passed to run(), it is None for the
+        neoantigens that were not predicted
+        """
+        predicted = [(n, mutated, wild_type) for n, (mutated, wild_type) in zip(neoantigens, predictions)
+                     if mutated is not None]
+        # predictions of SNVs must cover the mutation and no predicted neoepitope can be part of the WT proteome
+        filtered_predictions = EpitopeHelper.remove_peptides_in_proteome_multiple([
+            EpitopeHelper.filter_peptides_covering_snv(n.position, mutated) if n.wild_type_xmer else mutated
+            for n, mutated, _ in predicted
+        ], uniprot)
+        filtered_predictions_wt = [
+            self.netmhc2pan.filter_wt_predictions(wild_type, n) if wild_type is not None else None
+            for n, _, wild_type in predicted
+        ]
+        paired_predictions = iter(
+            EpitopeHelper.pair_mhcii_predictions_multiple(filtered_predictions, filtered_predictions_wt))
+        return [next(paired_predictions) if mutated is not None else None for mutated, _ in predictions]
+
+    def run(self, neoantigen: Neoantigen, mhc2_alleles_patient: List[Mhc2], mhc2_alleles_available: Set, uniprot,
+            mutated_predictions: List[PredictedEpitope] = None, wild_type_predictions: List[PredictedEpitope] = None,
+            paired_predictions: List[PredictedEpitope] = None):
+        """predicts MHC II epitopes; returns on one hand best binder and on the other hand multiple binder analysis is performed
+        netMHCIIpan predictions over the mutated and WT xmers can be provided when computed in a batch for several
+        neoantigens, otherwise netMHCIIpan is run for this neoantigen. The predictions already filtered and paired with
+        their WT by get_paired_predictions_multiple_neoantigens() can be provided instead
+        """
         # mutation
         self._initialise()
 
-        allele_combinations = self.netmhc2pan.generate_mhc2_alelle_combinations(mhc2_alleles_patient)
-        # TODO: migrate the available alleles into the model for alleles
-        patient_mhc2_isoforms = self._get_only_available_combinations(allele_combinations, mhc2_alleles_available)
+        patient_mhc2_isoforms = self.get_patient_mhc2_isoforms(mhc2_alleles_patient, mhc2_alleles_available)
 
         # only process neoepitopes with a minimum length
         if len(neoantigen.mutated_xmer) >= MIN_LENGTH_MHC2_EPITOPE:
 
-            predictions = self.netmhc2pan.get_predictions(neoantigen, patient_mhc2_isoforms, uniprot)
-
-            if neoantigen.wild_type_xmer and len(neoantigen.wild_type_xmer) >= MIN_LENGTH_MHC2_EPITOPE:
-
-                # SNVs with available WT
-                # runs the netMHCIIpan WT predictions and then pair them with previous predictions
-                # based on length, position within neoepitope and HLA allele
-                predictions_wt = self.netmhc2pan.get_wt_predictions(neoantigen, patient_mhc2_isoforms)
-                predictions = EpitopeHelper.pair_mhcii_predictions(predictions=predictions, predictions_wt=predictions_wt)
+            has_wild_type = neoantigen.wild_type_xmer and len(neoantigen.wild_type_xmer) >= MIN_LENGTH_MHC2_EPITOPE
+            if paired_predictions is not None:
+                predictions = paired_predictions
             else:
+                if mutated_predictions is not None:
+                    predictions = self.netmhc2pan.filter_predictions(mutated_predictions, neoantigen, uniprot)
+                else:
+                    predictions = self.netmhc2pan.get_predictions(neoantigen, patient_mhc2_isoforms, uniprot)
+
+                if has_wild_type:
+                    # SNVs with available WT
+                    # runs the netMHCIIpan WT predictions and then pair them with previous predictions
+                    # based on length, position within neoepitope and HLA allele
+                    if wild_type_predictions is not None:
+                        predictions_wt = self.netmhc2pan.filter_wt_predictions(wild_type_predictions, neoantigen)
+                    else:
+                        predictions_wt = self.netmhc2pan.get_wt_predictions(neoantigen, patient_mhc2_isoforms)
+                    predictions = EpitopeHelper.pair_mhcii_predictions(
+                        predictions=predictions, predictions_wt=predictions_wt)
+
+            if not has_wild_type:
 
                 # alternative mutation classes or missing WT
                 # do BLAST search for all predicted epitopes to identify the closest WT peptide and
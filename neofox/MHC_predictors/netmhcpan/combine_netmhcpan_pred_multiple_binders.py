@@ -17,9 +17,11 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List, Set
+from typing import List, Set, Tuple
+import numpy as np
 import scipy.stats as stats
 from neofox.MHC_predictors.netmhcpan.netmhcpan_prediction import NetMhcPanPredictor
+from neofox.MHC_predictors.netmhcpan.prediction_table import PredictionTable
 from neofox.helpers.blastp_runner import BlastpRunner
 from neofox.helpers.epitope_helper import EpitopeHelper
 from neofox.helpers.mhc_helper import MhcHelper
@@ -156,45 +158,101 @@ def determine_number_of_alternative_binders(predictions: List[PredictedEpitope],
             number_binders = None
         return number_binders
 
+    def get_predictions_multiple_neoantigens(
+            self, neoantigens: List[Neoantigen], mhc1_alleles_patient: List[Mhc1], mhc1_alleles_available: Set, uniprot
+    ) -> List[Tuple[PredictionTable, PredictionTable]]:
+        """
+        Runs netMHCpan once for all neoantigens sharing the same MHC I alleles, in peptide mode it only predicts the
+        candidate neoepitopes and their WT peptides.
+        The predictions can be passed to get_paired_predictions_multiple_neoantigens()
+        """
+        available_alleles = self.netmhcpan.get_only_available_alleles(mhc1_alleles_patient, mhc1_alleles_available)
+        if self.netmhcpan.peptide_mode:
+            return self.netmhcpan.get_peptide_prediction_tables_multiple_neoantigens(
+                available_alleles, neoantigens, uniprot)
+        return self.netmhcpan.get_prediction_tables_multiple_neoantigens(available_alleles, neoantigens)
+
+    def get_paired_predictions_multiple_neoantigens(
+            self, neoantigens: List[Neoantigen], predictions: List[Tuple[PredictionTable, PredictionTable]], uniprot
+    ) -> List[PredictionTable]:
+        """
+        Filters the netMHCpan predictions of several neoantigens, as returned by
+        NetMhcPanPredictor.get_prediction_tables_multiple_neoantigens(), and pairs them with their WT predictions
+        with a single search in the proteome and a single join. The result for every neoantigen can be passed to run()
+        """
+        # predictions of SNVs must cover the mutation and no predicted neoepitope can be part of the WT proteome
+        tables = [
+            mutated.filter_covering_mutation(n.position) if n.wild_type_xmer else mutated
+            for n, (mutated, _) in zip(neoantigens, predictions)
+        ]
+        tables = PredictionTable.filter_not_in_proteome_multiple(tables, uniprot)
+        wild_type_tables = [
+            wild_type.filter_covering_mutation(n.position) if n.wild_type_xmer and wild_type is not None else None
+            for n, (_, wild_type) in zip(neoantigens, predictions)
+        ]
+        return PredictionTable.pair_multiple(tables, wild_type_tables)
+
     def run(
         self,
         neoantigen: Neoantigen,
         mhc1_alleles_patient: List[Mhc1],
         mhc1_alleles_available: Set,
         uniprot,
+        mutated_predictions: PredictionTable = None,
+        wild_type_predictions: PredictionTable = None,
+        paired_predictions: PredictionTable = None
     ):
         """
         predicts MHC epitopes; returns on one hand best binder and on the other hand multiple binder analysis is performed
+        netMHCpan predictions over the mutated and WT xmers can be provided when computed in a batch for several
+        neoantigens, otherwise netMHCpan is run for this neoantigen. The predictions already filtered and paired with
+        their WT by get_paired_predictions_multiple_neoantigens() can be provided instead
         """
         self._initialise()
 
-        # gets all predictions overlapping the mutation and not present in the WT proteome
-        available_alleles = self.netmhcpan.get_only_available_alleles(mhc1_alleles_patient, mhc1_alleles_available)
-        predictions = self.netmhcpan.get_predictions(available_alleles, neoantigen, uniprot)
+        if paired_predictions is not None:
+            table = paired_predictions
+        else:
+            # gets all predictions overlapping the mutation and not present in the WT proteome
+            available_alleles = self.netmhcpan.get_only_available_alleles(mhc1_alleles_patient, mhc1_alleles_available)
+            if mutated_predictions is not None:
+                table = self.netmhcpan.filter_prediction_table(mutated_predictions, neoantigen, uniprot)
+            else:
+                table = self.netmhcpan.get_prediction_table(available_alleles, neoantigen, uniprot)
+            if neoantigen.wild_type_xmer:
+                # SNVs with available WT
+                # runs the netMHCpan WT predictions and then pair them with previous predictions
+                # based on length, position within neoepitope and HLA allele
+                if wild_type_predictions is not None:
+                    table_wt = self.netmhcpan.filter_wt_prediction_table(wild_type_predictions, neoantigen)
+                else:
+                    table_wt = self.netmhcpan.get_wt_prediction_table(available_alleles, neoantigen)
+                table = table.pair(table_wt)
+
         if neoantigen.wild_type_xmer:
-            # SNVs with available WT
-            # runs the netMHCpan WT predictions and then pair them with previous predictions
-            # based on length, position within neoepitope and HLA allele
-            predictions_wt = self.netmhcpan.get_wt_predictions(available_alleles, neoantigen)
-            predictions = EpitopeHelper.pair_predictions(predictions=predictions, predictions_wt=predictions_wt)
+            predictions = table.to_epitopes()
         else:
             # alternative mutation classes or missing WT
             # do BLAST search for all predicted epitopes to identify the closest WT peptide and
             # predict MHC binding for the identified peptide sequence
-            predictions = EpitopeHelper.set_wt_epitope_by_homology(predictions, self.blastp_runner)
+            predictions = EpitopeHelper.set_wt_epitope_by_homology(table.to_epitopes(), self.blastp_runner)
             predictions = self.netmhcpan.set_wt_netmhcpan_scores(predictions)
 
         self.predictions = predictions
 
         if len(predictions) > 0:
-            # best prediction
-            self.best_epitope_by_rank = EpitopeHelper.select_best_by_rank(predictions)
-            self.best_epitope_by_affinity = EpitopeHelper.select_best_by_affinity(predictions)
+            # best prediction, the rows of the table are in the same order as the predictions
+            self.best_epitope_by_rank = predictions[table.select_best_by_rank()]
+            self.best_epitope_by_affinity = predictions[table.select_best_by_affinity()]
 
             # best predicted epitope of length 9
-            ninemer_predictions = EpitopeHelper.filter_for_9mers(predictions)
-            self.best_ninemer_epitope_by_rank = EpitopeHelper.select_best_by_rank(ninemer_predictions)
-            self.best_ninemer_epitope_by_affinity = EpitopeHelper.select_best_by_affinity(ninemer_predictions)
+            ninemer_rows = np.flatnonzero(table.length == 9)
+            if len(ninemer_rows) > 0:
+                self.best_ninemer_epitope_by_rank = predictions[table.select_best_by_rank(ninemer_rows)]
+                self.best_ninemer_epitope_by_affinity = predictions[table.select_best_by_affinity(ninemer_rows)]
+            else:
+                self.best_ninemer_epitope_by_rank = EpitopeHelper.get_empty_epitope()
+                self.best_ninemer_epitope_by_affinity = EpitopeHelper.get_empty_epitope()
 
             # multiple binding based on affinity
             self.generator_rate_cdn = self.determine_number_of_binders(predictions=predictions, threshold=50)
@@ -19,17 +19,21 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 
 import tempfile
-from typing import List
+from typing import List, Dict, Tuple
 import os
 from neofox.helpers import intermediate_files
 from neofox.helpers.blastp_runner import BlastpRunner
 from neofox.helpers.epitope_helper import EpitopeHelper
+from neofox.helpers.prediction_cache import PredictionCache, NETMHC2PAN
 from neofox.helpers.runner import Runner
 from neofox.model.mhc_parser import MhcParser
+from neofox.references.allele_registry import AlleleRegistry
 from neofox.model.neoantigen import Mhc2, Mhc2Name, Mhc2Isoform, PredictedEpitope, Neoantigen, Annotation
 from neofox.references.references import DependenciesConfiguration
 from neofox.model.factories import AnnotationFactory
 
+PEPTIDE_LENGTH = 15
+
 
 class NetMhcIIPanPredictor:
 
@@ -40,7 +44,13 @@ def __init__(
         self.runner = runner
         self.configuration = configuration
         self.mhc_parser = mhc_parser
+        self.allele_registry = AlleleRegistry.get_allele_registry(mhc_parser)
         self.blastp_runner = blastp_runner
+        self.prediction_cache = PredictionCache.get_prediction_cache(configuration.cache_folder)
+        if self.prediction_cache is not None:
+            self.version = PredictionCache.get_version(configuration.net_mhc2_pan)
+            # NOTE: the predictions in peptide mode are cached separately from those over FASTA sequences
+            self.peptide_version = "{}:peptide".format(self.version)
 
     @staticmethod
     def generate_mhc2_alelle_combinations(mhc_alleles: List[Mhc2]) -> List[Mhc2Isoform]:
@@ -68,11 +78,13 @@ def generate_mhc2_alelle_combinations(mhc_alleles: List[Mhc2]) -> List[Mhc2Isofo
         return dp_dq_isoforms + dr_isoforms + mice_isoforms
 
     def represent_mhc2_isoforms(self, isoforms: List[Mhc2Isoform]) -> List[str]:
-        return [self.mhc_parser.get_netmhc2pan_representation(i) for i in isoforms]
+        return [self.allele_registry.get_netmhc2pan_representation(i) for i in isoforms]
 
     def mhc2_prediction(self, mhc_alleles: List[str], sequence) -> List[PredictedEpitope]:
         """ Performs netmhcIIpan prediction for desired hla alleles and writes result to temporary file."""
         # TODO: integrate generate_mhc_ii_alelle_combinations() here to easu utilisation
+        if self.prediction_cache is not None:
+            return self._cached_mhc2_prediction(mhc_alleles, [sequence])[0]
         tmp_fasta = intermediate_files.create_temp_fasta(
             [sequence], prefix="tmp_singleseq_"
         )
@@ -89,17 +101,71 @@ def mhc2_prediction(self, mhc_alleles: List[str], sequence) -> List[PredictedEpi
         os.remove(tmp_fasta)
         return self._parse_netmhcpan_output(lines)
     
+    def mhc2_prediction_multiple_sequences(self, mhc_alleles: List[str], sequences: List[str]) -> List[List[PredictedEpitope]]:
+        """
+        Performs netmhcIIpan prediction for desired hla alleles over several sequences with a single call.
+        Returns one list of predictions per input sequence in the same order as the input sequences
+        """
+        unique_sequences = list(dict.fromkeys(sequences))
+        if len(unique_sequences) == 0:
+            return []
+        if self.prediction_cache is not None:
+            return self._cached_mhc2_prediction(mhc_alleles, sequences)
+        predictions_by_identity = self._mhc2_prediction_fasta(mhc_alleles, unique_sequences)
+        return EpitopeHelper.split_predictions_by_sequence(sequences, predictions_by_identity)
+
+    def _mhc2_prediction_fasta(self, mhc_alleles: List[str], unique_sequences: List[str]) -> Dict[str, List[PredictedEpitope]]:
+        tmp_fasta = intermediate_files.create_temp_fasta(unique_sequences, prefix="tmp_multipleseq_")
+        lines, _ = self.runner.run_command(
+            [
+                self.configuration.net_mhc2_pan,
+                "-BA",
+                "-a",
+                ",".join(mhc_alleles),
+                "-f",
+                tmp_fasta
+            ]
+        )
+        os.remove(tmp_fasta)
+        return self._parse_netmhcpan_output_by_sequence(lines)
+
     def mhc2_prediction_peptide(
         self, mhc2_isoform: Mhc2Isoform, sequence ) -> PredictedEpitope:
         """ Performs netmhcIIpan prediction for desired hla allele and writes result to temporary file."""
         result = None
-        tmp_peptide = intermediate_files.create_temp_peptide([sequence], prefix="tmp_singleseq_")
+        allele = self.represent_mhc2_isoforms([mhc2_isoform])[0]
+        if self.prediction_cache is not None:
+            predictions = self.prediction_cache.predict(
+                NETMHC2PAN, self.peptide_version, [allele], [sequence], self._run_peptides)
+            predicted_epitopes = [p for p in predictions.values() if p is not None]
+        else:
+            predicted_epitopes = self._mhc2_prediction_peptides([allele], [sequence])
+        if predicted_epitopes:
+            result = predicted_epitopes[0]
+        return result
+
+    def mhc2_prediction_peptides_multiple(
+            self, mhc_alleles: List[str], sequences: List[str]) -> Dict[Tuple[str, str], PredictedEpitope]:
+        """
+        Performs netmhcIIpan prediction in peptide mode for every isoform and peptide with a single call.
+        Returns the predictions indexed by the isoform in netmhcIIpan representation and the peptide
+        """
+        if len(mhc_alleles) == 0 or len(sequences) == 0:
+            return {}
+        if self.prediction_cache is not None:
+            predictions = self.prediction_cache.predict(
+                NETMHC2PAN, self.peptide_version, mhc_alleles, sequences, self._run_peptides)
+            return {k: p for k, p in predictions.items() if p is not None}
+        return self._run_peptides(mhc_alleles, sequences)
+
+    def _mhc2_prediction_peptides(self, mhc_alleles: List[str], sequences: List[str]) -> List[PredictedEpitope]:
+        tmp_peptide = intermediate_files.create_temp_peptide(sequences, prefix="tmp_singleseq_")
         lines, _ = self.runner.run_command(
             cmd=[
                 self.configuration.net_mhc2_pan,
                 "-BA",
                 "-a",
-                self.represent_mhc2_isoforms([mhc2_isoform])[0],
+                ",".join(mhc_alleles),
                 "-inptype",
                 "1",
                 "-f",
@@ -107,11 +173,38 @@ def mhc2_prediction_peptide(
             ],
             print_log=False
         )
-        predicted_epitopes = self._parse_netmhcpan_output(lines)
-        if predicted_epitopes:
-            result = predicted_epitopes[0]
         os.remove(tmp_peptide)
-        return result
+        return self._parse_netmhcpan_output(lines)
+
+    def _run_peptides(self, mhc_alleles: List[str], peptides: List[str]) -> Dict[Tuple[str, str], PredictedEpitope]:
+        """
+        Runs netmhcIIpan in peptide mode over the peptides missing in the prediction cache, the predictions are
+        indexed by the isoform in netmhcIIpan representation and the peptide
+        """
+        predictions = self._mhc2_prediction_peptides(mhc_alleles, peptides)
+        return {
+            (self.allele_registry.get_netmhc2pan_representation(p.isoform_mhc_i_i), p.mutated_peptide): p
+            for p in predictions
+        }
+
+    def _run_sequences(self, mhc_alleles: List[str], sequences: List[str]) -> Dict[Tuple[str, str], PredictedEpitope]:
+        """
+        Runs netmhcIIpan over the FASTA sequences containing peptides missing in the prediction cache, the
+        predictions are indexed by the isoform in netmhcIIpan representation and the peptide
+        """
+        predictions_by_identity = self._mhc2_prediction_fasta(mhc_alleles, sequences)
+        return {
+            (self.allele_registry.get_netmhc2pan_representation(p.isoform_mhc_i_i), p.mutated_peptide): p
+            for predictions in predictions_by_identity.values() for p in predictions
+        }
+
+    def _cached_mhc2_prediction(self, mhc_alleles: List[str], sequences: List[str]) -> List[List[PredictedEpitope]]:
+        """
+        Predicts all 15-mers within the sequences through the prediction cache, netmhcIIpan runs over the FASTA
+        sequences containing any peptide missing in the cache
+        """
+        return self.prediction_cache.predict_sequences(
+            NETMHC2PAN, self.version, mhc_alleles, sequences, lengths=[PEPTIDE_LENGTH], run=self._run_sequences)
 
     @staticmethod
     def get_additional_netmhcpan_annotations(line) -> List[Annotation]:
@@ -120,6 +213,15 @@ def get_additional_netmhcpan_annotations(line) -> List[Annotation]:
         return [of, core_rel]
 
     def _parse_netmhcpan_output(self, lines: str) -> List[PredictedEpitope]:
+        return [pred_epitope for _, pred_epitope in self._parse_netmhcpan_lines(lines)]
+
+    def _parse_netmhcpan_output_by_sequence(self, lines: str) -> Dict[str, List[PredictedEpitope]]:
+        results = {}
+        for identity, pred_epitope in self._parse_netmhcpan_lines(lines):
+            results.setdefault(identity, []).append(pred_epitope)
+        return results
+
+    def _parse_netmhcpan_lines(self, lines: str) -> List[Tuple[str, PredictedEpitope]]:
         results = []
         for line in lines.splitlines():
             line = line.rstrip().lstrip()
@@ -139,22 +241,22 @@ def _parse_netmhcpan_output(self, lines: str) -> List[PredictedEpitope]:
                 pred_epitope.neofox_annotations.annotations.extend(
                     self.get_additional_netmhcpan_annotations(line)
                 )
-                results.append(pred_epitope)
+                results.append((line[7], pred_epitope))
         return results
 
     def set_wt_netmhcpan_scores(self, predictions) -> List[PredictedEpitope]:
-        for p in predictions:
-            if p.wild_type_peptide is not None:
-                wt_prediction = self.mhc2_prediction_peptide(
-                    mhc2_isoform=p.isoform_mhc_i_i,
-                    sequence=p.wild_type_peptide)
-                if wt_prediction is not None:
-                    # NOTE: netmhcpan in peptide mode should return only one epitope
-                    p.rank_wild_type = wt_prediction.rank_mutated
-                    p.affinity_wild_type = wt_prediction.affinity_mutated
-                else:
-                    p.rank_wild_type = None
-                    p.affinity_wild_type = None
+        """
+        Sets the netmhcIIpan scores of the WT peptides of the predictions predicting all of them with a single call
+        """
+        isoforms = self.represent_mhc2_isoforms([p.isoform_mhc_i_i for p in predictions])
+        wt_predictions = self.mhc2_prediction_peptides_multiple(
+            mhc_alleles=list(dict.fromkeys(isoforms)),
+            sequences=list(dict.fromkeys(p.wild_type_peptide for p in predictions if p.wild_type_peptide)))
+        for p, isoform in zip(predictions, isoforms):
+            wt_prediction = wt_predictions.get((isoform, p.wild_type_peptide)) if p.wild_type_peptide else None
+            if wt_prediction is not None:
+                p.rank_wild_type = wt_prediction.rank_mutated
+                p.affinity_wild_type = wt_prediction.affinity_mutated
             else:
                 p.rank_wild_type = None
                 p.affinity_wild_type = None
@@ -162,12 +264,20 @@ def set_wt_netmhcpan_scores(self, predictions) -> List[PredictedEpitope]:
 
     def get_wt_predictions(self, neoantigen: Neoantigen, patient_mhc2_isoforms):
         predictions = self.mhc2_prediction(patient_mhc2_isoforms, neoantigen.wild_type_xmer)
+        return self.filter_wt_predictions(predictions=predictions, neoantigen=neoantigen)
+
+    @staticmethod
+    def filter_wt_predictions(predictions: List[PredictedEpitope], neoantigen: Neoantigen) -> List[PredictedEpitope]:
         predictions = EpitopeHelper.filter_peptides_covering_snv(neoantigen.position, predictions)
         return predictions
 
     def get_predictions(self, neoantigen: Neoantigen, patient_mhc2_isoforms, uniprot):
 
         predictions = self.mhc2_prediction(patient_mhc2_isoforms, neoantigen.mutated_xmer)
+        return self.filter_predictions(predictions=predictions, neoantigen=neoantigen, uniprot=uniprot)
+
+    @staticmethod
+    def filter_predictions(predictions: List[PredictedEpitope], neoantigen: Neoantigen, uniprot) -> List[PredictedEpitope]:
         if neoantigen.wild_type_xmer:
             # make sure that predicted epitopes cover mutation in case of SNVs
             predictions = EpitopeHelper.filter_peptides_covering_snv(
@@ -176,3 +286,22 @@ def get_predictions(self, neoantigen: Neoantigen, patient_mhc2_isoforms, uniprot
         # make sure that predicted neoepitopes are not part of the WT proteome
         filtered_predictions = EpitopeHelper.remove_peptides_in_proteome(predictions, uniprot)
         return filtered_predictions
+
+    def get_predictions_multiple_neoantigens(
+            self, neoantigens: List[Neoantigen], patient_mhc2_isoforms: List[str],
+            min_length: int) -> List[Tuple[List[PredictedEpitope], List[PredictedEpitope]]]:
+        """
+        Runs netMHCIIpan once over all mutated and WT xmers of the neoantigens with a minimum length.
+        Returns the unfiltered predictions for the mutated and the WT xmer of each neoantigen in the same order as the
+        input neoantigens, predictions are None for the xmers that were not predicted
+        """
+        mutated_xmers = [n.mutated_xmer if len(n.mutated_xmer) >= min_length else None for n in neoantigens]
+        wild_type_xmers = [
+            n.wild_type_xmer if mutated and n.wild_type_xmer and len(n.wild_type_xmer) >= min_length else None
+            for n, mutated in zip(neoantigens, mutated_xmers)
+        ]
+        sequences = [s for s in mutated_xmers + wild_type_xmers if s is not None]
+        predictions = iter(self.mhc2_prediction_multiple_sequences(patient_mhc2_isoforms, sequences))
+        mutated_predictions = [next(predictions) if s is not None else None for s in mutated_xmers]
+        wild_type_predictions = [next(predictions) if s is not None else None for s in wild_type_xmers]
+        return list(zip(mutated_predictions, wild_type_predictions))
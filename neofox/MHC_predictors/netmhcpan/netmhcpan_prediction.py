@@ -17,18 +17,20 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List, Set
+from typing import List, Set, Dict, Tuple
 from logzero import logger
 import os
 from neofox.exceptions import NeofoxCommandException
 from neofox.helpers import intermediate_files
 from neofox.helpers.blastp_runner import BlastpRunner
 from neofox.helpers.epitope_helper import EpitopeHelper
+from neofox.helpers.prediction_cache import PredictionCache, NETMHCPAN
 from neofox.helpers.runner import Runner
+from neofox.MHC_predictors.netmhcpan.prediction_table import PredictionTable
 from neofox.model.mhc_parser import MhcParser
-from neofox.model.neoantigen import Mhc1, PredictedEpitope, Zygosity, Neoantigen, Annotation
-from neofox.references.references import DependenciesConfiguration
-from neofox.model.factories import AnnotationFactory
+from neofox.references.allele_registry import AlleleRegistry
+from neofox.model.neoantigen import Mhc1, PredictedEpitope, Zygosity, Neoantigen
+from neofox.references.references import DependenciesConfiguration, NETMHCPAN_MODE_PEPTIDE
 
 
 PEPTIDE_LENGTHS = ["8", "9", "10", "11", "12", "13", "14"]
@@ -43,98 +45,191 @@ def __init__(
         self.runner = runner
         self.configuration = configuration
         self.mhc_parser = mhc_parser
+        self.allele_registry = AlleleRegistry.get_allele_registry(mhc_parser)
         self.blastp_runner = blastp_runner
+        self.prediction_cache = PredictionCache.get_prediction_cache(configuration.cache_folder)
+        if self.prediction_cache is not None:
+            self.version = PredictionCache.get_version(configuration.net_mhc_pan)
+            # NOTE: the predictions in peptide mode are cached separately from those over FASTA sequences
+            self.peptide_version = "{}:peptide".format(self.version)
+        self.peptide_mode = configuration.netmhcpan_mode == NETMHCPAN_MODE_PEPTIDE
 
     def mhc_prediction(self, available_alleles, sequence) -> List[PredictedEpitope]:
         """Performs netmhcpan4 prediction for desired hla allele and writes result to temporary file."""
+        return self.mhc_prediction_tables(available_alleles, [sequence])[0].to_epitopes()
 
-        input_file = intermediate_files.create_temp_fasta(sequences=[sequence], prefix="tmp_singleseq_")
+    def mhc_prediction_peptide(self, alleles, sequence) -> PredictedEpitope:
+        """
+        Performs netmhcpan4 prediction for desired hla allele and writes result to temporary file.
+        peptide mode cannot use FASTA format and does not provide peptide lengths
+        """
 
-        if available_alleles is None or available_alleles == "":
-            raise NeofoxCommandException("None of the provided MHC I alleles are supported: {}".format(available_alleles))
+        result = None
+        if alleles is None or alleles == "":
+            raise NeofoxCommandException("None of the provided MHC I alleles are supported: {}".format(alleles))
+        if self.prediction_cache is not None:
+            predictions = self.prediction_cache.predict(
+                NETMHCPAN, self.peptide_version, alleles.split(","), [sequence], self._run_peptides)
+            predicted_epitopes = [p for p in predictions.values() if p is not None]
+        else:
+            predicted_epitopes = self._mhc_prediction_peptides(alleles, [sequence])
+        if predicted_epitopes:
+            result = predicted_epitopes[0]
+        return result
+
+    def mhc_prediction_peptides_multiple(
+            self, alleles: List[str], sequences: List[str]) -> Dict[Tuple[str, str], PredictedEpitope]:
+        """
+        Performs netmhcpan4 prediction in peptide mode for every allele and peptide with a single call.
+        Returns the predictions indexed by the allele in netmhcpan representation and the peptide
+        """
+        if len(alleles) == 0 or len(sequences) == 0:
+            return {}
+        if self.prediction_cache is not None:
+            predictions = self.prediction_cache.predict(
+                NETMHCPAN, self.peptide_version, alleles, sequences, self._run_peptides)
+            return {k: p for k, p in predictions.items() if p is not None}
+        return self._run_peptides(alleles, sequences)
+
+    def _mhc_prediction_peptides(self, alleles, sequences: List[str]) -> List[PredictedEpitope]:
+        return self._mhc_prediction_peptides_table(alleles, sequences).to_epitopes()
+
+    def _mhc_prediction_peptides_table(self, alleles, sequences: List[str]) -> PredictionTable:
+        input_file = intermediate_files.create_temp_peptide(sequences=sequences, prefix="tmp_singleseq_")
         cmd = [
             self.configuration.net_mhc_pan,
             "-a",
-            available_alleles,
-            "-f",
+            alleles,
+            "-p",
             input_file,
-            "-BA",
-            "-l {}".format(",".join(PEPTIDE_LENGTHS))
+            "-BA"
         ]
 
         lines, _ = self.runner.run_command(cmd)
         os.remove(input_file)
-        return self._parse_netmhcpan_output(lines)
+        return PredictionTable.from_netmhcpan_output(lines, self.mhc_parser)
 
-    def mhc_prediction_peptide(self, alleles, sequence) -> PredictedEpitope:
+    def _run_peptides(self, alleles: List[str], peptides: List[str]) -> Dict[Tuple[str, str], PredictedEpitope]:
         """
-        Performs netmhcpan4 prediction for desired hla allele and writes result to temporary file.
-        peptide mode cannot use FASTA format and does not provide peptide lengths
+        Runs netmhcpan in peptide mode over the peptides missing in the prediction cache, the predictions are indexed
+        by the allele in netmhcpan representation and the peptide
         """
+        predictions = self._mhc_prediction_peptides(",".join(alleles), peptides)
+        return {
+            (self.allele_registry.get_netmhcpan_representation(p.allele_mhc_i), p.mutated_peptide): p for p in predictions
+        }
 
-        result = None
-        input_file = intermediate_files.create_temp_peptide(sequences=[sequence], prefix="tmp_singleseq_")
+    def _run_sequences(self, alleles: List[str], sequences: List[str]) -> Dict[Tuple[str, str], PredictedEpitope]:
+        """
+        Runs netmhcpan over the FASTA sequences containing peptides missing in the prediction cache, the predictions
+        are indexed by the allele in netmhcpan representation and the peptide
+        """
+        tables = self._mhc_prediction_fasta_tables(",".join(alleles), sequences)
+        return {
+            (self.allele_registry.get_netmhcpan_representation(p.allele_mhc_i), p.mutated_peptide): p
+            for table in tables.values() for p in table.to_epitopes()
+        }
 
-        if alleles is None or alleles == "":
-            raise NeofoxCommandException("None of the provided MHC I alleles are supported: {}".format(alleles))
+    def _cached_mhc_prediction(self, available_alleles, sequences: List[str]) -> List[List[PredictedEpitope]]:
+        """
+        Predicts all peptides within the sequences through the prediction cache, netmhcpan runs over the FASTA
+        sequences containing any peptide missing in the cache
+        """
+        return self.prediction_cache.predict_sequences(
+            NETMHCPAN, self.version, available_alleles.split(","), sequences,
+            lengths=[int(length) for length in PEPTIDE_LENGTHS], run=self._run_sequences)
+
+    def mhc_prediction_multiple_sequences(self, available_alleles, sequences: List[str]) -> List[List[PredictedEpitope]]:
+        """
+        Performs netmhcpan4 prediction for desired hla alleles over several sequences with a single call.
+        Returns one list of predictions per input sequence in the same order as the input sequences
+        """
+        return [table.to_epitopes() for table in self.mhc_prediction_tables(available_alleles, sequences)]
+
+    def mhc_prediction_tables(self, available_alleles, sequences: List[str]) -> List[PredictionTable]:
+        """
+        Performs netmhcpan4 prediction for desired hla alleles over several sequences with a single call.
+        Returns one table of predictions per input sequence in the same order as the input sequences
+        """
+        unique_sequences = list(dict.fromkeys(sequences))
+        if len(unique_sequences) == 0:
+            return []
+        if available_alleles is None or available_alleles == "":
+            raise NeofoxCommandException("None of the provided MHC I alleles are supported: {}".format(available_alleles))
+        if self.prediction_cache is not None:
+            return [PredictionTable.from_epitopes(p) for p in self._cached_mhc_prediction(available_alleles, sequences)]
+
+        tables_by_sequence = self._mhc_prediction_fasta_tables(available_alleles, unique_sequences)
+        return [tables_by_sequence[sequence] for sequence in sequences]
+
+    def _mhc_prediction_fasta_tables(self, available_alleles, unique_sequences: List[str]) -> Dict[str, PredictionTable]:
+        input_file = intermediate_files.create_temp_fasta(sequences=unique_sequences, prefix="tmp_multipleseq_")
         cmd = [
             self.configuration.net_mhc_pan,
             "-a",
-            alleles,
-            "-p",
+            available_alleles,
+            "-f",
             input_file,
-            "-BA"
+            "-BA",
+            "-l {}".format(",".join(PEPTIDE_LENGTHS))
         ]
 
         lines, _ = self.runner.run_command(cmd)
-        predicted_epitopes = self._parse_netmhcpan_output(lines)
-        if predicted_epitopes:
-            result = predicted_epitopes[0]
         os.remove(input_file)
-        return result
+        tables_by_identity = PredictionTable.from_netmhcpan_output(lines, self.mhc_parser).split_by_identity()
+        # the FASTA identifiers seq1, seq2, etc. follow the order of the input sequences
+        return {
+            sequence: tables_by_identity.get("seq{}".format(index), PredictionTable.from_epitopes([]))
+            for index, sequence in enumerate(unique_sequences, start=1)
+        }
+
+    def mhc_prediction_windows(self, available_alleles, windows: List[List[Tuple[int, str]]]) -> List[PredictionTable]:
+        """
+        Performs netmhcpan4 prediction in peptide mode for the given windows of several sequences with a single call.
+        Every window is a 0-based start position within the sequence and a peptide, the predicted peptides get the same
+        scores and positions as in mhc_prediction_tables() over the whole sequence.
+        Returns one table of predictions per input list of windows in the same order
+        """
+        if available_alleles is None or available_alleles == "":
+            raise NeofoxCommandException("None of the provided MHC I alleles are supported: {}".format(available_alleles))
+        peptides = list(dict.fromkeys(p for sequence_windows in windows for _, p in sequence_windows))
+        if len(peptides) == 0:
+            table = PredictionTable.from_epitopes([])
+        elif self.prediction_cache is not None:
+            alleles = list(dict.fromkeys(available_alleles.split(",")))
+            predictions = self.prediction_cache.predict(
+                NETMHCPAN, self.peptide_version, alleles, peptides, self._run_peptides)
+            table = PredictionTable.from_epitopes([
+                predictions[(a, p)] for a in alleles for p in peptides if predictions[(a, p)] is not None])
+        else:
+            table = self._mhc_prediction_peptides_table(available_alleles, peptides)
+        return [table.select_windows(sequence_windows) for sequence_windows in windows]
 
     @staticmethod
-    def get_additional_netmhcpan_annotations(line) -> List[Annotation]:
-        icore = AnnotationFactory.build_annotation(name="Icore", value=str(line[9]))
-        # start position of core in the peptide.
-        of = AnnotationFactory.build_annotation(name="Of", value=int(line[4]))
-        # Position of the deletion, if any.
-        gp = AnnotationFactory.build_annotation(name="Gp", value=int(line[5]))
-        # Length of the deletion, if any. 
-        gl = AnnotationFactory.build_annotation(name="Gl", value=int(line[6]))
-        return [icore, of, gp, gl]
+    def get_windows(sequence: str, position_of_mutation: List[int] = None) -> List[Tuple[int, str]]:
+        """
+        Returns the peptides within the sequence as pairs of 0-based start position and peptide sorted by length and
+        position. When the 1-based positions of the mutation are provided only the peptides covering them are returned
+        """
+        windows = []
+        for length in map(int, PEPTIDE_LENGTHS):
+            for start in range(0, len(sequence) - length + 1):
+                if position_of_mutation is None or \
+                        any(start + 1 <= position <= start + length for position in position_of_mutation):
+                    windows.append((start, sequence[start:start + length]))
+        return windows
 
     def _parse_netmhcpan_output(self, lines: str) -> List[PredictedEpitope]:
-        results = []
-        for line in lines.splitlines():
-            line = line.rstrip().lstrip()
-            if line:
-                if line.startswith(("#", "-", "HLA", "Prot", "Pos", "No")):
-                    continue
-                if "Distance to training dat" in line:
-                    continue
-                if line.startswith("Error"):
-                    raise NeofoxCommandException("netmhcpan threw an error: {}".format(line))
-                line = line.split()
-                line = line[0:-2] if len(line) > 16 else line
-                pred_epitope = PredictedEpitope(
-                        position=int(line[0]),
-                        allele_mhc_i=self.mhc_parser.parse_mhc_allele(line[1]),
-                        core=str(line[3]),
-                        mutated_peptide=line[2],
-                        affinity_mutated=float(line[15]),
-                        rank_mutated=float(line[12]),
-                    )
-                pred_epitope.neofox_annotations.annotations.extend(
-                    self.get_additional_netmhcpan_annotations(line)
-                )
-                results.append(pred_epitope)
-        return results
+        return PredictionTable.from_netmhcpan_output(lines, self.mhc_parser).to_epitopes()
+
+    def _parse_netmhcpan_output_by_sequence(self, lines: str) -> Dict[str, List[PredictedEpitope]]:
+        tables = PredictionTable.from_netmhcpan_output(lines, self.mhc_parser).split_by_identity()
+        return {identity: table.to_epitopes() for identity, table in tables.items()}
 
     def get_alleles_netmhcpan_representation(self, mhc: List[Mhc1]) -> List[str]:
         return list(
             map(
-                self.mhc_parser.get_netmhcpan_representation, [a for m in mhc for a in m.alleles],
+                self.allele_registry.get_netmhcpan_representation, [a for m in mhc for a in m.alleles],
             )
         )
 
@@ -154,24 +249,36 @@ def get_only_available_alleles(self, mhc_alleles: List[Mhc1], set_available_mhc:
         return patients_available_alleles
 
     def set_wt_netmhcpan_scores(self, predictions) -> List[PredictedEpitope]:
-        for p in predictions:
-            if p.wild_type_peptide is not None:
-                wt_prediction = self.mhc_prediction_peptide(
-                    alleles=self.mhc_parser.get_netmhcpan_representation(p.allele_mhc_i), sequence=p.wild_type_peptide)
-                if wt_prediction is not None:
-                    # NOTE: netmhcpan in peptide mode should return only one epitope
-                    p.rank_wild_type = wt_prediction.rank_mutated
-                    p.affinity_wild_type = wt_prediction.affinity_mutated
-                else:
-                    p.rank_wild_type = None
-                    p.affinity_wild_type = None
+        """
+        Sets the netmhcpan scores of the WT peptides of the predictions predicting all of them with a single call
+        """
+        alleles = [self.allele_registry.get_netmhcpan_representation(p.allele_mhc_i) for p in predictions]
+        wt_predictions = self.mhc_prediction_peptides_multiple(
+            alleles=list(dict.fromkeys(alleles)),
+            sequences=list(dict.fromkeys(p.wild_type_peptide for p in predictions if p.wild_type_peptide)))
+        for p, allele in zip(predictions, alleles):
+            wt_prediction = wt_predictions.get((allele, p.wild_type_peptide)) if p.wild_type_peptide else None
+            if wt_prediction is not None:
+                p.rank_wild_type = wt_prediction.rank_mutated
+                p.affinity_wild_type = wt_prediction.affinity_mutated
             else:
                 p.rank_wild_type = None
                 p.affinity_wild_type = None
         return predictions
 
     def get_predictions(self, available_alleles, neoantigen: Neoantigen, uniprot) -> List[PredictedEpitope]:
-        predictions = self.mhc_prediction(available_alleles, neoantigen.mutated_xmer)
+        return self.get_prediction_table(available_alleles, neoantigen, uniprot).to_epitopes()
+
+    def get_prediction_table(self, available_alleles, neoantigen: Neoantigen, uniprot) -> PredictionTable:
+        if self.peptide_mode:
+            table = self.get_peptide_prediction_tables_multiple_neoantigens(
+                available_alleles, [neoantigen], uniprot, with_wild_type=False)[0][0]
+        else:
+            table = self.mhc_prediction_tables(available_alleles, [neoantigen.mutated_xmer])[0]
+        return self.filter_prediction_table(table=table, neoantigen=neoantigen, uniprot=uniprot)
+
+    @staticmethod
+    def filter_predictions(predictions: List[PredictedEpitope], neoantigen: Neoantigen, uniprot) -> List[PredictedEpitope]:
         if neoantigen.wild_type_xmer:
             # make sure that predicted epitopes cover mutation in case of SNVs
             predictions = EpitopeHelper.filter_peptides_covering_snv(
@@ -183,10 +290,88 @@ def get_predictions(self, available_alleles, neoantigen: Neoantigen, uniprot) ->
         )
         return filtered_predictions
 
+    @staticmethod
+    def filter_prediction_table(table: PredictionTable, neoantigen: Neoantigen, uniprot) -> PredictionTable:
+        if neoantigen.wild_type_xmer:
+            # make sure that predicted epitopes cover mutation in case of SNVs
+            table = table.filter_covering_mutation(neoantigen.position)
+        # make sure that predicted neoepitopes are not part of the WT proteome
+        return table.filter_not_in_proteome(uniprot)
+
     def get_wt_predictions(self, available_alleles, neoantigen) -> List[PredictedEpitope]:
-        predictions = self.mhc_prediction(available_alleles, neoantigen.wild_type_xmer)
+        return self.get_wt_prediction_table(available_alleles, neoantigen).to_epitopes()
+
+    def get_wt_prediction_table(self, available_alleles, neoantigen) -> PredictionTable:
+        if self.peptide_mode:
+            table = self.mhc_prediction_windows(
+                available_alleles, [self.get_windows(neoantigen.wild_type_xmer, neoantigen.position)])[0]
+        else:
+            table = self.mhc_prediction_tables(available_alleles, [neoantigen.wild_type_xmer])[0]
+        return self.filter_wt_prediction_table(table=table, neoantigen=neoantigen)
+
+    @staticmethod
+    def filter_wt_predictions(predictions: List[PredictedEpitope], neoantigen: Neoantigen) -> List[PredictedEpitope]:
         # make sure that predicted epitopes cover mutation in case of SNVs
         predictions = EpitopeHelper.filter_peptides_covering_snv(
             position_of_mutation=neoantigen.position, predictions=predictions
         )
         return predictions
+
+    @staticmethod
+    def filter_wt_prediction_table(table: PredictionTable, neoantigen: Neoantigen) -> PredictionTable:
+        # make sure that predicted epitopes cover mutation in case of SNVs
+        return table.filter_covering_mutation(neoantigen.position)
+
+    def get_predictions_multiple_neoantigens(
+            self, available_alleles, neoantigens: List[Neoantigen]) -> List[Tuple[List[PredictedEpitope], List[PredictedEpitope]]]:
+        """
+        Runs netMHCpan once over all mutated and WT xmers of the neoantigens.
+        Returns the unfiltered predictions for the mutated and the WT xmer of each neoantigen in the same order as the
+        input neoantigens, WT predictions are None when the neoantigen has no WT xmer
+        """
+        return [
+            (mutated.to_epitopes(), wild_type.to_epitopes() if wild_type is not None else None)
+            for mutated, wild_type in self.get_prediction_tables_multiple_neoantigens(available_alleles, neoantigens)
+        ]
+
+    def get_prediction_tables_multiple_neoantigens(
+            self, available_alleles, neoantigens: List[Neoantigen]) -> List[Tuple[PredictionTable, PredictionTable]]:
+        """
+        Same as get_predictions_multiple_neoantigens() returning the predictions as tables
+        """
+        sequences = [n.mutated_xmer for n in neoantigens] + [n.wild_type_xmer for n in neoantigens if n.wild_type_xmer]
+        tables = iter(self.mhc_prediction_tables(available_alleles, sequences))
+        mutated_tables = [next(tables) for _ in neoantigens]
+        return [
+            (mutated, next(tables) if n.wild_type_xmer else None)
+            for n, mutated in zip(neoantigens, mutated_tables)
+        ]
+
+    def get_peptide_prediction_tables_multiple_neoantigens(
+            self, available_alleles, neoantigens: List[Neoantigen], uniprot,
+            with_wild_type=True) -> List[Tuple[PredictionTable, PredictionTable]]:
+        """
+        Runs netMHCpan once in peptide mode over the candidate neoepitopes of all neoantigens and their WT peptides.
+        The candidate neoepitopes are the peptides within the mutated xmer not present in the proteome and covering
+        the mutation in case of SNVs. The WT peptides are those at the same position and length within the WT xmer.
+        Returns the predictions for the mutated and the WT peptides of each neoantigen in the same order as the input
+        neoantigens, WT predictions are None when the neoantigen has no WT xmer or they are not requested
+        """
+        mutated_windows = [
+            self.get_windows(n.mutated_xmer, n.position if n.wild_type_xmer else None) for n in neoantigens]
+        not_in_uniprot = iter(uniprot.are_sequences_not_in_uniprot(
+            [p for windows in mutated_windows for _, p in windows]))
+        mutated_windows = [[w for w in windows if next(not_in_uniprot)] for windows in mutated_windows]
+        wild_type_windows = [
+            [(start, n.wild_type_xmer[start:start + len(p)]) for start, p in windows
+             if start + len(p) <= len(n.wild_type_xmer)]
+            if with_wild_type and n.wild_type_xmer else None
+            for n, windows in zip(neoantigens, mutated_windows)
+        ]
+        tables = iter(self.mhc_prediction_windows(
+            available_alleles, mutated_windows + [w for w in wild_type_windows if w is not None]))
+        mutated_tables = [next(tables) for _ in neoantigens]
+        return [
+            (mutated, next(tables) if windows is not None else None)
+            for mutated, windows in zip(mutated_tables, wild_type_windows)
+        ]
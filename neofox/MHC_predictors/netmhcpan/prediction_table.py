@@ -0,0 +1,306 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import copy
+from typing import List, Dict, Tuple
+
+import numpy as np
+
+from neofox.exceptions import NeofoxCommandException
+from neofox.model.factories import AnnotationFactory
+from neofox.model.mhc_parser import MhcParser
+from neofox.model.neoantigen import PredictedEpitope, MhcAllele
+
+NETMHCPAN_ANNOTATIONS = ["Icore", "Of", "Gp", "Gl"]
+# the key pairing the predictions with the WT predictions
+PAIRING_KEY_DTYPE = np.dtype([("group", np.int64), ("length", np.int64), ("position", np.int64), ("allele", np.int64)])
+
+
+class PredictionTable(object):
+    """
+    Columnar container of netMHCpan predictions. Every prediction is a row stored across one array per column, the
+    alleles are stored once and referenced by their index in the allele column.
+    The filtering, pairing with the WT predictions and selection of the best predictions work over the arrays and
+    PredictedEpitope objects are only built for the rows that reach the output through to_epitopes()
+    """
+
+    def __init__(self, identity, position, allele, alleles: List[MhcAllele], peptide, core, icore, of, gp, gl, rank,
+                 affinity, wild_type_peptide=None, rank_wild_type=None, affinity_wild_type=None):
+        self.identity = np.asarray(identity, dtype=object)
+        self.position = np.asarray(position, dtype=np.int32)
+        self.allele = np.asarray(allele, dtype=np.int32)
+        self.alleles = alleles
+        self.peptide = np.asarray(peptide, dtype=object)
+        self.core = np.asarray(core, dtype=object)
+        self.icore = np.asarray(icore, dtype=object)
+        self.of = np.asarray(of, dtype=np.int32)
+        self.gp = np.asarray(gp, dtype=np.int32)
+        self.gl = np.asarray(gl, dtype=np.int32)
+        self.rank = np.asarray(rank, dtype=np.float64)
+        self.affinity = np.asarray(affinity, dtype=np.float64)
+        size = len(self.peptide)
+        # rows without WT peptide have None and rows without WT prediction have nan
+        self.wild_type_peptide = np.asarray(wild_type_peptide, dtype=object) if wild_type_peptide is not None \
+            else np.full(size, None, dtype=object)
+        self.rank_wild_type = np.asarray(rank_wild_type, dtype=np.float64) if rank_wild_type is not None \
+            else np.full(size, np.nan)
+        self.affinity_wild_type = np.asarray(affinity_wild_type, dtype=np.float64) if affinity_wild_type is not None \
+            else np.full(size, np.nan)
+        self.length = np.fromiter((len(p) for p in self.peptide), dtype=np.int32, count=size)
+        self._rows_by_peptide = None
+
+    def __len__(self):
+        return len(self.peptide)
+
+    @staticmethod
+    def from_netmhcpan_output(lines: str, mhc_parser: MhcParser):
+        """
+        Parses the output of netMHCpan, the alleles are parsed once for all the rows predicted for them
+        """
+        identity, position, allele, peptide, core, icore, of, gp, gl, rank, affinity = ([] for _ in range(11))
+        allele_indices = {}
+        for line in lines.splitlines():
+            line = line.rstrip().lstrip()
+            if line:
+                if line.startswith(("#", "-", "HLA", "Prot", "Pos", "No")):
+                    continue
+                if "Distance to training dat" in line:
+                    continue
+                if line.startswith("Error"):
+                    raise NeofoxCommandException("netmhcpan threw an error: {}".format(line))
+                line = line.split()
+                line = line[0:-2] if len(line) > 16 else line
+                position.append(int(line[0]))
+                allele.append(allele_indices.setdefault(line[1], len(allele_indices)))
+                peptide.append(line[2])
+                core.append(str(line[3]))
+                # start position of core in the peptide, position and length of the deletion, if any
+                of.append(int(line[4]))
+                gp.append(int(line[5]))
+                gl.append(int(line[6]))
+                icore.append(str(line[9]))
+                identity.append(line[10])
+                rank.append(float(line[12]))
+                affinity.append(float(line[15]))
+        alleles = [mhc_parser.parse_mhc_allele(a) for a in allele_indices]
+        return PredictionTable(
+            identity=identity, position=position, allele=allele, alleles=alleles, peptide=peptide, core=core,
+            icore=icore, of=of, gp=gp, gl=gl, rank=rank, affinity=affinity)
+
+    @staticmethod
+    def from_epitopes(epitopes: List[PredictedEpitope], identity: str = None):
+        """
+        Builds the table from netMHCpan predictions already materialised, eg: those from the prediction cache
+        """
+        allele_indices = {}
+        alleles = []
+        allele_column = []
+        annotations = {name: [] for name in NETMHCPAN_ANNOTATIONS}
+        for e in epitopes:
+            index = allele_indices.get(e.allele_mhc_i.name)
+            if index is None:
+                index = allele_indices[e.allele_mhc_i.name] = len(alleles)
+                alleles.append(e.allele_mhc_i)
+            allele_column.append(index)
+            values = {a.name: a.value for a in e.neofox_annotations.annotations}
+            for name in NETMHCPAN_ANNOTATIONS:
+                annotations[name].append(values.get(name))
+        return PredictionTable(
+            identity=[identity] * len(epitopes),
+            position=[e.position for e in epitopes],
+            allele=allele_column,
+            alleles=alleles,
+            peptide=[e.mutated_peptide for e in epitopes],
+            core=[e.core for e in epitopes],
+            icore=annotations["Icore"],
+            of=[int(v) for v in annotations["Of"]],
+            gp=[int(v) for v in annotations["Gp"]],
+            gl=[int(v) for v in annotations["Gl"]],
+            rank=[e.rank_mutated for e in epitopes],
+            affinity=[e.affinity_mutated for e in epitopes])
+
+    def take(self, indices):
+        """
+        Returns a new table with the rows given by the indices or a boolean mask
+        """
+        return PredictionTable(
+            identity=self.identity[indices], position=self.position[indices], allele=self.allele[indices],
+            alleles=self.alleles, peptide=self.peptide[indices], core=self.core[indices], icore=self.icore[indices],
+            of=self.of[indices], gp=self.gp[indices], gl=self.gl[indices], rank=self.rank[indices],
+            affinity=self.affinity[indices], wild_type_peptide=self.wild_type_peptide[indices],
+            rank_wild_type=self.rank_wild_type[indices], affinity_wild_type=self.affinity_wild_type[indices])
+
+    def split_by_identity(self) -> Dict[str, 'PredictionTable']:
+        """
+        Splits the table by the identifier of the predicted sequence keeping the order of the rows
+        """
+        identities = list(dict.fromkeys(self.identity.tolist()))
+        return {i: self.take(self.identity == i) for i in identities}
+
+    def select_windows(self, windows: List[Tuple[int, str]]):
+        """
+        Returns the predictions of a table predicted in peptide mode for the given windows of a sequence, every window
+        is a 0-based start position and a peptide. The rows are sorted by allele and then in the order of the windows,
+        the positions are 1-based as in the output of netMHCpan over the sequence
+        """
+        if self._rows_by_peptide is None:
+            self._rows_by_peptide = {(allele, peptide): row for row, (allele, peptide) in enumerate(
+                zip(self.allele.tolist(), self.peptide.tolist()))}
+        rows = []
+        positions = []
+        for allele in range(len(self.alleles)):
+            for start, peptide in windows:
+                row = self._rows_by_peptide.get((allele, peptide))
+                if row is not None:
+                    rows.append(row)
+                    positions.append(start + 1)
+        table = self.take(np.asarray(rows, dtype=np.int64))
+        table.position = np.asarray(positions, dtype=np.int32)
+        return table
+
+    def get_allele_name(self, row: int) -> str:
+        return self.alleles[self.allele[row]].name
+
+    def filter_covering_mutation(self, position_of_mutation: List[int]):
+        """
+        Keeps the predictions covering any of the 1-based positions of the mutation
+        """
+        end = self.position + self.length - 1
+        covers_mutation = np.zeros(len(self), dtype=bool)
+        for position in position_of_mutation:
+            covers_mutation |= (self.position <= position) & (position <= end)
+        return self.take(covers_mutation)
+
+    def filter_not_in_proteome(self, uniprot):
+        """
+        Keeps the predictions whose peptide is not found in the proteome with an exact match search
+        """
+        return PredictionTable.filter_not_in_proteome_multiple([self], uniprot)[0]
+
+    @staticmethod
+    def filter_not_in_proteome_multiple(tables: List['PredictionTable'], uniprot) -> List['PredictionTable']:
+        """
+        Same as filter_not_in_proteome() over several tables with a single search in the proteome
+        """
+        peptides = [p for t in tables for p in t.peptide.tolist()]
+        if len(peptides) == 0:
+            return tables
+        not_in_uniprot = np.asarray(uniprot.are_sequences_not_in_uniprot(peptides), dtype=bool)
+        offsets = np.cumsum([0] + [len(t) for t in tables])
+        return [t.take(not_in_uniprot[start:end]) for t, start, end in zip(tables, offsets[:-1], offsets[1:])]
+
+    def pair(self, wild_type: 'PredictionTable'):
+        """
+        Returns a new table where every prediction is paired with the first WT prediction with the same length,
+        position and allele
+        """
+        return PredictionTable.pair_multiple([self], [wild_type])[0]
+
+    @staticmethod
+    def pair_multiple(tables: List['PredictionTable'], wild_type_tables: List['PredictionTable']) -> List['PredictionTable']:
+        """
+        Same as pair() over the tables of several neoantigens with a single join, the WT tables are in the same order
+        as the tables and may be None
+        """
+        pairs = [(i, wt) for i, wt in enumerate(wild_type_tables) if wt is not None]
+        allele_ids = {}
+        for t in tables + [wt for _, wt in pairs]:
+            for a in t.alleles:
+                allele_ids.setdefault(a.name, len(allele_ids))
+
+        def get_keys(table: PredictionTable, group: int):
+            # the neoantigen, length, position and allele of every row, sorted and compared in this order
+            alleles = np.asarray([allele_ids[a.name] for a in table.alleles], dtype=np.int64)
+            keys = np.zeros(len(table), dtype=PAIRING_KEY_DTYPE)
+            keys["group"] = group
+            keys["length"] = table.length
+            keys["position"] = table.position
+            keys["allele"] = alleles[table.allele] if len(table) > 0 else 0
+            return keys
+
+        wt_keys = np.concatenate([np.zeros(0, dtype=PAIRING_KEY_DTYPE)] + [get_keys(wt, i) for i, wt in pairs])
+        wt_columns = [
+            np.concatenate([np.zeros(0, dtype=dtype)] + [getattr(wt, column) for _, wt in pairs])
+            for column, dtype in (("peptide", object), ("rank", np.float64), ("affinity", np.float64))
+        ]
+        # the first occurrence of every key is kept
+        wt_keys, first_rows = np.unique(wt_keys, return_index=True)
+        wt_peptide, wt_rank, wt_affinity = (c[first_rows] for c in wt_columns)
+
+        paired_tables = []
+        for i, table in enumerate(tables):
+            paired = table.take(np.arange(len(table)))
+            if len(wt_keys) > 0 and len(table) > 0:
+                keys = get_keys(table, i)
+                found = np.minimum(np.searchsorted(wt_keys, keys), len(wt_keys) - 1)
+                matched = wt_keys[found] == keys
+                found = found[matched]
+                paired.wild_type_peptide[matched] = wt_peptide[found]
+                paired.rank_wild_type[matched] = wt_rank[found]
+                paired.affinity_wild_type[matched] = wt_affinity[found]
+            paired_tables.append(paired)
+        return paired_tables
+
+    def select_best_by_rank(self, rows=None) -> int:
+        """
+        Returns the row with the lowest rank among the given rows or None if there are no rows. Ties are solved as in
+        EpitopeHelper.select_best_by_rank() on the peptide and the allele name
+        """
+        return self._select_best(self.rank, rows)
+
+    def select_best_by_affinity(self, rows=None) -> int:
+        """
+        Returns the row with the lowest affinity among the given rows or None if there are no rows. Ties are solved
+        as in EpitopeHelper.select_best_by_affinity() on the peptide and the allele name
+        """
+        return self._select_best(self.affinity, rows)
+
+    def _select_best(self, scores, rows=None) -> int:
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows)
+        if len(rows) == 0:
+            return None
+        candidates = rows[scores[rows] == scores[rows].min()]
+        return int(max(candidates, key=lambda row: (self.peptide[row], self.get_allele_name(row))))
+
+    def to_epitopes(self, rows=None) -> List[PredictedEpitope]:
+        """
+        Materialises the given rows, or all if not provided, as PredictedEpitope objects
+        """
+        rows = range(len(self)) if rows is None else rows
+        return [self._to_epitope(row) for row in rows]
+
+    def _to_epitope(self, row) -> PredictedEpitope:
+        epitope = PredictedEpitope(
+            position=int(self.position[row]),
+            allele_mhc_i=copy.deepcopy(self.alleles[self.allele[row]]),
+            core=self.core[row],
+            mutated_peptide=self.peptide[row],
+            affinity_mutated=float(self.affinity[row]),
+            rank_mutated=float(self.rank[row]),
+        )
+        epitope.neofox_annotations.annotations.extend([
+            AnnotationFactory.build_annotation(name="Icore", value=self.icore[row]),
+            AnnotationFactory.build_annotation(name="Of", value=int(self.of[row])),
+            AnnotationFactory.build_annotation(name="Gp", value=int(self.gp[row])),
+            AnnotationFactory.build_annotation(name="Gl", value=int(self.gl[row])),
+        ])
+        if self.wild_type_peptide[row] is not None:
+            epitope.wild_type_peptide = self.wild_type_peptide[row]
+            epitope.rank_wild_type = float(self.rank_wild_type[row])
+            epitope.affinity_wild_type = float(self.affinity_wild_type[row])
+        return epitope
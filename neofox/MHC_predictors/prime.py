@@ -17,9 +17,10 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List
+from typing import List, Dict
 
 from neofox.helpers.epitope_helper import EpitopeHelper
+from neofox.helpers.prediction_cache import PredictionCache, PRIME
 from neofox.helpers.runner import Runner
 from neofox.helpers.mhc_helper import MixMhcHelper
 
@@ -44,17 +45,30 @@ def __init__(self, runner: Runner, configuration: DependenciesConfiguration, mhc
         self.mhc_parser = mhc_parser
 
         self.parsed_mhc_alleles = MixMhcHelper(mhc_parser)
+        self.prediction_cache = PredictionCache.get_prediction_cache(configuration.cache_folder)
+        if self.prediction_cache is not None:
+            # NOTE: PRIME runs MixMHCpred, thus the predictions depend on both versions
+            self.version = "{}+{}".format(
+                PredictionCache.get_version(configuration.prime), PredictionCache.get_version(configuration.mix_mhc_pred))
 
         self.best_peptide = None
         self.best_rank = None
         self.best_allele = None
         self.best_score = None
-        self.results = None
 
     def _prime(self, mhc_alleles: List[str], potential_ligand_sequences) -> List[PredictedEpitope]:
         """
         Runs PRIME for desired hla allele and writes result to temporary file.
         """
+        if self.prediction_cache is None:
+            return self._run_prime(mhc_alleles, potential_ligand_sequences)
+        predictions = self.prediction_cache.predict(
+            PRIME, self.version, mhc_alleles, potential_ligand_sequences,
+            run=lambda alleles, peptides: MixMhcHelper.get_predictions_by_allele_and_peptide(
+                self._run_prime(alleles, peptides)))
+        return [p for p in predictions.values() if p is not None]
+
+    def _run_prime(self, mhc_alleles: List[str], potential_ligand_sequences) -> List[PredictedEpitope]:
         outtmp = intermediate_files.create_temp_file(prefix="prime", suffix=".txt")
         tmpfasta = intermediate_files.create_temp_fasta(
             potential_ligand_sequences, prefix="tmp_sequence_"
@@ -78,11 +92,12 @@ def _prime(self, mhc_alleles: List[str], potential_ligand_sequences) -> List[Pre
         os.remove(tmpfasta)
         return results
 
-    def run(self, neoantigen: Neoantigen, mhc: List[Mhc1], uniprot):
-        """Wrapper PRIME prediction, extraction of best epitope per mutations"""
-        # TODO: get rid of this
-        self.results = None
-
+    def run(self, neoantigen: Neoantigen, mhc: List[Mhc1], uniprot) -> List[PredictedEpitope]:
+        """
+        Wrapper PRIME prediction, returns the predictions of all epitopes of the neoantigen or None if PRIME could
+        not run on it
+        """
+        results = None
         if not EpitopeHelper.contains_rare_amino_acid(neoantigen.mutated_xmer):
             potential_ligand_sequences = EpitopeHelper.generate_nmers(
                 neoantigen=neoantigen, lengths=[8, 9, 10, 11, 12, 13, 14], uniprot=uniprot
@@ -91,26 +106,31 @@ def run(self, neoantigen: Neoantigen, mhc: List[Mhc1], uniprot):
                 mhc1_alleles = self.parsed_mhc_alleles.get_mixmhc_allele_representation(self.configuration.prime_alleles_list,
                                                                                  [a for m in mhc for a in m.alleles])
                 if len(mhc1_alleles) > 0:
-                    self.results = self._prime(mhc1_alleles, potential_ligand_sequences)
+                    results = self._prime(mhc1_alleles, potential_ligand_sequences)
                 else:
                     logger.warning("None of the MHC I alleles are supported by PRIME")
+        return results
 
     def run_peptide(self, peptide: str, allele: MhcAllele) -> PredictedEpitope:
-        result = None
-        if not EpitopeHelper.contains_rare_amino_acid(peptide=peptide):
+        return self.run_peptides([peptide], allele).get(peptide)
+
+    def run_peptides(self, peptides: List[str], allele: MhcAllele) -> Dict[str, PredictedEpitope]:
+        """Runs PRIME once on multiple peptides for the same allele, the results are indexed by peptide"""
+        results = {}
+        supported_peptides = [p for p in peptides if not EpitopeHelper.contains_rare_amino_acid(peptide=p)]
+        if len(supported_peptides) > 0:
             mhc1_alleles = self.parsed_mhc_alleles.get_mixmhc_allele_representation(self.configuration.prime_alleles_list,
                                                                              [allele])
             if len(mhc1_alleles) > 0:
-                results = self._prime(mhc1_alleles, [peptide])
-                if results:
-                    result = results[0]
+                results = {p.mutated_peptide: p for p in self._prime(mhc1_alleles, supported_peptides)}
             else:
                 logger.warning("None of the MHC I alleles are supported by PRIME")
-        return result
+        return results
 
-    def get_annotations(self) -> List[Annotation]:
+    @staticmethod
+    def get_annotations(results: List[PredictedEpitope]) -> List[Annotation]:
 
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.results)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         return [
             AnnotationFactory.build_annotation(
                 value=best_result.mutated_peptide, name="PRIME_best_peptide"
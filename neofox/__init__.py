@@ -37,6 +37,9 @@
 NEOFOX_LOG_FILE_ENV = "NEOFOX_LOGFILE"
 NEOFOX_PRIME_ENV = "NEOFOX_PRIME"
 NEOFOX_HLA_DATABASE_ENV = "NEOFOX_HLA_DATABASE"
+NEOFOX_CACHE_FOLDER_ENV = "NEOFOX_CACHE_FOLDER"
+NEOFOX_ALIGNMENT_ENGINE_ENV = "NEOFOX_ALIGNMENT_ENGINE"
+NEOFOX_NETMHCPAN_MODE_ENV = "NEOFOX_NETMHCPAN_MODE"
 
 MHC_II = "mhcII"
 MHC_I = "mhcI"
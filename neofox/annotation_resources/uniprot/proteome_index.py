@@ -0,0 +1,196 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import mmap
+import os
+from typing import List, Union
+import numpy as np
+from Bio import SeqIO
+
+KMER_LENGTH = 8
+BITS_PER_AMINOACID = 5
+PROTEOME_SUFFIX = ".proteome"
+CODES_SUFFIX = ".codes.npy"
+POSITIONS_SUFFIX = ".positions.npy"
+
+# NOTE: every letter gets a code from 1 to 26, any other character gets 0 and thus cannot be part of an indexed k-mer
+AMINOACID_CODES = np.zeros(256, dtype=np.uint64)
+AMINOACID_CODES[ord("A"):ord("Z") + 1] = np.arange(1, 27, dtype=np.uint64)
+
+
+class ProteomeIndex(object):
+    """
+    Index of all 8-mers in the proteome for exact match searches. Every 8-mer is encoded in an integer of 40 bits and
+    the index holds the sorted 8-mer codes together with their positions in the proteome.
+    A sequence is searched through its least frequent 8-mer and the candidate positions are verified against the
+    proteome, thus checking a sequence costs a binary search plus the verification of a few positions instead of a
+    scan of the whole proteome.
+    The proteome and the index are stored in flat files which are memory mapped read only, thus all worker processes
+    in a node share the same copy in the page cache
+    """
+
+    def __init__(self, proteome: Union[bytes, mmap.mmap], codes: np.ndarray, positions: np.ndarray):
+        self.proteome = proteome
+        self.codes = codes
+        self.positions = positions
+        # NOTE: the k-mers at the end of every protein not starting any 8-mer are only indexed when needed
+        self.tail_kmers = {}
+
+    @staticmethod
+    def build(proteome: str):
+        proteome = proteome.encode("ascii")
+        codes, valid = ProteomeIndex._encode(proteome)
+        positions = np.flatnonzero(valid).astype(np.uint32)
+        codes = codes[valid]
+        order = np.argsort(codes, kind="stable")
+        return ProteomeIndex(proteome=proteome, codes=codes[order], positions=positions[order])
+
+    @staticmethod
+    def build_from_fasta(fasta_file: str):
+        with open(fasta_file) as handle:
+            return ProteomeIndex.build("\n".join(str(record.seq) for record in SeqIO.parse(handle, "fasta")))
+
+    @staticmethod
+    def load(index_prefix: str):
+        with open(index_prefix + PROTEOME_SUFFIX, "rb") as f:
+            proteome = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return ProteomeIndex(
+            proteome=proteome,
+            codes=np.load(index_prefix + CODES_SUFFIX, mmap_mode="r"),
+            positions=np.load(index_prefix + POSITIONS_SUFFIX, mmap_mode="r"))
+
+    @staticmethod
+    def exists(index_prefix: str) -> bool:
+        return all(os.path.exists(index_prefix + suffix) for suffix in [PROTEOME_SUFFIX, CODES_SUFFIX, POSITIONS_SUFFIX])
+
+    def save(self, index_prefix: str):
+        with open(index_prefix + PROTEOME_SUFFIX, "wb") as f:
+            f.write(self.proteome)
+        np.save(index_prefix + CODES_SUFFIX, self.codes)
+        np.save(index_prefix + POSITIONS_SUFFIX, self.positions)
+
+    @staticmethod
+    def _encode(sequence: bytes, kmer_length=KMER_LENGTH):
+        """
+        Returns the codes of all k-mers in the sequence by start position and whether each k-mer only contains letters
+        """
+        letters = AMINOACID_CODES[np.frombuffer(sequence, dtype=np.uint8)]
+        num_kmers = max(len(letters) - kmer_length + 1, 0)
+        codes = np.zeros(num_kmers, dtype=np.uint64)
+        valid = np.ones(num_kmers, dtype=bool)
+        for i in range(kmer_length):
+            window = letters[i:i + num_kmers]
+            codes = (codes << np.uint64(BITS_PER_AMINOACID)) | window
+            valid &= window > 0
+        return codes, valid
+
+    def contains(self, sequence: str) -> bool:
+        return self.contains_multiple([sequence])[0]
+
+    def contains_multiple(self, sequences: List[str]) -> List[bool]:
+        """
+        Checks whether every sequence is contained in the proteome, all 8-mers of all sequences are searched at once
+        """
+        sequences = [s.encode("ascii", errors="replace") for s in sequences]
+        indexed_sequences = [s for s in sequences if len(s) >= KMER_LENGTH]
+        if indexed_sequences:
+            codes, valid = self._encode(b"\n".join(indexed_sequences))
+            starts = np.searchsorted(self.codes, codes, side="left")
+            counts = np.searchsorted(self.codes, codes, side="right") - starts
+            # NOTE: k-mers with characters other than letters are never in the index
+            counts[~valid] = 0
+        results = []
+        offset = 0
+        for sequence in sequences:
+            if len(sequence) < KMER_LENGTH:
+                # NOTE: sequences shorter than the k-mers are not indexed
+                results.append(self.proteome.find(sequence) >= 0)
+                continue
+            num_kmers = len(sequence) - KMER_LENGTH + 1
+            kmer = offset + int(np.argmin(counts[offset:offset + num_kmers]))
+            kmer_positions = self.positions[starts[kmer]:starts[kmer] + counts[kmer]]
+            shift = kmer - offset
+            results.append(any(
+                p >= shift and self.proteome[p - shift:p - shift + len(sequence)] == sequence
+                for p in kmer_positions.tolist()))
+            # NOTE: the sequences are separated by one character
+            offset += len(sequence) + 1
+        return results
+
+    def get_windows_sharing_kmers(self, sequence: str, kmer_length: int, only_within_proteome=True) -> np.ndarray:
+        """
+        Returns the start positions in the proteome of all windows of the same length as the sequence sharing at least
+        one k-mer with it, for k-mers shorter than the indexed 8-mers. Windows starting before or ending after the
+        proteome are only returned when only_within_proteome is False
+        """
+        codes, valid = self._encode(sequence.encode("ascii", errors="replace"), kmer_length=kmer_length)
+        offsets = np.flatnonzero(valid)
+        return self.get_windows_with_kmers(
+            codes[offsets], offsets, kmer_length=kmer_length, window_length=len(sequence),
+            only_within_proteome=only_within_proteome)
+
+    def get_windows_with_kmers(self, codes: np.ndarray, offsets: np.ndarray, kmer_length: int, window_length: int,
+                               only_within_proteome=True) -> np.ndarray:
+        """
+        Returns the start positions in the proteome of all windows of the given length having any of the k-mer codes
+        at its offset, for k-mers shorter than the indexed 8-mers. Windows starting before or ending after the
+        proteome are only returned when only_within_proteome is False
+        """
+        positions, offsets = self.get_kmer_positions(codes, offsets, kmer_length=kmer_length)
+        windows = np.unique(positions - offsets)
+        if not only_within_proteome:
+            return windows
+        return windows[(windows >= 0) & (windows <= len(self.proteome) - window_length)]
+
+    def get_kmer_positions(self, codes: np.ndarray, offsets: np.ndarray, kmer_length: int):
+        """
+        Returns all positions in the proteome of the k-mer codes together with the offset given for their k-mer, for
+        k-mers shorter than the indexed 8-mers. The positions of a k-mer are those of the 8-mers starting with it,
+        which are a contiguous range of the sorted codes, plus those of the k-mers at the end of every protein not
+        starting any 8-mer
+        """
+        codes = np.asarray(codes, dtype=np.uint64)
+        shift = np.uint64(BITS_PER_AMINOACID * (KMER_LENGTH - kmer_length))
+        starts = np.searchsorted(self.codes, codes << shift, side="left")
+        ends = np.searchsorted(self.codes, (codes + np.uint64(1)) << shift, side="left")
+        tail_codes, tail_positions = self._get_tail_kmers(kmer_length)
+        tail_starts = np.searchsorted(tail_codes, codes, side="left")
+        tail_ends = np.searchsorted(tail_codes, codes, side="right")
+        positions = [np.zeros(0, dtype=np.int64)]
+        for i in range(len(codes)):
+            positions.append(self.positions[starts[i]:ends[i]].astype(np.int64))
+            positions.append(tail_positions[tail_starts[i]:tail_ends[i]])
+        counts = (ends - starts) + (tail_ends - tail_starts)
+        return np.concatenate(positions), np.repeat(np.asarray(offsets, dtype=np.int64), counts)
+
+    def _get_tail_kmers(self, kmer_length: int):
+        if kmer_length not in self.tail_kmers:
+            proteome = np.frombuffer(self.proteome, dtype=np.uint8)
+            ends = np.append(np.flatnonzero((proteome < ord("A")) | (proteome > ord("Z"))), len(proteome))
+            # the last positions of every protein where an 8-mer does not fit, but a k-mer does
+            positions = (ends[:, np.newaxis] - np.arange(kmer_length, KMER_LENGTH)[np.newaxis, :]).ravel()
+            positions = np.unique(positions[positions >= 0])
+            letters = AMINOACID_CODES[proteome[positions[:, np.newaxis] + np.arange(kmer_length)[np.newaxis, :]]]
+            positions = positions[np.all(letters > 0, axis=1)]
+            letters = letters[np.all(letters > 0, axis=1)]
+            codes = np.zeros(len(positions), dtype=np.uint64)
+            for i in range(kmer_length):
+                codes = (codes << np.uint64(BITS_PER_AMINOACID)) | letters[:, i]
+            order = np.argsort(codes, kind="stable")
+            self.tail_kmers[kmer_length] = (codes[order], positions[order].astype(np.int64))
+        return self.tail_kmers[kmer_length]
@@ -19,20 +19,32 @@
 import pickle
 from typing import List
 from logzero import logger
+
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
 from neofox.model.neoantigen import Annotation, PredictedEpitope
 from neofox.model.factories import AnnotationFactory
 
 
 class Uniprot(object):
     """
-    Loads the whole Uniprot fasta in a single string to check for a exact match of an aminoacid sequence.
-    Even though this is not the most elegant, this is the fastest by 1 order of magnitude in both
-    data loading and checking for an exact match
+    Loads the whole Uniprot proteome to check for a exact match of an aminoacid sequence.
+    The exact matches are searched through an index of the 8-mers in the proteome. The index and the proteome are
+    memory mapped from the files built by neofox-configure. Without those files the proteome is loaded from the pickle
+    in a single string and searched for every sequence
     """
 
-    def __init__(self, proteome):
+    def __init__(self, proteome, index=None):
         logger.debug("Loading Uniprot...")
-        self.uniprot = self._load_proteome(proteome)
+        if index is not None and ProteomeIndex.exists(index):
+            self.index = ProteomeIndex.load(index)
+            self.uniprot = self.index.proteome
+        else:
+            if index is not None:
+                logger.warning("The proteome index {} was not found, run neofox-configure to create it. The proteome "
+                               "is searched without the index".format(index))
+            # NOTE: the index is not built here, as every worker process would hold its own copy
+            self.index = None
+            self.uniprot = self._load_proteome(proteome)
         logger.debug("Loaded Uniprot.")
 
     @staticmethod
@@ -42,7 +54,17 @@ def _load_proteome(proteome) -> str:
         return uniprot_unpickled
 
     def is_sequence_not_in_uniprot(self, sequence) -> bool:
-        return self.uniprot.find(sequence) < 0
+        if self.index is None:
+            return self.uniprot.find(sequence) < 0
+        return not self.index.contains(sequence)
+
+    def are_sequences_not_in_uniprot(self, sequences: List[str]) -> List[bool]:
+        """
+        Checks several sequences at once, eg: all n-mers of a neoantigen
+        """
+        if self.index is None:
+            return [self.uniprot.find(s) < 0 for s in sequences]
+        return [not found for found in self.index.contains_multiple(sequences)]
 
     def get_annotations(self, sequence_not_in_uniprot: bool) -> List[Annotation]:
         return [
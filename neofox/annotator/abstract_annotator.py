@@ -1,6 +1,8 @@
 from abc import ABC
+from typing import List
 
 from neofox.MHC_predictors.netmhcpan.combine_netmhcpan_pred_multiple_binders import BestAndMultipleBinder
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
 from neofox.annotation_resources.uniprot.uniprot import Uniprot
 from neofox.helpers.blastp_runner import BlastpRunner
 from neofox.helpers.epitope_helper import EpitopeHelper
@@ -15,7 +17,8 @@
 from neofox.published_features.neoantigen_fitness.neoantigen_fitness import NeoantigenFitnessCalculator
 from neofox.published_features.priority_score import PriorityScore
 from neofox.published_features.self_similarity.self_similarity import SelfSimilarityCalculator
-from neofox.references.references import ORGANISM_HOMO_SAPIENS, ReferenceFolder, DependenciesConfiguration
+from neofox.references.references import ORGANISM_HOMO_SAPIENS, ReferenceFolder, DependenciesConfiguration, \
+    ALIGNMENT_ENGINE_IN_PROCESS
 
 
 class AbstractAnnotator(ABC):
@@ -32,16 +35,19 @@ def __init__(
         self.self_similarity = self_similarity
         self.organism = references.organism
 
-        # NOTE: this one loads a big file, but it is faster loading it multiple times than passing it around
-        self.uniprot = Uniprot(references.uniprot_pickle)
+        # NOTE: this one loads a big file, but it is faster loading it once per process than passing it around,
+        # annotators are reused within every process through the AnnotatorRegistry
+        self.uniprot = Uniprot(references.uniprot_pickle, index=references.uniprot_index)
 
-        # initialise proteome and IEDB BLASTP runners
+        # initialise proteome and IEDB BLASTP runners, the IEDB is only indexed to be searched in process
         self.proteome_blastp_runner = BlastpRunner(
             runner=self.runner, configuration=configuration,
-            database=references.get_proteome_database())
+            database=references.get_proteome_database(), database_index=self.uniprot.index)
         self.iedb_blastp_runner = BlastpRunner(
             runner=self.runner, configuration=configuration,
-            database=references.get_iedb_database())
+            database=references.get_iedb_database(),
+            database_index=ProteomeIndex.build_from_fasta(references.get_iedb_fasta())
+            if configuration.alignment_engine == ALIGNMENT_ENGINE_IN_PROCESS else None)
 
         # NOTE: these resources do not read any file thus can be initialised fast
         self.dissimilarity_calculator = DissimilarityCalculator(proteome_blastp_runner=self.proteome_blastp_runner)
@@ -52,6 +58,25 @@ def __init__(
         self.amplitude = Amplitude()
         self.hex = Hex(references=references)
 
+    def precompute_annotations(self, epitopes: List[PredictedEpitope]):
+        """
+        Runs BLASTP once over all epitopes for the homologous WT peptides of those epitopes without WT, the
+        dissimilarity and the pathogen similarity and computes the self-similarities and HEX scores of all epitopes
+        at once. The annotations of every epitope then read these from the BLASTP runners, the self-similarity
+        calculator and HEX
+        """
+        epitopes_without_wt = [e.mutated_peptide for e in epitopes if not e.wild_type_peptide]
+        homologous_wt_peptides = dict(zip(
+            epitopes_without_wt, self.proteome_blastp_runner.get_most_similar_wt_epitopes(epitopes_without_wt)))
+        self.dissimilarity_calculator.calculate_dissimilarity_multiple_epitopes(epitopes=epitopes)
+        self.neoantigen_fitness_calculator.get_pathogen_similarity_multiple_peptides(
+            peptides=[e.mutated_peptide for e in epitopes])
+        pairs = [(e.mutated_peptide, e.wild_type_peptide or homologous_wt_peptides.get(e.mutated_peptide))
+                 for e in epitopes]
+        self.self_similarity.get_self_similarities(pairs=[(mut, wt) for mut, wt in pairs if mut and wt])
+        if self.organism == ORGANISM_HOMO_SAPIENS:
+            self.hex.apply_hex_multiple(mut_peptides=[e.mutated_peptide for e in epitopes])
+
     def get_additional_annotations_neoepitope_mhci(
             self, epitope: PredictedEpitope, neoantigen: Neoantigen = None) -> PredictedEpitope:
 
@@ -0,0 +1,84 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import threading
+from logzero import logger
+import neofox
+from neofox.annotator.neoantigen_annotator import NeoantigenAnnotator
+from neofox.annotator.neoepitope_annotator import NeoepitopeAnnotator
+from neofox.published_features.self_similarity.self_similarity import SelfSimilarityCalculator
+from neofox.references.references import ReferenceFolder, DependenciesConfiguration
+
+
+class AnnotatorRegistry(object):
+    """
+    Process level registry of annotators. Every dask worker builds its annotators once on the first task and
+    reuses them for all following tasks, avoiding to load the proteome, IEDB and allele tables for every task.
+    Annotators are indexed by the reference folder, the configuration and any other construction parameter
+    """
+
+    _annotators = {}
+    _lock = threading.Lock()
+
+    @staticmethod
+    def get_neoantigen_annotator(
+            references: ReferenceFolder, configuration: DependenciesConfiguration,
+            self_similarity: SelfSimilarityCalculator,
+            rank_mhci_threshold=neofox.RANK_MHCI_THRESHOLD_DEFAULT,
+            rank_mhcii_threshold=neofox.RANK_MHCII_THRESHOLD_DEFAULT,
+            max_concurrent_predictors=1) -> NeoantigenAnnotator:
+        return AnnotatorRegistry._get_annotator(
+            NeoantigenAnnotator, references, configuration, self_similarity,
+            rank_mhci_threshold=rank_mhci_threshold, rank_mhcii_threshold=rank_mhcii_threshold,
+            max_concurrent_predictors=max_concurrent_predictors)
+
+    @staticmethod
+    def get_neoepitope_annotator(
+            references: ReferenceFolder, configuration: DependenciesConfiguration,
+            self_similarity: SelfSimilarityCalculator) -> NeoepitopeAnnotator:
+        return AnnotatorRegistry._get_annotator(NeoepitopeAnnotator, references, configuration, self_similarity)
+
+    @staticmethod
+    def clear():
+        with AnnotatorRegistry._lock:
+            AnnotatorRegistry._annotators.clear()
+
+    @staticmethod
+    def _get_annotator(annotator_class, references, configuration, self_similarity, **kwargs):
+        key = AnnotatorRegistry._get_key(annotator_class, references, configuration, **kwargs)
+        with AnnotatorRegistry._lock:
+            annotator = AnnotatorRegistry._annotators.get(key)
+            if annotator is None:
+                logger.debug("Initialising {} in this process".format(annotator_class.__name__))
+                annotator = annotator_class(references, configuration, self_similarity=self_similarity, **kwargs)
+                AnnotatorRegistry._annotators[key] = annotator
+        return annotator
+
+    @staticmethod
+    def _get_key(annotator_class, references: ReferenceFolder, configuration: DependenciesConfiguration, **kwargs):
+        return (
+            annotator_class.__name__,
+            references.reference_genome_folder,
+            references.organism,
+            AnnotatorRegistry._get_values(configuration),
+            tuple(sorted(kwargs.items()))
+        )
+
+    @staticmethod
+    def _get_values(some_object) -> tuple:
+        return tuple(sorted((name, str(value)) for name, value in vars(some_object).items()))
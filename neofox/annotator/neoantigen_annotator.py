@@ -19,6 +19,7 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 
 from datetime import datetime
+from typing import List
 import neofox
 from neofox.MHC_predictors.MixMHCpred.mixmhc2pred import MixMHC2pred
 from neofox.MHC_predictors.MixMHCpred.mixmhcpred import MixMHCpred
@@ -42,7 +43,8 @@ class NeoantigenAnnotator(AbstractAnnotator):
     def __init__(self, references: ReferenceFolder, configuration: DependenciesConfiguration,
                  self_similarity: SelfSimilarityCalculator,
                  rank_mhci_threshold=neofox.RANK_MHCI_THRESHOLD_DEFAULT,
-                 rank_mhcii_threshold=neofox.RANK_MHCII_THRESHOLD_DEFAULT):
+                 rank_mhcii_threshold=neofox.RANK_MHCII_THRESHOLD_DEFAULT,
+                 max_concurrent_predictors=1):
         """class to annotate neoantigens"""
 
         super().__init__(references, configuration, self_similarity)
@@ -58,11 +60,28 @@ def __init__(self, references: ReferenceFolder, configuration: DependenciesConfi
 
         self.neoantigen_mhc_binding_annotator = NeoantigenMhcBindingAnnotator(
             references=references, configuration=configuration, proteome_blastp_runner=self.proteome_blastp_runner,
-            uniprot=self.uniprot)
+            uniprot=self.uniprot, max_concurrent_predictors=max_concurrent_predictors)
 
         self.resources_versions = references.get_resources_versions()
 
-    def get_annotated_neoantigen(self, neoantigen: Neoantigen, patient: Patient, with_all_neoepitopes=False) -> Neoantigen:
+    def get_annotated_neoantigens(
+            self, neoantigens: List[Neoantigen], patient: Patient, with_all_neoepitopes=False) -> List[Neoantigen]:
+        """
+        Annotates a batch of neoantigens from the same patient. The MHC binding predictions are computed for the
+        whole batch with a single call to every predictor
+        """
+        netmhcpan_predictions, netmhc2pan_predictions = self.neoantigen_mhc_binding_annotator.get_netmhc_predictions(
+            neoantigens=neoantigens, patient=patient)
+        return [
+            self.get_annotated_neoantigen(
+                neoantigen=n, patient=patient, with_all_neoepitopes=with_all_neoepitopes,
+                netmhcpan_predictions=netmhcpan_predictions[i] if netmhcpan_predictions else None,
+                netmhc2pan_predictions=netmhc2pan_predictions[i] if netmhc2pan_predictions else None)
+            for i, n in enumerate(neoantigens)
+        ]
+
+    def get_annotated_neoantigen(self, neoantigen: Neoantigen, patient: Patient, with_all_neoepitopes=False,
+                                 netmhcpan_predictions=None, netmhc2pan_predictions=None) -> Neoantigen:
         """Calculate new epitope features and add to dictionary that stores all properties"""
         neoantigen.neofox_annotations = Annotations(
             annotator="NeoFox",
@@ -72,14 +91,13 @@ def get_annotated_neoantigen(self, neoantigen: Neoantigen, patient: Patient, wit
             annotations=[]
         )
 
-        # Runs netmhcpan, netmhc2pan, mixmhcpred and mixmhc2prd in parallel
-        (
-            mixmhc2pred,
-            mixmhcpred,
-            netmhc2pan,
-            netmhcpan,
-            prime
-        ) = self.neoantigen_mhc_binding_annotator.get_mhc_binding_annotations(neoantigen=neoantigen, patient=patient)
+        # Runs netmhcpan, netmhc2pan, mixmhcpred, mixmhc2prd and prime, in parallel if more than one concurrent
+        # predictor is allowed
+        predictions = self.neoantigen_mhc_binding_annotator.get_mhc_binding_annotations(
+            neoantigen=neoantigen, patient=patient, netmhcpan_predictions=netmhcpan_predictions,
+            netmhc2pan_predictions=netmhc2pan_predictions)
+        netmhcpan = predictions.get("netmhcpan")
+        netmhc2pan = predictions.get("netmhc2pan")
 
         # HLA I predictions: NetMHCpan
         if netmhcpan:
@@ -92,27 +110,27 @@ def get_annotated_neoantigen(self, neoantigen: Neoantigen, patient: Patient, wit
             neoantigen.neoepitopes_mhc_i_i = [e for e in netmhc2pan.predictions if e.rank_mutated < self.rank_mhcii_threshold]
 
         # MixMHCpred
-        if mixmhcpred is not None:
-            neoantigen.neofox_annotations.annotations.extend(mixmhcpred.get_annotations())
+        if "mixmhcpred" in predictions:
+            neoantigen.neofox_annotations.annotations.extend(MixMHCpred.get_annotations(predictions["mixmhcpred"]))
             neoantigen.neoepitopes_mhc_i = AnnotationFactory.annotate_epitopes_with_other_scores(
                 epitopes=neoantigen.neoepitopes_mhc_i,
-                annotated_epitopes=mixmhcpred.results,
+                annotated_epitopes=predictions["mixmhcpred"],
                 annotation_name=MixMHCpred.ANNOTATION_PREFIX)
 
         # PRIME
-        if prime is not None:
-            neoantigen.neofox_annotations.annotations.extend(prime.get_annotations())
+        if "prime" in predictions:
+            neoantigen.neofox_annotations.annotations.extend(Prime.get_annotations(predictions["prime"]))
             neoantigen.neoepitopes_mhc_i = AnnotationFactory.annotate_epitopes_with_other_scores(
                 epitopes=neoantigen.neoepitopes_mhc_i,
-                annotated_epitopes=prime.results,
+                annotated_epitopes=predictions["prime"],
                 annotation_name=Prime.ANNOTATION_PREFIX)
 
         # MixMHC2pred
-        if mixmhc2pred is not None:
-            neoantigen.neofox_annotations.annotations.extend(mixmhc2pred.get_annotations())
+        if "mixmhc2pred" in predictions:
+            neoantigen.neofox_annotations.annotations.extend(MixMHC2pred.get_annotations(predictions["mixmhc2pred"]))
             neoantigen.neoepitopes_mhc_i_i = AnnotationFactory.annotate_epitopes_with_other_scores(
                 epitopes=neoantigen.neoepitopes_mhc_i_i,
-                annotated_epitopes=mixmhc2pred.results,
+                annotated_epitopes=predictions["mixmhc2pred"],
                 annotation_name=MixMHC2pred.ANNOTATION_PREFIX)
 
         # MHC binding independent features
@@ -215,6 +233,7 @@ def get_annotated_neoantigen(self, neoantigen: Neoantigen, patient: Patient, wit
 
         # annotate neoepitopes
         if with_all_neoepitopes:
+            self.precompute_annotations(epitopes=neoantigen.neoepitopes_mhc_i + neoantigen.neoepitopes_mhc_i_i)
             neoantigen.neoepitopes_mhc_i = [
                 self.get_additional_annotations_neoepitope_mhci(epitope=e, neoantigen=neoantigen)
                 for e in neoantigen.neoepitopes_mhc_i]
@@ -1,3 +1,25 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from typing import List, Callable
 from neofox.MHC_predictors.MixMHCpred.mixmhc2pred import MixMHC2pred
 from neofox.MHC_predictors.MixMHCpred.mixmhcpred import MixMHCpred
 from neofox.MHC_predictors.netmhcpan.combine_netmhcIIpan_pred_multiple_binders import BestAndMultipleBinderMhcII
@@ -7,16 +29,25 @@
 from neofox.helpers.blastp_runner import BlastpRunner
 from neofox.helpers.runner import Runner
 from neofox.model.mhc_parser import MhcParser
-from neofox.model.neoantigen import Neoantigen, Patient
+from neofox.model.neoantigen import Neoantigen, Patient, PredictedEpitope
 from neofox.references.references import DependenciesConfiguration, AvailableAlleles, ReferenceFolder, \
     ORGANISM_HOMO_SAPIENS
 
+# NOTE: the number of MHC predictors run for a neoantigen: netMHCpan, netMHCIIpan, MixMHCpred, MixMHC2pred and PRIME
+MAX_CONCURRENT_PREDICTORS = 5
+
 
 class NeoantigenMhcBindingAnnotator:
 
+    _executor = None
+    _executor_lock = threading.Lock()
+
     def __init__(self, references: ReferenceFolder, configuration: DependenciesConfiguration,
-                 uniprot: Uniprot, proteome_blastp_runner: BlastpRunner):
+                 uniprot: Uniprot, proteome_blastp_runner: BlastpRunner, max_concurrent_predictors: int = 1):
         """class to annotate neoantigens"""
+        # NOTE: with a value greater than 1 the independent MHC predictors run concurrently on a thread pool
+        self.max_concurrent_predictors = max_concurrent_predictors
+        self.concurrent_predictors = threading.Semaphore(max_concurrent_predictors)
         self.runner = Runner()
         self.configuration = configuration
         self.proteome_db = references.proteome_db
@@ -28,67 +59,134 @@ def __init__(self, references: ReferenceFolder, configuration: DependenciesConfi
 
         self.mhc_database = references.get_mhc_database()
         self.mhc_parser = MhcParser.get_mhc_parser(self.mhc_database)
-
-    def get_mhc_binding_annotations(self, neoantigen: Neoantigen, patient: Patient):
+        # NOTE: a single instance of every predictor is shared by all neoantigens, their run() is stateless
+        self.mixmhcpred = MixMHCpred(self.runner, self.configuration, self.mhc_parser) \
+            if configuration.mix_mhc_pred is not None else None
+        self.prime = Prime(self.runner, self.configuration, self.mhc_parser) \
+            if configuration.mix_mhc_pred is not None and configuration.prime is not None else None
+        self.mixmhc2pred = MixMHC2pred(self.runner, self.configuration, self.mhc_parser, references) \
+            if configuration.mix_mhc2_pred is not None else None
+
+    def get_netmhcpan_predictions(self, neoantigens: List[Neoantigen], patient: Patient):
+        """
+        Runs netMHCpan once for all neoantigens of a patient.
+        Returns the netMHCpan predictions of every neoantigen filtered and paired with their WT predictions or None if
+        the patient has no MHC I alleles
+        """
+        if patient.mhc1 is None or len(patient.mhc1) == 0:
+            return None
+        netmhcpan = BestAndMultipleBinder(
+            runner=self.runner, configuration=self.configuration, mhc_parser=self.mhc_parser,
+            blastp_runner=self.proteome_blastp_runner)
+        predictions = netmhcpan.get_predictions_multiple_neoantigens(
+            neoantigens, patient.mhc1, self.available_alleles.get_available_mhc_i(), self.uniprot)
+        return netmhcpan.get_paired_predictions_multiple_neoantigens(neoantigens, predictions, self.uniprot)
+
+    def get_netmhc2pan_predictions(self, neoantigens: List[Neoantigen], patient: Patient):
+        """
+        Runs netMHCIIpan once for all neoantigens of a patient.
+        Returns the netMHCIIpan predictions of every neoantigen filtered and paired with their WT predictions or None
+        if the patient has no MHC II alleles
+        """
+        if patient.mhc2 is None or len(patient.mhc2) == 0:
+            return None
+        netmhc2pan = BestAndMultipleBinderMhcII(
+            runner=self.runner, configuration=self.configuration, mhc_parser=self.mhc_parser,
+            blastp_runner=self.proteome_blastp_runner)
+        predictions = netmhc2pan.get_predictions_multiple_neoantigens(
+            neoantigens, patient.mhc2, self.available_alleles.get_available_mhc_ii())
+        return netmhc2pan.get_paired_predictions_multiple_neoantigens(neoantigens, predictions, self.uniprot)
+
+    def get_netmhc_predictions(self, neoantigens: List[Neoantigen], patient: Patient):
+        """
+        Runs netMHCpan and netMHCIIpan once for all neoantigens of a patient, see get_netmhcpan_predictions() and
+        get_netmhc2pan_predictions()
+        """
+        netmhcpan_predictions, netmhc2pan_predictions = self._run_predictors([
+            partial(self.get_netmhcpan_predictions, neoantigens, patient),
+            partial(self.get_netmhc2pan_predictions, neoantigens, patient)
+        ])
+        return netmhcpan_predictions, netmhc2pan_predictions
+
+    def get_mhc_binding_annotations(self, neoantigen: Neoantigen, patient: Patient, netmhcpan_predictions=None,
+                                    netmhc2pan_predictions=None) -> dict:
+        """
+        Runs the MHC predictors of a neoantigen. Returns the results of every predictor run indexed by its name
+        """
 
         has_mhc1 = patient.mhc1 is not None and len(patient.mhc1) > 0
         has_mhc2 = patient.mhc2 is not None and len(patient.mhc2) > 0
 
-        netmhcpan = None
-        netmhc2pan = None
-        mixmhcpred = None
-        mixmhc2pred = None
-        prime = None
+        # the predictors to run indexed by name, they are independent of each other
+        predictors = {}
 
         if has_mhc1:
-            netmhcpan = self.run_netmhcpan(
+            predictors["netmhcpan"] = partial(
+                self.run_netmhcpan,
                 self.runner,
                 self.configuration,
                 self.available_alleles,
                 self.mhc_parser,
                 neoantigen,
-                patient)
+                patient,
+                netmhcpan_predictions)
         if has_mhc2:
-            netmhc2pan = self._run_netmhc2pan(
+            predictors["netmhc2pan"] = partial(
+                self._run_netmhc2pan,
                 self.runner,
                 self.configuration,
                 self.available_alleles,
                 self.mhc_parser,
                 neoantigen,
-                patient
-            )
-
-        if self.configuration.mix_mhc2_pred is not None and has_mhc2:
-            mixmhc2pred = self._run_mixmhc2pred(
-                self.runner,
-                self.configuration,
-                self.mhc_parser,
-                neoantigen,
                 patient,
-                self.references
+                netmhc2pan_predictions
             )
 
+        if self.mixmhc2pred is not None and has_mhc2:
+            predictors["mixmhc2pred"] = partial(self._run_mixmhc2pred, neoantigen, patient)
+
         # avoids running MixMHCpred and PRIME for non human organisms
         if self.organism == ORGANISM_HOMO_SAPIENS:
 
-            if self.configuration.mix_mhc_pred is not None and has_mhc1:
-                mixmhcpred = self._run_mixmhcpred(
-                    self.runner,
-                    self.configuration,
-                    self.mhc_parser,
-                    neoantigen,
-                    patient,
-                )
-            if self.configuration.mix_mhc_pred is not None and self.configuration.prime is not None and has_mhc1:
-                prime = self._run_prime(
-                    self.runner,
-                    self.configuration,
-                    self.mhc_parser,
-                    neoantigen,
-                    patient,
-                )
-
-        return mixmhc2pred, mixmhcpred, netmhc2pan, netmhcpan, prime
+            if self.mixmhcpred is not None and has_mhc1:
+                predictors["mixmhcpred"] = partial(self._run_mixmhcpred, neoantigen, patient)
+            if self.prime is not None and has_mhc1:
+                predictors["prime"] = partial(self._run_prime, neoantigen, patient)
+
+        # NOTE: only the predictors that run are returned, MixMHCpred, PRIME and MixMHC2pred return their predictions
+        # which may be None
+        return dict(zip(predictors.keys(), self._run_predictors(list(predictors.values()))))
+
+    def _run_predictors(self, predictors: List[Callable]) -> List:
+        """
+        Runs the predictors one after the other or, if more than one concurrent predictor is allowed, on the thread
+        pool of this process. Returns the results in the same order as the predictors
+        """
+        if self.max_concurrent_predictors <= 1 or len(predictors) <= 1:
+            return [predictor() for predictor in predictors]
+        executor = NeoantigenMhcBindingAnnotator._get_executor()
+        futures = []
+        for predictor in predictors:
+            # NOTE: waits for a predictor to finish when max_concurrent_predictors are already running
+            self.concurrent_predictors.acquire()
+            try:
+                future = executor.submit(predictor)
+            except Exception:
+                self.concurrent_predictors.release()
+                raise
+            future.add_done_callback(lambda _: self.concurrent_predictors.release())
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    @staticmethod
+    def _get_executor() -> ThreadPoolExecutor:
+        # NOTE: a single thread pool is shared by all annotators in the same process and it is never replaced, the
+        # number of predictors running for every annotator is bounded by its semaphore
+        with NeoantigenMhcBindingAnnotator._executor_lock:
+            if NeoantigenMhcBindingAnnotator._executor is None:
+                NeoantigenMhcBindingAnnotator._executor = ThreadPoolExecutor(
+                    max_workers=MAX_CONCURRENT_PREDICTORS, thread_name_prefix="neofox_predictor")
+            return NeoantigenMhcBindingAnnotator._executor
 
     def run_netmhcpan(
             self,
@@ -98,6 +196,7 @@ def run_netmhcpan(
             mhc_parser: MhcParser,
             neoantigen: Neoantigen,
             patient: Patient,
+            netmhcpan_predictions=None
     ):
         netmhcpan = BestAndMultipleBinder(runner=runner, configuration=configuration, mhc_parser=mhc_parser,
                                           blastp_runner=self.proteome_blastp_runner)
@@ -106,6 +205,7 @@ def run_netmhcpan(
             mhc1_alleles_patient=patient.mhc1,
             mhc1_alleles_available=available_alleles.get_available_mhc_i(),
             uniprot=self.uniprot,
+            paired_predictions=netmhcpan_predictions
         )
         return netmhcpan
 
@@ -117,6 +217,7 @@ def _run_netmhc2pan(
             mhc_parser: MhcParser,
             neoantigen: Neoantigen,
             patient: Patient,
+            netmhc2pan_predictions=None
     ):
         netmhc2pan = BestAndMultipleBinderMhcII(
             runner=runner, configuration=configuration, mhc_parser=mhc_parser,
@@ -125,43 +226,16 @@ def _run_netmhc2pan(
             neoantigen=neoantigen,
             mhc2_alleles_patient=patient.mhc2,
             mhc2_alleles_available=available_alleles.get_available_mhc_ii(),
-            uniprot=self.uniprot
+            uniprot=self.uniprot,
+            paired_predictions=netmhc2pan_predictions
         )
         return netmhc2pan
 
-    def _run_mixmhcpred(
-            self,
-            runner: Runner,
-            configuration: DependenciesConfiguration,
-            mhc_parser: MhcParser,
-            neoantigen: Neoantigen,
-            patient: Patient,
-    ):
-        mixmhc = MixMHCpred(runner, configuration, mhc_parser)
-        mixmhc.run(neoantigen=neoantigen, mhc=patient.mhc1, uniprot=self.uniprot)
-        return mixmhc
+    def _run_mixmhcpred(self, neoantigen: Neoantigen, patient: Patient) -> List[PredictedEpitope]:
+        return self.mixmhcpred.run(neoantigen=neoantigen, mhc=patient.mhc1, uniprot=self.uniprot)
 
-    def _run_prime(
-            self,
-            runner: Runner,
-            configuration: DependenciesConfiguration,
-            mhc_parser: MhcParser,
-            neoantigen: Neoantigen,
-            patient: Patient,
-    ):
-        prime = Prime(runner, configuration, mhc_parser)
-        prime.run(neoantigen=neoantigen, mhc=patient.mhc1, uniprot=self.uniprot)
-        return prime
+    def _run_prime(self, neoantigen: Neoantigen, patient: Patient) -> List[PredictedEpitope]:
+        return self.prime.run(neoantigen=neoantigen, mhc=patient.mhc1, uniprot=self.uniprot)
 
-    def _run_mixmhc2pred(
-            self,
-            runner: Runner,
-            configuration: DependenciesConfiguration,
-            mhc_parser: MhcParser,
-            neoantigen: Neoantigen,
-            patient: Patient,
-            references: ReferenceFolder
-    ):
-        mixmhc2 = MixMHC2pred(runner, configuration, mhc_parser, references)
-        mixmhc2.run(mhc=patient.mhc2, neoantigen=neoantigen, uniprot=self.uniprot)
-        return mixmhc2
\ No newline at end of file
+    def _run_mixmhc2pred(self, neoantigen: Neoantigen, patient: Patient) -> List[PredictedEpitope]:
+        return self.mixmhc2pred.run(mhc=patient.mhc2, neoantigen=neoantigen, uniprot=self.uniprot)
@@ -18,6 +18,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 
+from typing import List
+
 from logzero import logger
 from datetime import datetime
 import neofox
@@ -62,29 +64,42 @@ def __init__(self, references: ReferenceFolder, configuration: DependenciesConfi
         self.resources_versions = references.get_resources_versions()
 
     def get_annotated_neoepitope(self, neoepitope: PredictedEpitope) -> PredictedEpitope:
-        neoepitope.neofox_annotations = Annotations(
-            annotator="NeoFox",
-            annotator_version=neofox.VERSION,
-            timestamp="{:%Y%m%d%H%M%S%f}".format(datetime.now()),
-            resources=self.resources_versions,
-            annotations=[]
-        )
+        return self.get_annotated_neoepitopes(neoepitopes=[neoepitope])[0]
+
+    def get_annotated_neoepitopes(self, neoepitopes: List[PredictedEpitope]) -> List[PredictedEpitope]:
+        """
+        Annotates multiple neoepitopes, the MHC binding predictors run once per MHC allele or isoform for all of them
+        """
         self.expression_calculator = Expression()
-        expression_annotation = self.expression_calculator.get_annotations(neoantigen=neoepitope)
+        expression_annotations = []
+        for neoepitope in neoepitopes:
+            neoepitope.neofox_annotations = Annotations(
+                annotator="NeoFox",
+                annotator_version=neofox.VERSION,
+                timestamp="{:%Y%m%d%H%M%S%f}".format(datetime.now()),
+                resources=self.resources_versions,
+                annotations=[]
+            )
+            expression_annotations.append(self.expression_calculator.get_annotations(neoantigen=neoepitope))
+
+            # if the WT is not provided it searches for the closest match in the proteome
+            if neoepitope.wild_type_peptide is None or neoepitope.wild_type_peptide == '':
+                neoepitope.wild_type_peptide = self.proteome_blastp_runner.get_most_similar_wt_epitope(
+                    neoepitope.mutated_peptide)
 
-        # if the WT is not provided it searches for the closest match in the proteome
-        if neoepitope.wild_type_peptide is None or neoepitope.wild_type_peptide == '':
-            neoepitope.wild_type_peptide = self.proteome_blastp_runner.get_most_similar_wt_epitope(
-                neoepitope.mutated_peptide)
+        # Runs netmhcpan, netmhc2pan, mixmhcpred and mixmhc2prd once per MHC allele or isoform
+        annotated_neoepitopes = self.neoepitope_mhc_binding_annotator.get_mhc_binding_annotations_multiple(
+            neoepitopes=neoepitopes)
 
-        # Runs netmhcpan, netmhc2pan, mixmhcpred and mixmhc2prd in parallel
-        annotated_neoepitope = self.neoepitope_mhc_binding_annotator.get_mhc_binding_annotations(neoepitope=neoepitope)
-        annotated_neoepitope.neofox_annotations.annotations.extend(expression_annotation)
-        has_mhc1 = annotated_neoepitope.allele_mhc_i is not None and annotated_neoepitope.allele_mhc_i.name
+        results = []
+        for annotated_neoepitope, expression_annotation in zip(annotated_neoepitopes, expression_annotations):
+            annotated_neoepitope.neofox_annotations.annotations.extend(expression_annotation)
+            has_mhc1 = annotated_neoepitope.allele_mhc_i is not None and annotated_neoepitope.allele_mhc_i.name
 
-        if has_mhc1:
-            annotated_neoepitope = self.get_additional_annotations_neoepitope_mhci(epitope=annotated_neoepitope)
-        else:
-            annotated_neoepitope = self.get_additional_annotations_neoepitope_mhcii(epitope=annotated_neoepitope)
+            if has_mhc1:
+                annotated_neoepitope = self.get_additional_annotations_neoepitope_mhci(epitope=annotated_neoepitope)
+            else:
+                annotated_neoepitope = self.get_additional_annotations_neoepitope_mhcii(epitope=annotated_neoepitope)
+            results.append(annotated_neoepitope)
 
-        return annotated_neoepitope
+        return results
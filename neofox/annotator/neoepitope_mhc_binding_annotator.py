@@ -1,4 +1,4 @@
-from typing import Tuple
+from typing import Tuple, List, Dict
 
 from neofox.MHC_predictors.MixMHCpred.mixmhc2pred import MixMHC2pred
 from neofox.MHC_predictors.MixMHCpred.mixmhcpred import MixMHCpred
@@ -14,6 +14,7 @@
 from neofox.model.factories import AnnotationFactory
 from neofox.model.mhc_parser import MhcParser
 from neofox.model.neoantigen import Neoantigen, Patient, PredictedEpitope
+from neofox.references.allele_registry import AlleleRegistry
 from neofox.references.references import DependenciesConfiguration, AvailableAlleles, ReferenceFolder, \
     ORGANISM_HOMO_SAPIENS
 
@@ -33,6 +34,7 @@ def __init__(self, references: ReferenceFolder, configuration: DependenciesConfi
 
         self.mhc_database = references.get_mhc_database()
         self.mhc_parser = MhcParser.get_mhc_parser(self.mhc_database)
+        self.allele_registry = AlleleRegistry.get_allele_registry(self.mhc_parser)
         self.netmhcpan = NetMhcPanPredictor(
             runner=self.runner, configuration=configuration, mhc_parser=self.mhc_parser,
             blastp_runner=self.proteome_blastp_runner)
@@ -44,124 +46,165 @@ def __init__(self, references: ReferenceFolder, configuration: DependenciesConfi
         self.prime = Prime(self.runner, self.configuration, self.mhc_parser)
 
     def get_mhc_binding_annotations(self, neoepitope: PredictedEpitope) -> PredictedEpitope:
-
-        has_mhc1 = neoepitope.allele_mhc_i is not None and neoepitope.allele_mhc_i.name != ''
-        has_mhc2 = neoepitope.isoform_mhc_i_i is not None and neoepitope.isoform_mhc_i_i.name != ''
-
-        if has_mhc1:
-            # MHC I epitope
-            annotated_neoepitope = self._run_netmhcpan(neoepitope=neoepitope)
-            if annotated_neoepitope:
-                if self.configuration.mix_mhc_pred and self.organism == ORGANISM_HOMO_SAPIENS:
-                    mixmhcpred_neoepitope, mixmhcpred_neoepitope_wt = self._run_mixmhcpred(neoepitope=neoepitope)
-                    if mixmhcpred_neoepitope:
-                        annotated_neoepitope = AnnotationFactory.annotate_epitope(
-                            epitope=annotated_neoepitope,
-                            paired_epitope=mixmhcpred_neoepitope,
-                            annotation_name=MixMHCpred.ANNOTATION_PREFIX)
-                    if mixmhcpred_neoepitope_wt:
-                        annotated_neoepitope = AnnotationFactory.annotate_epitope(
-                            epitope=annotated_neoepitope,
-                            paired_epitope=mixmhcpred_neoepitope_wt,
-                            annotation_name=MixMHCpred.ANNOTATION_PREFIX_WT)
-                    if self.configuration.prime:
-                        prime_neoepitope, prime_neoepitope_wt = self._run_prime(neoepitope=neoepitope)
-                        if prime_neoepitope:
-                            annotated_neoepitope = AnnotationFactory.annotate_epitope(
-                                epitope=annotated_neoepitope,
-                                paired_epitope=prime_neoepitope,
-                                annotation_name=Prime.ANNOTATION_PREFIX)
-                        if prime_neoepitope_wt:
-                            annotated_neoepitope = AnnotationFactory.annotate_epitope(
-                                epitope=annotated_neoepitope,
-                                paired_epitope=prime_neoepitope_wt,
-                                annotation_name=Prime.ANNOTATION_PREFIX_WT)
-        elif has_mhc2:
-            # MHC II epitope
-            annotated_neoepitope = self._run_netmhc2pan(neoepitope=neoepitope)
-            if annotated_neoepitope:
-                if self.configuration.mix_mhc2_pred and self.organism == ORGANISM_HOMO_SAPIENS:
-                    mixmhc2pred_neoepitope, mixmhc2pred_neoepitope_wt = self._run_mixmhc2pred(neoepitope=neoepitope)
-                    if mixmhc2pred_neoepitope:
-                        annotated_neoepitope = AnnotationFactory.annotate_epitope(
-                            epitope=annotated_neoepitope,
-                            paired_epitope=mixmhc2pred_neoepitope,
-                            annotation_name=MixMHC2pred.ANNOTATION_PREFIX)
-                        annotated_neoepitope = AnnotationFactory.annotate_epitope(
-                            epitope=annotated_neoepitope,
-                            paired_epitope=mixmhc2pred_neoepitope_wt,
-                            annotation_name=MixMHC2pred.ANNOTATION_PREFIX_WT)
-        else:
-            raise ValueError("Neoepitope without neither MHC I allele or MHC II isoform")
-
-        return annotated_neoepitope
-
-    def _run_netmhcpan(self, neoepitope: PredictedEpitope) -> PredictedEpitope:
-        # runs NetMHCpan in peptide mode over the mutated and WT separately and merges it back in one
-        # predicted epitope
-        annotated_neoepitope = neoepitope
-        annotated_neoepitope.affinity_wild_type = None
-        annotated_neoepitope.rank_wild_type = None 
-
-        netmhcpan_allele = self.mhc_parser.get_netmhcpan_representation(neoepitope.allele_mhc_i)
-        if netmhcpan_allele in self.available_alleles.get_available_mhc_i():
-            mutated_epitope = self.netmhcpan.mhc_prediction_peptide(
-                sequence=neoepitope.mutated_peptide, alleles=netmhcpan_allele)
-            annotated_neoepitope.affinity_mutated = mutated_epitope.affinity_mutated
-            annotated_neoepitope.rank_mutated = mutated_epitope.rank_mutated
+        return self.get_mhc_binding_annotations_multiple(neoepitopes=[neoepitope])[0]
+
+    def get_mhc_binding_annotations_multiple(self, neoepitopes: List[PredictedEpitope]) -> List[PredictedEpitope]:
+        """
+        Annotates the MHC binding of multiple neoepitopes. The neoepitopes are grouped by MHC I allele or MHC II
+        isoform and every tool runs once per group over all the mutated and WT peptides in the group, the scores are
+        then distributed back to every neoepitope
+        """
+        mhc1_neoepitopes = []
+        mhc2_neoepitopes = []
+        for neoepitope in neoepitopes:
+            if neoepitope.allele_mhc_i is not None and neoepitope.allele_mhc_i.name != '':
+                mhc1_neoepitopes.append(neoepitope)
+            elif neoepitope.isoform_mhc_i_i is not None and neoepitope.isoform_mhc_i_i.name != '':
+                mhc2_neoepitopes.append(neoepitope)
+            else:
+                raise ValueError("Neoepitope without neither MHC I allele or MHC II isoform")
+
+        if mhc1_neoepitopes:
+            # MHC I epitopes
+            self._run_netmhcpan(neoepitopes=mhc1_neoepitopes)
+            if self.configuration.mix_mhc_pred and self.organism == ORGANISM_HOMO_SAPIENS:
+                self._annotate_with_paired_predictions(
+                    neoepitopes=mhc1_neoepitopes,
+                    predictions=self._run_mixmhcpred(neoepitopes=mhc1_neoepitopes),
+                    annotation_name=MixMHCpred.ANNOTATION_PREFIX,
+                    annotation_name_wt=MixMHCpred.ANNOTATION_PREFIX_WT)
+                if self.configuration.prime:
+                    self._annotate_with_paired_predictions(
+                        neoepitopes=mhc1_neoepitopes,
+                        predictions=self._run_prime(neoepitopes=mhc1_neoepitopes),
+                        annotation_name=Prime.ANNOTATION_PREFIX,
+                        annotation_name_wt=Prime.ANNOTATION_PREFIX_WT)
+        if mhc2_neoepitopes:
+            # MHC II epitopes
+            self._run_netmhc2pan(neoepitopes=mhc2_neoepitopes)
+            if self.configuration.mix_mhc2_pred and self.organism == ORGANISM_HOMO_SAPIENS:
+                self._annotate_with_paired_predictions(
+                    neoepitopes=mhc2_neoepitopes,
+                    predictions=self._run_mixmhc2pred(neoepitopes=mhc2_neoepitopes),
+                    annotation_name=MixMHC2pred.ANNOTATION_PREFIX,
+                    annotation_name_wt=MixMHC2pred.ANNOTATION_PREFIX_WT,
+                    wt_requires_mutated=True)
+
+        return neoepitopes
+
+    @staticmethod
+    def _group_peptides(neoepitopes: List[PredictedEpitope], get_group) -> Dict[str, List[str]]:
+        """
+        Groups the unique mutated and WT peptides of the neoepitopes by the key returned by get_group, neoepitopes
+        with a None key are not grouped
+        """
+        peptides_by_group = {}
+        for neoepitope in neoepitopes:
+            group = get_group(neoepitope)
+            if group is not None:
+                peptides = peptides_by_group.setdefault(group, {})
+                peptides[neoepitope.mutated_peptide] = None
+                if neoepitope.wild_type_peptide:
+                    peptides[neoepitope.wild_type_peptide] = None
+        return {group: list(peptides) for group, peptides in peptides_by_group.items()}
+
+    @staticmethod
+    def _annotate_with_paired_predictions(
+            neoepitopes: List[PredictedEpitope], predictions: List[Tuple[PredictedEpitope, PredictedEpitope]],
+            annotation_name: str, annotation_name_wt: str, wt_requires_mutated=False):
+        for neoepitope, (mutated_epitope, wt_epitope) in zip(neoepitopes, predictions):
+            if mutated_epitope:
+                AnnotationFactory.annotate_epitope(
+                    epitope=neoepitope, paired_epitope=mutated_epitope, annotation_name=annotation_name)
+            if wt_epitope and (mutated_epitope or not wt_requires_mutated):
+                AnnotationFactory.annotate_epitope(
+                    epitope=neoepitope, paired_epitope=wt_epitope, annotation_name=annotation_name_wt)
+
+    def _run_netmhcpan(self, neoepitopes: List[PredictedEpitope]):
+        # runs NetMHCpan in peptide mode once per allele over the mutated and WT peptides and merges them back in
+        # every predicted epitope
+        available_mhc_i = self.available_alleles.get_available_mhc_i()
+
+        def get_allele(neoepitope: PredictedEpitope):
+            netmhcpan_allele = self.allele_registry.get_netmhcpan_representation(neoepitope.allele_mhc_i)
+            return netmhcpan_allele if netmhcpan_allele in available_mhc_i else None
+
+        predictions = {}
+        for allele, peptides in self._group_peptides(neoepitopes, get_allele).items():
+            predictions.update(self.netmhcpan.mhc_prediction_peptides_multiple(alleles=[allele], sequences=peptides))
+        for neoepitope in neoepitopes:
+            self._set_netmhcpan_scores(neoepitope, get_allele(neoepitope), predictions)
+
+    def _run_netmhc2pan(self, neoepitopes: List[PredictedEpitope]):
+        available_mhc_ii = self.available_alleles.get_available_mhc_ii()
+
+        def get_isoform(neoepitope: PredictedEpitope):
+            netmhc2pan_allele = self.allele_registry.get_netmhc2pan_representation(neoepitope.isoform_mhc_i_i)
+            return netmhc2pan_allele if netmhc2pan_allele in available_mhc_ii else None
+
+        predictions = {}
+        for isoform, peptides in self._group_peptides(neoepitopes, get_isoform).items():
+            predictions.update(self.netmhc2pan.mhc2_prediction_peptides_multiple(
+                mhc_alleles=[isoform], sequences=peptides))
+        for neoepitope in neoepitopes:
+            self._set_netmhcpan_scores(neoepitope, get_isoform(neoepitope), predictions)
+
+    @staticmethod
+    def _set_netmhcpan_scores(
+            neoepitope: PredictedEpitope, allele: str, predictions: Dict[Tuple[str, str], PredictedEpitope]):
+        neoepitope.affinity_wild_type = None
+        neoepitope.rank_wild_type = None
+        if allele is not None:
+            mutated_epitope = predictions.get((allele, neoepitope.mutated_peptide))
+            if mutated_epitope is not None:
+                neoepitope.affinity_mutated = mutated_epitope.affinity_mutated
+                neoepitope.rank_mutated = mutated_epitope.rank_mutated
             if neoepitope.wild_type_peptide:
-                wt_epitope = self.netmhcpan.mhc_prediction_peptide(
-                    sequence=neoepitope.wild_type_peptide, alleles=netmhcpan_allele)
-                annotated_neoepitope.affinity_wild_type = wt_epitope.affinity_mutated
-                annotated_neoepitope.rank_wild_type = wt_epitope.rank_mutated
-        return annotated_neoepitope
-
-    def _run_netmhc2pan(self, neoepitope: PredictedEpitope) -> PredictedEpitope:
-        annotated_neoepitope = neoepitope
-        annotated_neoepitope.affinity_wild_type = None
-        annotated_neoepitope.rank_wild_type = None 
-
-        netmhc2pan_allele = self.mhc_parser.get_netmhc2pan_representation(neoepitope.isoform_mhc_i_i)
-        if netmhc2pan_allele in self.available_alleles.get_available_mhc_ii():
-            mutated_epitope = self.netmhc2pan.mhc2_prediction_peptide(
-                sequence=neoepitope.mutated_peptide,
-                mhc2_isoform=neoepitope.isoform_mhc_i_i)
-            annotated_neoepitope.affinity_mutated = mutated_epitope.affinity_mutated
-            annotated_neoepitope.rank_mutated = mutated_epitope.rank_mutated
+                wt_epitope = predictions.get((allele, neoepitope.wild_type_peptide))
+                if wt_epitope is not None:
+                    neoepitope.affinity_wild_type = wt_epitope.affinity_mutated
+                    neoepitope.rank_wild_type = wt_epitope.rank_mutated
+
+    def _run_mixmhcpred(self, neoepitopes: List[PredictedEpitope]) -> List[Tuple[PredictedEpitope, PredictedEpitope]]:
+        return self._run_peptides_by_mhc(
+            neoepitopes,
+            get_mhc=lambda e: e.allele_mhc_i,
+            get_group=lambda e: self.allele_registry.get_mixmhcpred_representation(e.allele_mhc_i),
+            run_peptides=self.mixmhcpred.run_peptides)
+
+    def _run_prime(self, neoepitopes: List[PredictedEpitope]) -> List[Tuple[PredictedEpitope, PredictedEpitope]]:
+        return self._run_peptides_by_mhc(
+            neoepitopes,
+            get_mhc=lambda e: e.allele_mhc_i,
+            get_group=lambda e: self.allele_registry.get_mixmhcpred_representation(e.allele_mhc_i),
+            run_peptides=self.prime.run_peptides)
+
+    def _run_mixmhc2pred(self, neoepitopes: List[PredictedEpitope]) -> List[Tuple[PredictedEpitope, PredictedEpitope]]:
+        return self._run_peptides_by_mhc(
+            neoepitopes,
+            get_mhc=lambda e: e.isoform_mhc_i_i,
+            get_group=lambda e: e.isoform_mhc_i_i.name,
+            run_peptides=self.mixmhc2pred.run_peptides)
+
+    def _run_peptides_by_mhc(
+            self, neoepitopes: List[PredictedEpitope], get_mhc, get_group, run_peptides) \
+            -> List[Tuple[PredictedEpitope, PredictedEpitope]]:
+        """
+        Runs a predictor once per MHC allele or isoform over all the mutated and WT peptides restricted to it and
+        returns the pair of mutated and WT predictions of every neoepitope
+        """
+        mhc_by_group = {}
+        for neoepitope in neoepitopes:
+            mhc_by_group.setdefault(get_group(neoepitope), get_mhc(neoepitope))
+        predictions = {
+            group: run_peptides(peptides, mhc_by_group[group])
+            for group, peptides in self._group_peptides(neoepitopes, get_group).items()
+        }
+        results = []
+        for neoepitope in neoepitopes:
+            group_predictions = predictions.get(get_group(neoepitope), {})
+            wt_epitope = None
             if neoepitope.wild_type_peptide:
-                wt_epitope = self.netmhc2pan.mhc2_prediction_peptide(
-                    sequence=neoepitope.wild_type_peptide,
-                    mhc2_isoform=neoepitope.isoform_mhc_i_i)
-                annotated_neoepitope.affinity_wild_type = wt_epitope.affinity_mutated
-                annotated_neoepitope.rank_wild_type = wt_epitope.rank_mutated
-        return annotated_neoepitope
-
-    def _run_mixmhcpred(self, neoepitope: PredictedEpitope) -> Tuple[PredictedEpitope, PredictedEpitope]:
-        
-        wt_epitope = None
-        
-        mutated_epitope = self.mixmhcpred.run_peptide(
-            peptide=neoepitope.mutated_peptide, allele=neoepitope.allele_mhc_i)
-        if neoepitope.wild_type_peptide:
-            wt_epitope = self.mixmhcpred.run_peptide(
-                peptide=neoepitope.wild_type_peptide, allele=neoepitope.allele_mhc_i)
-        return mutated_epitope, wt_epitope
-
-    def _run_prime(self, neoepitope: PredictedEpitope) -> Tuple[PredictedEpitope, PredictedEpitope]:
-
-        wt_epitope = None
-        mutated_epitope = self.prime.run_peptide(peptide=neoepitope.mutated_peptide, allele=neoepitope.allele_mhc_i)
-        if neoepitope.wild_type_peptide:
-            wt_epitope = self.prime.run_peptide(
-                peptide=neoepitope.wild_type_peptide, allele=neoepitope.allele_mhc_i)
-        return mutated_epitope, wt_epitope
-
-    def _run_mixmhc2pred(self, neoepitope: PredictedEpitope) -> Tuple[PredictedEpitope, PredictedEpitope]:
-        wt_epitope = None
-        mutated_epitope = self.mixmhc2pred.run_peptide(
-            isoform=neoepitope.isoform_mhc_i_i, peptide=neoepitope.mutated_peptide)
-
-        if neoepitope.wild_type_peptide:
-            wt_epitope = self.mixmhc2pred.run_peptide(
-                peptide=neoepitope.wild_type_peptide, isoform=neoepitope.isoform_mhc_i_i)
-        return mutated_epitope, wt_epitope
+                wt_epitope = group_predictions.get(neoepitope.wild_type_peptide)
+            results.append((group_predictions.get(neoepitope.mutated_peptide), wt_epitope))
+        return results
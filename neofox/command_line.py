@@ -17,12 +17,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 from argparse import ArgumentParser
-from typing import Tuple, List, Dict
+from typing import Tuple, List, Dict, Iterator
 import dotenv
 from logzero import logger
 import json
 import neofox
 import neofox.neofox
+from neofox.helpers.prediction_cache import PredictionCache, NETMHCPAN, NETMHC2PAN, MIXMHCPRED, MIXMHC2PRED, PRIME, \
+    BLASTP_SIMILARITY, BLASTP_WILD_TYPE
 from neofox.model.neoantigen import Neoantigen, Patient, PredictedEpitope
 from neofox.model.validation import ModelValidator, InputValidator
 from neofox.neofox import NeoFox
@@ -68,6 +70,50 @@ def neofox_configure():
     logger.info("Finished the installation succesfully!")
 
 
+def neofox_cache():
+    parser = ArgumentParser(
+        description="Reports the statistics of the NeoFox cache of MHC binding and BLASTP predictions or invalidates it",
+        epilog=epilog)
+    parser.add_argument(
+        "--cache-folder",
+        dest="cache_folder",
+        help="the folder with the cache of MHC binding predictions, if not provided it is read from the "
+             "environment variable {}".format(neofox.NEOFOX_CACHE_FOLDER_ENV),
+    )
+    parser.add_argument(
+        "--config",
+        dest="config",
+        help="an optional configuration file with all the environment variables",
+        default=None,
+    )
+    parser.add_argument(
+        "--invalidate",
+        dest="invalidate",
+        action="store_true",
+        help="removes the cached predictions",
+    )
+    parser.add_argument(
+        "--predictor",
+        dest="predictor",
+        choices=[NETMHCPAN, NETMHC2PAN, MIXMHCPRED, MIXMHC2PRED, PRIME, BLASTP_SIMILARITY, BLASTP_WILD_TYPE],
+        help="reports the statistics or removes the cached predictions only of this predictor",
+    )
+
+    args = parser.parse_args()
+    if args.config:
+        dotenv.load_dotenv(args.config, override=True)
+    cache_folder = args.cache_folder if args.cache_folder else os.environ.get(neofox.NEOFOX_CACHE_FOLDER_ENV)
+    if not cache_folder:
+        parser.error("no cache folder provided")
+
+    prediction_cache = PredictionCache.get_prediction_cache(cache_folder)
+    if args.invalidate:
+        removed = prediction_cache.invalidate(predictor=args.predictor)
+        logger.info("Removed {} cached predictions".format(removed))
+    for predictor, num_predictions, hits, misses in prediction_cache.get_statistics(predictor=args.predictor):
+        logger.info("{}: {} cached predictions, {} hits and {} misses".format(predictor, num_predictions, hits, misses))
+
+
 def neofox_cli():
     parser = ArgumentParser(
         description="NeoFox {} annotates a given set of neoantigen candidate sequences "
@@ -120,6 +166,37 @@ def neofox_cli():
     parser.add_argument(
         "--num-cpus", dest="num_cpus", default=1, help="number of CPUs for computation"
     )
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        help="number of neoantigens annotated in every task sent to the workers "
+             "(default: as many chunks per patient as CPUs)",
+    )
+    parser.add_argument(
+        "--max-chunks-in-flight",
+        dest="max_chunks_in_flight",
+        help="maximum number of chunks submitted to the workers at any time (default: no limit)",
+    )
+    parser.add_argument(
+        "--max-concurrent-predictors",
+        dest="max_concurrent_predictors",
+        default=1,
+        help="number of MHC binding predictors run concurrently for every neoantigen in each CPU, "
+             "every predictor runs in its own process (default: 1)",
+    )
+    parser.add_argument(
+        "--stream-chunk-size",
+        dest="stream_chunk_size",
+        help="reads the input file in chunks of this number of neoantigens, every chunk is annotated and appended to "
+             "the output files before reading the next one (default: the whole input file is read at once)",
+    )
+    parser.add_argument(
+        "--in-memory-expression",
+        dest="in_memory_expression",
+        action="store_true",
+        help="loads the TCGA gene expression in memory once per process to impute the expression instead of querying "
+             "its tabix index for every gene, it uses more memory",
+    )
     parser.add_argument(
         "--config",
         dest="config",
@@ -148,6 +225,11 @@ def neofox_cli():
     rank_mhci_threshold = float(args.rank_mhci_threshold)
     rank_mhcii_threshold = float(args.rank_mhcii_threshold)
     num_cpus = int(args.num_cpus)
+    chunk_size = int(args.chunk_size) if args.chunk_size else None
+    max_chunks_in_flight = int(args.max_chunks_in_flight) if args.max_chunks_in_flight else None
+    max_concurrent_predictors = int(args.max_concurrent_predictors)
+    stream_chunk_size = int(args.stream_chunk_size) if args.stream_chunk_size else None
+    in_memory_expression = args.in_memory_expression
     config = args.config
     organism = args.organism
 
@@ -175,31 +257,55 @@ def neofox_cli():
 
         logger.info('Number of CPUs being used:  {}'.format(num_cpus))
 
-        # reads the input data
-        neoantigens, patients = _read_data(
-            input_file,
-            patients_data,
-            reference_folder.get_mhc_database())
-
-        # run annotations
-        annotated_neoantigens = NeoFox(
-            neoantigens=neoantigens,
-            patients=patients,
-            log_file_name=log_file_name,
-            num_cpus=num_cpus,
-            reference_folder=reference_folder,
-            rank_mhci_threshold=rank_mhci_threshold,
-            rank_mhcii_threshold=rank_mhcii_threshold,
-            with_all_neoepitopes=with_all_neoepitopes,
-            verbose=args.verbose
-        ).get_annotations()
-
-        _write_results(
-            neoantigens=annotated_neoantigens,
-            output_folder=output_folder,
-            output_prefix=output_prefix,
-            with_all_neoepitopes=with_all_neoepitopes
-        )
+        if stream_chunk_size:
+            _stream_annotations(
+                input_file=input_file,
+                patients_data=patients_data,
+                stream_chunk_size=stream_chunk_size,
+                output_folder=output_folder,
+                output_prefix=output_prefix,
+                with_all_neoepitopes=with_all_neoepitopes,
+                log_file_name=log_file_name,
+                num_cpus=num_cpus,
+                reference_folder=reference_folder,
+                rank_mhci_threshold=rank_mhci_threshold,
+                rank_mhcii_threshold=rank_mhcii_threshold,
+                verbose=args.verbose,
+                chunk_size=chunk_size,
+                max_chunks_in_flight=max_chunks_in_flight,
+                max_concurrent_predictors=max_concurrent_predictors,
+                in_memory_expression=in_memory_expression
+            )
+        else:
+            # reads the input data
+            neoantigens, patients = _read_data(
+                input_file,
+                patients_data,
+                reference_folder.get_mhc_database())
+
+            # run annotations
+            annotated_neoantigens = NeoFox(
+                neoantigens=neoantigens,
+                patients=patients,
+                log_file_name=log_file_name,
+                num_cpus=num_cpus,
+                reference_folder=reference_folder,
+                rank_mhci_threshold=rank_mhci_threshold,
+                rank_mhcii_threshold=rank_mhcii_threshold,
+                with_all_neoepitopes=with_all_neoepitopes,
+                verbose=args.verbose,
+                chunk_size=chunk_size,
+                max_chunks_in_flight=max_chunks_in_flight,
+                max_concurrent_predictors=max_concurrent_predictors,
+                in_memory_expression=in_memory_expression
+            ).get_annotations()
+
+            _write_results(
+                neoantigens=annotated_neoantigens,
+                output_folder=output_folder,
+                output_prefix=output_prefix,
+                with_all_neoepitopes=with_all_neoepitopes
+            )
     except Exception as e:
         logger.exception(e)  # logs every exception in the file
         raise e
@@ -208,10 +314,7 @@ def neofox_cli():
 
 
 def _read_data(input_file, patients_data, mhc_database: MhcDatabase) -> Tuple[List[Neoantigen], List[Patient]]:
-    logger.info("Parsing patients data from: {}".format(patients_data))
-    patients = ModelConverter.parse_patients_file(patients_data, mhc_database)
-    logger.info("Loaded {} patients".format(len(patients)))
-
+    patients = _read_patients(patients_data, mhc_database)
 
     if input_file.endswith('.json')  :
         logger.info("Parsing candidate neoantigens from: {}".format(input_file))
@@ -222,49 +325,85 @@ def _read_data(input_file, patients_data, mhc_database: MhcDatabase) -> Tuple[Li
         neoantigens = ModelConverter.parse_candidate_file(input_file)
         logger.info("Loaded {} candidate neoantigens".format(len(neoantigens)))
 
+    _validate_patient_identifiers(neoantigens, patients)
+
+    return neoantigens, patients
+
+
+def _read_patients(patients_data, mhc_database: MhcDatabase) -> List[Patient]:
+    logger.info("Parsing patients data from: {}".format(patients_data))
+    patients = ModelConverter.parse_patients_file(patients_data, mhc_database)
+    logger.info("Loaded {} patients".format(len(patients)))
+    return patients
+
+
+def _validate_patient_identifiers(neoantigens: List[Neoantigen], patients: List[Patient]):
     neoantigens_patient_ids = set(neoantigen.patient_identifier for neoantigen in neoantigens)
     patient_ids = set(patient.identifier for patient in patients)
     if len(neoantigens_patient_ids.difference(patient_ids)) > 0:
         raise ValueError('%s patient candidate does not exist in the patient data file.'
                          % neoantigens_patient_ids.difference(patient_ids))
 
-    return neoantigens, patients
+
+def _read_data_chunks(input_file, patients: List[Patient], chunk_size: int) -> Iterator[List[Neoantigen]]:
+    logger.info("Parsing candidate neoantigens in chunks of {} from: {}".format(chunk_size, input_file))
+    if input_file.endswith('.json'):
+        # NOTE: the JSON input is a single array which is loaded at once, only the annotation runs in chunks
+        neoantigens = ModelConverter.parse_neoantigens_json_file(input_file)
+        chunks = (neoantigens[i:i + chunk_size] for i in range(0, len(neoantigens), chunk_size))
+    else:
+        chunks = ModelConverter.parse_candidate_file_chunks(input_file, chunk_size=chunk_size)
+    for chunk in chunks:
+        _validate_patient_identifiers(chunk, patients)
+        yield chunk
+
+
+def _stream_annotations(
+        input_file, patients_data, stream_chunk_size, output_folder, output_prefix, with_all_neoepitopes,
+        log_file_name, num_cpus, reference_folder: ReferenceFolder, **kwargs):
+    """
+    Reads, annotates and writes the neoantigens in chunks of stream_chunk_size rows, so the memory used depends on the
+    chunk size and not on the size of the input. The dask workers are started once and shared by all chunks.
+    """
+    # NOTE: these imports here are a compromise solution so the help of the command line responds faster
+    from dask.distributed import Client
+    from neofox.helpers.results_writer import ResultsWriter
+
+    patients = _read_patients(patients_data, reference_folder.get_mhc_database())
+    dask_client = Client(n_workers=num_cpus, threads_per_worker=1)
+    count = 0
+    neofox_runner = None
+    try:
+        with ResultsWriter(output_folder, output_prefix, with_all_neoepitopes) as writer:
+            for neoantigens in _read_data_chunks(input_file, patients, chunk_size=stream_chunk_size):
+                if neofox_runner is None:
+                    # NOTE: the reference data is loaded and sent to the workers only once for all chunks
+                    neofox_runner = NeoFox(
+                        neoantigens=neoantigens,
+                        patients=patients,
+                        log_file_name=log_file_name,
+                        num_cpus=num_cpus,
+                        reference_folder=reference_folder,
+                        with_all_neoepitopes=with_all_neoepitopes,
+                        **kwargs
+                    )
+                else:
+                    neofox_runner.set_neoantigens(neoantigens)
+                annotated_neoantigens = neofox_runner.get_annotations(dask_client=dask_client)
+                writer.write(annotated_neoantigens)
+                count += len(annotated_neoantigens)
+                logger.info("Annotated and written {} candidate neoantigens".format(count))
+    finally:
+        dask_client.shutdown()          # terminates schedulers and workers
+        dask_client.close(timeout=10)   # waits 10 seconds for the client to close before killing
 
 
 def _write_results(neoantigens, output_folder, output_prefix, with_all_neoepitopes):
     # NOTE: this import here is a compromise solution so the help of the command line responds faster
-    from neofox.model.conversion import ModelConverter
+    from neofox.helpers.results_writer import ResultsWriter
     # writes the output
-    ModelConverter.annotations2neoantigens_table(neoantigens).to_csv(
-        os.path.join(
-            output_folder,
-            "{}_neoantigen_candidates_annotated.tsv".format(output_prefix),
-        ),
-        sep="\t",
-        index=False,
-    )
-
-    if with_all_neoepitopes:
-        ModelConverter.annotations2epitopes_table(neoantigens, mhc=neofox.MHC_I).to_csv(
-            os.path.join(
-                output_folder,
-                "{}_mhcI_epitope_candidates_annotated.tsv".format(output_prefix),
-            ),
-            sep="\t",
-            index=False,
-        )
-        ModelConverter.annotations2epitopes_table(neoantigens, mhc=neofox.MHC_II).to_csv(
-            os.path.join(
-                output_folder,
-                "{}_mhcII_epitope_candidates_annotated.tsv".format(output_prefix),
-            ),
-            sep="\t",
-            index=False,
-        )
-
-    output_features = os.path.join(output_folder, "{}_neoantigen_candidates_annotated.json".format(output_prefix))
-    with open(output_features, "w") as f:
-        f.write(json.dumps(ModelConverter.objects2json(neoantigens)))
+    with ResultsWriter(output_folder, output_prefix, with_all_neoepitopes) as writer:
+        writer.write(neoantigens)
 
 
 def neofox_epitope_cli():
@@ -298,6 +437,24 @@ def neofox_epitope_cli():
     parser.add_argument(
         "--num-cpus", dest="num_cpus", default=1, help="number of CPUs for computation"
     )
+    parser.add_argument(
+        "--chunk-size",
+        dest="chunk_size",
+        help="number of neoepitopes annotated in every task sent to the workers "
+             "(default: as many chunks as CPUs)",
+    )
+    parser.add_argument(
+        "--max-chunks-in-flight",
+        dest="max_chunks_in_flight",
+        help="maximum number of chunks submitted to the workers at any time (default: no limit)",
+    )
+    parser.add_argument(
+        "--in-memory-expression",
+        dest="in_memory_expression",
+        action="store_true",
+        help="loads the TCGA gene expression in memory once per process to impute the expression instead of querying "
+             "its tabix index for every gene, it uses more memory",
+    )
     parser.add_argument(
         "--config",
         dest="config",
@@ -323,6 +480,9 @@ def neofox_epitope_cli():
     output_folder = args.output_folder
     output_prefix = args.output_prefix
     num_cpus = int(args.num_cpus)
+    chunk_size = int(args.chunk_size) if args.chunk_size else None
+    max_chunks_in_flight = int(args.max_chunks_in_flight) if args.max_chunks_in_flight else None
+    in_memory_expression = args.in_memory_expression
     config = args.config
     organism = args.organism
 
@@ -355,7 +515,10 @@ def neofox_epitope_cli():
             log_file_name=log_file_name,
             num_cpus=num_cpus,
             reference_folder=reference_folder, 
-            verbose = args.verbose
+            verbose = args.verbose,
+            chunk_size=chunk_size,
+            max_chunks_in_flight=max_chunks_in_flight,
+            in_memory_expression=in_memory_expression
         ).get_annotations()
 
         _write_results_epitopes(
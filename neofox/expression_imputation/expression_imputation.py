@@ -18,6 +18,10 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 
 
+import threading
+from typing import List, Dict
+
+import numpy as np
 import pysam
 from logzero import logger
 import os
@@ -27,28 +31,91 @@
 COHORT_INDEX_FILE = "tcga_cohort_code.tab"
 
 
+class ExpressionMatrix(object):
+    """
+    The median gene expression of the TCGA cohorts held in memory as a gene x cohort float64 matrix with an index
+    of gene symbols. The column of a cohort is its integer index minus one, missing values are NaN
+    """
+
+    def __init__(self, genes: Dict[str, int], matrix: np.ndarray):
+        self.genes = genes
+        self.matrix = matrix
+
+    @staticmethod
+    def from_file(expression_file: str) -> 'ExpressionMatrix':
+        # NOTE: the medians are parsed as the tabix queries do to return exactly the same values
+        data = pd.read_csv(expression_file, sep="\t", usecols=[0, 1, 2], dtype={0: str, 2: str}, keep_default_na=False)
+        data.columns = ["gene", "cohort", "median"]
+        # the tabix queries return the first entry for a gene and cohort
+        data = data.drop_duplicates(subset=["gene", "cohort"], keep="first")
+        gene_symbols, gene_rows = np.unique(data["gene"].to_numpy(dtype=str), return_inverse=True)
+        cohort_columns = data["cohort"].to_numpy(dtype=np.int64) - 1
+        matrix = np.full((len(gene_symbols), cohort_columns.max() + 1), np.nan, dtype=np.float64)
+        matrix[gene_rows, cohort_columns] = [ExpressionMatrix._parse_median(m) for m in data["median"]]
+        return ExpressionMatrix(genes={g: i for i, g in enumerate(gene_symbols)}, matrix=matrix)
+
+    @staticmethod
+    def _parse_median(median: str) -> float:
+        try:
+            return float(median)
+        except ValueError:
+            return np.nan
+
+    def get_expression(self, gene_names: List[str], cohort_indices: List[int]) -> np.ndarray:
+        """
+        Returns the median expression of every gene in the corresponding cohort index, NaN if not available
+        """
+        rows = np.array([self.genes.get(g, -1) if g else -1 for g in gene_names], dtype=np.int64)
+        columns = np.array([c - 1 if c is not None else -1 for c in cohort_indices], dtype=np.int64)
+        found = (rows >= 0) & (columns >= 0) & (columns < self.matrix.shape[1])
+        expression = np.full(len(rows), np.nan, dtype=np.float64)
+        expression[found] = self.matrix[rows[found], columns[found]]
+        return expression
+
+
 class ExpressionAnnotator(object):
-    def __init__(self):
+
+    _matrices = {}
+    _matrices_lock = threading.Lock()
+
+    def __init__(self, expression_file: str = None, in_memory=False):
         """
         The expression file is tab separated values file compressed with bgzip and tabix indexed on the gene name and the
         TCGA cohort (encoded as an integer.
         The header of the file is as follows:
         #Gene_Symbol    TCGA_Cohort     Median_Exp      Exp_90p Exp_10p Study_Name
+        In memory mode the whole file is loaded once per process in a gene x cohort matrix instead of querying the
+        tabix index for every gene
         """
-        expression_file = os.path.join(
-            os.path.abspath(os.path.dirname(__file__)), EXPRESSION_FILE
-        )
+        if expression_file is None:
+            expression_file = os.path.join(
+                os.path.abspath(os.path.dirname(__file__)), EXPRESSION_FILE
+            )
         cohort_index_file = os.path.join(
             os.path.abspath(os.path.dirname(__file__)), COHORT_INDEX_FILE
         )
         self.cohort_indices = self._load_tcga_cohort_indices(cohort_index_file)
-        self.expression = pysam.TabixFile(expression_file)
+        self.expression_file = expression_file
+        self.in_memory = in_memory
+        self.expression = None if in_memory else pysam.TabixFile(expression_file)
 
     def _load_tcga_cohort_indices(self, tcga_cohort_index_file):
         data = pd.read_csv(tcga_cohort_index_file, sep="\t")
         dictionary = data.set_index("cohort").T.to_dict("records")[0]
         return dictionary
 
+    def get_expression_matrix(self) -> ExpressionMatrix:
+        """
+        Returns the expression matrix shared by all annotators in this process
+        """
+        with ExpressionAnnotator._matrices_lock:
+            matrix = ExpressionAnnotator._matrices.get(self.expression_file)
+            if matrix is None:
+                logger.info("Loading the gene expression matrix from {}".format(self.expression_file))
+                matrix = ExpressionMatrix.from_file(self.expression_file)
+                ExpressionAnnotator._matrices[self.expression_file] = matrix
+        return matrix
+
     def get_gene_expression_annotation(self, gene_name: str, tcga_cohort: str) -> float:
         """
         Returns median gene expression of given gene in TCGA cohort
@@ -56,6 +123,8 @@ def get_gene_expression_annotation(self, gene_name: str, tcga_cohort: str) -> fl
         :param tcga_cohort: cancer entity, needs to be on of the available TCGA cohorts
         :return: the gene expression
         """
+        if self.in_memory:
+            return self.get_gene_expression_annotations([gene_name], [tcga_cohort])[0]
         expression_value = None
         if gene_name is not None and gene_name.strip(" ") != "":
             try:
@@ -65,6 +134,28 @@ def get_gene_expression_annotation(self, gene_name: str, tcga_cohort: str) -> fl
                 logger.error("Tumor type is not available in TCGA data")
         return expression_value
 
+    def get_gene_expression_annotations(self, gene_names: List[str], tcga_cohorts: List[str]) -> List[float]:
+        """
+        Returns median gene expression of every gene in the corresponding TCGA cohort, with a single lookup in the
+        expression matrix in memory mode or with a tabix query per gene otherwise
+        :param gene_names: gene names
+        :param tcga_cohorts: cancer entities, need to be on of the available TCGA cohorts
+        :return: the gene expressions, None when not available
+        """
+        if not self.in_memory:
+            return [self.get_gene_expression_annotation(g, c) for g, c in zip(gene_names, tcga_cohorts)]
+        gene_names = [g if g is not None and g.strip(" ") != "" else None for g in gene_names]
+        cohort_indices = [self.cohort_indices.get(c) if g is not None else None for g, c in zip(gene_names, tcga_cohorts)]
+        for cohort in {c for g, c, i in zip(gene_names, tcga_cohorts, cohort_indices) if g is not None and i is None}:
+            logger.error("Tumor type is not available in TCGA data: {}".format(cohort))
+
+        expression = self.get_expression_matrix().get_expression(gene_names, cohort_indices)
+        missing = np.isnan(expression)
+        for gene_name, cohort_index in {(g, i) for g, i, m in zip(gene_names, cohort_indices, missing)
+                                        if m and i is not None}:
+            logger.error("No gene expression entries for {}:{}".format(gene_name, cohort_index))
+        return [None if m else float(e) for e, m in zip(expression, missing)]
+
     def _get_gene_expression(self, gene_name: str, cohort_index: int) -> float:
         median_gene_expression = None
         logger.debug(
@@ -17,29 +17,83 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 from math import exp, log
+import functools
 import json
-import subprocess
+import os
+from typing import List, Dict, Tuple
 from Bio.Align import PairwiseAligner
 from Bio.Align import substitution_matrices
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
+from neofox.helpers import intermediate_files
+from neofox.helpers.homology_search import HomologySearch
+from neofox.helpers.lru_cache import LruCache
+from neofox.helpers.prediction_cache import PredictionCache, BLASTP_SIMILARITY, BLASTP_WILD_TYPE
 from neofox.helpers.runner import Runner
-from neofox.references.references import DependenciesConfiguration
+from neofox.helpers.similarity_search import SimilaritySearch, get_alignment_scores, compute_recognition_probability
+from neofox.references.references import DependenciesConfiguration, ALIGNMENT_ENGINE_IN_PROCESS
+
+BLASTP_CACHE_SIZE = 100000
 
 
 class BlastpRunner(object):
 
     INF = float("inf")
 
-    def __init__(self, runner: Runner, configuration: DependenciesConfiguration, database: str):
+    def __init__(self, runner: Runner, configuration: DependenciesConfiguration, database: str,
+                 database_index: ProteomeIndex = None, cache_size=BLASTP_CACHE_SIZE):
         self.runner = runner
         self.configuration = configuration
         self.database = database
-        self.cache_homologous_epitopes = {}
+        self.cache_homologous_epitopes = LruCache(maxsize=cache_size)
+        self.cache_similarities = LruCache(maxsize=cache_size)
+        # NOTE: the database is searched in process when configured and the index of the database is given
+        self.homology_search = None
+        self.similarity_search = None
+        if configuration.alignment_engine == ALIGNMENT_ENGINE_IN_PROCESS and database_index is not None:
+            self.homology_search = HomologySearch(database_index)
+            self.similarity_search = SimilaritySearch(database_index)
+        # NOTE: the persistent cache is shared across annotators and runs
+        self.prediction_cache = PredictionCache.get_prediction_cache(configuration.cache_folder)
+        if self.prediction_cache is not None:
+            self.version = "{}:{}".format(
+                PredictionCache.get_version(configuration.blastp) if self.homology_search is None
+                else ALIGNMENT_ENGINE_IN_PROCESS,
+                PredictionCache.get_database_version(database))
 
     def calculate_similarity_database(self, peptide, a=26) -> float:
         """
         This function runs BLASTP on a given database and returns a score defining the similarity of the input sequence
         to best BLAST hit
         """
+        return self.calculate_similarity_database_multiple_peptides([peptide], a=a)[0]
+
+    def calculate_similarity_database_multiple_peptides(self, peptides: List[str], a=26) -> List[float]:
+        """
+        Returns the similarity scores of several peptides running BLASTP once over all peptides not computed before.
+        The scores are returned in the same order as the input peptides
+        """
+        similarities = {p: self.cache_similarities.get((p, a)) for p in dict.fromkeys(peptides)
+                        if (p, a) in self.cache_similarities}
+        missing_peptides = [p for p in dict.fromkeys(peptides) if p not in similarities]
+        if missing_peptides:
+            if self.prediction_cache is None:
+                missing_similarities = self._calculate_similarities(missing_peptides, a=a)
+            else:
+                parameters = "a={}".format(a)
+                results = self.prediction_cache.predict(
+                    BLASTP_SIMILARITY, self.version, [parameters], missing_peptides,
+                    run=lambda _, batch: {
+                        (parameters, p): s for p, s in self._calculate_similarities(batch, a=a).items()})
+                missing_similarities = {p: results.get((parameters, p)) for p in missing_peptides}
+            missing_similarities = {p: missing_similarities.get(p) for p in missing_peptides}
+            self.cache_similarities.update({(p, a): s for p, s in missing_similarities.items()})
+            similarities.update(missing_similarities)
+        return [similarities.get(p) for p in peptides]
+
+    def _calculate_similarities(self, peptides: List[str], a=26) -> Dict[str, float]:
+        if self.similarity_search is not None:
+            return {peptide: self._calculate_similarity_in_process(hits, a=a)
+                    for peptide, hits in self.similarity_search.get_hits_multiple(peptides).items()}
         cmd = [
             self.configuration.blastp,
             "-gapopen",
@@ -53,7 +107,10 @@ def calculate_similarity_database(self, peptide, a=26) -> float:
             "-evalue",
             "100000000"
         ]
-        hits = self._run_blastp(cmd=cmd, peptide=peptide)
+        hits_by_peptide = self._run_blastp(cmd=cmd, peptides=peptides)
+        return {peptide: self._calculate_similarity(hits, a=a) for peptide, hits in hits_by_peptide.items()}
+
+    def _calculate_similarity(self, hits, a=26) -> float:
         local_alignments = []
         try:
             for hit in hits:
@@ -71,53 +128,103 @@ def calculate_similarity_database(self, peptide, a=26) -> float:
             similarity_score = None
         return similarity_score
 
+    @staticmethod
+    def _calculate_similarity_in_process(hits: List[Tuple[str, str]], a=26) -> float:
+        """
+        Scores the aligned query and target sequences of the in-process hits as _calculate_similarity() scores the
+        ungapped hits of BLASTP, but all hits at once
+        """
+        try:
+            scores = get_alignment_scores([query for query, _ in hits], [target for _, target in hits])
+        except ValueError:
+            # NOTE: as with BLASTP, some rarer aminoacids are not present in the BLOSUM matrix
+            return None
+        return compute_recognition_probability(scores, a=a)
+
     def get_most_similar_wt_epitope(self, peptide):
-        if peptide not in self.cache_homologous_epitopes:
-            cmd = [
-                self.configuration.blastp,
-                "-outfmt",
-                "15",
-                "-db",
-                self.database,
-                "-evalue",
-                "100000000",
-                "-qcov_hsp_perc",
-                "100",
-                "-comp_based_stats F",
-                "-num_alignments 1",
-                "-ungapped"
-            ]
-
-            hits = self._run_blastp(cmd=cmd, peptide=peptide, print_log=True)
+        return self.get_most_similar_wt_epitopes([peptide])[0]
+
+    def get_most_similar_wt_epitopes(self, peptides: List[str]) -> List[str]:
+        """
+        Returns the most similar WT peptide in the database for several peptides running BLASTP once over all
+        peptides not searched before. The WT peptides are returned in the same order as the input peptides
+        """
+        wt_peptides = {p: self.cache_homologous_epitopes.get(p) for p in dict.fromkeys(peptides)
+                       if p in self.cache_homologous_epitopes}
+        missing_peptides = [p for p in dict.fromkeys(peptides) if p not in wt_peptides]
+        if missing_peptides:
+            if self.prediction_cache is None:
+                missing_wt_peptides = self._get_most_similar_wt_epitopes(missing_peptides)
+            else:
+                results = self.prediction_cache.predict(
+                    BLASTP_WILD_TYPE, self.version, [""], missing_peptides,
+                    run=lambda _, batch: {("", p): wt for p, wt in self._get_most_similar_wt_epitopes(batch).items()})
+                missing_wt_peptides = {p: results.get(("", p)) for p in missing_peptides}
+            missing_wt_peptides = {p: missing_wt_peptides.get(p) for p in missing_peptides}
+            self.cache_homologous_epitopes.update(missing_wt_peptides)
+            wt_peptides.update(missing_wt_peptides)
+        return [wt_peptides.get(p) for p in peptides]
+
+    def _get_most_similar_wt_epitopes(self, peptides: List[str]) -> Dict[str, str]:
+        if self.homology_search is not None:
+            return self.homology_search.get_most_similar_wt_epitopes(peptides)
+        cmd = [
+            self.configuration.blastp,
+            "-outfmt",
+            "15",
+            "-db",
+            self.database,
+            "-evalue",
+            "100000000",
+            "-qcov_hsp_perc",
+            "100",
+            "-comp_based_stats F",
+            "-num_alignments 1",
+            "-ungapped"
+        ]
+        hits_by_peptide = self._run_blastp(cmd=cmd, peptides=peptides, print_log=True)
+        wt_peptides = {}
+        for peptide, hits in hits_by_peptide.items():
             wt_peptide = None
             if hits is not None and len(hits) > 0:
                 best_hit = hits[0]
                 wt_peptide = best_hit.get("hsps")[0].get("hseq")
-            self.cache_homologous_epitopes[peptide] = wt_peptide
-        else:
-            wt_peptide = self.cache_homologous_epitopes.get(peptide)
-        return wt_peptide
-
-    def _run_blastp(self, cmd, peptide, print_log=True):
-        with subprocess.Popen(('echo', peptide), stdout=subprocess.PIPE) as echo:
-            output, errors = self.runner.run_command(cmd=cmd, stdin=echo.stdout, print_log=print_log)
-            echo.wait()
-            echo.kill()
+            wt_peptides[peptide] = wt_peptide
+        return wt_peptides
+
+    def _run_blastp(self, cmd, peptides: List[str], print_log=True) -> Dict[str, List]:
+        """
+        Runs BLASTP once over all peptides in a multi-FASTA and returns the hits of every peptide
+        """
+        unique_peptides = list(dict.fromkeys(peptides))
+        query = intermediate_files.create_temp_fasta(unique_peptides, prefix="tmp_blastp_")
+        output, _ = self.runner.run_command(cmd=cmd + ["-query", query], print_log=print_log)
+        os.remove(query)
         results = json.loads(output)
-        hits = results.get("BlastOutput2")[0].get("report").get("results").get("search").get("hits")
-        return hits
+        # NOTE: BLASTP writes one report per query in the same order as the queries
+        reports = results.get("BlastOutput2")
+        return {
+            peptide: report.get("report").get("results").get("search").get("hits")
+            for peptide, report in zip(unique_peptides, reports)
+        }
 
     @staticmethod
     def align(seq1, seq2):
         """
         Smith-Waterman alignment with default parameters.
         """
+        aln = BlastpRunner._get_aligner().align(seq1.upper(), seq2.upper())
+        return aln
+
+    @staticmethod
+    @functools.lru_cache(maxsize=1)
+    def _get_aligner() -> PairwiseAligner:
+        # NOTE: the aligner and the BLOSUM62 matrix are loaded once and shared by all alignments
         aligner = PairwiseAligner()
         aligner.open_gap_score = -11
         aligner.extend_gap_score = -1
         aligner.substitution_matrix = substitution_matrices.load("BLOSUM62")
-        aln = aligner.align(seq1.upper(), seq2.upper())
-        return aln
+        return aligner
 
     @staticmethod
     def computeR(alignments, a=26, k=4.87) -> float:
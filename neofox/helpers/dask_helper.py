@@ -0,0 +1,78 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import math
+from typing import List, Callable, Iterable, Iterator
+
+from dask.distributed import as_completed
+
+
+def split_in_chunks(indices: List[int], chunk_size: int = None, num_chunks: int = 1) -> List[List[int]]:
+    """
+    Splits a list of indices in chunks of at most chunk_size elements, if no chunk size is provided it splits them
+    in num_chunks chunks of similar size
+    """
+    if len(indices) == 0:
+        return []
+    if chunk_size is None:
+        chunk_size = math.ceil(len(indices) / num_chunks)
+    return [indices[i:i + chunk_size] for i in range(0, len(indices), chunk_size)]
+
+
+def submit_in_chunks(
+        dask_client, function: Callable, chunks: Iterable, *args, max_chunks_in_flight: int = None) -> Iterator:
+    """
+    Submits one task per chunk calling function(*chunk, *args), where every chunk is a tuple with the first
+    arguments of the function. The chunks may be a lazy iterable, they are only consumed as they are submitted.
+    At most max_chunks_in_flight chunks are running at any time and a new chunk is submitted as soon as any of them
+    completes, thus a slow chunk does not keep the other workers idle. Every result is gathered on completion and its
+    future released. The results are yielded in the same order as the chunks, the results completed ahead of a slower
+    chunk are kept until it completes.
+    """
+    pending_chunks = enumerate(chunks)
+    running = as_completed()
+    chunk_indices = {}
+
+    def submit_next_chunk() -> bool:
+        index_and_chunk = next(pending_chunks, None)
+        if index_and_chunk is None:
+            return False
+        index, chunk = index_and_chunk
+        # NOTE: pure=False avoids that equal chunks are merged into a single task
+        future = dask_client.submit(function, *chunk, *args, pure=False)
+        chunk_indices[future.key] = index
+        running.add(future)
+        return True
+
+    if max_chunks_in_flight:
+        for _ in range(max_chunks_in_flight):
+            submit_next_chunk()
+    else:
+        while submit_next_chunk():
+            pass
+
+    completed = {}
+    next_index = 0
+    for future in running:
+        completed[chunk_indices.pop(future.key)] = future.result()
+        future.release()
+        submit_next_chunk()
+        # restores the order of the chunks
+        while next_index in completed:
+            yield completed.pop(next_index)
+            next_index += 1
@@ -16,7 +16,8 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List
+import copy
+from typing import List, Dict
 
 from Bio.Data import IUPACData
 
@@ -41,10 +42,13 @@ def generate_nmers(neoantigen: Neoantigen, lengths, uniprot):
                 ends = [s + length for s in starts]
                 for s, e in zip(starts, ends):
                     peptide = neoantigen.mutated_xmer[s:e]
-                    if len(peptide) == length and uniprot.is_sequence_not_in_uniprot(peptide):
+                    if len(peptide) == length:
                         list_peptides.add(peptide)
 
-        return list(list_peptides)
+        # checks all peptides against the proteome at once
+        list_peptides = list(list_peptides)
+        return [p for p, not_in_uniprot in zip(list_peptides, uniprot.are_sequences_not_in_uniprot(list_peptides))
+                if not_in_uniprot]
 
     @staticmethod
     def position_of_mutation_epitope(epitope: PredictedEpitope) -> int:
@@ -117,28 +121,50 @@ def contains_rare_amino_acid(peptide):
 
     @staticmethod
     def pair_predictions(predictions, predictions_wt) -> List[PredictedEpitope]:
-        for prediction in predictions:
-            for prediction_wt in predictions_wt:
-                if len(prediction_wt.mutated_peptide) == len(prediction.mutated_peptide) and \
-                        prediction.position == prediction_wt.position and \
-                        prediction.allele_mhc_i.name == prediction_wt.allele_mhc_i.name:
-                    prediction.wild_type_peptide = prediction_wt.mutated_peptide
-                    prediction.rank_wild_type = prediction_wt.rank_mutated
-                    prediction.affinity_wild_type = prediction_wt.affinity_mutated
-                    break
-        return predictions
+        return EpitopeHelper.pair_predictions_multiple([predictions], [predictions_wt])[0]
 
     @staticmethod
     def pair_mhcii_predictions(predictions, predictions_wt) -> List[PredictedEpitope]:
-        for prediction in predictions:
-            for prediction_wt in predictions_wt:
-                if len(prediction_wt.mutated_peptide) == len(prediction.mutated_peptide) and \
-                        prediction.position == prediction_wt.position and \
-                        prediction.isoform_mhc_i_i.name == prediction_wt.isoform_mhc_i_i.name:
+        return EpitopeHelper.pair_mhcii_predictions_multiple([predictions], [predictions_wt])[0]
+
+    @staticmethod
+    def pair_predictions_multiple(
+            predictions: List[List[PredictedEpitope]], predictions_wt: List[List[PredictedEpitope]]
+    ) -> List[List[PredictedEpitope]]:
+        """
+        Pairs the MHC I predictions of several neoantigens with their WT predictions on length, position and allele.
+        The lists of predictions of every neoantigen are in the same order in both inputs, WT predictions may be None
+        """
+        return EpitopeHelper._pair_by_key(
+            predictions, predictions_wt, key=lambda p: (len(p.mutated_peptide), p.position, p.allele_mhc_i.name))
+
+    @staticmethod
+    def pair_mhcii_predictions_multiple(
+            predictions: List[List[PredictedEpitope]], predictions_wt: List[List[PredictedEpitope]]
+    ) -> List[List[PredictedEpitope]]:
+        """
+        Pairs the MHC II predictions of several neoantigens with their WT predictions on length, position and isoform.
+        The lists of predictions of every neoantigen are in the same order in both inputs, WT predictions may be None
+        """
+        return EpitopeHelper._pair_by_key(
+            predictions, predictions_wt, key=lambda p: (len(p.mutated_peptide), p.position, p.isoform_mhc_i_i.name))
+
+    @staticmethod
+    def _pair_by_key(
+            predictions: List[List[PredictedEpitope]], predictions_wt: List[List[PredictedEpitope]], key
+    ) -> List[List[PredictedEpitope]]:
+        # joins on the key prefixed by the neoantigen, every prediction is paired with the first WT prediction
+        wt_by_key = {}
+        for i, neoantigen_predictions_wt in enumerate(predictions_wt):
+            for prediction_wt in neoantigen_predictions_wt or []:
+                wt_by_key.setdefault((i, ) + key(prediction_wt), prediction_wt)
+        for i, neoantigen_predictions in enumerate(predictions):
+            for prediction in neoantigen_predictions:
+                prediction_wt = wt_by_key.get((i, ) + key(prediction))
+                if prediction_wt is not None:
                     prediction.wild_type_peptide = prediction_wt.mutated_peptide
                     prediction.rank_wild_type = prediction_wt.rank_mutated
                     prediction.affinity_wild_type = prediction_wt.affinity_mutated
-                    break
         return predictions
 
     @staticmethod
@@ -198,14 +224,16 @@ def remove_peptides_in_proteome(predictions: List[PredictedEpitope], uniprot
                                     ) -> List[PredictedEpitope]:
         """filters prediction file for predicted epitopes that cover mutations by searching for epitope
         in uniprot proteome database with an exact match search"""
-        return list(
-            filter(
-                lambda p: uniprot.is_sequence_not_in_uniprot(
-                    p.mutated_peptide
-                ),
-                predictions,
-            )
-        )
+        not_in_uniprot = uniprot.are_sequences_not_in_uniprot([p.mutated_peptide for p in predictions])
+        return [p for p, n in zip(predictions, not_in_uniprot) if n]
+
+    @staticmethod
+    def remove_peptides_in_proteome_multiple(predictions: List[List[PredictedEpitope]], uniprot
+                                             ) -> List[List[PredictedEpitope]]:
+        """same as remove_peptides_in_proteome() over the predictions of several neoantigens with a single search"""
+        not_in_uniprot = iter(uniprot.are_sequences_not_in_uniprot(
+            [p.mutated_peptide for neoantigen_predictions in predictions for p in neoantigen_predictions]))
+        return [[p for p in neoantigen_predictions if next(not_in_uniprot)] for neoantigen_predictions in predictions]
 
     @staticmethod
     def filter_for_9mers(predictions: List[PredictedEpitope]) -> List[PredictedEpitope]:
@@ -230,10 +258,35 @@ def set_wt_epitope_by_homology(predictions: List[PredictedEpitope], blastp_runne
         """returns wt epitope for each neoepitope candidate of a neoantigen candidate from an alternative mutation
         class by a BLAST search."""
 
-        for p in predictions:
-            p.wild_type_peptide = blastp_runner.get_most_similar_wt_epitope(p.mutated_peptide)
+        wt_peptides = blastp_runner.get_most_similar_wt_epitopes([p.mutated_peptide for p in predictions])
+        for p, wt_peptide in zip(predictions, wt_peptides):
+            p.wild_type_peptide = wt_peptide
         return predictions
 
+    @staticmethod
+    def split_predictions_by_sequence(
+            sequences: List[str], predictions_by_identity: Dict[str, List[PredictedEpitope]]) -> List[List[PredictedEpitope]]:
+        """
+        Returns the predictions for each of the input sequences in the same order as the input sequences.
+        The predictions are indexed by the FASTA identifiers seq1, seq2, etc. following the order of the first
+        occurrence of every sequence
+        """
+        unique_sequences = list(dict.fromkeys(sequences))
+        predictions_by_sequence = {
+            sequence: predictions_by_identity.get("seq{}".format(index), [])
+            for index, sequence in enumerate(unique_sequences, start=1)
+        }
+        results = []
+        returned_sequences = set()
+        for sequence in sequences:
+            predictions = predictions_by_sequence.get(sequence)
+            if sequence in returned_sequences:
+                # repeated sequences get their own copies as predictions are modified downstream
+                predictions = copy.deepcopy(predictions)
+            returned_sequences.add(sequence)
+            results.append(predictions)
+        return results
+
     @staticmethod
     def get_epitope_id(epitope):
         if epitope.allele_mhc_i is not None:
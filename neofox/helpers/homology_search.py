@@ -0,0 +1,75 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from typing import List, Dict
+import numpy as np
+from Bio.Align import substitution_matrices
+
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
+
+SEED_LENGTH = 3
+
+
+def load_blosum62():
+    """
+    Returns BLOSUM62 as a matrix together with the index in the matrix of every character.
+    Any character not in BLOSUM62 is scored as X and the separator between proteins as minus infinity
+    """
+    blosum = substitution_matrices.load("BLOSUM62")
+    separator = len(blosum.alphabet)
+    aminoacid_indices = np.full(256, blosum.alphabet.index("X"), dtype=np.int8)
+    for i, aa in enumerate(blosum.alphabet):
+        aminoacid_indices[ord(aa)] = i
+    aminoacid_indices[ord("\n")] = separator
+    matrix = np.full((separator + 1, separator + 1), -np.inf)
+    matrix[:separator, :separator] = np.array(blosum)
+    return aminoacid_indices, matrix
+
+
+class HomologySearch(object):
+    """
+    In-process search of the most similar wild type peptide in the proteome, an alternative to an ungapped BLASTP
+    search with full query coverage reporting only the best alignment.
+    Every peptide is searched through its 3-mers, the positions of every 3-mer in the proteome are read from the
+    proteome index. Every proteome window of the same length as the peptide sharing a 3-mer with it is then scored with
+    BLOSUM62 at once and the best scoring window is returned. Windows spanning two proteins are never returned
+    """
+
+    def __init__(self, index: ProteomeIndex):
+        self.index = index
+        self.proteome = np.frombuffer(index.proteome, dtype=np.uint8)
+        self.aminoacid_indices, self.blosum = load_blosum62()
+
+    def get_most_similar_wt_epitope(self, peptide: str) -> str:
+        return self.get_most_similar_wt_epitopes([peptide])[peptide]
+
+    def get_most_similar_wt_epitopes(self, peptides: List[str]) -> Dict[str, str]:
+        return {p: self._search(p) for p in dict.fromkeys(peptides)}
+
+    def _search(self, peptide: str) -> str:
+        candidate_starts = self.index.get_windows_sharing_kmers(peptide, kmer_length=SEED_LENGTH)
+        if len(candidate_starts) == 0:
+            return None
+        encoded_peptide = self.aminoacid_indices[np.frombuffer(peptide.encode("ascii", errors="replace"), np.uint8)]
+        windows = self.aminoacid_indices[self.proteome[candidate_starts[:, np.newaxis] + np.arange(len(peptide))]]
+        scores = self.blosum[encoded_peptide[np.newaxis, :], windows].sum(axis=1)
+        best = int(np.argmax(scores))
+        if scores[best] == -np.inf:
+            return None
+        start = int(candidate_starts[best])
+        return bytes(self.index.proteome[start:start + len(peptide)]).decode("ascii")
@@ -0,0 +1,67 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import threading
+from collections import OrderedDict
+from typing import Dict, Hashable, Any
+
+
+class LruCache(object):
+    """
+    In-memory cache holding at most maxsize entries, the least recently used entries are removed first.
+    Contrary to functools.lru_cache the entries are read and written in batches. The entries are not pickled, thus
+    a cache sent to other processes starts empty
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        # NOTE: the annotators may be used from several threads
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        # NOTE: neither the lock nor the entries are sent to other processes
+        return {"maxsize": self.maxsize}
+
+    def __setstate__(self, state):
+        self.__init__(maxsize=state["maxsize"])
+
+    def __contains__(self, key: Hashable) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: Hashable, default=None) -> Any:
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def update(self, entries: Dict[Hashable, Any]):
+        with self._lock:
+            for key, value in entries.items():
+                self._entries[key] = value
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def __setitem__(self, key: Hashable, value: Any):
+        self.update({key: value})
@@ -1,6 +1,7 @@
-from typing import List
+from typing import List, Dict, Tuple
 from neofox.model.neoantigen import Mhc1, Zygosity, MhcAllele, PredictedEpitope, Neoantigen
 from neofox.model.mhc_parser import MhcParser
+from neofox.references.allele_registry import AlleleRegistry
 
 import pandas as pd
 from pandas.errors import EmptyDataError
@@ -38,21 +39,28 @@ class MixMhcHelper:
 
     def __init__(self, mhc_parser: MhcParser):
         self.mhc_parser = mhc_parser
+        self.allele_registry = AlleleRegistry.get_allele_registry(mhc_parser)
 
     @staticmethod
-    def get_mixmhc_allele_representation(file_alleles, mhc_alleles: List[MhcAllele]):
+    def get_mixmhc_representation(allele: MhcAllele) -> str:
+        return AlleleRegistry.get_mixmhcpred_allele_representation(allele)
+
+    @staticmethod
+    def get_predictions_by_allele_and_peptide(predictions: List[PredictedEpitope]) -> Dict[Tuple[str, str], PredictedEpitope]:
+        """
+        Indexes the predictions from MixMHCpred and PRIME by the allele in MixMHCpred representation and the peptide
         """
-        loads file with available HLA II alleles for MixMHCpred and PRIME prediction, returns set
+        return {(MixMhcHelper.get_mixmhc_representation(p.allele_mhc_i), p.mutated_peptide): p for p in predictions}
+
+    def get_mixmhc_allele_representation(self, file_alleles, mhc_alleles: List[MhcAllele]):
+        """
+        returns the alleles available for MixMHCpred and PRIME prediction, the file with available alleles is loaded
+        once per process
         :return:
         """
-        alleles = pd.read_csv(
-            file_alleles, sep="\t"
-        )
-        available_alleles =  set(alleles["Allele"])
+        available_alleles = AlleleRegistry.get_supported_alleles(file_alleles, column="Allele")
 
-        converted_mhc_alleles = list(map(
-                    lambda x: "{gene}{group}{protein}".format(gene=x.gene, group=x.group, protein=x.protein),
-                    mhc_alleles))
+        converted_mhc_alleles = list(map(self.allele_registry.get_mixmhcpred_representation, mhc_alleles))
 
         not_available_alleles = list(set(converted_mhc_alleles).difference(available_alleles))
         if len(not_available_alleles) > 0:
@@ -0,0 +1,299 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import atexit
+import copy
+import glob
+import os
+import pickle
+import shutil
+import sqlite3
+import threading
+from typing import List, Dict, Tuple, Callable, Optional
+from logzero import logger
+from neofox.model.neoantigen import PredictedEpitope
+
+PREDICTION_CACHE_FILE = "neofox_predictions.sqlite"
+
+NETMHCPAN = "netMHCpan"
+NETMHC2PAN = "netMHCIIpan"
+MIXMHCPRED = "MixMHCpred"
+MIXMHC2PRED = "MixMHC2pred"
+PRIME = "PRIME"
+BLASTP_SIMILARITY = "blastp_similarity"
+BLASTP_WILD_TYPE = "blastp_wild_type"
+
+# NOTE: the hits and misses are written to the database after this number of lookups or with the next predictions
+STATISTICS_FLUSH_INTERVAL = 1000
+
+
+class PredictionCache(object):
+    """
+    Persistent cache of the MHC binding predictions stored in a SQLite database.
+    Every prediction is stored for a peptide, an allele in the representation of the predictor, the predictor and the
+    version of the predictor binary. A peptide for which the predictor returns no prediction is cached as such.
+    The results of BLASTP are cached in the same way, the allele is replaced by the parameters of the calculation and
+    the version includes the BLAST database.
+    """
+
+    _caches = {}
+    _caches_lock = threading.Lock()
+
+    def __init__(self, cache_folder: str):
+        os.makedirs(cache_folder, exist_ok=True)
+        self.database = os.path.join(cache_folder, PREDICTION_CACHE_FILE)
+        # NOTE: the connection may be used from the threads running the predictors concurrently
+        self.connection = sqlite3.connect(self.database, timeout=600, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.hits = {}
+        self.misses = {}
+        self.pending_statistics = {}
+        self.pending_lookups = 0
+        with self.lock, self.connection:
+            # NOTE: WAL allows several worker processes to read while another one writes
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS predictions ("
+                "predictor TEXT NOT NULL, version TEXT NOT NULL, allele TEXT NOT NULL, peptide TEXT NOT NULL, "
+                "prediction BLOB, PRIMARY KEY (predictor, version, allele, peptide))")
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS statistics ("
+                "predictor TEXT PRIMARY KEY, hits INTEGER NOT NULL, misses INTEGER NOT NULL)")
+
+    @staticmethod
+    def get_prediction_cache(cache_folder: str):
+        """
+        Returns the cache for the given folder shared by all predictors in this process or None if there is no folder
+        """
+        if not cache_folder:
+            return None
+        with PredictionCache._caches_lock:
+            cache = PredictionCache._caches.get(cache_folder)
+            if cache is None:
+                cache = PredictionCache(cache_folder)
+                PredictionCache._caches[cache_folder] = cache
+                atexit.register(cache.flush_statistics)
+        return cache
+
+    @staticmethod
+    def get_version(binary: str) -> str:
+        """
+        The version of a predictor is derived from the path, the size and the modification time of its binary,
+        thus any reinstallation invalidates the cached predictions
+        """
+        path = shutil.which(binary) if binary else None
+        if path is None:
+            return str(binary)
+        stat = os.stat(path)
+        return "{}:{}:{}".format(os.path.realpath(path), stat.st_size, int(stat.st_mtime))
+
+    @staticmethod
+    def get_database_version(database: str) -> str:
+        """
+        The version of a BLAST database is derived from the path, the size and the modification time of its files
+        """
+        files = sorted(glob.glob("{}.*".format(database)))
+        return "{}:{}".format(os.path.realpath(database), ",".join(
+            "{}:{}".format(os.stat(f).st_size, int(os.stat(f).st_mtime)) for f in files))
+
+    def get(self, predictor: str, version: str, allele: str, peptides: List[str]) -> Dict[str, Optional[PredictedEpitope]]:
+        """
+        Returns the cached predictions for the given peptides, peptides not in the cache are not returned and
+        peptides without prediction are returned with None
+        """
+        results = {}
+        unique_peptides = list(dict.fromkeys(peptides))
+        with self.lock:
+            # NOTE: SQLite limits the number of parameters in a query
+            for i in range(0, len(unique_peptides), 500):
+                batch = unique_peptides[i:i + 500]
+                rows = self.connection.execute(
+                    "SELECT peptide, prediction FROM predictions WHERE predictor = ? AND version = ? AND allele = ? "
+                    "AND peptide IN ({})".format(",".join("?" * len(batch))),
+                    [predictor, version, allele] + batch)
+                for peptide, prediction in rows:
+                    results[peptide] = pickle.loads(prediction) if prediction is not None else None
+        return results
+
+    def put(self, predictor: str, version: str, allele: str, predictions: Dict[str, Optional[PredictedEpitope]]):
+        with self.lock, self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO predictions (predictor, version, allele, peptide, prediction) "
+                "VALUES (?, ?, ?, ?, ?)",
+                [(predictor, version, allele, peptide, pickle.dumps(prediction) if prediction is not None else None)
+                 for peptide, prediction in predictions.items()])
+            # NOTE: the pending statistics are written within the same transaction
+            self._write_statistics()
+
+    def predict(
+            self, predictor: str, version: str, alleles: List[str], peptides: List[str],
+            run: Callable[[List[str], List[str]], Dict[Tuple[str, str], PredictedEpitope]]
+    ) -> Dict[Tuple[str, str], Optional[PredictedEpitope]]:
+        """
+        Returns the predictions for every pair of allele and peptide. Only the pairs missing in the cache are sent to
+        the predictor through run(alleles, peptides), which returns the predictions indexed by allele and peptide.
+        Alleles missing the same peptides are predicted together with a single call
+        """
+        unique_peptides = list(dict.fromkeys(peptides))
+        results, missing_peptides_by_allele = self._get_cached(predictor, version, alleles, unique_peptides)
+        alleles_by_missing_peptides = {}
+        for allele, missing_peptides in missing_peptides_by_allele.items():
+            alleles_by_missing_peptides.setdefault(tuple(missing_peptides), []).append(allele)
+
+        for missing_peptides, missing_alleles in alleles_by_missing_peptides.items():
+            predictions = run(missing_alleles, list(missing_peptides))
+            self._put_predictions(predictor, version, missing_alleles, missing_peptides, predictions, results)
+        return results
+
+    def predict_sequences(
+            self, predictor: str, version: str, alleles: List[str], sequences: List[str], lengths: List[int],
+            run: Callable[[List[str], List[str]], Dict[Tuple[str, str], PredictedEpitope]]
+    ) -> List[List[PredictedEpitope]]:
+        """
+        Returns the predictions for all peptides of the given lengths within every sequence in the same order as the
+        input sequences. The sequences containing peptides missing in the cache are sent to the predictor through
+        run(alleles, sequences), which predicts the whole sequences and returns the predictions indexed by allele and
+        peptide, thus the predictor runs in the same mode as without cache.
+        The predictions of every sequence are sorted by allele, peptide length and position and the position is
+        1-based as in the predictors output
+        """
+        windows = {
+            sequence: [(start, sequence[start:start + length])
+                       for length in lengths for start in range(0, len(sequence) - length + 1)]
+            for sequence in dict.fromkeys(sequences)
+        }
+        unique_peptides = list(dict.fromkeys(p for sequence_windows in windows.values() for _, p in sequence_windows))
+        predictions, missing_peptides_by_allele = self._get_cached(predictor, version, alleles, unique_peptides)
+        alleles_by_missing_sequences = {}
+        for allele, missing_peptides in missing_peptides_by_allele.items():
+            missing_peptides = set(missing_peptides)
+            missing_sequences = tuple(
+                sequence for sequence, sequence_windows in windows.items()
+                if any(p in missing_peptides for _, p in sequence_windows))
+            alleles_by_missing_sequences.setdefault(missing_sequences, []).append(allele)
+
+        for missing_sequences, missing_alleles in alleles_by_missing_sequences.items():
+            sequence_predictions = run(missing_alleles, list(missing_sequences))
+            missing_peptides = list(dict.fromkeys(
+                p for sequence in missing_sequences for _, p in windows[sequence]))
+            self._put_predictions(
+                predictor, version, missing_alleles, missing_peptides, sequence_predictions, predictions)
+
+        results = []
+        for sequence in sequences:
+            sequence_predictions = []
+            for allele in dict.fromkeys(alleles):
+                for start, peptide in windows[sequence]:
+                    prediction = predictions.get((allele, peptide))
+                    if prediction is not None:
+                        prediction = copy.deepcopy(prediction)
+                        prediction.position = start + 1
+                        sequence_predictions.append(prediction)
+            results.append(sequence_predictions)
+        return results
+
+    def _get_cached(
+            self, predictor: str, version: str, alleles: List[str], peptides: List[str]
+    ) -> Tuple[Dict[Tuple[str, str], Optional[PredictedEpitope]], Dict[str, List[str]]]:
+        """
+        Returns the cached predictions indexed by allele and peptide and the peptides missing for every allele
+        """
+        results = {}
+        missing_peptides_by_allele = {}
+        for allele in dict.fromkeys(alleles):
+            cached = self.get(predictor, version, allele, peptides)
+            missing_peptides = []
+            for peptide in peptides:
+                if peptide in cached:
+                    results[(allele, peptide)] = cached[peptide]
+                else:
+                    missing_peptides.append(peptide)
+            if missing_peptides:
+                missing_peptides_by_allele[allele] = missing_peptides
+        num_misses = sum(len(p) for p in missing_peptides_by_allele.values())
+        self._count(predictor, hits=len(results), misses=num_misses)
+        return results, missing_peptides_by_allele
+
+    def _put_predictions(self, predictor, version, alleles, peptides, predictions, results):
+        for allele in alleles:
+            allele_predictions = {p: predictions.get((allele, p)) for p in peptides}
+            self.put(predictor, version, allele, allele_predictions)
+            results.update({(allele, p): prediction for p, prediction in allele_predictions.items()})
+
+    def _count(self, predictor, hits, misses):
+        with self.lock:
+            self.hits[predictor] = self.hits.get(predictor, 0) + hits
+            self.misses[predictor] = self.misses.get(predictor, 0) + misses
+            pending_hits, pending_misses = self.pending_statistics.get(predictor, (0, 0))
+            self.pending_statistics[predictor] = (pending_hits + hits, pending_misses + misses)
+            self.pending_lookups += 1
+            if self.pending_lookups >= STATISTICS_FLUSH_INTERVAL:
+                with self.connection:
+                    self._write_statistics()
+        logger.debug("Prediction cache for {}: {} hits and {} misses".format(predictor, hits, misses))
+
+    def _write_statistics(self):
+        """
+        Writes the pending statistics, the lock must be held by the caller
+        """
+        if self.pending_statistics:
+            self.connection.executemany(
+                "INSERT INTO statistics (predictor, hits, misses) VALUES (?, ?, ?) "
+                "ON CONFLICT(predictor) DO UPDATE SET hits = hits + excluded.hits, misses = misses + excluded.misses",
+                [(predictor, hits, misses) for predictor, (hits, misses) in self.pending_statistics.items()])
+            self.pending_statistics = {}
+        self.pending_lookups = 0
+
+    def flush_statistics(self):
+        """
+        Writes the hits and misses not yet stored in the database
+        """
+        with self.lock, self.connection:
+            self._write_statistics()
+
+    def get_statistics(self, predictor: str = None) -> List[Tuple[str, int, int, int]]:
+        """
+        Returns the number of cached predictions and the accumulated number of hits and misses for every predictor,
+        or only for the given predictor
+        """
+        self.flush_statistics()
+        with self.lock:
+            counts = dict(self.connection.execute("SELECT predictor, COUNT(*) FROM predictions GROUP BY predictor"))
+            statistics = {p: (h, m) for p, h, m in self.connection.execute(
+                "SELECT predictor, hits, misses FROM statistics")}
+        predictors = set(counts.keys()).union(statistics.keys())
+        if predictor:
+            predictors = predictors.intersection([predictor])
+        return [(p, counts.get(p, 0), *statistics.get(p, (0, 0))) for p in sorted(predictors)]
+
+    def invalidate(self, predictor: str = None) -> int:
+        """
+        Removes all cached predictions and statistics, or only those of the given predictor.
+        Returns the number of removed predictions
+        """
+        with self.lock, self.connection:
+            self._write_statistics()
+            if predictor:
+                removed = self.connection.execute("DELETE FROM predictions WHERE predictor = ?", (predictor,)).rowcount
+                self.connection.execute("DELETE FROM statistics WHERE predictor = ?", (predictor,))
+            else:
+                removed = self.connection.execute("DELETE FROM predictions").rowcount
+                self.connection.execute("DELETE FROM statistics")
+        with self.lock:
+            self.connection.execute("VACUUM")
+        return removed
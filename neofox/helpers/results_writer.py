@@ -0,0 +1,156 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import json
+import os
+import tempfile
+from typing import List
+import pandas as pd
+import neofox
+from neofox.model.conversion import ModelConverter
+from neofox.model.neoantigen import Neoantigen
+
+
+class TableAppender(object):
+    """
+    Appends data frames to a tab-separated file. The header is written with the first data frame and every following
+    data frame is appended directly in the order of the known columns, values missing in a data frame are left empty.
+    Columns first seen in a later data frame are added at the end of the header, which requires rewriting the rows
+    already written. The table is written into a temporary file next to the output file, which is only renamed to the
+    output file on close
+    """
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.temporary_file = _create_temporary_file(output_file)
+        self.columns = []
+
+    def append(self, df: pd.DataFrame):
+        if len(df.columns) == 0:
+            return
+        known_columns = set(self.columns)
+        new_columns = [c for c in df.columns if c not in known_columns]
+        if len(self.columns) == 0:
+            self.columns = list(df.columns)
+            df.to_csv(self.temporary_file, sep="\t", index=False)
+            return
+        if len(new_columns) > 0:
+            self.columns = self.columns + new_columns
+            # NOTE: the values are read as text to write them back exactly as they were written
+            written_df = pd.read_csv(self.temporary_file, sep="\t", dtype=str, na_filter=False)
+            written_df.reindex(columns=self.columns, fill_value="").to_csv(self.temporary_file, sep="\t", index=False)
+        df.reindex(columns=self.columns).to_csv(self.temporary_file, sep="\t", index=False, header=False, mode="a")
+
+    def close(self):
+        if len(self.columns) == 0:
+            pd.DataFrame().to_csv(self.temporary_file, sep="\t", index=False)
+        os.replace(self.temporary_file, self.output_file)
+
+    def discard(self):
+        if os.path.exists(self.temporary_file):
+            os.remove(self.temporary_file)
+
+
+class JsonArrayAppender(object):
+    """
+    Writes a JSON array of model objects incrementally into a temporary file next to the output file, which is only
+    renamed to the output file on close
+    """
+
+    def __init__(self, output_file: str):
+        self.output_file = output_file
+        self.temporary_file = _create_temporary_file(output_file)
+        self.file = open(self.temporary_file, "w")
+        self.file.write("[")
+        self.empty = True
+
+    def append(self, objects: List[dict]):
+        for o in objects:
+            if not self.empty:
+                self.file.write(", ")
+            self.file.write(json.dumps(o))
+            self.empty = False
+
+    def close(self):
+        self.file.write("]")
+        self.file.close()
+        os.replace(self.temporary_file, self.output_file)
+
+    def discard(self):
+        self.file.close()
+        if os.path.exists(self.temporary_file):
+            os.remove(self.temporary_file)
+
+
+def _create_temporary_file(output_file: str) -> str:
+    descriptor, temporary_file = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(output_file)), prefix=".{}.".format(os.path.basename(output_file)),
+        suffix=".tmp")
+    os.close(descriptor)
+    return temporary_file
+
+
+class ResultsWriter(object):
+    """
+    Writes the annotated neoantigens into the output files, the neoantigens can be written in several chunks so the
+    output files are appended as the annotations arrive. The output files only appear on close, when leaving the
+    context with an error the partial outputs are removed instead
+    """
+
+    def __init__(self, output_folder: str, output_prefix: str, with_all_neoepitopes: bool):
+        self.neoantigens_table = TableAppender(
+            os.path.join(output_folder, "{}_neoantigen_candidates_annotated.tsv".format(output_prefix)))
+        self.epitopes_tables = {}
+        if with_all_neoepitopes:
+            self.epitopes_tables[neofox.MHC_I] = TableAppender(
+                os.path.join(output_folder, "{}_mhcI_epitope_candidates_annotated.tsv".format(output_prefix)))
+            self.epitopes_tables[neofox.MHC_II] = TableAppender(
+                os.path.join(output_folder, "{}_mhcII_epitope_candidates_annotated.tsv".format(output_prefix)))
+        self.neoantigens_json = JsonArrayAppender(
+            os.path.join(output_folder, "{}_neoantigen_candidates_annotated.json".format(output_prefix)))
+
+    def write(self, neoantigens: List[Neoantigen]):
+        self.neoantigens_table.append(ModelConverter.annotations2neoantigens_table(neoantigens))
+        for mhc, epitopes_table in self.epitopes_tables.items():
+            epitopes_table.append(ModelConverter.annotations2epitopes_table(neoantigens, mhc=mhc))
+        self.neoantigens_json.append(ModelConverter.objects2json(neoantigens))
+
+    def close(self):
+        self.neoantigens_table.close()
+        for epitopes_table in self.epitopes_tables.values():
+            epitopes_table.close()
+        self.neoantigens_json.close()
+
+    def discard(self):
+        """
+        Removes the partial outputs without publishing them
+        """
+        self.neoantigens_table.discard()
+        for epitopes_table in self.epitopes_tables.values():
+            epitopes_table.discard()
+        self.neoantigens_json.discard()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        # NOTE: the outputs are only published when all neoantigens were written
+        if exc_type is None:
+            self.close()
+        else:
+            self.discard()
@@ -0,0 +1,236 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from typing import List, Dict, Tuple
+import numpy as np
+from Bio.Align import substitution_matrices
+
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex, AMINOACID_CODES, BITS_PER_AMINOACID
+from neofox.helpers.homology_search import load_blosum62, SEED_LENGTH
+
+# BLASTP reports by default at most 500 hits
+MAX_TARGET_SEQUENCES = 500
+# BLASTP seeds its hits with all words of 3 aminoacids scoring at least 11 against a word of the query
+WORD_THRESHOLD = 11
+# the letters of the words similar to the query words, the 20 standard aminoacids plus B, Z and X
+WORD_ALPHABET = "ARNDCQEGHILKMFPSTWYVBZX"
+# any score below the sum of all BLOSUM62 scores of a peptide, it replaces minus infinity in the cumulative sums
+SEPARATOR_SCORE = -1e6
+# windows scored at once to bound the memory of the substitution scores
+BATCH_SIZE = 100000
+# the gap scores of the alignment of every hit, as in BlastpRunner.align()
+OPEN_GAP_SCORE = -11
+EXTEND_GAP_SCORE = -1
+
+
+class SimilaritySearch(object):
+    """
+    In-process search of the hits of a peptide in a database of sequences (ie: IEDB or the proteome), an alternative
+    to BLASTP for the computation of the TCR-recognition probability.
+    The database is held in memory through its index. As in BLASTP the hits are seeded by the neighbourhood words of
+    the peptide, all words of 3 aminoacids scoring at least WORD_THRESHOLD with BLOSUM62 against a word of the peptide.
+    Every diagonal of the database with a seed is scored with BLOSUM62 at once and its best ungapped local alignment
+    is taken as a high-scoring segment pair (HSP). The best HSP of every database sequence is its hit and, as with
+    BLASTP, only the best hits are returned as pairs of aligned query and target sequences. The recognition
+    probability is then computed over these pairs with get_alignment_scores() and compute_recognition_probability()
+    """
+
+    def __init__(self, index: ProteomeIndex):
+        self.index = index
+        self.database = np.frombuffer(index.proteome, dtype=np.uint8)
+        self.aminoacid_indices, self.blosum = load_blosum62()
+        self.separators = np.flatnonzero(self.database == ord("\n"))
+        # all words over the alphabet, as indices in BLOSUM62 and as codes in the database index
+        letters = np.frombuffer(WORD_ALPHABET.encode("ascii"), dtype=np.uint8)
+        words = np.stack(np.meshgrid(*[letters] * SEED_LENGTH, indexing="ij"), axis=-1).reshape(-1, SEED_LENGTH)
+        self.words = self.aminoacid_indices[words]
+        self.word_codes = self._get_word_codes(words)
+
+    def get_hits_multiple(self, peptides: List[str]) -> Dict[str, List[Tuple[str, str]]]:
+        return {p: self.get_hits(p) for p in dict.fromkeys(peptides)}
+
+    def get_hits(self, peptide: str) -> List[Tuple[str, str]]:
+        """
+        Returns the aligned query and target sequences of the best ungapped HSP of every database sequence with a seed
+        of the peptide, sorted by decreasing score and limited to the best MAX_TARGET_SEQUENCES hits
+        """
+        window_starts, sequence_ids = self._get_seeded_windows(peptide)
+        if len(window_starts) == 0:
+            return []
+
+        query = self.aminoacid_indices[np.frombuffer(peptide.encode("ascii", errors="replace"), np.uint8)]
+        segments = [
+            self._get_best_segments(query, window_starts[i:i + BATCH_SIZE], sequence_ids[i:i + BATCH_SIZE])
+            for i in range(0, len(window_starts), BATCH_SIZE)]
+        scores, query_starts, query_ends = (np.concatenate(s) for s in zip(*segments))
+
+        # keeps the best HSP of every database sequence, the first one on ties as BLASTP keeps the first HSP
+        order = np.lexsort((np.arange(len(scores)), -scores, sequence_ids))
+        first = np.ones(len(order), dtype=bool)
+        first[1:] = sequence_ids[order][1:] != sequence_ids[order][:-1]
+        best = order[first]
+        best = best[scores[best] > 0]
+        best = best[np.argsort(-scores[best], kind="stable")][0:MAX_TARGET_SEQUENCES]
+        return [
+            (peptide[query_starts[i]:query_ends[i]],
+             bytes(self.index.proteome[window_starts[i] + query_starts[i]:window_starts[i] + query_ends[i]]).decode(
+                 "ascii"))
+            for i in best.tolist()
+        ]
+
+    def _get_seeded_windows(self, peptide: str):
+        """
+        Returns the start of every diagonal of the database with a neighbourhood word of any word of the peptide at
+        its position, together with the database sequence holding the word. The words of the peptide are always part
+        of their own neighbourhood
+        """
+        letters = np.frombuffer(peptide.encode("ascii", errors="replace"), np.uint8)
+        num_words = len(letters) - SEED_LENGTH + 1
+        if num_words <= 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+        query_words = letters[np.arange(num_words)[:, np.newaxis] + np.arange(SEED_LENGTH)]
+        word_scores = self.blosum[
+            self.aminoacid_indices[query_words][:, np.newaxis, :], self.words[np.newaxis, :, :]].sum(axis=2)
+        offsets, words = np.nonzero(word_scores >= WORD_THRESHOLD)
+        # NOTE: words with characters other than letters are never in the database index
+        valid = np.all(AMINOACID_CODES[query_words] > 0, axis=1)
+        positions, offsets = self.index.get_kmer_positions(
+            np.concatenate([self.word_codes[words], self._get_word_codes(query_words[valid])]),
+            np.concatenate([offsets, np.flatnonzero(valid)]),
+            kmer_length=SEED_LENGTH)
+        # NOTE: a diagonal spanning several database sequences is only scored against those with a seed
+        seeds = np.unique(np.stack(
+            [positions - offsets, np.searchsorted(self.separators, positions, side="left")], axis=1), axis=0)
+        return seeds[:, 0], seeds[:, 1]
+
+    @staticmethod
+    def _get_word_codes(words: np.ndarray) -> np.ndarray:
+        """
+        Returns the codes in the database index of the words given as rows of characters
+        """
+        codes = np.zeros(len(words), dtype=np.uint64)
+        for i in range(SEED_LENGTH):
+            codes = (codes << np.uint64(BITS_PER_AMINOACID)) | AMINOACID_CODES[words[:, i]]
+        return codes
+
+    def _get_best_segments(self, query: np.ndarray, window_starts: np.ndarray, sequence_ids: np.ndarray):
+        """
+        Returns the score, the start and the end in the query of the best ungapped local alignment of every window
+        """
+        sequence_starts = np.append(0, self.separators + 1)[sequence_ids]
+        sequence_ends = np.append(self.separators, len(self.database))[sequence_ids]
+        positions = window_starts[:, np.newaxis] + np.arange(len(query))
+        outside = (positions < sequence_starts[:, np.newaxis]) | (positions >= sequence_ends[:, np.newaxis])
+        targets = self.aminoacid_indices[self.database[np.clip(positions, 0, len(self.database) - 1)]]
+        substitution_scores = self.blosum[query[np.newaxis, :], targets]
+        # NOTE: residues outside the database sequence cannot be aligned
+        substitution_scores[outside | np.isinf(substitution_scores)] = SEPARATOR_SCORE
+        # the best segment ending at j starts after the latest minimum of the cumulative scores up to j
+        cumulative_scores = np.zeros((len(window_starts), len(query) + 1))
+        cumulative_scores[:, 1:] = np.cumsum(substitution_scores, axis=1)
+        minimum_scores = np.minimum.accumulate(cumulative_scores, axis=1)
+        latest_minimum = np.maximum.accumulate(
+            np.where(cumulative_scores == minimum_scores, np.arange(len(query) + 1), 0), axis=1)
+        segment_scores = cumulative_scores[:, 1:] - minimum_scores[:, :-1]
+        # the first end reaching the best score gives the shortest segment
+        ends = np.argmax(segment_scores, axis=1)
+        rows = np.arange(len(window_starts))
+        return segment_scores[rows, ends], latest_minimum[rows, ends], ends + 1
+
+
+def _load_alignment_matrix():
+    """
+    Returns BLOSUM62 as a matrix together with the index in the matrix of every character, -1 for the characters
+    not in BLOSUM62
+    """
+    blosum = substitution_matrices.load("BLOSUM62")
+    aminoacid_indices = np.full(256, -1, dtype=np.int64)
+    for i, aa in enumerate(blosum.alphabet):
+        aminoacid_indices[ord(aa)] = i
+    return aminoacid_indices, np.array(blosum)
+
+
+ALIGNMENT_AMINOACID_INDICES, ALIGNMENT_MATRIX = _load_alignment_matrix()
+
+
+def get_alignment_scores(queries: List[str], targets: List[str]) -> np.ndarray:
+    """
+    Returns the score of the alignment of every query with its target, the same score as BlastpRunner.align() with
+    PairwiseAligner: a global alignment with BLOSUM62, a gap opening score of -11 and a gap extension score of -1.
+    All pairs of sequences with the same lengths are aligned at once, the dynamic programming runs over the rows of
+    the query and every row is computed for all pairs at once. The gaps within a row are the running maximum of the
+    scores of the row penalised by their distance.
+    Raises a ValueError when a sequence has a character not in BLOSUM62, as PairwiseAligner does
+    """
+    scores = np.zeros(len(queries))
+    pairs_by_lengths = {}
+    for i, (query, target) in enumerate(zip(queries, targets)):
+        pairs_by_lengths.setdefault((len(query), len(target)), []).append(i)
+    for (query_length, target_length), pairs in pairs_by_lengths.items():
+        encoded_queries = _encode_for_alignment([queries[i] for i in pairs], query_length)
+        encoded_targets = _encode_for_alignment([targets[i] for i in pairs], target_length)
+        scores[pairs] = _align(encoded_queries, encoded_targets)
+    return scores
+
+
+def _encode_for_alignment(sequences: List[str], length: int) -> np.ndarray:
+    encoded = ALIGNMENT_AMINOACID_INDICES[
+        np.frombuffer("".join(sequences).upper().encode("ascii", errors="replace"), dtype=np.uint8)]
+    if np.any(encoded < 0):
+        raise ValueError("Sequence with characters not in BLOSUM62")
+    return encoded.reshape(len(sequences), length)
+
+
+def _align(queries: np.ndarray, targets: np.ndarray) -> np.ndarray:
+    num_pairs, query_length = queries.shape
+    target_length = targets.shape[1]
+    columns = np.arange(target_length + 1)
+    # the gap scores of a gap of the length of every column
+    gap_scores = np.where(columns > 0, OPEN_GAP_SCORE + (columns - 1) * EXTEND_GAP_SCORE, 0)
+    # best score of every prefix of the target aligned with the query rows so far
+    best = np.tile(gap_scores.astype(float), (num_pairs, 1))
+    # best score of the alignments ending with a gap in the target
+    target_gaps = np.full((num_pairs, target_length + 1), -np.inf)
+    for i in range(query_length):
+        target_gaps = np.maximum(best + OPEN_GAP_SCORE, target_gaps + EXTEND_GAP_SCORE)
+        row = np.empty((num_pairs, target_length + 1))
+        row[:, 0] = target_gaps[:, 0]
+        row[:, 1:] = np.maximum(
+            best[:, :-1] + ALIGNMENT_MATRIX[queries[:, i, np.newaxis], targets], target_gaps[:, 1:])
+        # NOTE: a gap in the query is opened after the best score of any previous column of this row
+        query_gaps = np.full((num_pairs, target_length + 1), -np.inf)
+        query_gaps[:, 1:] = np.maximum.accumulate(row - columns * EXTEND_GAP_SCORE, axis=1)[:, :-1] + \
+            OPEN_GAP_SCORE + (columns[1:] - 1) * EXTEND_GAP_SCORE
+        best = np.maximum(row, query_gaps)
+    return best[:, target_length]
+
+
+def compute_recognition_probability(scores: np.ndarray, a=26, k=4.87) -> float:
+    """
+    Returns the TCR-recognition probability over the alignment scores of all hits, as BlastpRunner.computeR() with
+    a NumPy log-sum-exp
+    """
+    # energies of all bound states
+    binding_energies = -k * (a - np.asarray(scores, dtype=float))
+    if len(binding_energies) == 0:
+        return 0.0
+    # log of the partition function of the bound states and over the bound states and an unbound state
+    maximum_energy = np.max(binding_energies)
+    log_bound = maximum_energy + np.log(np.sum(np.exp(binding_energies - maximum_energy)))
+    log_partition = np.logaddexp(log_bound, 0.0)
+    return float(np.exp(log_bound - log_partition))
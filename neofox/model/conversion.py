@@ -16,12 +16,13 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List
+from typing import List, Iterator, Dict
 import pandas as pd
 import betterproto
 import os
 from betterproto import Casing
 from neofox import NOT_AVAILABLE_VALUE, MHC_II, MHC_I
+from neofox.exceptions import NeofoxDataValidationException
 from collections import defaultdict
 import json
 import numpy as np
@@ -41,6 +42,17 @@
 from neofox.references.references import MhcDatabase
 from logzero import logger
 
+# NOTE: forces the types of every column to avoid pandas setting the wrong type for corner cases
+CANDIDATE_FILE_DTYPES = {
+    "gene": str,
+    "wildTypeXmer": str,
+    "mutatedXmer": str,
+    "patientIdentifier": str,
+    "dnaVariantAlleleFrequency": float,
+    "rnaExpression": float,
+    "rnaVariantAlleleFrequency": float
+}
+
 class ModelConverter(object):
 
     @staticmethod
@@ -52,19 +64,7 @@ def parse_candidate_file(candidate_file: str) -> List[Neoantigen]:
 
         InputValidator.validate_input_file(candidate_file)
 
-        data = pd.read_csv(
-            candidate_file, sep="\t",
-            # NOTE: forces the types of every column to avoid pandas setting the wrong type for corner cases
-            dtype={
-                "gene": str,
-                "wildTypeXmer": str,
-                "mutatedXmer": str,
-                "patientIdentifier": str,
-                "dnaVariantAlleleFrequency": float,
-                "rnaExpression": float,
-                "rnaVariantAlleleFrequency": float
-            }
-        )
+        data = pd.read_csv(candidate_file, sep="\t", dtype=CANDIDATE_FILE_DTYPES)
         # there is a limitation here
         # It could be a data has more than one type of separators due to human mistakes
         if data.shape[1] == 1:
@@ -75,6 +75,25 @@ def parse_candidate_file(candidate_file: str) -> List[Neoantigen]:
             neoantigens = ModelConverter._neoantigens_csv2objects(data)
             return neoantigens
 
+    @staticmethod
+    def parse_candidate_file_chunks(candidate_file: str, chunk_size: int) -> Iterator[List[Neoantigen]]:
+        """
+        Reads the neoantigen candidate input file in chunks of rows, so only one chunk is held in memory at any time
+        :param candidate_file: the path to an neoantigen candidate input file
+        :param chunk_size: the number of rows in every chunk
+        :return: generator of lists of at most chunk_size neoantigens in model objects
+        """
+
+        InputValidator.validate_input_file(candidate_file)
+
+        with pd.read_csv(candidate_file, sep="\t", dtype=CANDIDATE_FILE_DTYPES, chunksize=chunk_size) as reader:
+            for data in reader:
+                if data.shape[1] == 1:
+                    raise NeofoxDataValidationException(
+                        'Input data has an unsupported delimiter in NeoFox. NeoFox supports only the tab delimiter.')
+                data = data.replace({np.nan: None})
+                yield ModelConverter._neoantigens_csv2objects(data)
+
     @staticmethod
     def parse_candidate_neoepitopes_file(candidate_file: str, mhc_database: MhcDatabase, organism: str) -> List[PredictedEpitope]:
         
@@ -166,33 +185,25 @@ def objects2json(model_objects: List[betterproto.Message]):
 
     @staticmethod
     def annotations2neoantigens_table(neoantigens: List[Neoantigen]) -> pd.DataFrame:
-        dfs = []
-        neoantigens_df = ModelConverter._neoantigens2table(neoantigens)
+        # NOTE: reads the fields of the neoantigens directly, as the epitopes are not in this table
+        neoantigens_df = pd.DataFrame({
+            "patientIdentifier": [n.patient_identifier for n in neoantigens],
+            "gene": [n.gene for n in neoantigens],
+            "mutatedXmer": [n.mutated_xmer for n in neoantigens],
+            "wildTypeXmer": [n.wild_type_xmer for n in neoantigens],
+            "position": [",".join([str(y) for y in n.position]) if n.position is not None else None
+                         for n in neoantigens],
+            "dnaVariantAlleleFrequency": [n.dna_variant_allele_frequency for n in neoantigens],
+            "rnaVariantAlleleFrequency": [n.rna_variant_allele_frequency for n in neoantigens],
+            "rnaExpression": [n.rna_expression for n in neoantigens],
+            "imputedGeneExpression": [n.imputed_gene_expression for n in neoantigens],
+        })
         neoantigens_df.replace({None: NOT_AVAILABLE_VALUE}, inplace=True)
-        # we set the order of columns
-        neoantigens_df = neoantigens_df.loc[:,
-                         ["patientIdentifier",
-                          "gene",
-                          "mutatedXmer",
-                          "wildTypeXmer",
-                          "position",
-                          "dnaVariantAlleleFrequency",
-                          "rnaVariantAlleleFrequency",
-                          "rnaExpression",
-                          "imputedGeneExpression"
-                          ]]
-        for n in neoantigens:
-            annotations = [a.to_dict() for a in n.neofox_annotations.annotations]
-            annotations.extend([a.to_dict() for a in n.external_annotations])
-            df = (
-                pd.DataFrame(annotations)
-                    .set_index("name")
-                    .transpose()
-            )
-
-            dfs.append(df)
-        neofox_annotations_df = pd.concat(dfs, sort=True).reset_index()
-        del neofox_annotations_df["index"]
+        # NOTE: the annotations are sorted by name and missing values are left empty
+        annotations = ModelConverter._annotations2columns(
+            [n.neofox_annotations.annotations + n.external_annotations for n in neoantigens])
+        neofox_annotations_df = pd.DataFrame(
+            annotations, columns=sorted(annotations.keys()), index=neoantigens_df.index, dtype=object)
         df = pd.concat([neoantigens_df, neofox_annotations_df], axis=1)
         df.replace('None', NOT_AVAILABLE_VALUE, inplace=True)
         return df
@@ -202,53 +213,66 @@ def annotations2epitopes_table(neoantigens: List[Neoantigen], mhc: str) -> pd.Da
 
         assert(mhc in [MHC_I, MHC_II], 'Bad MHC value')
 
-        epitopes_dfs = []
-        for n in neoantigens:
-            # parses epitopes from a neoantigen into a data frame
-            epitopes = n.neoepitopes_mhc_i if mhc == MHC_I else n.neoepitopes_mhc_i_i
-            epitopes_temp_df = ModelConverter._objects2dataframe(epitopes)
-
-            epitopes_temp_df['patientIdentifier'] = n.patient_identifier
-            epitopes_temp_df['gene'] = n.gene
-            epitopes_temp_df['rnaExpression'] = n.rna_expression
-            epitopes_temp_df['imputedGeneExpression'] = n.imputed_gene_expression
-            epitopes_temp_df['dnaVariantAlleleFrequency'] = n.dna_variant_allele_frequency
-            epitopes_temp_df['rnaVariantAlleleFrequency'] = n.rna_variant_allele_frequency
-            epitopes_temp_df['mutatedXmer'] = n.mutated_xmer
-
-            # adapts output table depending on MHC type
-            if mhc == MHC_I:
-                epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='isoformMhcII.*')), axis=1, inplace=True)
-                epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='coreMhcII.*')), axis=1, inplace=True)
-            else:
-                epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='alleleMhcI.*')), axis=1, inplace=True)
-
-            # annotations need a custom parsing, thus we remove these columns
-            epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='neofoxAnnotations.*')), axis=1, inplace=True)
-
-            # parses the annotations from each of the epitopes into a data frame
-            annotations_dfs = []
-            for e in epitopes:
-                annotations = [a.to_dict() for a in e.neofox_annotations.annotations]
-                # add external annotations also to epitope table
-                annotations.extend([a.to_dict() for a in n.external_annotations])
-                annotations_temp_df = (pd.DataFrame(annotations).set_index("name").transpose())
-                annotations_dfs.append(annotations_temp_df)
-            if len(annotations_dfs) > 0:
-                annotations_df = pd.concat(annotations_dfs, sort=True).reset_index()
-                del annotations_df["index"]
-                   
-                # puts together both data frames
-                epitopes_temp_df = pd.concat([epitopes_temp_df, annotations_df], axis=1)
-            
-            epitopes_temp_df.replace({None: NOT_AVAILABLE_VALUE}, inplace=True)
-            epitopes_dfs.append(epitopes_temp_df)
+        epitopes_by_neoantigen = [n.neoepitopes_mhc_i if mhc == MHC_I else n.neoepitopes_mhc_i_i for n in neoantigens]
+        num_rows = sum(len(epitopes) for epitopes in epitopes_by_neoantigen)
 
-        # concatenates all together
-        epitopes_df = pd.concat(epitopes_dfs)
+        # parses all epitopes at once into a data frame
+        epitopes_df = ModelConverter._objects2dataframe([e for epitopes in epitopes_by_neoantigen for e in epitopes])
+        # adapts output table depending on MHC type
+        # annotations need a custom parsing, thus we remove these columns
+        dropped_columns = ['neofoxAnnotations'] + (['isoformMhcII', 'coreMhcII'] if mhc == MHC_I else ['alleleMhcI'])
+        epitope_columns = [c for c in epitopes_df.columns if not any(d in c for d in dropped_columns)]
+
+        # the values of the neoantigen repeated for each of its epitopes
+        neoantigen_columns = {
+            'patientIdentifier': [n.patient_identifier for n in neoantigens],
+            'gene': [n.gene for n in neoantigens],
+            'rnaExpression': [n.rna_expression for n in neoantigens],
+            'imputedGeneExpression': [n.imputed_gene_expression for n in neoantigens],
+            'dnaVariantAlleleFrequency': [n.dna_variant_allele_frequency for n in neoantigens],
+            'rnaVariantAlleleFrequency': [n.rna_variant_allele_frequency for n in neoantigens],
+            'mutatedXmer': [n.mutated_xmer for n in neoantigens],
+        }
+        counts = [len(epitopes) for epitopes in epitopes_by_neoantigen]
+        columns = {c: epitopes_df[c].to_list() for c in epitope_columns}
+        for name, values in neoantigen_columns.items():
+            columns[name] = [NOT_AVAILABLE_VALUE if v is None else v for v, c in zip(values, counts) for _ in range(c)]
+
+        # accumulates the annotations of each epitope and the external annotations of its neoantigen into one column
+        # per annotation, annotations missing in an epitope are NA if other epitopes of the same neoantigen have them
+        # and empty otherwise
+        annotations = {}
+        column_names = {}
+        start = 0
+        for n, epitopes in zip(neoantigens, epitopes_by_neoantigen):
+            if len(epitopes) == 0:
+                column_names.update(dict.fromkeys(neoantigen_columns.keys()))
+                continue
+            neoantigen_annotations = ModelConverter._annotations2columns(
+                [e.neofox_annotations.annotations + n.external_annotations for e in epitopes],
+                missing_value=NOT_AVAILABLE_VALUE)
+            for name, values in neoantigen_annotations.items():
+                column = annotations.get(name)
+                if column is None:
+                    column = [np.nan] * num_rows
+                    annotations[name] = column
+                column[start:start + len(epitopes)] = values
+            column_names.update(dict.fromkeys(epitope_columns + ['mutatedXmer']))
+            column_names.update(dict.fromkeys(sorted(neoantigen_annotations.keys())))
+            start += len(epitopes)
+        columns.update(annotations)
+
+        # the rows keep the index of every epitope within its neoantigen
+        index = [i for c in counts for i in range(c)]
+        epitopes_df = pd.DataFrame({c: columns[c] for c in column_names}, index=index)
+        if 0 in counts:
+            # NOTE: the integer columns are written as floats whenever a neoantigen has no epitopes, as they were
+            # when concatenating one data frame per neoantigen
+            integer_columns = [c for c in epitope_columns if pd.api.types.is_integer_dtype(epitopes_df[c])]
+            epitopes_df[integer_columns] = epitopes_df[integer_columns].astype(float)
         # has to be dropped otherwise a column containing all external annotations will exist
         # if there are no epitopes below the rank threshold, this column does not exist
-        if 'externalAnnotations' in epitopes_df.columns: 
+        if 'externalAnnotations' in epitopes_df.columns:
             epitopes_df.drop(["externalAnnotations"], axis=1, inplace=True)
         epitopes_df.replace('None', NOT_AVAILABLE_VALUE, inplace=True)
 
@@ -273,17 +297,13 @@ def annotated_neoepitopes2epitopes_table(neoepitopes: List[PredictedEpitope], mh
         # the position is used to pair neoepitopes coming out of netMHCpan in neoantigen mode, not of any use here
         epitopes_df.drop(["position"], axis=1, inplace=True)
 
-        # parses the annotations from each of the epitopes into a data frame
-        annotations_dfs = []
-        for e in neoepitopes:
-            annotations = [a.to_dict() for a in e.neofox_annotations.annotations]
-            # add external annotations to output table
-            annotations.extend([a.to_dict() for a in e.external_annotations])
-            annotations_temp_df = (pd.DataFrame(annotations).set_index("name").transpose())
-            annotations_dfs.append(annotations_temp_df)
-        if len(annotations_dfs) > 0:
-            annotations_df = pd.concat(annotations_dfs, sort=True).reset_index()
-            del annotations_df["index"]
+        # parses the annotations from each of the epitopes into one column per annotation
+        # add external annotations to output table
+        annotations = ModelConverter._annotations2columns(
+            [e.neofox_annotations.annotations + e.external_annotations for e in neoepitopes])
+        if len(neoepitopes) > 0:
+            annotations_df = pd.DataFrame(
+                annotations, columns=sorted(annotations.keys()), index=epitopes_df.index, dtype=object)
 
             # puts together both data frames
             epitopes_df = pd.concat([epitopes_df, annotations_df], axis=1)
@@ -318,6 +338,25 @@ def _objects2dataframe(model_objects: List[betterproto.Message]) -> pd.DataFrame
             data=[n.to_dict(include_default_values=True) for n in model_objects]
         )
 
+    @staticmethod
+    def _annotations2columns(annotations_by_row: List[List[Annotation]], missing_value=np.nan) -> Dict[str, list]:
+        """
+        Accumulates the annotations of every row into one list of values per annotation name
+        :param annotations_by_row: the annotations of every row
+        :param missing_value: the value of the rows without a given annotation or with an empty value
+        :return: the values of every annotation in the order of the rows
+        """
+        num_rows = len(annotations_by_row)
+        columns = {}
+        for row, annotations in enumerate(annotations_by_row):
+            for a in annotations:
+                column = columns.get(a.name)
+                if column is None:
+                    column = [missing_value] * num_rows
+                    columns[a.name] = column
+                column[row] = a.value if a.value != "" else missing_value
+        return columns
+
     @staticmethod
     def _neoantigens_csv2objects(dataframe: pd.DataFrame) -> List[Neoantigen]:
         """transforms an patients CSV into a list of objects"""
@@ -16,8 +16,12 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import functools
+import threading
 from abc import ABC, abstractmethod
-from typing import List
+from typing import List, Optional, Tuple
+
+import betterproto
 
 from neofox.exceptions import NeofoxInputParametersException, NeofoxDataValidationException
 from neofox.model.neoantigen import MhcAllele, Mhc2Isoform, Mhc2GeneName, Mhc2
@@ -42,6 +46,7 @@
 H2_NETMHCPAN_ALLELE_PATTERN = re.compile(r"H-2-I?(K|D|L|A|E)([a-z][0-9]?)")
 H2_MOLECULE_PATTERN = re.compile(r"(H2A|H2E)([a-z][0-9]?)")
 H2_MIXMHC2PRED_ALLELE = re.compile(r"H2_(A|E)a_([a-z][0-9]?)__H2_(A|E)b_([a-z][0-9]?)")
+MHC_PARSER_CACHE_SIZE = 4096
 ALLELE_PATTERN_BY_ORGANISM = {
     ORGANISM_HOMO_SAPIENS: HLA_ALLELE_PATTERN,
     ORGANISM_MUS_MUSCULUS: H2_ALLELE_PATTERN,
@@ -49,17 +54,60 @@
 
 
 class MhcParser(ABC):
+    """
+    Parses MHC alleles and isoforms. The parsed alleles and isoforms are memoised in a bounded cache, thus the
+    same allele in every row of a predictor output is parsed only once. The returned objects are not shared, callers
+    may modify them
+    """
+
+    _parsers = {}
+    _parsers_lock = threading.Lock()
 
-    def __init__(self, mhc_database: MhcDatabase):
+    def __init__(self, mhc_database: MhcDatabase, cache_size=MHC_PARSER_CACHE_SIZE):
         super().__init__()
         self.mhc_database = mhc_database
+        self.cache_size = cache_size
+        self._initialise_caches()
+
+    def _initialise_caches(self):
+        # NOTE: the caches hold immutable tuples, every caller gets a new message built from them
+        self._cached_parse_mhc_allele = functools.lru_cache(maxsize=self.cache_size)(
+            lambda allele: _get_allele_fields(self._parse_mhc_allele(allele)))
+        self._cached_parse_mhc2_isoform = functools.lru_cache(maxsize=self.cache_size)(
+            lambda isoform: _get_isoform_fields(self._parse_mhc2_isoform(isoform)))
+
+    def __getstate__(self):
+        # NOTE: the caches are not sent to other processes
+        state = self.__dict__.copy()
+        del state["_cached_parse_mhc_allele"]
+        del state["_cached_parse_mhc2_isoform"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._initialise_caches()
+
+    def parse_mhc_allele(self, allele: str) -> MhcAllele:
+        return _build_allele(self._cached_parse_mhc_allele(allele))
+
+    def parse_mhc2_isoform(self, allele: str) -> Mhc2Isoform:
+        return _build_isoform(self._cached_parse_mhc2_isoform(allele))
+
+    def get_cache_statistics(self) -> dict:
+        """
+        Returns the hits, misses and size of the caches of parsed alleles and isoforms
+        """
+        return {
+            "alleles": self._cached_parse_mhc_allele.cache_info()._asdict(),
+            "isoforms": self._cached_parse_mhc2_isoform.cache_info()._asdict()
+        }
 
     @abstractmethod
-    def parse_mhc_allele(self, allele: str):
+    def _parse_mhc_allele(self, allele: str) -> MhcAllele:
         pass
 
     @abstractmethod
-    def parse_mhc2_isoform(self, allele: str):
+    def _parse_mhc2_isoform(self, allele: str) -> Mhc2Isoform:
         pass
 
     @abstractmethod
@@ -72,17 +120,49 @@ def get_netmhc2pan_representation(self, isoform: Mhc2Isoform):
 
     @staticmethod
     def get_mhc_parser(mhc_database: MhcDatabase):
+        """
+        Returns the parser for the given MHC database shared by all callers in this process
+        """
         if mhc_database.is_homo_sapiens():
-            mhc_parser = HlaParser(mhc_database=mhc_database)
+            parser_class = HlaParser
         elif mhc_database.is_mus_musculus():
-            mhc_parser = H2Parser(mhc_database=mhc_database)
+            parser_class = H2Parser
         else:
             raise NeofoxInputParametersException("Organism not supported {}".format(mhc_database.organism))
+        key = (mhc_database.organism, mhc_database.database_filename)
+        with MhcParser._parsers_lock:
+            mhc_parser = MhcParser._parsers.get(key)
+            if mhc_parser is None:
+                mhc_parser = parser_class(mhc_database=mhc_database)
+                MhcParser._parsers[key] = mhc_parser
         return mhc_parser
 
+def _get_allele_fields(allele: MhcAllele) -> Optional[Tuple[str, str, str, str, str]]:
+    # NOTE: None keeps apart an allele not set, as the alpha chain of DR isoforms, from an allele with empty fields
+    if not betterproto.serialized_on_wire(allele):
+        return None
+    return allele.full_name, allele.name, allele.gene, allele.group, allele.protein
+
+
+def _build_allele(fields: Optional[Tuple[str, str, str, str, str]]) -> MhcAllele:
+    if fields is None:
+        return MhcAllele()
+    full_name, name, gene, group, protein = fields
+    return MhcAllele(full_name=full_name, name=name, gene=gene, group=group, protein=protein)
+
+
+def _get_isoform_fields(isoform: Mhc2Isoform) -> Tuple[str, Optional[tuple], Optional[tuple]]:
+    return isoform.name, _get_allele_fields(isoform.alpha_chain), _get_allele_fields(isoform.beta_chain)
+
+
+def _build_isoform(fields: Tuple[str, Optional[tuple], Optional[tuple]]) -> Mhc2Isoform:
+    name, alpha_chain, beta_chain = fields
+    return Mhc2Isoform(name=name, alpha_chain=_build_allele(alpha_chain), beta_chain=_build_allele(beta_chain))
+
+
 class H2Parser(MhcParser):
 
-    def parse_mhc_allele(self, allele: str, pattern=H2_ALLELE_PATTERN) -> MhcAllele:
+    def _parse_mhc_allele(self, allele: str) -> MhcAllele:
         match = H2_NETMHCPAN_ALLELE_PATTERN.match(allele)
         if match:
             # this ensures that netmhcpan output is normalized
@@ -109,7 +189,7 @@ def parse_mhc_allele(self, allele: str, pattern=H2_ALLELE_PATTERN) -> MhcAllele:
         mhc_allele.full_name = name
         return mhc_allele
 
-    def parse_mhc2_isoform(self, allele: str) -> Mhc2Isoform:
+    def _parse_mhc2_isoform(self, allele: str) -> Mhc2Isoform:
         # MHC II molecules in H2 lab mouse are represented as single chain proteins
         # NOTE: by convention we represent this allele in both the alpha and beta chains
         # format from current version of MixMHC2pred: H2_Aa_b__H2_Aa_b
@@ -124,7 +204,7 @@ def parse_mhc2_isoform(self, allele: str) -> Mhc2Isoform:
         if match:
             # this ensures that netmhcpan output is normalized
             allele = "H2{gene}{protein}".format(gene=match.group(1), protein=match.group(2))
-        allele = self.parse_mhc_allele(allele=allele, pattern=H2_MOLECULE_PATTERN)
+        allele = self.parse_mhc_allele(allele)
         return Mhc2Isoform(name=allele.name, alpha_chain=allele, beta_chain=allele)
 
     def get_netmhcpan_representation(self, allele: MhcAllele):
@@ -136,7 +216,7 @@ def get_netmhc2pan_representation(self, isoform: Mhc2Isoform):
 
 class HlaParser(MhcParser):
 
-    def parse_mhc_allele(self, allele: str) -> MhcAllele:
+    def _parse_mhc_allele(self, allele: str) -> MhcAllele:
         match = HLA_ALLELE_PATTERN_WITHOUT_SEPARATOR.match(allele)
         if match is not None:
             # allele without separator, controls for ambiguities
@@ -184,7 +264,7 @@ def parse_mhc_allele(self, allele: str) -> MhcAllele:
         mhc_allele.full_name = full_name
         return mhc_allele
 
-    def parse_mhc2_isoform(self, isoform: str) -> Mhc2Isoform:
+    def _parse_mhc2_isoform(self, isoform: str) -> Mhc2Isoform:
         # TODO: this method currently fails for netmhc2pan alleles which are like 'HLA-DQA10509-DQB10630'
         # infers gene, group and protein from the name
         match = HLA_MOLECULE_PATTERN.match(isoform)
@@ -20,19 +20,20 @@
 import logging
 import os
 import time
-from typing import List
+from typing import List, Tuple
 import logzero
 from logzero import logger
 from dask.distributed import Client
 
 import neofox
 from neofox.expression_imputation.expression_imputation import ExpressionAnnotator
+from neofox.helpers.dask_helper import split_in_chunks, submit_in_chunks
 from neofox.model.factories import NeoantigenFactory
 from neofox.published_features.self_similarity.self_similarity import SelfSimilarityCalculator
 from neofox.published_features.expression import Expression
 from neofox.references.references import ReferenceFolder, DependenciesConfiguration, ORGANISM_HOMO_SAPIENS
 from neofox import NEOFOX_LOG_FILE_ENV
-from neofox.annotator.neoantigen_annotator import NeoantigenAnnotator
+from neofox.annotator.annotator_registry import AnnotatorRegistry
 from neofox.exceptions import NeofoxConfigurationException, NeofoxDataValidationException
 from neofox.model.neoantigen import Neoantigen, Patient
 from neofox.model.validation import ModelValidator
@@ -53,7 +54,11 @@ def __init__(
             configuration_file=None,
             rank_mhci_threshold=neofox.RANK_MHCI_THRESHOLD_DEFAULT,
             rank_mhcii_threshold=neofox.RANK_MHCII_THRESHOLD_DEFAULT,
-            with_all_neoepitopes=False):
+            with_all_neoepitopes=False,
+            chunk_size: int = None,
+            max_chunks_in_flight: int = None,
+            max_concurrent_predictors: int = 1,
+            in_memory_expression=False):
 
         self.verbose = verbose
         initialise_logs(logfile=log_file_name, verbose=self.verbose)
@@ -79,7 +84,17 @@ def __init__(
             configuration if configuration else DependenciesConfiguration()
         )
         self.self_similarity = SelfSimilarityCalculator()
+        self.scattered_resources = None
         self.num_cpus = num_cpus
+        # NOTE: the neoantigens are sent to the workers in chunks of chunk_size neoantigens from the same patient
+        # with at most max_chunks_in_flight chunks submitted at any time, by default every patient is split in as many
+        # chunks as CPUs and all chunks are submitted at once
+        self.chunk_size = chunk_size
+        self.max_chunks_in_flight = max_chunks_in_flight
+        # NOTE: number of MHC predictors running concurrently for a neoantigen in every worker
+        self.max_concurrent_predictors = max_concurrent_predictors
+        # NOTE: the TCGA gene expression is imputed from a matrix loaded in memory instead of querying the tabix index
+        self.in_memory_expression = in_memory_expression
 
         if (
             neoantigens is None
@@ -89,6 +104,24 @@ def __init__(
         ):
             raise NeofoxConfigurationException("Missing input data to run Neofox")
 
+        # validates patients
+        self.patients = {}
+        for patient in patients:
+            ModelValidator.validate_patient(patient, organism=self.reference_folder.organism)
+            self.patients[patient.identifier] = patient
+
+        self.with_all_neoepitopes = with_all_neoepitopes
+        if with_all_neoepitopes:
+            logger.info("Prediction of all neoepitopes will be performed")
+
+        self.set_neoantigens(neoantigens)
+        logger.info("Reference data loaded")
+
+    def set_neoantigens(self, neoantigens: List[Neoantigen]):
+        """
+        Validates the neoantigens to annotate and imputes their gene expression. A streamed input calls this for every
+        chunk, so the reference data and the patients are loaded only once
+        """
         # validates neoantigens
         self.neoantigens = neoantigens
         for n in self.neoantigens:
@@ -96,41 +129,26 @@ def __init__(
             n.position = NeoantigenFactory.mut_position_xmer_seq(neoantigen=n)
             ModelValidator.validate_neoantigen(n)
 
-        # validates patients
-        self.patients = {}
-        for patient in patients:
-            ModelValidator.validate_patient(patient, organism=self.reference_folder.organism)
-            self.patients[patient.identifier] = patient
-
         self._validate_input_data()
 
-
         # annotate TCGA gene expression
         if self.reference_folder.organism == ORGANISM_HOMO_SAPIENS:
             # NOTE: this must happen after validation to avoid uncaptured errors due to missing patients
             # NOTE: add gene expression to neoantigen candidate model
             self.neoantigens = self._conditional_expression_imputation()
 
-        self.with_all_neoepitopes = with_all_neoepitopes
-        if with_all_neoepitopes:
-            logger.info("Prediction of all neoepitopes will be performed")
-        logger.info("Reference data loaded")
-
     def _conditional_expression_imputation(self) -> List[Neoantigen]:
-        expression_annotator = ExpressionAnnotator()
+        # NOTE: in memory mode the expression of all neoantigens is imputed with a single lookup in the expression
+        # matrix
+        expression_annotator = ExpressionAnnotator(in_memory=self.in_memory_expression)
+        gene_expressions = expression_annotator.get_gene_expression_annotations(
+            gene_names=[neoantigen.gene for neoantigen in self.neoantigens],
+            tcga_cohorts=[self.patients[neoantigen.patient_identifier].tumor_type for neoantigen in self.neoantigens]
+        )
         neoantigens_transformed = []
-
-        for neoantigen in self.neoantigens:
-
-            patient = self.patients[neoantigen.patient_identifier]
+        for neoantigen, gene_expression in zip(self.neoantigens, gene_expressions):
             neoantigen_transformed = neoantigen
-
-            gene_expression = expression_annotator.get_gene_expression_annotation(
-                gene_name=neoantigen.gene, tcga_cohort=patient.tumor_type
-            )
-
             neoantigen_transformed.imputed_gene_expression = gene_expression
-
             neoantigens_transformed.append(neoantigen_transformed)
         return neoantigens_transformed
 
@@ -171,13 +189,17 @@ def _validate_input_data(self):
                 )
             )
 
-    def get_annotations(self) -> List[Neoantigen]:
+    def get_annotations(self, dask_client: Client = None) -> List[Neoantigen]:
         """
         Loads epitope data (if file has been not imported to R; colnames need to be changed), adds data to class that are needed to calculate,
         calls epitope class --> determination of epitope properties,
         write to txt file
+        :param dask_client: an optional running dask client, this is reused across chunks of a streamed input and it is
+        not closed here
         """
         logger.info("Starting NeoFox annotations...")
+        if dask_client is not None:
+            return self.send_to_client(dask_client)
         # initialise dask
         # see reference on using threads versus CPUs here https://docs.dask.org/en/latest/setup/single-machine.html
         dask_client = Client(n_workers=self.num_cpus, threads_per_worker=1)
@@ -187,34 +209,58 @@ def get_annotations(self) -> List[Neoantigen]:
 
         return annotations
 
+    def _get_batches(self) -> List[List[int]]:
+        """
+        Groups the indices of the neoantigens by patient, so the MHC binding predictions run once for every batch.
+        The neoantigens of every patient are split in batches of the chunk size or in as many batches as CPUs
+        """
+        indices_by_patient = {}
+        for index, neoantigen in enumerate(self.neoantigens):
+            indices_by_patient.setdefault(neoantigen.patient_identifier, []).append(index)
+        batches = []
+        for indices in indices_by_patient.values():
+            batches.extend(split_in_chunks(indices, chunk_size=self.chunk_size, num_chunks=self.num_cpus))
+        return batches
+
+    def _scatter_resources(self, dask_client):
+        """
+        Sends the heavy resources to all workers in the cluster, only once for every client as it is reused across the
+        chunks of a streamed input
+        """
+        if self.scattered_resources is None or self.scattered_resources[0] is not dask_client:
+            # NOTE: sets those heavy resources to be used by all workers in the cluster
+            future_self_similarity = dask_client.scatter(self.self_similarity, broadcast=True)
+            future_reference_folder = dask_client.scatter(self.reference_folder, broadcast=True)
+            future_configuration = dask_client.scatter(self.configuration, broadcast=True)
+            self.scattered_resources = (
+                dask_client, (future_self_similarity, future_reference_folder, future_configuration))
+        return self.scattered_resources[1]
+
     def send_to_client(self, dask_client):
-        # feature calculation for each epitope
-        futures = []
+        # feature calculation for each batch of neoantigens
         start = time.time()
-        # NOTE: sets those heavy resources to be used by all workers in the cluster
-        future_self_similarity = dask_client.scatter(self.self_similarity, broadcast=True)
-        future_reference_folder = dask_client.scatter(self.reference_folder, broadcast=True)
-        future_configuration = dask_client.scatter(self.configuration, broadcast=True)
-        for neoantigen in self.neoantigens:
-            patient = self.patients.get(neoantigen.patient_identifier)
-            logger.debug("Neoantigen: {}".format(neoantigen.to_json(indent=3)))
-            logger.debug("Patient: {}".format(patient.to_json(indent=3)))
-            futures.append(
-                dask_client.submit(
-                    NeoFox.annotate_neoantigen,
-                    neoantigen,
-                    patient,
-                    future_reference_folder,
-                    future_configuration,
-                    future_self_similarity,
-                    self.log_file_name,
-                    self.rank_mhci_threshold,
-                    self.rank_mhcii_threshold,
-                    self.with_all_neoepitopes,
-                    self.verbose
-                )
-            )
-        annotated_neoantigens = dask_client.gather(futures)
+        future_self_similarity, future_reference_folder, future_configuration = self._scatter_resources(dask_client)
+        batches = self._get_batches()
+        annotated_batches = submit_in_chunks(
+            dask_client,
+            NeoFox.annotate_neoantigens,
+            (self._get_chunk(batch) for batch in batches),
+            future_reference_folder,
+            future_configuration,
+            future_self_similarity,
+            self.log_file_name,
+            self.rank_mhci_threshold,
+            self.rank_mhcii_threshold,
+            self.with_all_neoepitopes,
+            self.verbose,
+            self.max_concurrent_predictors,
+            max_chunks_in_flight=self.max_chunks_in_flight
+        )
+        # restores the input order of the neoantigens
+        annotated_neoantigens = [None] * len(self.neoantigens)
+        for batch, annotated_batch in zip(batches, annotated_batches):
+            for index, annotated_neoantigen in zip(batch, annotated_batch):
+                annotated_neoantigens[index] = annotated_neoantigen
         end = time.time()
         logger.info(
             "Elapsed time for annotating {} neoantigens {} seconds".format(
@@ -223,9 +269,17 @@ def send_to_client(self, dask_client):
         )
         return annotated_neoantigens
 
+    def _get_chunk(self, batch: List[int]) -> Tuple[List[Neoantigen], Patient]:
+        neoantigens = [self.neoantigens[i] for i in batch]
+        patient = self.patients.get(neoantigens[0].patient_identifier)
+        for neoantigen in neoantigens:
+            logger.debug("Neoantigen: {}".format(neoantigen.to_json(indent=3)))
+        logger.debug("Patient: {}".format(patient.to_json(indent=3)))
+        return neoantigens, patient
+
     @staticmethod
-    def annotate_neoantigen(
-        neoantigen: Neoantigen,
+    def annotate_neoantigens(
+        neoantigens: List[Neoantigen],
         patient: Patient,
         reference_folder: ReferenceFolder,
         configuration: DependenciesConfiguration,
@@ -234,30 +288,34 @@ def annotate_neoantigen(
         rank_mhci_threshold = neofox.RANK_MHCI_THRESHOLD_DEFAULT,
         rank_mhcii_threshold=neofox.RANK_MHCII_THRESHOLD_DEFAULT,
         with_all_neoepitopes=False,
-        verbose = False
+        verbose = False,
+        max_concurrent_predictors=1
     ):
         # the logs need to be initialised inside every dask job
         initialise_logs(log_file_name, verbose)
-        logger.debug("Starting neoantigen annotation with peptide={}".format(neoantigen.mutated_xmer))
+        logger.debug("Starting annotation of {} neoantigens from patient={}".format(
+            len(neoantigens), patient.identifier))
         start = time.time()
         try:
-            annotated_neoantigen = NeoantigenAnnotator(
+            # NOTE: the annotator is built only once per worker process, as it loads some big files
+            annotated_neoantigens = AnnotatorRegistry.get_neoantigen_annotator(
                 reference_folder,
                 configuration,
                 self_similarity=self_similarity,
                 rank_mhci_threshold=rank_mhci_threshold,
-                rank_mhcii_threshold=rank_mhcii_threshold
-            ).get_annotated_neoantigen(neoantigen, patient, with_all_neoepitopes=with_all_neoepitopes)
+                rank_mhcii_threshold=rank_mhcii_threshold,
+                max_concurrent_predictors=max_concurrent_predictors
+            ).get_annotated_neoantigens(neoantigens, patient, with_all_neoepitopes=with_all_neoepitopes)
         except Exception as e:
-            logger.error("Error processing neoantigen {}".format(neoantigen.to_dict()))
+            logger.error("Error processing neoantigens {}".format([n.to_dict() for n in neoantigens]))
             logger.error("Error processing patient {}".format(patient.to_dict()))
             raise e
         end = time.time()
         logger.debug(
-            "Elapsed time for annotating neoantigen for peptide={}: {} seconds".format(
-                neoantigen.mutated_xmer, int(end - start))
+            "Elapsed time for annotating {} neoantigens from patient={}: {} seconds".format(
+                len(neoantigens), patient.identifier, int(end - start))
         )
-        return annotated_neoantigen
+        return annotated_neoantigens
 
 
 def initialise_logs(logfile, verbose=False):
@@ -25,8 +25,9 @@
 from logzero import logger
 from dask.distributed import Client
 
-from neofox.annotator.neoepitope_annotator import NeoepitopeAnnotator
+from neofox.annotator.annotator_registry import AnnotatorRegistry
 from neofox.expression_imputation.expression_imputation import ExpressionAnnotator
+from neofox.helpers.dask_helper import split_in_chunks, submit_in_chunks
 from neofox.published_features.self_similarity.self_similarity import SelfSimilarityCalculator
 from neofox.references.references import ReferenceFolder, DependenciesConfiguration, ORGANISM_HOMO_SAPIENS
 from neofox.exceptions import NeofoxConfigurationException, NeofoxDataValidationException
@@ -46,7 +47,10 @@ def __init__(
             reference_folder: ReferenceFolder = None,
             configuration: DependenciesConfiguration = None,
             verbose=False,
-            configuration_file=None):
+            configuration_file=None,
+            chunk_size: int = None,
+            max_chunks_in_flight: int = None,
+            in_memory_expression=False):
 
         self.verbose = verbose
         initialise_logs(logfile=log_file_name, verbose=verbose)
@@ -70,6 +74,13 @@ def __init__(
         )
         self.self_similarity = SelfSimilarityCalculator()
         self.num_cpus = num_cpus
+        # NOTE: the neoepitopes are sent to the workers in chunks of chunk_size neoepitopes with at most
+        # max_chunks_in_flight chunks submitted at any time, by default the neoepitopes are split in as many chunks as
+        # CPUs and all chunks are submitted at once
+        self.chunk_size = chunk_size
+        self.max_chunks_in_flight = max_chunks_in_flight
+        # NOTE: the TCGA gene expression is imputed from a matrix loaded in memory instead of querying the tabix index
+        self.in_memory_expression = in_memory_expression
 
         # validates optional patient object
         if patients:
@@ -131,28 +142,27 @@ def get_annotations(self) -> List[PredictedEpitope]:
         return annotations
 
     def send_to_client(self, dask_client):
-        # feature calculation for each epitope
-        futures = []
+        # feature calculation for each chunk of epitopes
         start = time.time()
         # NOTE: sets those heavy resources distributed to all workers in the cluster
         future_self_similarity = dask_client.scatter(self.self_similarity, broadcast=True)
         future_reference_folder = dask_client.scatter(self.reference_folder, broadcast=True)
         future_configuration = dask_client.scatter(self.configuration, broadcast=True)
 
-        for neoepitope in self.neoepitopes:
-            logger.debug("Neoantigen: {}".format(neoepitope.to_json(indent=3)))
-            futures.append(
-                dask_client.submit(
-                    NeoFoxEpitope.annotate_neoepitope,
-                    neoepitope,
-                    future_reference_folder,
-                    future_configuration,
-                    future_self_similarity,
-                    self.log_file_name,
-                    self.verbose,
-                )
-            )
-        annotated_neoantigens = dask_client.gather(futures)
+        batches = split_in_chunks(
+            list(range(len(self.neoepitopes))), chunk_size=self.chunk_size, num_chunks=self.num_cpus)
+        annotated_batches = submit_in_chunks(
+            dask_client,
+            NeoFoxEpitope.annotate_neoepitopes,
+            (([self.neoepitopes[i] for i in batch],) for batch in batches),
+            future_reference_folder,
+            future_configuration,
+            future_self_similarity,
+            self.log_file_name,
+            self.verbose,
+            max_chunks_in_flight=self.max_chunks_in_flight
+        )
+        annotated_neoantigens = [n for annotated_batch in annotated_batches for n in annotated_batch]
         end = time.time()
         logger.info(
             "Elapsed time for annotating {} neoepitopes {} seconds".format(
@@ -168,49 +178,48 @@ def send_to_client(self, dask_client):
         return annotated_neoantigens
 
     @staticmethod
-    def annotate_neoepitope(
-        neoepitope: PredictedEpitope,
+    def annotate_neoepitopes(
+        neoepitopes: List[PredictedEpitope],
         reference_folder: ReferenceFolder,
         configuration: DependenciesConfiguration,
         self_similarity: SelfSimilarityCalculator,
         log_file_name: str,
         verbose = False
-    ):
+    ) -> List[PredictedEpitope]:
         # the logs need to be initialised inside every dask job
         initialise_logs(log_file_name, verbose=verbose)
-        logger.debug("Starting neoepitope annotation with peptide={}".format(neoepitope.mutated_peptide))
+        logger.debug("Starting annotation of {} neoepitopes".format(len(neoepitopes)))
         start = time.time()
+        annotator = AnnotatorRegistry.get_neoepitope_annotator(
+            reference_folder,
+            configuration,
+            self_similarity=self_similarity,
+        )
         try:
-            annotated_neoantigen = NeoepitopeAnnotator(
-                reference_folder,
-                configuration,
-                self_similarity=self_similarity,
-            ).get_annotated_neoepitope(neoepitope)
+            # NOTE: runs BLASTP and the self-similarity once over all neoepitopes in the chunk
+            annotator.precompute_annotations(epitopes=neoepitopes)
+            # NOTE: runs every MHC binding predictor once per MHC allele or isoform in the chunk
+            annotated_neoepitopes = annotator.get_annotated_neoepitopes(neoepitopes)
         except Exception as e:
-            logger.error("Error processing neoantigen {}".format(neoepitope.to_dict()))
+            logger.error("Error processing neoepitopes {}".format([n.to_dict() for n in neoepitopes]))
             raise e
         end = time.time()
         logger.debug(
-            "Elapsed time for annotating neoantigen for peptide={}: {} seconds".format(
-                neoepitope.mutated_peptide, int(end - start))
-        )
-        return annotated_neoantigen
+            "Elapsed time for annotating {} neoepitopes: {} seconds".format(len(neoepitopes), int(end - start)))
+        return annotated_neoepitopes
 
     def _conditional_expression_imputation(self) -> List[PredictedEpitope]:
-
-        expression_annotator = ExpressionAnnotator()
-        neoepitopes_transformed = []
-        for neoepitope in self.neoepitopes:
-            if neoepitope.patient_identifier is not None and neoepitope.patient_identifier != '':
-                patient = self.patients[neoepitope.patient_identifier]
-                neoepitope_transformed = neoepitope
-                gene_expression = expression_annotator.get_gene_expression_annotation(
-                    gene_name=neoepitope.gene, tcga_cohort=patient.tumor_type)
-                neoepitope.imputed_gene_expression = gene_expression
-                neoepitopes_transformed.append(neoepitope_transformed)
-            else:
-                neoepitopes_transformed.append(neoepitope)
-        return neoepitopes_transformed
+        # NOTE: in memory mode the expression of all neoepitopes with a patient is imputed with a single lookup in the
+        # expression matrix
+        expression_annotator = ExpressionAnnotator(in_memory=self.in_memory_expression)
+        neoepitopes_with_patient = [
+            n for n in self.neoepitopes if n.patient_identifier is not None and n.patient_identifier != '']
+        gene_expressions = expression_annotator.get_gene_expression_annotations(
+            gene_names=[n.gene for n in neoepitopes_with_patient],
+            tcga_cohorts=[self.patients[n.patient_identifier].tumor_type for n in neoepitopes_with_patient])
+        for neoepitope, gene_expression in zip(neoepitopes_with_patient, gene_expressions):
+            neoepitope.imputed_gene_expression = gene_expression
+        return self.neoepitopes
 
 
 def initialise_logs(logfile, verbose=False):
@@ -32,25 +32,31 @@ def calculate_dissimilarity(self, epitope: PredictedEpitope):
         """
         wrapper for dissimilarity calculation
         """
-        dissimilarity = None
-        if epitope.mutated_peptide != "-":
-            similarity = self.proteome_blastp_runner.calculate_similarity_database(
-                peptide=epitope.mutated_peptide, a=32)
-            if similarity is not None:
-                dissimilarity = 1 - similarity
-        return dissimilarity
+        return self.calculate_dissimilarity_multiple_epitopes(epitopes=[epitope])[0]
+
+    def calculate_dissimilarity_multiple_epitopes(self, epitopes: List[PredictedEpitope]) -> List[float]:
+        """
+        dissimilarity calculation for several epitopes with a single BLASTP run, returns the dissimilarities in the
+        same order as the input epitopes
+        """
+        peptides = [e.mutated_peptide for e in epitopes if e.mutated_peptide != "-"]
+        similarities = dict(zip(
+            peptides, self.proteome_blastp_runner.calculate_similarity_database_multiple_peptides(peptides, a=32)))
+        dissimilarities = []
+        for epitope in epitopes:
+            similarity = similarities.get(epitope.mutated_peptide)
+            dissimilarities.append(1 - similarity if similarity is not None else None)
+        return dissimilarities
 
     def get_annotations(
             self, mutated_peptide_mhci: PredictedEpitope, mutated_peptide_mhcii: PredictedEpitope) -> List[Annotation]:
         """
         returns dissimilarity for MHC I (affinity) MHC II (affinity)
         """
-        dissimilarity_mhci = None
-        dissimilarity_mhcii = None
-        if mutated_peptide_mhci and mutated_peptide_mhci.mutated_peptide:
-            dissimilarity_mhci = self.calculate_dissimilarity(epitope=mutated_peptide_mhci)
-        if mutated_peptide_mhcii and mutated_peptide_mhcii.mutated_peptide:
-            dissimilarity_mhcii = self.calculate_dissimilarity(epitope=mutated_peptide_mhcii)
+        epitopes = [e if e and e.mutated_peptide else None for e in [mutated_peptide_mhci, mutated_peptide_mhcii]]
+        dissimilarities = iter(self.calculate_dissimilarity_multiple_epitopes(
+            epitopes=[e for e in epitopes if e is not None]))
+        dissimilarity_mhci, dissimilarity_mhcii = [next(dissimilarities) if e is not None else None for e in epitopes]
         annotations = [
             AnnotationFactory.build_annotation(
                 value=dissimilarity_mhci,
@@ -35,34 +35,44 @@ def apply_hex(self, mut_peptide):
         """
         return self.pyhex.run(mut_peptide)
 
+    def apply_hex_multiple(self, mut_peptides: List[str]) -> List[float]:
+        """
+        calls hex over several neoepitope candidates at once, the scores are kept so that later calls for the same
+        neoepitope candidates are not computed again
+        """
+        return self.pyhex.run_multiple(mut_peptides)
+
     def get_annotation(
             self, mutated_peptide_mhci: PredictedEpitope, mutated_peptide_mhcii: PredictedEpitope) -> List[Annotation]:
         """
         wrapper function for HEX (Homology evaluation of Xenopeptides) (Chiaro et al., 2021)
         """
-        # TODO: add annotation of b score when re-implemented in python. The annotation is too slow for bigger datasets
+        # NOTE: the B-score of HEX is not annotated, there is no reference implementation of it to validate against
         hex_aln_score_mhci = None
         hex_aln_score_mhcii = None
-        # hex_b_score = None
-        if mutated_peptide_mhci and mutated_peptide_mhci.mutated_peptide:
-            # hex_aln_score, hex_b_score = self.apply_hex(netmhcpan.best_epitope_by_affinity.peptide).split(" ")
-            hex_aln_score_mhci = self.apply_hex(mutated_peptide_mhci.mutated_peptide)
-        if mutated_peptide_mhcii and mutated_peptide_mhcii.mutated_peptide:
-            hex_aln_score_mhcii = self.apply_hex(mutated_peptide_mhcii.mutated_peptide)
+        # NOTE: both peptides are scored at once
+        peptides = [p.mutated_peptide if p and p.mutated_peptide else None
+                    for p in [mutated_peptide_mhci, mutated_peptide_mhcii]]
+        scores = dict(zip(
+            [p for p in peptides if p], self.apply_hex_multiple([p for p in peptides if p])))
+        if peptides[0]:
+            hex_aln_score_mhci = scores[peptides[0]]
+        if peptides[1]:
+            hex_aln_score_mhcii = scores[peptides[1]]
         annotations = [
             AnnotationFactory.build_annotation(
                 value=hex_aln_score_mhci, name="HexAlignmentScore_MHCI"),
             AnnotationFactory.build_annotation(
                 value=hex_aln_score_mhcii, name="HexAlignmentScore_MHCII")
-            # AnnotationFactory.build_annotation(
-             #   value=hex_b_score, name="hex_B_score"
-            #)
         ]
         return annotations
 
     def get_annotations_epitope(self, epitope: PredictedEpitope) -> List[Annotation]:
+        return self.get_annotations_epitopes(epitopes=[epitope])[0]
+
+    def get_annotations_epitopes(self, epitopes: List[PredictedEpitope]) -> List[List[Annotation]]:
+        scores = self.apply_hex_multiple(mut_peptides=[e.mutated_peptide for e in epitopes])
         return [
-            AnnotationFactory.build_annotation(
-                value=self.apply_hex(mut_peptide=epitope.mutated_peptide),
-                name='hex_alignment_score')
+            [AnnotationFactory.build_annotation(value=score, name='hex_alignment_score')]
+            for score in scores
         ]
@@ -1,9 +1,13 @@
 from math import ceil, floor
+from typing import List, Dict
 
+import numpy as np
 from Bio import SeqIO
 from Bio.Align import substitution_matrices
 from Bio.Data.IUPACData import protein_letters
 
+BATCH_SIZE = 1000
+
 
 class PyHex:
 
@@ -11,6 +15,12 @@ def __init__(self, iedb_fasta, magic_number=4):
         self.iedb_sequences = self._read_fasta(iedb_fasta)
         self.magic_number = magic_number
         self.blosum = substitution_matrices.load("BLOSUM62")
+        # BLOSUM as a matrix indexed by the position of every aminoacid in its alphabet
+        self.aminoacids = {aa: i for i, aa in enumerate(self.blosum.alphabet)}
+        self.blosum_matrix = np.array(self.blosum, dtype=float)
+        self.iedb_sequences_by_length = self._encode_sequences_by_length(self.iedb_sequences)
+        self.weights = {}
+        self.scores = {}
 
     @staticmethod
     def _read_fasta(fasta_file):
@@ -23,6 +33,18 @@ def _read_fasta(fasta_file):
                     sequences.append(record)
         return sequences
 
+    def _encode(self, sequence) -> List[int]:
+        return [self.aminoacids[aa] for aa in sequence]
+
+    def _encode_sequences_by_length(self, sequences) -> Dict[int, np.ndarray]:
+        """
+        Encodes the sequences as a matrix of aminoacid indices for each sequence length
+        """
+        sequences_by_length = {}
+        for s in sequences:
+            sequences_by_length.setdefault(len(s.seq), []).append(self._encode(s.seq))
+        return {length: np.array(encoded, dtype=np.int8) for length, encoded in sequences_by_length.items()}
+
     def _align(self, sequence, mutated_sequence):
         weights = self._get_sequence_weights(mutated_sequence)
         score = sum([self.blosum[q, t] * w for q, t, w in zip(sequence, mutated_sequence, weights)])
@@ -30,6 +52,8 @@ def _align(self, sequence, mutated_sequence):
 
     def _get_sequence_weights(self, mutated_sequence):
         length_mutated_sequence = len(mutated_sequence)
+        if length_mutated_sequence in self.weights:
+            return self.weights[length_mutated_sequence]
         mid_score = ceil(length_mutated_sequence / 2) * self.magic_number
         weights = list(range(1, mid_score, self.magic_number))
         weights.extend(reversed(weights[0:floor(length_mutated_sequence / 2)]))
@@ -39,13 +63,37 @@ def _get_sequence_weights(self, mutated_sequence):
         tail = length_mutated_sequence - top_floor
         weights[tail:length_mutated_sequence] = list(reversed(range(1, top_floor + 1)))
 
+        self.weights[length_mutated_sequence] = weights
         return weights
 
     def run(self, mutated_sequence):
-        # excludes sequences that have different length than the mutated sequence
-        sequences = [s for s in self.iedb_sequences if len(s.seq) == len(mutated_sequence)]
-        # align each of the sequences
-        alignment_scores = [self._align(s.seq, mutated_sequence) for s in sequences]
-        # gets the best score of all the alignments
-        best_score = max(alignment_scores)
-        return best_score
+        return self.run_multiple([mutated_sequence])[0]
+
+    def run_multiple(self, mutated_sequences: List[str]) -> List[float]:
+        """
+        Returns the best alignment score against the IEDB sequences of the same length for several sequences.
+        Sequences of the same length are aligned at once against all IEDB sequences of that length, sequences without
+        any IEDB sequence of the same length have no score
+        """
+        missing_sequences_by_length = {}
+        for sequence in dict.fromkeys(mutated_sequences):
+            if sequence not in self.scores:
+                missing_sequences_by_length.setdefault(len(sequence), []).append(sequence)
+        for length, sequences in missing_sequences_by_length.items():
+            iedb_sequences = self.iedb_sequences_by_length.get(length)
+            if iedb_sequences is None:
+                self.scores.update({s: None for s in sequences})
+                continue
+            weights = self._get_sequence_weights(sequences[0])
+            # NOTE: sequences are aligned in batches to bound the memory of the matrix of scores
+            for i in range(0, len(sequences), BATCH_SIZE):
+                batch = sequences[i:i + BATCH_SIZE]
+                encoded_sequences = np.array([self._encode(s) for s in batch], dtype=np.int8)
+                # scores of each sequence against each IEDB sequence accumulated over the positions
+                alignment_scores = np.zeros((len(batch), iedb_sequences.shape[0]))
+                for position, weight in enumerate(weights):
+                    alignment_scores += self.blosum_matrix[
+                        iedb_sequences[np.newaxis, :, position], encoded_sequences[:, position, np.newaxis]] * weight
+                # gets the best score of all the alignments
+                self.scores.update(zip(batch, alignment_scores.max(axis=1).tolist()))
+        return [self.scores[s] for s in mutated_sequences]
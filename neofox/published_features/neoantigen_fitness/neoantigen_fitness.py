@@ -32,11 +32,19 @@ def __init__(self, iedb_blastp_runner: BlastpRunner):
         self.iedb_blastp_runner = iedb_blastp_runner
 
     def get_pathogen_similarity(self, peptide: str):
-        pathsim = self.iedb_blastp_runner.calculate_similarity_database(peptide=peptide)
-        logger.debug(
-            "Peptide {} has a pathogen similarity of {}".format(peptide, pathsim)
-        )
-        return pathsim
+        return self.get_pathogen_similarity_multiple_peptides(peptides=[peptide])[0]
+
+    def get_pathogen_similarity_multiple_peptides(self, peptides: List[str]) -> List[float]:
+        """
+        pathogen similarity of several peptides with a single BLASTP run, returns the similarities in the same order
+        as the input peptides
+        """
+        pathsims = self.iedb_blastp_runner.calculate_similarity_database_multiple_peptides(peptides=peptides)
+        for peptide, pathsim in zip(peptides, pathsims):
+            logger.debug(
+                "Peptide {} has a pathogen similarity of {}".format(peptide, pathsim)
+            )
+        return pathsims
 
     def calculate_amplitude_mhc(
         self, score_mutation, score_wild_type, apply_correction=False
@@ -82,15 +90,18 @@ def get_annotations(
         pathogen_similarity_9mer = None
         pathogen_similarity_mhcii = None
         recognition_potential = None
+        # NOTE: computes the pathogen similarity of both peptides with a single BLASTP run
+        peptides = [e.mutated_peptide for e in [mutated_peptide_mhci, mutated_peptide_mhcii] if e and e.mutated_peptide]
+        pathogen_similarities = dict(zip(peptides, self.get_pathogen_similarity_multiple_peptides(peptides=peptides)))
         if mutated_peptide_mhci and mutated_peptide_mhci.mutated_peptide:
-            pathogen_similarity_9mer = self.get_pathogen_similarity(peptide=mutated_peptide_mhci.mutated_peptide)
+            pathogen_similarity_9mer = pathogen_similarities.get(mutated_peptide_mhci.mutated_peptide)
             if pathogen_similarity_9mer is not None:
                 recognition_potential = self.calculate_recognition_potential(
                             amplitude=amplitude,
                             pathogen_similarity=pathogen_similarity_9mer
                         )
         if mutated_peptide_mhcii and mutated_peptide_mhcii.mutated_peptide:
-            pathogen_similarity_mhcii = self.get_pathogen_similarity(peptide=mutated_peptide_mhcii.mutated_peptide)
+            pathogen_similarity_mhcii = pathogen_similarities.get(mutated_peptide_mhcii.mutated_peptide)
 
         annotations = [
             AnnotationFactory.build_annotation(
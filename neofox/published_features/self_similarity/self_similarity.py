@@ -17,9 +17,11 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
-from typing import List
+from typing import List, Tuple
 import math
 import os
+import numpy as np
+from neofox.helpers.lru_cache import LruCache
 from neofox.model.validation import ModelValidator
 from neofox.model.neoantigen import Annotation, PredictedEpitope
 from neofox.model.factories import AnnotationFactory
@@ -29,15 +31,21 @@
 
 BETA = 0.11387
 BLOSUM62_FILE_NAME = "BLOSUM62-2.matrix.txt"
+SELF_SIMILARITY_CACHE_SIZE = 100000
 
 
 class SelfSimilarityCalculator:
-    def __init__(self):
+    def __init__(self, cache_size=SELF_SIMILARITY_CACHE_SIZE):
         blosum_file = os.path.join(
             os.path.abspath(os.path.dirname(__file__)), BLOSUM62_FILE_NAME
         )
         blosum_dict = self._load_blosum(blosum_file)
         self.k1 = self._compute_k1(blosum_dict)
+        # K1 as a matrix indexed by the position of every aminoacid in the BLOSUM matrix
+        self.aminoacids = {aa: i for i, aa in enumerate(self.k1.keys())}
+        self.k1_matrix = np.array([[self.k1[i][j] for j in self.k1.keys()] for i in self.k1.keys()])
+        self.self_kernels = LruCache(maxsize=cache_size)
+        self.self_similarities = LruCache(maxsize=cache_size)
 
     def _compute_k1(self, blosum_dict):
         K1 = {}
@@ -70,43 +78,85 @@ def _load_blosum(self, blosum):
         return blosum_dict
 
     def compute_k_hat_3(self, x, y):  # K^3
-        return self._compute_k3(x, y) / math.sqrt(
-            self._compute_k3(x, x) * self._compute_k3(y, y)
-        )
+        return self.compute_k_hat_3_multiple([(x, y)])[0]
+
+    def compute_k_hat_3_multiple(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        Computes K^3 normalised by the self-kernels for several pairs of peptides at once,
+        the self-kernel of every peptide is computed only once
+        """
+        peptides = list(dict.fromkeys(p for pair in pairs for p in pair))
+        self_kernels = {p: self.self_kernels.get(p) for p in peptides if p in self.self_kernels}
+        missing_peptides = [p for p in peptides if p not in self_kernels]
+        missing_self_kernels = dict(zip(
+            missing_peptides, self._compute_k3_multiple([(p, p) for p in missing_peptides])))
+        self.self_kernels.update(missing_self_kernels)
+        self_kernels.update(missing_self_kernels)
+        results = []
+        for (x, y), k3 in zip(pairs, self._compute_k3_multiple(pairs)):
+            norm = math.sqrt(self_kernels[x] * self_kernels[y])
+            results.append(k3 / norm if norm > 0 else math.nan)
+        return results
 
     def _compute_k3(self, f, g):
-        max_k = min(len(f), len(g))
-        s = 0
-        for k in range(1, max_k + 1):
-            for i in range(len(f) - (k - 1)):
-                u = f[i : i + k]
-                for j in range(len(g) - (k - 1)):
-                    v = g[j : j + k]
-                    s += self._compute_k2k(u, v, self.k1)
-        return s
-
-    def _compute_k2k(self, u, v, K1):
-        if len(u) != len(v):
-            return None
-        k = len(u)
-        p = K1[u[0]][v[0]]
-        for i in range(1, k):
-            p = p * K1[u[i]][v[i]]
-        return p
+        return self._compute_k3_multiple([(f, g)])[0]
+
+    def _compute_k3_multiple(self, pairs: List[Tuple[str, str]]) -> List[float]:
+        """
+        K^3 is the sum of the products of K1 over all pairs of k-mers of the same length. These products lie on the
+        diagonals of the matrix of K1 between the aminoacids of both peptides, thus the sum of the products of all
+        k-mers ending at (i, j) is M[i, j] * (1 + P[i - 1, j - 1]) and K^3 is the sum of P.
+        Pairs of peptides with the same lengths are computed together
+        """
+        results = [0.0] * len(pairs)
+        pairs_by_lengths = {}
+        for index, (f, g) in enumerate(pairs):
+            pairs_by_lengths.setdefault((len(f), len(g)), []).append(index)
+        for (length_f, length_g), indices in pairs_by_lengths.items():
+            if length_f == 0 or length_g == 0:
+                continue
+            encoded_f = np.array([[self.aminoacids[aa] for aa in pairs[i][0]] for i in indices])
+            encoded_g = np.array([[self.aminoacids[aa] for aa in pairs[i][1]] for i in indices])
+            # matrix of K1 for every pair with dimensions: pair x position in f x position in g
+            m = self.k1_matrix[encoded_f[:, :, np.newaxis], encoded_g[:, np.newaxis, :]]
+            p = np.zeros(len(indices))
+            previous = np.zeros((len(indices), length_g))
+            for i in range(length_f):
+                current = m[:, i, :].copy()
+                current[:, 1:] *= 1 + previous[:, :-1]
+                p += current.sum(axis=1)
+                previous = current
+            for index, k3 in zip(indices, p.tolist()):
+                results[index] = k3
+        return results
 
     def get_self_similarity(self, mutated_peptide, wt_peptide):
         """
         Returns self-similiarity between mutated and wt epitope according to Bjerregard et al.,
         Argument mhc indicates if determination for MHC I or MHC II epitopes
         """
-        self_similarity = None
-        if not ModelValidator.has_peptide_rare_amino_acids(mutated_peptide) and \
-            not ModelValidator.has_peptide_rare_amino_acids(wt_peptide):
-                try:
-                    self_similarity = str(self.compute_k_hat_3(mutated_peptide, wt_peptide))
-                except ZeroDivisionError:
-                    pass            
-        return self_similarity
+        return self.get_self_similarities(pairs=[(mutated_peptide, wt_peptide)])[0]
+
+    def get_self_similarities(self, pairs: List[Tuple[str, str]]) -> List[str]:
+        """
+        Returns the self-similarities of several pairs of mutated and wt epitopes computed at once
+        """
+        self_similarities = {
+            pair: self.self_similarities.get(pair) for pair in dict.fromkeys(pairs) if pair in self.self_similarities}
+        missing_pairs = [
+            pair for pair in dict.fromkeys(pairs)
+            if pair not in self_similarities and
+            not ModelValidator.has_peptide_rare_amino_acids(pair[0]) and
+            not ModelValidator.has_peptide_rare_amino_acids(pair[1])
+        ]
+        # NOTE: empty peptides have a self-kernel of zero and no self-similarity
+        missing_self_similarities = {
+            pair: str(k_hat_3) if math.isfinite(k_hat_3) else None
+            for pair, k_hat_3 in zip(missing_pairs, self.compute_k_hat_3_multiple(missing_pairs))
+        }
+        self.self_similarities.update(missing_self_similarities)
+        self_similarities.update(missing_self_similarities)
+        return [self_similarities.get(pair) for pair in pairs]
 
     def is_improved_binder(self, score_mutation, score_wild_type) -> bool:
         """
@@ -0,0 +1,155 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import threading
+from typing import Dict, FrozenSet, Tuple
+
+import pandas as pd
+from logzero import logger
+
+from neofox.model.mhc_parser import MhcParser
+from neofox.model.neoantigen import MhcAllele, Mhc2Isoform
+from neofox.references.references import ORGANISM_HOMO_SAPIENS
+
+
+class AlleleRegistry(object):
+    """
+    Process level registry of MHC alleles. The alleles supported by MixMHCpred, PRIME and MixMHC2pred are loaded once
+    per process and the netMHCpan, netMHCIIpan, MixMHCpred and MixMHC2pred representations of every allele in the MHC
+    database are precomputed, thus resolving the representation of an allele is a dictionary lookup
+    """
+
+    _supported_alleles = {}
+    _registries = {}
+    _lock = threading.Lock()
+
+    def __init__(self, mhc_parser: MhcParser):
+        self.mhc_parser = mhc_parser
+        self.organism = mhc_parser.mhc_database.organism
+        self.netmhcpan = {}
+        self.netmhc2pan = {}
+        self.mixmhcpred = {}
+        self.mixmhc2pred = {}
+
+        mhc1_genes = {g.name for g in mhc_parser.mhc_database.mhc1_genes}
+        for allele in mhc_parser.mhc_database.get_mhc_alleles():
+            key = AlleleRegistry._get_key(allele)
+            if allele.gene in mhc1_genes:
+                self.netmhcpan[key] = mhc_parser.get_netmhcpan_representation(allele)
+                self.mixmhcpred[key] = AlleleRegistry.get_mixmhcpred_allele_representation(allele)
+            else:
+                self.mixmhc2pred[key] = self._get_mixmhc2pred_allele_representation(allele)
+                # DR isoforms in human and all isoforms in mouse are represented by a single allele
+                if allele.gene == "DRB1":
+                    isoform = Mhc2Isoform(alpha_chain=MhcAllele(), beta_chain=allele)
+                    self.netmhc2pan[(AlleleRegistry._get_key(None), key)] = \
+                        mhc_parser.get_netmhc2pan_representation(isoform)
+                elif self.organism != ORGANISM_HOMO_SAPIENS:
+                    isoform = Mhc2Isoform(alpha_chain=allele, beta_chain=allele)
+                    self.netmhc2pan[(key, key)] = mhc_parser.get_netmhc2pan_representation(isoform)
+
+    @staticmethod
+    def get_allele_registry(mhc_parser: MhcParser) -> 'AlleleRegistry':
+        """
+        Returns the registry for the MHC database of the given parser shared by all predictors in this process
+        """
+        mhc_database = mhc_parser.mhc_database
+        key = (mhc_database.organism, mhc_database.database_filename)
+        with AlleleRegistry._lock:
+            registry = AlleleRegistry._registries.get(key)
+            if registry is None:
+                logger.debug("Initialising the allele registry for {} in this process".format(mhc_database.organism))
+                registry = AlleleRegistry(mhc_parser)
+                AlleleRegistry._registries[key] = registry
+        return registry
+
+    @staticmethod
+    def get_supported_alleles(alleles_file: str, column: str, skiprows=0) -> FrozenSet[str]:
+        """
+        Returns the alleles supported by a predictor as listed in the given column of its tab separated alleles file,
+        every file is read only once per process
+        """
+        key = (alleles_file, column, skiprows)
+        with AlleleRegistry._lock:
+            alleles = AlleleRegistry._supported_alleles.get(key)
+            if alleles is None:
+                alleles = frozenset(pd.read_csv(alleles_file, sep="\t", skiprows=skiprows)[column])
+                AlleleRegistry._supported_alleles[key] = alleles
+        return alleles
+
+    @staticmethod
+    def clear():
+        with AlleleRegistry._lock:
+            AlleleRegistry._supported_alleles.clear()
+            AlleleRegistry._registries.clear()
+
+    def get_netmhcpan_representation(self, allele: MhcAllele) -> str:
+        return self._get_representation(self.netmhcpan, allele, self.mhc_parser.get_netmhcpan_representation)
+
+    def get_mixmhcpred_representation(self, allele: MhcAllele) -> str:
+        return self._get_representation(
+            self.mixmhcpred, allele, AlleleRegistry.get_mixmhcpred_allele_representation)
+
+    def get_mixmhc2pred_representation(self, allele: MhcAllele) -> str:
+        return self._get_representation(self.mixmhc2pred, allele, self._get_mixmhc2pred_allele_representation)
+
+    def get_netmhc2pan_representation(self, isoform: Mhc2Isoform) -> str:
+        key = (AlleleRegistry._get_key(isoform.alpha_chain), AlleleRegistry._get_key(isoform.beta_chain))
+        representation = self.netmhc2pan.get(key)
+        if representation is None:
+            representation = AlleleRegistry._insert(
+                self.netmhc2pan, key, self.mhc_parser.get_netmhc2pan_representation(isoform))
+        return representation
+
+    def get_mixmhc2pred_isoform_representation(self, isoform: Mhc2Isoform) -> str:
+        beta_chain = self.get_mixmhc2pred_representation(isoform.beta_chain)
+        if self.organism == ORGANISM_HOMO_SAPIENS and isoform.alpha_chain is not None and isoform.alpha_chain.name:
+            # for DR only beta chain is provided
+            alpha_chain = self.get_mixmhc2pred_representation(isoform.alpha_chain)
+            return "{alpha}__{beta}".format(alpha=alpha_chain, beta=beta_chain)
+        return beta_chain
+
+    @staticmethod
+    def get_mixmhcpred_allele_representation(allele: MhcAllele) -> str:
+        return "{gene}{group}{protein}".format(gene=allele.gene, group=allele.group, protein=allele.protein)
+
+    def _get_mixmhc2pred_allele_representation(self, allele: MhcAllele) -> str:
+        if self.organism == ORGANISM_HOMO_SAPIENS:
+            return "{gene}_{group}_{protein}".format(gene=allele.gene, group=allele.group, protein=allele.protein)
+        return "H2_{gene}a_{protein}__H2_{gene}b_{protein}".format(gene=allele.gene[-1], protein=allele.protein)
+
+    @staticmethod
+    def _get_representation(representations: Dict[Tuple[str, str, str], str], allele: MhcAllele, build) -> str:
+        # alleles not in the MHC database are represented on the fly and kept for following lookups
+        key = AlleleRegistry._get_key(allele)
+        representation = representations.get(key)
+        if representation is None:
+            representation = AlleleRegistry._insert(representations, key, build(allele))
+        return representation
+
+    @staticmethod
+    def _insert(representations: dict, key, representation: str) -> str:
+        # NOTE: the registry is shared by all threads in the process, lookups do not lock but inserts do
+        with AlleleRegistry._lock:
+            return representations.setdefault(key, representation)
+
+    @staticmethod
+    def _get_key(allele: MhcAllele) -> Tuple[str, str, str]:
+        if allele is None:
+            return "", "", ""
+        return allele.gene, allele.group, allele.protein
@@ -10,6 +10,7 @@
 import hashlib
 import xmltodict
 from neofox import NEOFOX_HLA_DATABASE_ENV
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
 from neofox.exceptions import NeofoxReferenceException
 from neofox.helpers.runner import Runner
 from neofox.model.neoantigen import Resource
@@ -21,9 +22,9 @@
     PROTEOME_DB_FOLDER,
     IEDB_FASTA_HOMO_SAPIENS,
     HOMO_SAPIENS_FASTA,
-    PREFIX_HOMO_SAPIENS, HLA_DATABASE_AVAILABLE_ALLELES_FILE, HOMO_SAPIENS_PICKLE,
+    PREFIX_HOMO_SAPIENS, HLA_DATABASE_AVAILABLE_ALLELES_FILE, HOMO_SAPIENS_PICKLE, HOMO_SAPIENS_INDEX,
     NETMHCPAN_AVAILABLE_ALLELES_MICE_FILE, NETMHC2PAN_AVAILABLE_ALLELES_MICE_FILE, MUS_MUSCULUS_FASTA,
-    PREFIX_MUS_MUSCULUS, MUS_MUSCULUS_PICKLE, IEDB_FASTA_MUS_MUSCULUS, IEDB_BLAST_PREFIX_HOMO_SAPIENS,
+    PREFIX_MUS_MUSCULUS, MUS_MUSCULUS_PICKLE, MUS_MUSCULUS_INDEX, IEDB_FASTA_MUS_MUSCULUS, IEDB_BLAST_PREFIX_HOMO_SAPIENS,
     IEDB_BLAST_PREFIX_MUS_MUSCULUS, H2_DATABASE_AVAILABLE_ALLELES_FILE, RESOURCES_VERSIONS,
     MIXMHC2PRED_PWM
 )
@@ -227,7 +228,8 @@ def _set_proteome(self):
             version_url=HUMAN_PROTEOME_VERSION,
             proteome_file_name=HOMO_SAPIENS_FASTA,
             proteome_prefix=PREFIX_HOMO_SAPIENS,
-            proteome_pickle_file_name=HOMO_SAPIENS_PICKLE)
+            proteome_pickle_file_name=HOMO_SAPIENS_PICKLE,
+            proteome_index_file_name=HOMO_SAPIENS_INDEX)
 
         # installs Mus musculus proteome
         hash_mouse, hash_isoforms_mouse, version_mouse = self._prepare_proteome(
@@ -236,7 +238,8 @@ def _set_proteome(self):
             version_url=MOUSE_PROTEOME_VERSION,
             proteome_file_name=MUS_MUSCULUS_FASTA,
             proteome_prefix=PREFIX_MUS_MUSCULUS,
-            proteome_pickle_file_name=MUS_MUSCULUS_PICKLE)
+            proteome_pickle_file_name=MUS_MUSCULUS_PICKLE,
+            proteome_index_file_name=MUS_MUSCULUS_INDEX)
 
         return [
             Resource(name="Human Uniprot proteome", version=version_human, url=HUMAN_PROTEOME,
@@ -249,7 +252,8 @@ def _set_proteome(self):
                      url=MOUSE_PROTEOME_ISOFORMS, hash=hash_isoforms_mouse),
         ]
 
-    def _prepare_proteome(self, url, url_isoforms, version_url, proteome_file_name, proteome_prefix, proteome_pickle_file_name):
+    def _prepare_proteome(self, url, url_isoforms, version_url, proteome_file_name, proteome_prefix, proteome_pickle_file_name,
+                          proteome_index_file_name):
         # download proteome
         hash = self._download_and_unzip(proteome_file_name, url)
         proteome_isoforms_file_name = proteome_file_name + ".isoforms.fasta"
@@ -287,10 +291,16 @@ def _prepare_proteome(self, url, url_isoforms, version_url, proteome_file_name,
         proteome_pickle = os.path.join(
             self.reference_folder, PROTEOME_DB_FOLDER, proteome_pickle_file_name
         )
+        proteome = "\n".join(proteome_sequences_to_serialize)
         outfile = open(proteome_pickle, 'wb')
-        pickle.dump("\n".join(proteome_sequences_to_serialize), outfile)
+        pickle.dump(proteome, outfile)
         outfile.close()
 
+        # builds the index of k-mers for exact match searches in the proteome, the proteome is stored together with
+        # the index in a flat file to be memory mapped
+        ProteomeIndex.build(proteome).save(
+            os.path.join(self.reference_folder, PROTEOME_DB_FOLDER, proteome_index_file_name))
+
         # fetches the proteome version
         proteome_version_file = os.path.join(
             self.reference_folder, PROTEOME_DB_FOLDER, "%s.version" % proteome_file_name
@@ -36,6 +36,14 @@
 DEFAULT_MIXMHC2PRED = "MixMHC2pred_unix"
 DEFAULT_BLASTP = "blastp"
 
+ALIGNMENT_ENGINE_BLASTP = "blastp"
+ALIGNMENT_ENGINE_IN_PROCESS = "in-process"
+ALIGNMENT_ENGINES = [ALIGNMENT_ENGINE_BLASTP, ALIGNMENT_ENGINE_IN_PROCESS]
+
+NETMHCPAN_MODE_SEQUENCE = "sequence"
+NETMHCPAN_MODE_PEPTIDE = "peptide"
+NETMHCPAN_MODES = [NETMHCPAN_MODE_SEQUENCE, NETMHCPAN_MODE_PEPTIDE]
+
 ORGANISM_HOMO_SAPIENS = 'human'
 HOMO_SAPIENS_MHC_I_GENES = [Mhc1Name.A, Mhc1Name.B, Mhc1Name.C]
 HOMO_SAPIENS_MHC_II_GENES = [Mhc2GeneName.DPA1, Mhc2GeneName.DPB1, Mhc2GeneName.DQA1, Mhc2GeneName.DQB1,
@@ -58,9 +66,11 @@
 PREFIX_HOMO_SAPIENS = "homo_sapiens"
 HOMO_SAPIENS_FASTA = "Homo_sapiens.fa"
 HOMO_SAPIENS_PICKLE = "Homo_sapiens.pickle"
+HOMO_SAPIENS_INDEX = "Homo_sapiens.index"
 PREFIX_MUS_MUSCULUS = "mus_musculus"
 MUS_MUSCULUS_FASTA = "Mus_musculus.fa"
 MUS_MUSCULUS_PICKLE = "Mus_musculus.pickle"
+MUS_MUSCULUS_INDEX = "Mus_musculus.index"
 PROTEOME_DB_FOLDER = "proteome_db"
 
 IEDB_FASTA_HOMO_SAPIENS = "IEDB_homo_sapiens.fasta"
@@ -153,6 +163,20 @@ def __init__(self):
             self.prime_alleles_list = os.path.join(
                 os.path.dirname(self.prime), "lib", PRIME_AVAILABLE_ALLELES_FILE
             )
+        # the folder for the persistent cache of MHC binding predictions is optional
+        self.cache_folder = os.environ.get(neofox.NEOFOX_CACHE_FOLDER_ENV)
+        # the engine searching the proteome and IEDB, either BLASTP or the in-process search
+        self.alignment_engine = os.environ.get(neofox.NEOFOX_ALIGNMENT_ENGINE_ENV, ALIGNMENT_ENGINE_BLASTP)
+        if self.alignment_engine not in ALIGNMENT_ENGINES:
+            raise NeofoxConfigurationException(
+                "Non supported alignment engine in ${}: {}. Use one of {}".format(
+                    neofox.NEOFOX_ALIGNMENT_ENGINE_ENV, self.alignment_engine, ALIGNMENT_ENGINES))
+        # netMHCpan predicts either all peptides within the xmers or only the candidate neoepitopes in peptide mode
+        self.netmhcpan_mode = os.environ.get(neofox.NEOFOX_NETMHCPAN_MODE_ENV, NETMHCPAN_MODE_SEQUENCE)
+        if self.netmhcpan_mode not in NETMHCPAN_MODES:
+            raise NeofoxConfigurationException(
+                "Non supported netMHCpan mode in ${}: {}. Use one of {}".format(
+                    neofox.NEOFOX_NETMHCPAN_MODE_ENV, self.netmhcpan_mode, NETMHCPAN_MODES))
 
 
 class DependenciesConfigurationForInstaller(AbstractDependenciesConfiguration):
@@ -171,12 +195,17 @@ class MhcDatabase(ABC):
 
     def __init__(self, database_filename: str):
         super().__init__()
+        self.database_filename = database_filename
         self.alleles = self._load_alleles(database_filename)
 
     @abstractmethod
     def _load_alleles(self, hla_database_filename: str):
         pass
 
+    @abstractmethod
+    def get_mhc_alleles(self) -> List[MhcAllele]:
+        pass
+
     @abstractmethod
     def exists(self, allele: MhcAllele):
         pass
@@ -218,6 +247,14 @@ def exists(self, allele: MhcAllele):
         return "{gene}*{group}:{protein}".format(
             gene=allele.gene, group=allele.group, protein=allele.protein) in self.alleles
 
+    def get_mhc_alleles(self) -> List[MhcAllele]:
+        mhc_alleles = []
+        for allele in self.alleles:
+            gene, group_and_protein = allele.split("*")
+            group, protein = group_and_protein.split(":")
+            mhc_alleles.append(MhcAllele(gene=gene, group=group, protein=protein))
+        return mhc_alleles
+
 
 class H2Database(MhcDatabase):
 
@@ -245,6 +282,10 @@ def exists(self, allele: MhcAllele):
         # the sequence level we will here use the protein field only and skip the group
         return "{gene}{protein}".format(gene=allele.gene, protein=allele.protein) in self.alleles
 
+    def get_mhc_alleles(self) -> List[MhcAllele]:
+        # the gene is the three first characters (eg: H2K) and the rest is the protein (eg: b)
+        return [MhcAllele(gene=allele[0:3], protein=allele[3:]) for allele in self.alleles]
+
 
 class ReferenceFolder(object):
 
@@ -260,6 +301,7 @@ def __init__(self, organism=ORGANISM_HOMO_SAPIENS, verbose=False):
         self.proteome_db = self._get_reference_file_name(PROTEOME_DB_FOLDER)
         self.uniprot = self.get_proteome_fasta()
         self.uniprot_pickle = self.get_proteome_pickle()
+        self.uniprot_index = self.get_proteome_index()
         if self.organism == ORGANISM_HOMO_SAPIENS:
             self.mhc_database_filename = self._get_reference_file_name(HLA_DATABASE_AVAILABLE_ALLELES_FILE)
             self.available_mhc_ii = self._get_reference_file_name(NETMHC2PAN_AVAILABLE_ALLELES_FILE)
@@ -344,6 +386,12 @@ def get_proteome_pickle(self):
             HOMO_SAPIENS_PICKLE if self.organism == ORGANISM_HOMO_SAPIENS
             else MUS_MUSCULUS_PICKLE)
 
+    def get_proteome_index(self):
+        return os.path.join(
+            self.proteome_db,
+            HOMO_SAPIENS_INDEX if self.organism == ORGANISM_HOMO_SAPIENS
+            else MUS_MUSCULUS_INDEX)
+
     def get_iedb_database(self):
         return os.path.join(
             self.iedb,
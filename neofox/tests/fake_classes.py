@@ -99,3 +99,12 @@ class FakePredictedEpitope(PredictedEpitope):
     def __init__(self, mutated_epitope, allele, affinity):
         self.mutated_peptide = mutated_epitope
         self.affinity_mutated = affinity
+
+
+class FakeUniprot:
+
+    def __init__(self, peptides):
+        self.peptides = peptides
+
+    def are_sequences_not_in_uniprot(self, sequences):
+        return [s not in self.peptides for s in sequences]
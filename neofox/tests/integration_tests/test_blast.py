@@ -16,14 +16,17 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import copy
 import time
 from unittest import TestCase
 
 import numpy as np
 
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
 from neofox.helpers.blastp_runner import (
     BlastpRunner,
 )
+from neofox.references.references import ALIGNMENT_ENGINE_IN_PROCESS
 from logzero import logger
 from neofox.helpers.runner import Runner
 import neofox.tests.integration_tests.integration_test_tools as integration_test_tools
@@ -79,3 +82,36 @@ def test_performance_calculate_similarity_database(self):
                 logger.info("{}: {}".format(kmer, similarity))
             logger.info("Average time for {}-mers: {}".format(k, np.mean(times)))
             logger.info("Standard deviation for {}-mers: {}".format(k, np.std(times)))
+
+    def test_in_process_engine(self):
+        configuration = copy.copy(self.configuration)
+        configuration.alignment_engine = ALIGNMENT_ENGINE_IN_PROCESS
+        proteome_runner = BlastpRunner(
+            runner=Runner(verbose=False), configuration=configuration,
+            database=self.references.get_proteome_database(),
+            database_index=ProteomeIndex.build_from_fasta(self.references.get_proteome_fasta()))
+        iedb_runner = BlastpRunner(
+            runner=Runner(verbose=False), configuration=configuration,
+            database=self.references.get_iedb_database(),
+            database_index=ProteomeIndex.build_from_fasta(self.references.get_iedb_fasta()))
+        self.assertEqual('FVAGLIVLL', proteome_runner.get_most_similar_wt_epitope("FIAGLIAIV"))
+        self.assertAlmostEqual(
+            self.iedb_blastp_runner.calculate_similarity_database("FIAGLIAIV"),
+            iedb_runner.calculate_similarity_database("FIAGLIAIV"), places=2)
+        # NOTE: both engines may find slightly different hits, the documented tolerance is 0.005
+        iedb_differences = []
+        proteome_differences = []
+        for _ in range(100):
+            kmer = integration_test_tools.get_random_kmer(k=9)
+            iedb_differences.append(abs(
+                self.iedb_blastp_runner.calculate_similarity_database(kmer) -
+                iedb_runner.calculate_similarity_database(kmer)))
+            proteome_differences.append(abs(
+                self.proteome_blastp_runner.calculate_similarity_database(kmer, a=32) -
+                proteome_runner.calculate_similarity_database(kmer, a=32)))
+        logger.info("IEDB absolute differences: mean {}, max {}".format(
+            np.mean(iedb_differences), np.max(iedb_differences)))
+        logger.info("Proteome absolute differences: mean {}, max {}".format(
+            np.mean(proteome_differences), np.max(proteome_differences)))
+        self.assertLess(np.max(iedb_differences), 0.005)
+        self.assertLess(np.max(proteome_differences), 0.005)
@@ -16,6 +16,7 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import timeit
 from unittest import TestCase
 from logzero import logger
 from neofox.published_features.hex.hex import Hex
@@ -49,5 +50,19 @@ def test_comparison(self):
                 res_pyhex = pyhex.run(peptide)
                 self.assertEqual(float(res), res_pyhex, "Peptide: {}".format(peptide))
 
+    def test_benchmark_hex(self):
+        peptides = [integration_test_tools.get_random_kmer(k=k) for k in range(9, 16) for _ in range(100)]
+        hex = Hex(references=self.references)
 
+        def compute_alignment_scores():
+            hex.pyhex.scores = {}
+            hex.apply_hex_multiple(mut_peptides=peptides)
 
+        # the vectorised scores match the best alignment against every IEDB sequence of the same length
+        scores = hex.apply_hex_multiple(mut_peptides=peptides)
+        for peptide, score in list(zip(peptides, scores))[::50]:
+            iedb_sequences = [s.seq for s in hex.pyhex.iedb_sequences if len(s.seq) == len(peptide)]
+            self.assertAlmostEqual(max(hex.pyhex._align(s, peptide) for s in iedb_sequences), score)
+
+        logger.info("Time per peptide of the alignment score: {}".format(
+            timeit.timeit(compute_alignment_scores, number=5) / 5 / len(peptides)))
@@ -51,9 +51,9 @@ def setUp(self):
     def test_mixmhcpred_epitope_iedb(self):
         # this is an epitope from IEDB of length 9
         mutation = get_neoantigen(mutated_xmer="NLVPMVATV", wild_type_xmer="NLVPIVATV")
-        self.mixmhcpred.run(neoantigen=mutation, mhc=self.test_mhc_one, uniprot=self.uniprot)
+        results = self.mixmhcpred.run(neoantigen=mutation, mhc=self.test_mhc_one, uniprot=self.uniprot)
         best_result = EpitopeHelper.select_best_by_affinity(
-            predictions=self.mixmhcpred.results, maximum=True)
+            predictions=results, maximum=True)
         self.assertEquals("NLVPMVATV", best_result.mutated_peptide)
         self.assertAlmostEqual(0.107561, best_result.affinity_mutated, delta=0.00001)
         self.assertEquals(0.0659342, best_result.rank_mutated)
@@ -61,9 +61,9 @@ def test_mixmhcpred_epitope_iedb(self):
 
     def test_mixmhcpred_too_small_epitope(self):
         mutation = get_neoantigen(mutated_xmer="NLVP", wild_type_xmer="NLNP")
-        self.mixmhcpred.run(neoantigen=mutation, mhc=self.test_mhc_one, uniprot=self.uniprot)
+        results = self.mixmhcpred.run(neoantigen=mutation, mhc=self.test_mhc_one, uniprot=self.uniprot)
         best_result = EpitopeHelper.select_best_by_affinity(
-            predictions=self.mixmhcpred.results, maximum=True)
+            predictions=results, maximum=True)
         self.assertIsNone(best_result.mutated_peptide)
         self.assertIsNone(best_result.rank_mutated)
         self.assertIsNone(best_result.allele_mhc_i.name)
@@ -74,13 +74,13 @@ def test_mixmhcpred_not_supported_allele(self):
         this is a combination of neoepitope and HLA alleles from Balachandran
         """
         mutation = get_neoantigen(mutated_xmer="SIYGGLVLI", wild_type_xmer="PIYGGLVLI")
-        self.mixmhcpred.run(
+        results = self.mixmhcpred.run(
             neoantigen=mutation,
             mhc=MhcFactory.build_mhc1_alleles(["A02:01", "B44:02", "C05:17", "C05:01"], self.hla_database),
             uniprot=self.uniprot
         )
         best_result = EpitopeHelper.select_best_by_affinity(
-            predictions=self.mixmhcpred.results, maximum=True)
+            predictions=results, maximum=True)
         self.assertEqual('SIYGGLVLI', best_result.mutated_peptide)
         self.assertAlmostEqual(-0.296735, best_result.affinity_mutated, places=5)
         self.assertEqual(0.267446, best_result.rank_mutated)
@@ -89,9 +89,9 @@ def test_mixmhcpred_not_supported_allele(self):
     def test_mixmhcpred_rare_aminoacid(self):
         for wild_type_xmer, mutated_xmer in integration_test_tools.mutations_with_rare_aminoacids:
             mutation = get_neoantigen(mutated_xmer=mutated_xmer, wild_type_xmer=wild_type_xmer)
-            self.mixmhcpred.run(neoantigen=mutation, mhc=self.test_mhc_one, uniprot=self.uniprot)
+            results = self.mixmhcpred.run(neoantigen=mutation, mhc=self.test_mhc_one, uniprot=self.uniprot)
             best_result = EpitopeHelper.select_best_by_affinity(
-                predictions=self.mixmhcpred.results, maximum=True)
+                predictions=results, maximum=True)
             # rare aminoacids only return empty results when in the mutated sequence
             if EpitopeHelper.contains_rare_amino_acid(mutated_xmer):
                 self.assertIsNone(best_result.mutated_peptide)
@@ -109,11 +109,11 @@ def test_mixmhcpred2_epitope_iedb(self):
         neoantigen = get_neoantigen(
             mutated_xmer="DEVLGEPSQDILVTDQTRLEATISPET",
             wild_type_xmer="DEVLGEPSQDILVIDQTRLEATISPET")
-        self.mixmhc2pred.run(
+        results = self.mixmhc2pred.run(
             neoantigen=neoantigen, mhc=self.test_mhc_two,
             uniprot=self.uniprot
         )
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         self.assertEquals("TDQTRLEATISPET", best_result.mutated_peptide)
         self.assertEquals(0.913, best_result.rank_mutated)
         self.assertEquals("HLA-DPA1*01:03-DPB1*13:01", best_result.isoform_mhc_i_i.name)
@@ -123,20 +123,20 @@ def test_mixmhcpred2_epitope_iedb_forcing_no_drb1(self):
         neoantigen = get_neoantigen(
             mutated_xmer="DEVLGEPSQDILVTDQTRLEATISPET",
             wild_type_xmer="DEVLGEPSQDILVIDQTRLEATISPET")
-        self.mixmhc2pred.run(
+        results = self.mixmhc2pred.run(
             # forces no DRB1 allele to get as a result one of the composite isoforms
             neoantigen=neoantigen, mhc=[m for m in self.test_mhc_two if m.name != Mhc2Name.DR],
             uniprot=self.uniprot
         )
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         self.assertEquals("TDQTRLEATISPET", best_result.mutated_peptide)
         self.assertEquals(0.913, best_result.rank_mutated)
         self.assertEquals("HLA-DPA1*01:03-DPB1*13:01", best_result.isoform_mhc_i_i.name)
 
     def test_mixmhcpred2_too_small_epitope(self):
         neoantigen = get_neoantigen(mutated_xmer="ENPVVHFF", wild_type_xmer="ENPVVHFF")
-        self.mixmhc2pred.run(neoantigen=neoantigen, mhc=self.test_mhc_two, uniprot=self.uniprot)
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        results = self.mixmhc2pred.run(neoantigen=neoantigen, mhc=self.test_mhc_two, uniprot=self.uniprot)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         self.assertIsNone(best_result.mutated_peptide)
         self.assertIsNone(best_result.rank_mutated)
         self.assertIsNone(best_result.isoform_mhc_i_i.name)
@@ -144,8 +144,8 @@ def test_mixmhcpred2_too_small_epitope(self):
     def test_mixmhcpred2_no_mutation(self):
         for wild_type_xmer, mutated_xmer in integration_test_tools.mutations_with_rare_aminoacids:
             neoantigen = get_neoantigen(mutated_xmer=mutated_xmer, wild_type_xmer=wild_type_xmer)
-            self.mixmhc2pred.run(neoantigen=neoantigen, mhc=self.test_mhc_two, uniprot=self.uniprot)
-            best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+            results = self.mixmhc2pred.run(neoantigen=neoantigen, mhc=self.test_mhc_two, uniprot=self.uniprot)
+            best_result = EpitopeHelper.select_best_by_rank(predictions=results)
             self.assertIsNone(best_result.mutated_peptide)
             self.assertIsNone(best_result.rank_mutated)
             self.assertIsNone(best_result.isoform_mhc_i_i.name)
@@ -153,8 +153,8 @@ def test_mixmhcpred2_no_mutation(self):
     def test_mixmhc2pred_rare_aminoacid(self):
         # this is an epitope from IEDB of length 9
         neoantigen = get_neoantigen(mutated_xmer="XTTDSWGKF", wild_type_xmer="XTTDSDGKF")
-        self.mixmhc2pred.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        results = self.mixmhc2pred.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         self.assertIsNone(best_result.mutated_peptide)
         self.assertIsNone(best_result.rank_mutated)
         self.assertIsNone(best_result.isoform_mhc_i_i.name)
@@ -178,8 +178,8 @@ def test_mixmhc2pred_allele(self):
         )
         alleles = self.mixmhc2pred.transform_hla_ii_alleles_for_prediction(MHC_TWO_NEW)
         logger.info(alleles)
-        self.mixmhc2pred.run(neoantigen=neoantigen, mhc=MHC_TWO_NEW, uniprot=self.uniprot)
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        results = self.mixmhc2pred.run(neoantigen=neoantigen, mhc=MHC_TWO_NEW, uniprot=self.uniprot)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         self.assertIsNotNone(best_result.mutated_peptide)
         self.assertIsNotNone(best_result.rank_mutated)
         self.assertIsNotNone(best_result.isoform_mhc_i_i.name)
@@ -56,12 +56,12 @@ def test_mixmhcpred2_antigen_iedb_b_haplotype(self):
         neoantigen = get_neoantigen(
             mutated_xmer="RQHSIKEGLQFIQPPLSYPGTQEQYAV",
             wild_type_xmer= "RQHSIKEGLQFIQSPLSYPGTQEQYAV")
-        self.mixmhc2pred.run(
+        results = self.mixmhc2pred.run(
             neoantigen=neoantigen, mhc=self.test_mhc_two_b,
             uniprot=self.uniprot
         )
 
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
 
         self.assertEquals("QPPLSYPGTQEQYAV", best_result.mutated_peptide)
         self.assertEquals(9.43, best_result.rank_mutated)
@@ -73,12 +73,12 @@ def test_mixmhcpred2_antigen_iedb(self):
         neoantigen = get_neoantigen(
             mutated_xmer="RQHSIKEGLQFIQPPLSYPGTQEQYAV",
             wild_type_xmer= "RQHSIKEGLQFIQSPLSYPGTQEQYAV")
-        self.mixmhc2pred.run(
+        results = self.mixmhc2pred.run(
             neoantigen=neoantigen, mhc=self.test_mhc_two,
             uniprot=self.uniprot
         )
 
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
 
         self.assertEquals("KEGLQFIQPPLSYPG", best_result.mutated_peptide)
         self.assertEquals(11.9, best_result.rank_mutated)
@@ -88,12 +88,12 @@ def test_mixmhcpred2_no_mutation(self):
         neoantigen = get_neoantigen(
             mutated_xmer="RQHSIKEGLQFIQSPLSYPGTQEQYAV",
             wild_type_xmer= "RQHSIKEGLQFIQSPLSYPGTQEQYAV")
-        self.mixmhc2pred.run(
+        results = self.mixmhc2pred.run(
             neoantigen=neoantigen, mhc=self.test_mhc_two,
             uniprot=self.uniprot
         )
 
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
 
         self.assertIsNone(best_result.mutated_peptide)
         self.assertIsNone(best_result.rank_mutated)
@@ -115,8 +115,8 @@ def test_mixmhc2pred_allele(self):
         alleles = self.mixmhc2pred.transform_h2_alleles_for_prediction(MHC_TWO_NEW)
         logger.info(alleles)
         self.assertListEqual(alleles, ['H2_Aa_b__H2_Ab_b', 'H2_Aa_d__H2_Ab_d', 'H2_Ea_d__H2_Eb_d'])
-        self.mixmhc2pred.run(neoantigen=neoantigen, mhc=MHC_TWO_NEW, uniprot=self.uniprot)
-        best_result = EpitopeHelper.select_best_by_rank(predictions=self.mixmhc2pred.results)
+        results = self.mixmhc2pred.run(neoantigen=neoantigen, mhc=MHC_TWO_NEW, uniprot=self.uniprot)
+        best_result = EpitopeHelper.select_best_by_rank(predictions=results)
         self.assertIsNotNone(best_result.mutated_peptide)
         self.assertIsNotNone(best_result.rank_mutated)
         self.assertIsNotNone(best_result.isoform_mhc_i_i.name)
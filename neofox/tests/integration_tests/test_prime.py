@@ -41,9 +41,9 @@ def setUp(self):
 
     def test_prime_epitope(self):
         neoantigen = get_neoantigen(mutated_xmer="LVTDQTRLE", wild_type_xmer="LVTDQTRNE")
-        self.prime.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
+        results = self.prime.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
         best_result = EpitopeHelper.select_best_by_affinity(
-            predictions=self.prime.results, maximum=True)
+            predictions=results, maximum=True)
         self.assertEqual("LVTDQTRL", best_result.mutated_peptide)
         self.assertAlmostEqual(0.001858 , best_result.affinity_mutated, delta=0.00001)
         self.assertEqual(18.992, best_result.rank_mutated)
@@ -51,9 +51,9 @@ def test_prime_epitope(self):
 
     def test_prime_too_small_epitope(self):
         neoantigen = get_neoantigen(mutated_xmer="NLVP", wild_type_xmer="NLNP")
-        self.prime.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
+        results = self.prime.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
         best_result = EpitopeHelper.select_best_by_affinity(
-            predictions=self.prime.results, maximum=True)
+            predictions=results, maximum=True)
         self.assertIsNone(best_result.mutated_peptide)
         self.assertIsNone(best_result.affinity_mutated)
         self.assertIsNone(best_result.rank_mutated)
@@ -64,13 +64,13 @@ def test_prime_not_supported_allele(self):
         this is a combination of neoepitope and HLA alleles from Balachandran
         """
         neoantigen = get_neoantigen(mutated_xmer="SIYGGLVLI", wild_type_xmer="PIYGGLVLI")
-        self.prime.run(
+        results = self.prime.run(
             neoantigen=neoantigen,
             mhc=MhcFactory.build_mhc1_alleles(["A02:01", "B44:02", "C05:17", "C05:01"], self.hla_database),
             uniprot=self.uniprot
         )
         best_result = EpitopeHelper.select_best_by_affinity(
-            predictions=self.prime.results, maximum=True)
+            predictions=results, maximum=True)
         self.assertEqual('SIYGGLVLI', best_result.mutated_peptide)
         self.assertEqual(0.13728, best_result.affinity_mutated)
         self.assertEqual(0.127, best_result.rank_mutated)
@@ -79,10 +79,10 @@ def test_prime_not_supported_allele(self):
     def test_prime_rare_aminoacid(self):
         for wild_type_xmer, mutated_xmer in integration_test_tools.mutations_with_rare_aminoacids:
             neoantigen = get_neoantigen(mutated_xmer=mutated_xmer, wild_type_xmer=wild_type_xmer)
-            self.prime.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
+            results = self.prime.run(neoantigen=neoantigen, mhc=self.test_mhc_one, uniprot=self.uniprot)
             # rare aminoacids only return empty results when in the mutated sequence
             best_result = EpitopeHelper.select_best_by_affinity(
-                predictions=self.prime.results, maximum=True)
+                predictions=results, maximum=True)
             if EpitopeHelper.contains_rare_amino_acid(mutated_xmer):
                 self.assertIsNone(best_result.mutated_peptide)
                 self.assertIsNone(best_result.rank_mutated)
@@ -0,0 +1,96 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from unittest import TestCase
+
+from neofox.model.mhc_parser import MhcParser
+from neofox.model.neoantigen import MhcAllele
+from neofox.references.allele_registry import AlleleRegistry
+from neofox.tests.fake_classes import FakeHlaDatabase, FakeH2Database
+
+
+class TestAlleleRegistry(TestCase):
+
+    def setUp(self):
+        AlleleRegistry.clear()
+        self.hla_parser = MhcParser.get_mhc_parser(FakeHlaDatabase())
+        self.h2_parser = MhcParser.get_mhc_parser(FakeH2Database())
+
+    def test_supported_alleles_are_loaded_once(self):
+        alleles_file = tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".txt").name
+        with open(alleles_file, "w") as fd:
+            fd.write("Allele\tOther\nA0101\t1\nB0702\t2\n")
+        alleles = AlleleRegistry.get_supported_alleles(alleles_file, column="Allele")
+        self.assertEqual(frozenset(["A0101", "B0702"]), alleles)
+
+        # changes in the file are not loaded again in this process
+        with open(alleles_file, "w") as fd:
+            fd.write("Allele\tOther\nC0701\t1\n")
+        self.assertIs(alleles, AlleleRegistry.get_supported_alleles(alleles_file, column="Allele"))
+        os.remove(alleles_file)
+
+    def test_registry_is_shared(self):
+        self.assertIs(
+            AlleleRegistry.get_allele_registry(self.hla_parser),
+            AlleleRegistry.get_allele_registry(MhcParser.get_mhc_parser(self.hla_parser.mhc_database)))
+        self.assertIsNot(
+            AlleleRegistry.get_allele_registry(self.hla_parser), AlleleRegistry.get_allele_registry(self.h2_parser))
+
+    def test_hla_representations(self):
+        registry = AlleleRegistry.get_allele_registry(self.hla_parser)
+        allele = self.hla_parser.parse_mhc_allele("HLA-A*02:01")
+        self.assertIn(("A", "02", "01"), registry.netmhcpan)
+        self.assertEqual("HLA-A02:01", registry.get_netmhcpan_representation(allele))
+        self.assertEqual("A0201", registry.get_mixmhcpred_representation(allele))
+
+        dq_isoform = self.hla_parser.parse_mhc2_isoform("HLA-DQA1*01:01-DQB1*05:01")
+        self.assertEqual("HLA-DQA10101-DQB10501", registry.get_netmhc2pan_representation(dq_isoform))
+        self.assertEqual("DQA1_01_01__DQB1_05_01", registry.get_mixmhc2pred_isoform_representation(dq_isoform))
+        dr_isoform = self.hla_parser.parse_mhc2_isoform("HLA-DRB1*01:01")
+        self.assertEqual("DRB1_0101", registry.get_netmhc2pan_representation(dr_isoform))
+        self.assertEqual("DRB1_01_01", registry.get_mixmhc2pred_isoform_representation(dr_isoform))
+
+    def test_h2_representations(self):
+        registry = AlleleRegistry.get_allele_registry(self.h2_parser)
+        allele = self.h2_parser.parse_mhc_allele("H2Kb")
+        self.assertEqual("H-2-Kb", registry.get_netmhcpan_representation(allele))
+        isoform = self.h2_parser.parse_mhc2_isoform("H2Ab")
+        self.assertEqual("H-2-IAb", registry.get_netmhc2pan_representation(isoform))
+        self.assertEqual("H2_Aa_b__H2_Ab_b", registry.get_mixmhc2pred_isoform_representation(isoform))
+
+    def test_allele_not_in_database(self):
+        registry = AlleleRegistry.get_allele_registry(self.hla_parser)
+        allele = MhcAllele(gene="A", group="99", protein="99")
+        self.assertNotIn(("A", "99", "99"), registry.netmhcpan)
+        self.assertEqual(self.hla_parser.get_netmhcpan_representation(allele),
+                         registry.get_netmhcpan_representation(allele))
+        self.assertIn(("A", "99", "99"), registry.netmhcpan)
+
+    def test_concurrent_alleles_not_in_database(self):
+        registry = AlleleRegistry.get_allele_registry(self.hla_parser)
+        alleles = [MhcAllele(gene="A", group="99", protein="{:02d}".format(i)) for i in range(50)]
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            representations = list(executor.map(
+                registry.get_netmhcpan_representation, [a for _ in range(10) for a in alleles]))
+        self.assertEqual(
+            [self.hla_parser.get_netmhcpan_representation(a) for _ in range(10) for a in alleles], representations)
+        for allele in alleles:
+            self.assertIn(("A", "99", allele.protein), registry.netmhcpan)
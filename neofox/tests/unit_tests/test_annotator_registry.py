@@ -0,0 +1,67 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from unittest import TestCase
+
+from neofox.annotator.annotator_registry import AnnotatorRegistry
+from neofox.references.references import ORGANISM_MUS_MUSCULUS
+from neofox.tests.fake_classes import FakeReferenceFolder, FakeDependenciesConfiguration
+
+
+class FakeAnnotator:
+
+    instances = 0
+
+    def __init__(self, references, configuration, self_similarity, **kwargs):
+        FakeAnnotator.instances += 1
+
+
+class TestAnnotatorRegistry(TestCase):
+
+    def setUp(self):
+        AnnotatorRegistry.clear()
+        FakeAnnotator.instances = 0
+        self.references = FakeReferenceFolder()
+        self.configuration = FakeDependenciesConfiguration()
+
+    def tearDown(self):
+        AnnotatorRegistry.clear()
+
+    def test_annotator_is_reused(self):
+        annotator = AnnotatorRegistry._get_annotator(FakeAnnotator, self.references, self.configuration, None)
+        # equivalent reference folder and configuration objects, as received in every dask task
+        other_annotator = AnnotatorRegistry._get_annotator(
+            FakeAnnotator, FakeReferenceFolder(), FakeDependenciesConfiguration(), None)
+        self.assertIs(annotator, other_annotator)
+        self.assertEqual(1, FakeAnnotator.instances)
+
+    def test_different_parameters_build_different_annotators(self):
+        annotator = AnnotatorRegistry._get_annotator(
+            FakeAnnotator, self.references, self.configuration, None, rank_mhci_threshold=2.0)
+        other_annotator = AnnotatorRegistry._get_annotator(
+            FakeAnnotator, self.references, self.configuration, None, rank_mhci_threshold=1.0)
+        self.assertIsNot(annotator, other_annotator)
+        mouse_annotator = AnnotatorRegistry._get_annotator(
+            FakeAnnotator, FakeReferenceFolder(organism=ORGANISM_MUS_MUSCULUS), self.configuration, None,
+            rank_mhci_threshold=2.0)
+        self.assertIsNot(annotator, mouse_annotator)
+        self.configuration.net_mhc_pan = "another_netmhcpan"
+        another_configuration_annotator = AnnotatorRegistry._get_annotator(
+            FakeAnnotator, self.references, self.configuration, None, rank_mhci_threshold=2.0)
+        self.assertIsNot(annotator, another_configuration_annotator)
+        self.assertEqual(4, FakeAnnotator.instances)
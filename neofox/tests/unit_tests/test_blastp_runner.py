@@ -0,0 +1,138 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import json
+import tempfile
+from unittest import TestCase
+
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
+from neofox.helpers.blastp_runner import BlastpRunner
+from neofox.references.references import ALIGNMENT_ENGINE_IN_PROCESS
+from neofox.tests.fake_classes import FakeDependenciesConfiguration
+
+BLASTP_OUTPUT = json.dumps({"BlastOutput2": [{"report": {"results": {"search": {"hits": [
+    {"hsps": [{"qseq": "DYVVKHLV", "hseq": "DYVVKHLE"}]}
+]}}}}]})
+BLASTP_OUTPUT_MULTIPLE_QUERIES = json.dumps({"BlastOutput2": [
+    {"report": {"results": {"search": {"hits": [{"hsps": [{"qseq": "DYVVKHLV", "hseq": "DYVVKHLE"}]}]}}}},
+    {"report": {"results": {"search": {"hits": []}}}}
+]})
+
+
+class FakeRunner:
+
+    def __init__(self):
+        self.commands = []
+        self.output = BLASTP_OUTPUT
+
+    def run_command(self, cmd, print_log=True, **kwargs):
+        self.commands.append(cmd)
+        return self.output, ""
+
+
+class TestBlastpRunner(TestCase):
+
+    def setUp(self):
+        self.runner = FakeRunner()
+        self.configuration = FakeDependenciesConfiguration()
+        self.configuration.cache_folder = tempfile.mkdtemp()
+
+    def _get_blastp_runner(self):
+        return BlastpRunner(runner=self.runner, configuration=self.configuration, database="some_database")
+
+    def test_cached_wild_type_peptide(self):
+        self.assertEqual("DYVVKHLE", self._get_blastp_runner().get_most_similar_wt_epitope("DYVVKHLV"))
+        # another instance reads the peptide from the persistent cache
+        self.assertEqual("DYVVKHLE", self._get_blastp_runner().get_most_similar_wt_epitope("DYVVKHLV"))
+        self.assertEqual(1, len(self.runner.commands))
+
+    def test_cached_similarity(self):
+        similarity = self._get_blastp_runner().calculate_similarity_database("DYVVKHLV")
+        self.assertGreater(similarity, 0)
+        self.assertEqual(similarity, self._get_blastp_runner().calculate_similarity_database("DYVVKHLV"))
+        self.assertEqual(1, len(self.runner.commands))
+        # a different parameter is not shared
+        self.assertNotEqual(similarity, self._get_blastp_runner().calculate_similarity_database("DYVVKHLV", a=32))
+        self.assertEqual(2, len(self.runner.commands))
+
+    def test_no_cache(self):
+        self.configuration.cache_folder = None
+        blastp_runner = self._get_blastp_runner()
+        self.assertEqual(
+            blastp_runner.calculate_similarity_database("DYVVKHLV"),
+            blastp_runner.calculate_similarity_database("DYVVKHLV"))
+        self.assertEqual(1, len(self.runner.commands))
+        # another instance does not share the results
+        self._get_blastp_runner().calculate_similarity_database("DYVVKHLV")
+        self.assertEqual(2, len(self.runner.commands))
+
+    def test_multiple_peptides_single_call(self):
+        self.configuration.cache_folder = None
+        self.runner.output = BLASTP_OUTPUT_MULTIPLE_QUERIES
+        blastp_runner = self._get_blastp_runner()
+        wt_peptides = blastp_runner.get_most_similar_wt_epitopes(["DYVVKHLV", "AAAAAAAA", "DYVVKHLV"])
+        self.assertEqual(["DYVVKHLE", None, "DYVVKHLE"], wt_peptides)
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertIn("-query", self.runner.commands[0])
+        similarities = blastp_runner.calculate_similarity_database_multiple_peptides(["DYVVKHLV", "AAAAAAAA"])
+        self.assertGreater(similarities[0], 0)
+        self.assertEqual(0, similarities[1])
+        self.assertEqual(2, len(self.runner.commands))
+        # already searched peptides do not run BLASTP
+        self.assertEqual("DYVVKHLE", blastp_runner.get_most_similar_wt_epitope("DYVVKHLV"))
+        self.assertEqual(similarities[0], blastp_runner.calculate_similarity_database("DYVVKHLV"))
+        self.assertEqual(2, len(self.runner.commands))
+
+    def test_bounded_in_memory_cache(self):
+        self.configuration.cache_folder = None
+        self.runner.output = BLASTP_OUTPUT_MULTIPLE_QUERIES
+        blastp_runner = BlastpRunner(
+            runner=self.runner, configuration=self.configuration, database="some_database", cache_size=1)
+        # the results of a batch larger than the cache are still returned
+        self.assertEqual(
+            ["DYVVKHLE", None], blastp_runner.get_most_similar_wt_epitopes(["DYVVKHLV", "AAAAAAAA"]))
+        self.assertEqual(1, len(blastp_runner.cache_homologous_epitopes))
+        self.assertIsNone(blastp_runner.get_most_similar_wt_epitope("AAAAAAAA"))
+        self.assertEqual(1, len(self.runner.commands))
+        # the least recently used peptide was evicted
+        self.runner.output = BLASTP_OUTPUT
+        self.assertEqual("DYVVKHLE", blastp_runner.get_most_similar_wt_epitope("DYVVKHLV"))
+        self.assertEqual(2, len(self.runner.commands))
+
+    def test_in_process_wild_type_peptide(self):
+        self.configuration.alignment_engine = ALIGNMENT_ENGINE_IN_PROCESS
+        proteome_index = ProteomeIndex.build("MKTAYIAKQRDYVVKHLEQISFVKSHFSRQ\nMSSHEGGKKKALKQPKKQAKEMDEEEKAFKQKQKEE")
+        blastp_runner = BlastpRunner(
+            runner=self.runner, configuration=self.configuration, database="some_database",
+            database_index=proteome_index)
+        self.assertEqual("DYVVKHLE", blastp_runner.get_most_similar_wt_epitope("DYVVKHLV"))
+        self.assertEqual(0, len(self.runner.commands))
+        # the in-process results are not shared with BLASTP in the persistent cache
+        self.configuration.alignment_engine = "blastp"
+        self.assertEqual("DYVVKHLE", self._get_blastp_runner().get_most_similar_wt_epitope("DYVVKHLV"))
+        self.assertEqual(1, len(self.runner.commands))
+
+    def test_in_process_similarity(self):
+        self.configuration.alignment_engine = ALIGNMENT_ENGINE_IN_PROCESS
+        database_index = ProteomeIndex.build("MKTAYIAKQRDYVVKHLEQISFVKSHFSRQ\nMSSHEGGKKKALKQPKKQAKEMDEEEKAFKQKQKEE")
+        blastp_runner = BlastpRunner(
+            runner=self.runner, configuration=self.configuration, database="some_database",
+            database_index=database_index)
+        similarity = blastp_runner.calculate_similarity_database("DYVVKHLV")
+        self.assertGreater(similarity, 0)
+        self.assertEqual(0, len(self.runner.commands))
@@ -0,0 +1,115 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import threading
+from unittest import TestCase
+
+from dask.distributed import Client
+
+from neofox.helpers.dask_helper import split_in_chunks, submit_in_chunks
+
+
+def multiply(values, factor):
+    return [v * factor for v in values]
+
+
+all_chunks_submitted = threading.Event()
+running_chunks = []
+running_chunks_lock = threading.Lock()
+
+
+def multiply_after_other_chunks(values, factor):
+    # NOTE: the first chunk completes only once all other chunks are submitted
+    if values == [0]:
+        all_chunks_submitted.wait(timeout=10)
+    return multiply(values, factor)
+
+
+def multiply_counting_running_chunks(values, factor):
+    with running_chunks_lock:
+        running_chunks.append(values)
+        max_running = len(running_chunks)
+    threading.Event().wait(0.01)
+    with running_chunks_lock:
+        running_chunks.remove(values)
+    return multiply(values, factor), max_running
+
+
+class TestDaskHelper(TestCase):
+
+    def test_split_in_chunks_by_size(self):
+        self.assertEqual([[0, 1], [2, 3], [4]], split_in_chunks([0, 1, 2, 3, 4], chunk_size=2))
+        self.assertEqual([[0, 1, 2, 3, 4]], split_in_chunks([0, 1, 2, 3, 4], chunk_size=10))
+        self.assertEqual([], split_in_chunks([], chunk_size=2))
+
+    def test_split_in_chunks_by_number(self):
+        self.assertEqual([[0, 1, 2], [3, 4]], split_in_chunks([0, 1, 2, 3, 4], num_chunks=2))
+        self.assertEqual([[0], [1]], split_in_chunks([0, 1], num_chunks=4))
+        self.assertEqual([[0, 1, 2, 3, 4]], split_in_chunks([0, 1, 2, 3, 4]))
+
+    def test_submit_in_chunks_keeps_order(self):
+        client = Client(processes=False, n_workers=1, threads_per_worker=2, dashboard_address=None)
+        try:
+            chunks = [([i, i + 1],) for i in range(10)] + [([1, 2],)]
+            expected = [multiply(c[0], 3) for c in chunks]
+            self.assertEqual(expected, list(submit_in_chunks(client, multiply, chunks, 3, max_chunks_in_flight=2)))
+            self.assertEqual(expected, list(submit_in_chunks(client, multiply, chunks, 3)))
+            self.assertEqual([], list(submit_in_chunks(client, multiply, [], 3, max_chunks_in_flight=2)))
+        finally:
+            client.close()
+
+    def test_submit_in_chunks_does_not_wait_for_slow_chunk(self):
+        client = Client(processes=False, n_workers=1, threads_per_worker=2, dashboard_address=None)
+        consumed = []
+
+        def get_chunks():
+            for i in range(10):
+                consumed.append(i)
+                yield [i],
+            all_chunks_submitted.set()
+
+        try:
+            all_chunks_submitted.clear()
+            results = submit_in_chunks(client, multiply_after_other_chunks, get_chunks(), 2, max_chunks_in_flight=2)
+            self.assertEqual([0], next(results))
+            # the other chunks run on the second thread while the first chunk is still running
+            self.assertTrue(all_chunks_submitted.is_set())
+            self.assertEqual(10, len(consumed))
+            self.assertEqual([[2 * i] for i in range(1, 10)], list(results))
+        finally:
+            client.close()
+
+    def test_submit_in_chunks_bounds_running_chunks(self):
+        client = Client(processes=False, n_workers=1, threads_per_worker=4, dashboard_address=None)
+        consumed = []
+
+        def get_chunks():
+            for i in range(20):
+                consumed.append(i)
+                yield [i],
+
+        try:
+            results = submit_in_chunks(client, multiply_counting_running_chunks, get_chunks(), 2, max_chunks_in_flight=2)
+            first_result = next(results)
+            self.assertEqual([0], first_result[0])
+            self.assertLess(len(consumed), 20)
+            results = [first_result] + list(results)
+            self.assertEqual([[2 * i] for i in range(20)], [r for r, _ in results])
+            self.assertLessEqual(max(m for _, m in results), 2)
+        finally:
+            client.close()
@@ -19,7 +19,7 @@
 from unittest import TestCase
 
 from neofox.helpers.epitope_helper import EpitopeHelper
-from neofox.model.neoantigen import PredictedEpitope, Annotation
+from neofox.model.neoantigen import PredictedEpitope, Annotation, MhcAllele, Mhc2Isoform
 
 
 class EpitopeHelperTest(TestCase):
@@ -61,4 +61,41 @@ def test_get_annotation_by_name(self):
         except ValueError:
             self.assertTrue(True)
 
+    def test_pair_predictions(self):
+        predictions = [
+            PredictedEpitope(mutated_peptide="AAAAAAAAK", position=1, allele_mhc_i=MhcAllele(name="HLA-A*01:01")),
+            PredictedEpitope(mutated_peptide="AAAAAAAAK", position=1, allele_mhc_i=MhcAllele(name="HLA-A*02:01")),
+            PredictedEpitope(mutated_peptide="AAAAAAAAKA", position=1, allele_mhc_i=MhcAllele(name="HLA-A*01:01")),
+        ]
+        predictions_wt = [
+            PredictedEpitope(mutated_peptide="AAAAAAAAA", position=1, allele_mhc_i=MhcAllele(name="HLA-A*01:01"),
+                             rank_mutated=1.0, affinity_mutated=10.0),
+            PredictedEpitope(mutated_peptide="AAAAAAAAC", position=1, allele_mhc_i=MhcAllele(name="HLA-A*01:01"),
+                             rank_mutated=2.0, affinity_mutated=20.0),
+            PredictedEpitope(mutated_peptide="AAAAAAAAA", position=2, allele_mhc_i=MhcAllele(name="HLA-A*02:01"),
+                             rank_mutated=3.0, affinity_mutated=30.0),
+        ]
+        paired = EpitopeHelper.pair_predictions(predictions, predictions_wt)
+        # the first WT prediction with the same length, position and allele is paired
+        self.assertEqual("AAAAAAAAA", paired[0].wild_type_peptide)
+        self.assertEqual(1.0, paired[0].rank_wild_type)
+        self.assertEqual(10.0, paired[0].affinity_wild_type)
+        self.assertEqual("", paired[1].wild_type_peptide)
+        self.assertEqual("", paired[2].wild_type_peptide)
+
+    def test_pair_mhcii_predictions_multiple(self):
+        predictions = [
+            [PredictedEpitope(mutated_peptide="AAAAAAAAK", position=1, isoform_mhc_i_i=Mhc2Isoform(name="DRB1*01:01"))],
+            [PredictedEpitope(mutated_peptide="CAAAAAAAK", position=1, isoform_mhc_i_i=Mhc2Isoform(name="DRB1*01:01"))],
+            [PredictedEpitope(mutated_peptide="DAAAAAAAK", position=1, isoform_mhc_i_i=Mhc2Isoform(name="DRB1*01:01"))],
+        ]
+        predictions_wt = [
+            [PredictedEpitope(mutated_peptide="AAAAAAAAA", position=1, isoform_mhc_i_i=Mhc2Isoform(name="DRB1*01:01"))],
+            [PredictedEpitope(mutated_peptide="CAAAAAAAA", position=1, isoform_mhc_i_i=Mhc2Isoform(name="DRB1*01:01"))],
+            None
+        ]
+        paired = EpitopeHelper.pair_mhcii_predictions_multiple(predictions, predictions_wt)
+        # every neoantigen is paired only with its own WT predictions
+        self.assertEqual(["AAAAAAAAA", "CAAAAAAAA", ""], [p[0].wild_type_peptide for p in paired])
+
     # TODO: test ther methods in the EpitopeHelper
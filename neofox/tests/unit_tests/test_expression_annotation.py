@@ -17,9 +17,18 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
 
-from unittest import TestCase
+import os
+import random
+import shutil
+import tempfile
+from unittest import TestCase, skipUnless
 
-from neofox.expression_imputation.expression_imputation import ExpressionAnnotator
+import pysam
+
+from neofox.expression_imputation.expression_imputation import ExpressionAnnotator, EXPRESSION_FILE
+import neofox.expression_imputation.expression_imputation as expression_imputation
+
+REAL_EXPRESSION_FILE = os.path.join(os.path.dirname(expression_imputation.__file__), EXPRESSION_FILE)
 
 
 class TestExpressionAnnotator(TestCase):
@@ -73,3 +82,53 @@ def test_empty_cohort(self):
         )
         self.assertIsNone(result)
 
+
+class TestInMemoryExpressionAnnotator(TestCase):
+
+    def setUp(self) -> None:
+        self.folder = tempfile.mkdtemp()
+        expression_file = os.path.join(self.folder, "tcga_exp_summary_modified.tab")
+        with open(expression_file, "w") as fd:
+            fd.write("#Gene_Symbol\tTCGA_Cohort\tMedian_Exp\tExp_90p\tExp_10p\tStudy_Name\n")
+            fd.write("ATF2\t1\t1.5\t2.0\t1.0\tACC\n")
+            fd.write("ATF2\t22\t5.0347541234567891\t6.0\t4.0\tSARC\n")
+            fd.write("BRCA2\t22\tNA\t6.0\t4.0\tSARC\n")
+            fd.write("NBPF24\t12\t1234567.839773\t7.0\t6.0\tKIPAN\n")
+        self.expression_file = pysam.tabix_index(
+            expression_file, seq_col=0, start_col=1, end_col=1, meta_char="#", force=True)
+        self.tabix_annotator = ExpressionAnnotator(expression_file=self.expression_file)
+        self.in_memory_annotator = ExpressionAnnotator(expression_file=self.expression_file, in_memory=True)
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.folder)
+
+    def test_in_memory_matches_tabix(self):
+        genes = ["ATF2", "ATF2", "NBPF24", "BRCA2", "blabluplupp", "ATF2", "ATF2", "", None]
+        cohorts = ["SARC", "ACC", "KIPAN", "SARC", "SARC", "KIPAN", "blabluplupp", "SARC", "SARC"]
+        expected = [self.tabix_annotator.get_gene_expression_annotation(g, c) for g, c in zip(genes, cohorts)]
+        self.assertEqual([5.0347541234567891, 1.5, 1234567.839773, None, None, None, None, None, None], expected)
+        self.assertEqual(expected, self.in_memory_annotator.get_gene_expression_annotations(genes, cohorts))
+        self.assertEqual(
+            expected, [self.in_memory_annotator.get_gene_expression_annotation(g, c) for g, c in zip(genes, cohorts)])
+        # without in memory mode the batch queries the tabix index
+        self.assertEqual(expected, self.tabix_annotator.get_gene_expression_annotations(genes, cohorts))
+
+    def test_expression_matrix_is_shared(self):
+        self.assertIs(
+            self.in_memory_annotator.get_expression_matrix(),
+            ExpressionAnnotator(expression_file=self.expression_file, in_memory=True).get_expression_matrix())
+
+
+@skipUnless(os.path.exists(REAL_EXPRESSION_FILE), "the TCGA expression file is not available")
+class TestInMemoryExpressionAnnotatorRealFile(TestCase):
+
+    def test_in_memory_matches_tabix(self):
+        tabix_annotator = ExpressionAnnotator()
+        in_memory_annotator = ExpressionAnnotator(in_memory=True)
+        # NOTE: a sample of the genes in the file in every cohort, querying all genes with tabix is too slow
+        genes = random.Random(123).sample(sorted(tabix_annotator.expression.contigs), 500) + ["blabluplupp"]
+        cohorts = list(tabix_annotator.cohort_indices.keys())
+        genes, cohorts = zip(*[(g, c) for g in genes for c in cohorts])
+        expected = [tabix_annotator.get_gene_expression_annotation(g, c) for g, c in zip(genes, cohorts)]
+        self.assertTrue(any(e is not None for e in expected))
+        self.assertEqual(expected, in_memory_annotator.get_gene_expression_annotations(list(genes), list(cohorts)))
@@ -0,0 +1,71 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import random
+import tempfile
+from unittest import TestCase
+
+from Bio.Data.IUPACData import protein_letters
+
+from neofox.published_features.hex.pyhex import PyHex
+
+
+class TestPyHex(TestCase):
+
+    def setUp(self):
+        random.seed(123)
+        self.iedb_fasta = tempfile.NamedTemporaryFile(mode="w", delete=False, suffix=".fasta")
+        with self.iedb_fasta as f:
+            for i in range(200):
+                f.write(">seq{}\n{}\n".format(i, self._get_random_peptide(random.randint(8, 15))))
+            # a sequence with non standard aminoacids is excluded
+            f.write(">seq_rare\nAAAAXAAAA\n")
+        self.pyhex = PyHex(iedb_fasta=self.iedb_fasta.name)
+
+    def test_run_equals_alignment_of_all_sequences(self):
+        for _ in range(20):
+            peptide = self._get_random_peptide(random.randint(8, 15))
+            expected = max(self.pyhex._align(s.seq, peptide)
+                           for s in self.pyhex.iedb_sequences if len(s.seq) == len(peptide))
+            self.assertEqual(expected, PyHex(iedb_fasta=self.iedb_fasta.name).run(peptide))
+
+    def test_run_multiple(self):
+        peptides = [self._get_random_peptide(length) for length in [9, 9, 10, 15, 8]]
+        peptides.append(peptides[0])
+        scores = self.pyhex.run_multiple(peptides)
+        self.assertEqual(len(peptides), len(scores))
+        self.assertEqual(scores[0], scores[5])
+        for peptide, score in zip(peptides, scores):
+            self.assertIsInstance(score, float)
+            self.assertEqual(PyHex(iedb_fasta=self.iedb_fasta.name).run(peptide), score)
+
+    def test_identical_sequence(self):
+        sequence = str(self.pyhex.iedb_sequences[0].seq)
+        self.assertEqual(self.pyhex._align(sequence, sequence), self.pyhex.run(sequence))
+
+    def test_no_sequences_of_same_length(self):
+        self.assertIsNone(self.pyhex.run(self._get_random_peptide(25)))
+
+    def test_sequences_encoded_by_length(self):
+        self.assertEqual(200, sum(s.shape[0] for s in self.pyhex.iedb_sequences_by_length.values()))
+        for length, sequences in self.pyhex.iedb_sequences_by_length.items():
+            self.assertEqual(length, sequences.shape[1])
+
+    @staticmethod
+    def _get_random_peptide(length):
+        return "".join(random.choices(protein_letters, k=length))
@@ -0,0 +1,90 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import random
+from unittest import TestCase
+
+from Bio.Align import substitution_matrices
+
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
+from neofox.helpers.homology_search import HomologySearch
+
+AMINOACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+class TestHomologySearch(TestCase):
+
+    def setUp(self):
+        random.seed(123)
+        self.proteome = "\n".join(
+            "".join(random.choices(AMINOACIDS, k=random.randint(50, 300))) for _ in range(100))
+        self.homology_search = HomologySearch(ProteomeIndex.build(self.proteome))
+        self.blosum = substitution_matrices.load("BLOSUM62")
+
+    def test_exact_match(self):
+        peptide = self.proteome[100:109]
+        self.assertEqual(peptide, self.homology_search.get_most_similar_wt_epitope(peptide))
+
+    def test_best_scoring_window(self):
+        for _ in range(20):
+            peptide = self._get_mutated_peptide(length=random.randint(8, 15))
+            wt_peptide = self.homology_search.get_most_similar_wt_epitope(peptide)
+            self.assertEqual(len(peptide), len(wt_peptide))
+            self.assertIn(wt_peptide, self.proteome)
+            self.assertEqual(self._get_best_score(peptide), self._score(peptide, wt_peptide))
+
+    def test_multiple_peptides(self):
+        peptides = [self._get_mutated_peptide(length=9) for _ in range(5)]
+        wt_peptides = self.homology_search.get_most_similar_wt_epitopes(peptides + peptides[0:1])
+        self.assertEqual(set(peptides), set(wt_peptides.keys()))
+        for peptide in peptides:
+            self.assertEqual(self.homology_search.get_most_similar_wt_epitope(peptide), wt_peptides[peptide])
+
+    def test_windows_do_not_span_proteins(self):
+        homology_search = HomologySearch(ProteomeIndex.build("AAAAAAAAAA\nWWWWWWWWWW"))
+        self.assertEqual("AAAAAAAAA", homology_search.get_most_similar_wt_epitope("AAAAAAAWW"))
+        self.assertEqual("WWWWWWWWW", homology_search.get_most_similar_wt_epitope("AWWWWWWWW"))
+
+    def test_seeds_at_the_end_of_proteins(self):
+        # the only shared 3-mer is at the end of the first protein and does not start any 8-mer
+        homology_search = HomologySearch(ProteomeIndex.build("AAAAAAAAAACDE\nWWWWWWWWWW"))
+        self.assertEqual("AAAAAACDE", homology_search.get_most_similar_wt_epitope("GGGGGGCDE"))
+
+    def test_no_shared_seeds(self):
+        homology_search = HomologySearch(ProteomeIndex.build("AAAAAAAAAA\nWWWWWWWWWW"))
+        self.assertIsNone(homology_search.get_most_similar_wt_epitope("CDECDECDE"))
+        self.assertIsNone(homology_search.get_most_similar_wt_epitope("AA"))
+
+    def test_rare_aminoacids(self):
+        peptide = self.proteome[100:104] + "U" + self.proteome[105:109]
+        self.assertEqual(self.proteome[100:109], self.homology_search.get_most_similar_wt_epitope(peptide))
+
+    def _get_mutated_peptide(self, length):
+        while True:
+            start = random.randint(0, len(self.proteome) - length)
+            peptide = list(self.proteome[start:start + length])
+            if "\n" not in peptide:
+                peptide[random.randrange(length)] = random.choice(AMINOACIDS)
+                return "".join(peptide)
+
+    def _score(self, peptide, wt_peptide):
+        return sum(self.blosum[a, b] for a, b in zip(peptide, wt_peptide))
+
+    def _get_best_score(self, peptide):
+        windows = [self.proteome[i:i + len(peptide)] for i in range(len(self.proteome) - len(peptide) + 1)]
+        return max(self._score(peptide, w) for w in windows if "\n" not in w)
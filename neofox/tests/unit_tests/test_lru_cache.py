@@ -0,0 +1,51 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import pickle
+from unittest import TestCase
+
+from neofox.helpers.lru_cache import LruCache
+
+
+class TestLruCache(TestCase):
+
+    def test_least_recently_used_are_removed(self):
+        cache = LruCache(maxsize=2)
+        cache.update({"a": 1, "b": 2})
+        self.assertEqual(1, cache.get("a"))
+        cache["c"] = 3
+        self.assertEqual(2, len(cache))
+        self.assertIn("a", cache)
+        self.assertNotIn("b", cache)
+        self.assertIn("c", cache)
+
+    def test_none_values(self):
+        cache = LruCache(maxsize=2)
+        cache["a"] = None
+        self.assertIn("a", cache)
+        self.assertIsNone(cache.get("a", "default"))
+        self.assertEqual("default", cache.get("b", "default"))
+
+    def test_pickle_drops_entries(self):
+        cache = LruCache(maxsize=2)
+        cache["a"] = 1
+        unpickled_cache = pickle.loads(pickle.dumps(cache))
+        self.assertEqual(2, unpickled_cache.maxsize)
+        self.assertEqual(0, len(unpickled_cache))
+        unpickled_cache["b"] = 2
+        self.assertEqual(2, unpickled_cache.get("b"))
@@ -1,3 +1,4 @@
+import pickle
 import unittest
 
 from neofox.exceptions import NeofoxDataValidationException
@@ -148,3 +149,43 @@ def test_invalid_mhc_ii_alleles(self):
         self._assert_invalid_allele("HLA-0123456")
         # nonsense
         self._assert_invalid_allele("nonsense")
+
+    def test_parsed_alleles_are_cached(self):
+        mhc_parser = MhcParser.get_mhc_parser(self.mhc_parser.mhc_database)
+        self.assertIs(self.mhc_parser, mhc_parser)
+        misses = mhc_parser.get_cache_statistics()["alleles"]["misses"]
+        hits = mhc_parser.get_cache_statistics()["alleles"]["hits"]
+        allele = mhc_parser.parse_mhc_allele("HLA-A*02:07")
+        self.assertEqual(allele, mhc_parser.parse_mhc_allele("HLA-A*02:07"))
+        statistics = mhc_parser.get_cache_statistics()["alleles"]
+        self.assertEqual(misses + 1, statistics["misses"])
+        self.assertEqual(hits + 1, statistics["hits"])
+
+        isoform = mhc_parser.parse_mhc2_isoform("HLA-DQA1*01:01-DQB1*05:01")
+        self.assertEqual(isoform, mhc_parser.parse_mhc2_isoform("HLA-DQA1*01:01-DQB1*05:01"))
+        self.assertGreaterEqual(mhc_parser.get_cache_statistics()["isoforms"]["hits"], 1)
+
+    def test_cached_alleles_are_not_shared(self):
+        allele = self.mhc_parser.parse_mhc_allele("HLA-B*07:02")
+        allele.name = "modified"
+        self.assertIsNot(allele, self.mhc_parser.parse_mhc_allele("HLA-B*07:02"))
+        self.assertEqual("HLA-B*07:02", self.mhc_parser.parse_mhc_allele("HLA-B*07:02").name)
+
+        isoform = self.mhc_parser.parse_mhc2_isoform("HLA-DQA1*01:01-DQB1*05:01")
+        isoform.alpha_chain.name = "modified"
+        self.assertEqual(
+            "HLA-DQA1*01:01", self.mhc_parser.parse_mhc2_isoform("HLA-DQA1*01:01-DQB1*05:01").alpha_chain.name)
+
+        # the alpha chain of DR isoforms remains unset
+        dr_isoform = self.mhc_parser.parse_mhc2_isoform("HLA-DRB1*01:01")
+        self.assertEqual(self.mhc_parser._parse_mhc2_isoform("HLA-DRB1*01:01").to_dict(), dr_isoform.to_dict())
+        self.assertNotIn("alphaChain", self.mhc_parser.parse_mhc2_isoform("HLA-DRB1*01:01").to_dict())
+
+    def test_invalid_alleles_are_not_cached(self):
+        self._assert_invalid_allele("nonsense")
+        self._assert_invalid_allele("nonsense")
+
+    def test_parser_can_be_pickled(self):
+        mhc_parser = pickle.loads(pickle.dumps(self.mhc_parser))
+        self.assertEqual(0, mhc_parser.get_cache_statistics()["alleles"]["currsize"])
+        self.assertEqual("HLA-A*02:01", mhc_parser.parse_mhc_allele("HLA-A02:01").name)
@@ -159,6 +159,15 @@ def test_csv_neoantigens2model(self):
                 elif a.name == "external_annotation_2":
                     self.assertEqual(a.value, "blah2")
 
+    def test_csv_neoantigens2model_in_chunks(self):
+        neoantigens_file = pkg_resources.resource_filename(
+            neofox.tests.__name__, "resources/test_data_model.txt"
+        )
+        neoantigens = ModelConverter.parse_candidate_file(neoantigens_file)
+        chunks = list(ModelConverter.parse_candidate_file_chunks(neoantigens_file, chunk_size=2))
+        self.assertEqual([2, 2, 1], [len(c) for c in chunks])
+        self.assertEqual(neoantigens, [n for c in chunks for n in c])
+
     def test_json_neoantigens2model(self):
         neoantigens_file = pkg_resources.resource_filename(
             neofox.tests.__name__, "resources/test_data_json.json"
@@ -0,0 +1,222 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import random
+import timeit
+from typing import List
+from unittest import TestCase
+import numpy as np
+import pandas as pd
+from logzero import logger
+from neofox import MHC_I, MHC_II, NOT_AVAILABLE_VALUE
+from neofox.model.conversion import ModelConverter
+from neofox.model.neoantigen import Neoantigen, PredictedEpitope, Annotation, Annotations, MhcAllele, Mhc2Isoform
+from neofox.tests.tools import get_random_neoantigen
+
+
+def legacy_annotations2neoantigens_table(neoantigens: List[Neoantigen]) -> pd.DataFrame:
+    """the implementation building one data frame per neoantigen, kept as a reference"""
+    dfs = []
+    neoantigens_df = ModelConverter._neoantigens2table(neoantigens)
+    neoantigens_df.replace({None: NOT_AVAILABLE_VALUE}, inplace=True)
+    neoantigens_df = neoantigens_df.loc[:,
+                     ["patientIdentifier", "gene", "mutatedXmer", "wildTypeXmer", "position",
+                      "dnaVariantAlleleFrequency", "rnaVariantAlleleFrequency", "rnaExpression",
+                      "imputedGeneExpression"]]
+    for n in neoantigens:
+        annotations = [a.to_dict() for a in n.neofox_annotations.annotations]
+        annotations.extend([a.to_dict() for a in n.external_annotations])
+        dfs.append(pd.DataFrame(annotations).set_index("name").transpose())
+    neofox_annotations_df = pd.concat(dfs, sort=True).reset_index()
+    del neofox_annotations_df["index"]
+    df = pd.concat([neoantigens_df, neofox_annotations_df], axis=1)
+    df.replace('None', NOT_AVAILABLE_VALUE, inplace=True)
+    return df
+
+
+def legacy_annotations2epitopes_table(neoantigens: List[Neoantigen], mhc: str) -> pd.DataFrame:
+    """the implementation building one data frame per neoantigen and per epitope, kept as a reference"""
+    epitopes_dfs = []
+    for n in neoantigens:
+        epitopes = n.neoepitopes_mhc_i if mhc == MHC_I else n.neoepitopes_mhc_i_i
+        epitopes_temp_df = ModelConverter._objects2dataframe(epitopes)
+        epitopes_temp_df['patientIdentifier'] = n.patient_identifier
+        epitopes_temp_df['gene'] = n.gene
+        epitopes_temp_df['rnaExpression'] = n.rna_expression
+        epitopes_temp_df['imputedGeneExpression'] = n.imputed_gene_expression
+        epitopes_temp_df['dnaVariantAlleleFrequency'] = n.dna_variant_allele_frequency
+        epitopes_temp_df['rnaVariantAlleleFrequency'] = n.rna_variant_allele_frequency
+        epitopes_temp_df['mutatedXmer'] = n.mutated_xmer
+        if mhc == MHC_I:
+            epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='isoformMhcII.*')), axis=1, inplace=True)
+            epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='coreMhcII.*')), axis=1, inplace=True)
+        else:
+            epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='alleleMhcI.*')), axis=1, inplace=True)
+        epitopes_temp_df.drop(list(epitopes_temp_df.filter(regex='neofoxAnnotations.*')), axis=1, inplace=True)
+        annotations_dfs = []
+        for e in epitopes:
+            annotations = [a.to_dict() for a in e.neofox_annotations.annotations]
+            annotations.extend([a.to_dict() for a in n.external_annotations])
+            annotations_dfs.append(pd.DataFrame(annotations).set_index("name").transpose())
+        if len(annotations_dfs) > 0:
+            annotations_df = pd.concat(annotations_dfs, sort=True).reset_index()
+            del annotations_df["index"]
+            epitopes_temp_df = pd.concat([epitopes_temp_df, annotations_df], axis=1)
+        epitopes_temp_df.replace({None: NOT_AVAILABLE_VALUE}, inplace=True)
+        epitopes_dfs.append(epitopes_temp_df)
+    epitopes_df = pd.concat(epitopes_dfs)
+    if 'externalAnnotations' in epitopes_df.columns:
+        epitopes_df.drop(["externalAnnotations"], axis=1, inplace=True)
+    epitopes_df.replace('None', NOT_AVAILABLE_VALUE, inplace=True)
+    return epitopes_df
+
+
+def legacy_annotated_neoepitopes2epitopes_table(neoepitopes: List[PredictedEpitope], mhc: str) -> pd.DataFrame:
+    """the implementation building one data frame per epitope, kept as a reference"""
+    epitopes_df = ModelConverter._objects2dataframe(neoepitopes)
+    if mhc == MHC_I:
+        epitopes_df.drop(list(epitopes_df.filter(regex='isoformMhcII.*')), axis=1, inplace=True)
+        epitopes_df.drop(list(epitopes_df.filter(regex='coreMhcII.*')), axis=1, inplace=True)
+    else:
+        epitopes_df.drop(list(epitopes_df.filter(regex='alleleMhcI.*')), axis=1, inplace=True)
+    epitopes_df.drop(list(epitopes_df.filter(regex='neofoxAnnotations.*')), axis=1, inplace=True)
+    epitopes_df.drop(["position"], axis=1, inplace=True)
+    annotations_dfs = []
+    for e in neoepitopes:
+        annotations = [a.to_dict() for a in e.neofox_annotations.annotations]
+        annotations.extend([a.to_dict() for a in e.external_annotations])
+        annotations_dfs.append(pd.DataFrame(annotations).set_index("name").transpose())
+    if len(annotations_dfs) > 0:
+        annotations_df = pd.concat(annotations_dfs, sort=True).reset_index()
+        del annotations_df["index"]
+        epitopes_df = pd.concat([epitopes_df, annotations_df], axis=1)
+    epitopes_df.drop(["externalAnnotations"], axis=1, inplace=True)
+    epitopes_df.replace({None: NOT_AVAILABLE_VALUE}, inplace=True)
+    return epitopes_df
+
+
+ANNOTATION_NAMES = ["Selfsimilarity", "DAI", "amplitude", "PRIME_score", "hex_alignment_score", "IEDB_Immunogenicity"]
+
+
+def get_random_annotations(names=ANNOTATION_NAMES) -> List[Annotation]:
+    # some annotations are missing, empty or None
+    return [
+        Annotation(name=name, value=random.choice([str(random.random()), "None", ""]))
+        for name in names if random.random() > 0.2
+    ]
+
+
+def get_random_epitope(mhc: str) -> PredictedEpitope:
+    epitope = PredictedEpitope(
+        mutated_peptide="".join(random.choices("ACDEFGHIKLMNPQRSTVWY", k=9)),
+        wild_type_peptide="".join(random.choices("ACDEFGHIKLMNPQRSTVWY", k=9)),
+        position=random.randint(0, 8),
+        affinity_mutated=random.uniform(0, 5000),
+        rank_mutated=random.uniform(0, 2),
+        affinity_wild_type=random.uniform(0, 5000),
+        rank_wild_type=random.uniform(0, 2),
+        neofox_annotations=Annotations(annotations=get_random_annotations())
+    )
+    if mhc == MHC_I:
+        epitope.allele_mhc_i = MhcAllele(name="HLA-A*01:01", gene="A", group="01", protein="01")
+    else:
+        epitope.isoform_mhc_i_i = Mhc2Isoform(name="HLA-DRB1*01:01")
+        epitope.core = epitope.mutated_peptide[0:9]
+    return epitope
+
+
+def get_random_annotated_neoantigen(with_epitopes=True) -> Neoantigen:
+    neoantigen = get_random_neoantigen()
+    if random.random() > 0.8:
+        neoantigen.gene = None
+    if random.random() > 0.8:
+        neoantigen.rna_expression = None
+    neoantigen.neofox_annotations = Annotations(annotations=get_random_annotations() + [
+        Annotation(name="Priority_score", value=str(random.random()))])
+    neoantigen.external_annotations = [Annotation(name="external_annotation", value="blah")]
+    if with_epitopes:
+        neoantigen.neoepitopes_mhc_i = [get_random_epitope(MHC_I) for _ in range(random.randint(0, 4))]
+        neoantigen.neoepitopes_mhc_i_i = [get_random_epitope(MHC_II) for _ in range(random.randint(0, 4))]
+    return neoantigen
+
+
+class ModelConverterTablesTest(TestCase):
+
+    def setUp(self) -> None:
+        random.seed(123)
+        np.random.seed(123)
+        # the first neoantigen has no epitopes, this sets the order of the columns in the epitopes tables
+        self.neoantigens = [get_random_annotated_neoantigen(with_epitopes=False)] + \
+                           [get_random_annotated_neoantigen() for _ in range(50)]
+
+    def test_neoantigens_table(self):
+        self._assert_tables_equal(
+            legacy_annotations2neoantigens_table(self.neoantigens),
+            ModelConverter.annotations2neoantigens_table(self.neoantigens))
+
+    def test_epitopes_tables(self):
+        for mhc in [MHC_I, MHC_II]:
+            self._assert_tables_equal(
+                legacy_annotations2epitopes_table(self.neoantigens, mhc=mhc),
+                ModelConverter.annotations2epitopes_table(self.neoantigens, mhc=mhc))
+
+    def test_epitopes_tables_starting_with_epitopes(self):
+        neoantigens = self.neoantigens[1:] + self.neoantigens[0:1]
+        for mhc in [MHC_I, MHC_II]:
+            self._assert_tables_equal(
+                legacy_annotations2epitopes_table(neoantigens, mhc=mhc),
+                ModelConverter.annotations2epitopes_table(neoantigens, mhc=mhc))
+
+    def test_epitopes_tables_without_epitopes(self):
+        neoantigens = [get_random_annotated_neoantigen(with_epitopes=False) for _ in range(3)]
+        for mhc in [MHC_I, MHC_II]:
+            self._assert_tables_equal(
+                legacy_annotations2epitopes_table(neoantigens, mhc=mhc),
+                ModelConverter.annotations2epitopes_table(neoantigens, mhc=mhc))
+
+    def test_annotated_neoepitopes_tables(self):
+        for mhc in [MHC_I, MHC_II]:
+            neoepitopes = [get_random_epitope(mhc) for _ in range(50)]
+            for e in neoepitopes:
+                e.external_annotations = get_random_annotations(names=["external_1", "external_2"])
+            self._assert_tables_equal(
+                legacy_annotated_neoepitopes2epitopes_table(neoepitopes, mhc=mhc),
+                ModelConverter.annotated_neoepitopes2epitopes_table(neoepitopes, mhc=mhc))
+
+    def test_benchmark_tables(self):
+        neoantigens = [get_random_annotated_neoantigen() for _ in range(200)]
+
+        def legacy_tables():
+            legacy_annotations2neoantigens_table(neoantigens)
+            legacy_annotations2epitopes_table(neoantigens, mhc=MHC_I)
+            legacy_annotations2epitopes_table(neoantigens, mhc=MHC_II)
+
+        def tables():
+            ModelConverter.annotations2neoantigens_table(neoantigens)
+            ModelConverter.annotations2epitopes_table(neoantigens, mhc=MHC_I)
+            ModelConverter.annotations2epitopes_table(neoantigens, mhc=MHC_II)
+
+        legacy_time = timeit.timeit(legacy_tables, number=1)
+        time = timeit.timeit(tables, number=1)
+        logger.info("Time per neoantigen of the output tables: {} (one data frame per row: {})".format(
+            time / len(neoantigens), legacy_time / len(neoantigens)))
+
+    def _assert_tables_equal(self, expected: pd.DataFrame, actual: pd.DataFrame):
+        self.assertEqual(expected.columns.to_list(), actual.columns.to_list())
+        self.assertEqual(expected.index.to_list(), actual.index.to_list())
+        self.assertEqual(expected.to_csv(sep="\t", index=False), actual.to_csv(sep="\t", index=False))
@@ -0,0 +1,124 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import threading
+from unittest import TestCase
+
+from neofox.annotator.neoantigen_mhc_binding_annotator import NeoantigenMhcBindingAnnotator, \
+    MAX_CONCURRENT_PREDICTORS
+from neofox.model.neoantigen import Neoantigen, Patient, Mhc1, Mhc1Name
+from neofox.references.references import ORGANISM_HOMO_SAPIENS
+
+
+class TestNeoantigenMhcBindingAnnotator(TestCase):
+
+    def _get_annotator(self, max_concurrent_predictors) -> NeoantigenMhcBindingAnnotator:
+        # NOTE: avoids loading references, running the predictors does not need them
+        annotator = NeoantigenMhcBindingAnnotator.__new__(NeoantigenMhcBindingAnnotator)
+        annotator.max_concurrent_predictors = max_concurrent_predictors
+        annotator.concurrent_predictors = threading.Semaphore(max_concurrent_predictors)
+        return annotator
+
+    @staticmethod
+    def _get_predictor(value, threads, barrier: threading.Barrier = None):
+        def predictor():
+            threads.add(threading.current_thread().name)
+            if barrier is not None:
+                # NOTE: only passes if all predictors are running at the same time
+                barrier.wait()
+            return value
+        return predictor
+
+    def test_sequential_predictors(self):
+        threads = set()
+        results = self._get_annotator(1)._run_predictors([self._get_predictor(i, threads) for i in range(3)])
+        self.assertEqual([0, 1, 2], results)
+        self.assertEqual({threading.current_thread().name}, threads)
+
+    def test_concurrent_predictors(self):
+        threads = set()
+        barrier = threading.Barrier(3, timeout=10)
+        results = self._get_annotator(3)._run_predictors(
+            [self._get_predictor(i, threads, barrier) for i in range(3)])
+        self.assertFalse(barrier.broken)
+        self.assertEqual([0, 1, 2], results)
+        self.assertEqual(3, len(threads))
+
+    def test_executor_is_shared(self):
+        executor = NeoantigenMhcBindingAnnotator._get_executor()
+        self.assertIs(executor, NeoantigenMhcBindingAnnotator._get_executor())
+        self.assertEqual(MAX_CONCURRENT_PREDICTORS, executor._max_workers)
+        # annotators with different limits use the same pool
+        self._get_annotator(2)._run_predictors([self._get_predictor(i, set()) for i in range(2)])
+        self._get_annotator(4)._run_predictors([self._get_predictor(i, set()) for i in range(4)])
+        self.assertIs(executor, NeoantigenMhcBindingAnnotator._get_executor())
+
+    def test_concurrent_predictors_are_bounded(self):
+        running = []
+        max_running = []
+        lock = threading.Lock()
+
+        def get_predictor(value):
+            def predictor():
+                with lock:
+                    running.append(value)
+                    max_running.append(len(running))
+                threading.Event().wait(0.05)
+                with lock:
+                    running.remove(value)
+                return value
+            return predictor
+
+        results = self._get_annotator(2)._run_predictors([get_predictor(i) for i in range(5)])
+        self.assertEqual([0, 1, 2, 3, 4], results)
+        self.assertEqual(2, max(max_running))
+
+    def test_concurrent_predictors_errors_are_raised(self):
+        def failing_predictor():
+            raise ValueError("failed")
+        with self.assertRaises(ValueError):
+            self._get_annotator(2)._run_predictors([self._get_predictor(0, set()), failing_predictor])
+
+    def test_predictors_are_reused_and_return_their_results(self):
+        class FakePredictor:
+            def __init__(self):
+                self.neoantigens = []
+
+            def run(self, neoantigen, mhc, uniprot):
+                self.neoantigens.append(neoantigen)
+                return None if neoantigen.mutated_xmer == "AAA" else [neoantigen.mutated_xmer]
+
+        annotator = self._get_annotator(2)
+        annotator.organism = ORGANISM_HOMO_SAPIENS
+        annotator.uniprot = None
+        annotator.mixmhcpred = FakePredictor()
+        annotator.prime = FakePredictor()
+        annotator.mixmhc2pred = None
+        annotator.runner = annotator.configuration = annotator.available_alleles = annotator.mhc_parser = None
+        annotator.run_netmhcpan = lambda *args: "netmhcpan"
+        patient = Patient(identifier="patient", mhc1=[Mhc1(name=Mhc1Name.A)])
+        for xmer in ["AAA", "CCC"]:
+            predictions = annotator.get_mhc_binding_annotations(
+                neoantigen=Neoantigen(mutated_xmer=xmer), patient=patient)
+            self.assertEqual({"netmhcpan", "mixmhcpred", "prime"}, set(predictions.keys()))
+            expected = None if xmer == "AAA" else [xmer]
+            self.assertEqual(expected, predictions["mixmhcpred"])
+            self.assertEqual(expected, predictions["prime"])
+            self.assertEqual("netmhcpan", predictions["netmhcpan"])
+        self.assertEqual(["AAA", "CCC"], [n.mutated_xmer for n in annotator.mixmhcpred.neoantigens])
+        self.assertEqual(["AAA", "CCC"], [n.mutated_xmer for n in annotator.prime.neoantigens])
@@ -0,0 +1,155 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from types import SimpleNamespace
+from unittest import TestCase
+
+from neofox.annotator.neoepitope_mhc_binding_annotator import NeoepitopeMhcBindingAnnotator
+from neofox.helpers.epitope_helper import EpitopeHelper
+from neofox.model.mhc_parser import MhcParser
+from neofox.model.neoantigen import PredictedEpitope, Annotations
+from neofox.references.allele_registry import AlleleRegistry
+from neofox.references.references import ORGANISM_HOMO_SAPIENS
+from neofox.tests.fake_classes import FakeHlaDatabase, FakeAvailableAlleles
+
+# affinity, rank, WT affinity, WT rank and annotations of every neoepitope in _get_neoepitopes() as annotated one by
+# one by the implementation preceding the batch annotation
+RECORDED_SINGLE_ANNOTATIONS = [
+    (9.0, 91.0, 9.0, 2.0,
+     {"MixMHCpred_score": "9", "MixMHCpred_rank": "91", "MixMHCpred_WT_score": "9", "MixMHCpred_WT_rank": "2",
+      "PRIME_score": "9", "PRIME_rank": "91", "PRIME_WT_score": "9", "PRIME_WT_rank": "2"}),
+    (9.0, 95.0, 9.0, 2.0,
+     {"MixMHCpred_score": "9", "MixMHCpred_rank": "95", "MixMHCpred_WT_score": "9", "MixMHCpred_WT_rank": "2",
+      "PRIME_score": "9", "PRIME_rank": "95", "PRIME_WT_score": "9", "PRIME_WT_rank": "2"}),
+    (9.0, 95.0, 9.0, 2.0,
+     {"MixMHCpred_score": "9", "MixMHCpred_rank": "95", "MixMHCpred_WT_score": "9", "MixMHCpred_WT_rank": "2",
+      "PRIME_score": "9", "PRIME_rank": "95", "PRIME_WT_score": "9", "PRIME_WT_rank": "2"}),
+    (0.0, 0.0, None, None,
+     {"MixMHCpred_score": "9", "MixMHCpred_rank": "11", "MixMHCpred_WT_score": "9", "MixMHCpred_WT_rank": "18",
+      "PRIME_score": "9", "PRIME_rank": "11", "PRIME_WT_score": "9", "PRIME_WT_rank": "18"}),
+    (16.0, 16.0, 16.0, 27.0,
+     {"MixMHC2pred_score": "16", "MixMHC2pred_rank": "16", "MixMHC2pred_WT_score": "16", "MixMHC2pred_WT_rank": "27"}),
+    (16.0, 50.0, 16.0, 57.0,
+     {"MixMHC2pred_score": "16", "MixMHC2pred_rank": "50", "MixMHC2pred_WT_score": "16", "MixMHC2pred_WT_rank": "57"}),
+]
+
+
+class FakePeptidePredictor:
+    """
+    Mimics a MHC binding predictor with scores that only depend on the peptide and records every call
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def _predict(self, peptides):
+        return {p: PredictedEpitope(mutated_peptide=p, affinity_mutated=float(len(p)), rank_mutated=float(sum(
+            map(ord, p)) % 100)) for p in peptides}
+
+    def run_peptides(self, peptides, allele):
+        self.calls.append((allele.name, peptides))
+        return self._predict(peptides)
+
+    def mhc_prediction_peptides_multiple(self, alleles, sequences):
+        self.calls.append((alleles, sequences))
+        return {(a, p): e for a in alleles for p, e in self._predict(sequences).items()}
+
+    def mhc2_prediction_peptides_multiple(self, mhc_alleles, sequences):
+        return self.mhc_prediction_peptides_multiple(mhc_alleles, sequences)
+
+
+class TestNeoepitopeMhcBindingAnnotator(TestCase):
+
+    def setUp(self):
+        # NOTE: avoids loading references, running the predictors does not need them
+        self.mhc_parser = MhcParser.get_mhc_parser(FakeHlaDatabase())
+        self.annotator = NeoepitopeMhcBindingAnnotator.__new__(NeoepitopeMhcBindingAnnotator)
+        self.annotator.configuration = SimpleNamespace(mix_mhc_pred="mixmhcpred", prime="prime", mix_mhc2_pred="mixmhc2pred")
+        self.annotator.organism = ORGANISM_HOMO_SAPIENS
+        self.annotator.mhc_parser = self.mhc_parser
+        self.annotator.allele_registry = AlleleRegistry.get_allele_registry(self.mhc_parser)
+        self.annotator.available_alleles = FakeAvailableAlleles(
+            available_mch_i=["HLA-A01:01", "HLA-B07:02"], available_mch_ii=["DRB1_0101"])
+        self.annotator.netmhcpan = FakePeptidePredictor()
+        self.annotator.netmhc2pan = FakePeptidePredictor()
+        self.annotator.mixmhcpred = FakePeptidePredictor()
+        self.annotator.prime = FakePeptidePredictor()
+        self.annotator.mixmhc2pred = FakePeptidePredictor()
+
+    def _get_neoepitope(self, mutated, wild_type, allele=None, isoform=None):
+        neoepitope = PredictedEpitope(
+            mutated_peptide=mutated, wild_type_peptide=wild_type, neofox_annotations=Annotations(annotations=[]))
+        if allele:
+            neoepitope.allele_mhc_i = self.mhc_parser.parse_mhc_allele(allele)
+        if isoform:
+            neoepitope.isoform_mhc_i_i = self.mhc_parser.parse_mhc2_isoform(isoform)
+        return neoepitope
+
+    def _get_neoepitopes(self):
+        return [
+            self._get_neoepitope("DILVIDQTR", "DILVTDQTR", allele="HLA-A*01:01"),
+            self._get_neoepitope("AAAAAKAAA", "AAAAARAAA", allele="HLA-B*07:02"),
+            self._get_neoepitope("DILVTDQTK", "DILVTDQTR", allele="HLA-A*01:01"),
+            self._get_neoepitope("CCCCCKCCC", "CCCCCRCCC", allele="HLA-C*07:02"),
+            self._get_neoepitope("DILVIDQTRDILVIDQ", "DILVTDQTRDILVIDQ", isoform="DRB1_0101"),
+            self._get_neoepitope("AAAAAKAAAAAAAAAA", "AAAAARAAAAAAAAAA", isoform="DRB1_0101"),
+        ]
+
+    def test_predictors_run_once_per_allele(self):
+        self.annotator.get_mhc_binding_annotations_multiple(self._get_neoepitopes())
+
+        # one call per available allele with the unique mutated and WT peptides
+        self.assertEqual(
+            [(["HLA-A01:01"], ["DILVIDQTR", "DILVTDQTR", "DILVTDQTK"]),
+             (["HLA-B07:02"], ["AAAAAKAAA", "AAAAARAAA"])],
+            self.annotator.netmhcpan.calls)
+        self.assertEqual(1, len(self.annotator.netmhc2pan.calls))
+        self.assertEqual(["DILVIDQTRDILVIDQ", "DILVTDQTRDILVIDQ", "AAAAAKAAAAAAAAAA", "AAAAARAAAAAAAAAA"],
+                         self.annotator.netmhc2pan.calls[0][1])
+        # MixMHCpred and PRIME handle the allele support themselves
+        self.assertEqual(3, len(self.annotator.mixmhcpred.calls))
+        self.assertEqual(3, len(self.annotator.prime.calls))
+        self.assertEqual(1, len(self.annotator.mixmhc2pred.calls))
+
+    def test_batch_annotations_match_single_annotations(self):
+        batch_annotated = self.annotator.get_mhc_binding_annotations_multiple(self._get_neoepitopes())
+        self.assertEqual(len(RECORDED_SINGLE_ANNOTATIONS), len(batch_annotated))
+        for recorded, neoepitope in zip(RECORDED_SINGLE_ANNOTATIONS, batch_annotated):
+            self.assertEqual(recorded, (
+                neoepitope.affinity_mutated, neoepitope.rank_mutated, neoepitope.affinity_wild_type,
+                neoepitope.rank_wild_type, {a.name: a.value for a in neoepitope.neofox_annotations.annotations}))
+
+    def test_scores_are_distributed_to_every_neoepitope(self):
+        neoepitopes = self.annotator.get_mhc_binding_annotations_multiple(self._get_neoepitopes())
+        for neoepitope in neoepitopes[0:3] + neoepitopes[4:]:
+            self.assertEqual(float(len(neoepitope.mutated_peptide)), neoepitope.affinity_mutated)
+            self.assertEqual(float(sum(map(ord, neoepitope.wild_type_peptide)) % 100), neoepitope.rank_wild_type)
+        # the allele not available in netMHCpan has no netMHCpan scores
+        self.assertIsNone(neoepitopes[3].affinity_wild_type)
+        for neoepitope in neoepitopes[0:4]:
+            self.assertIsNotNone(EpitopeHelper.get_annotation_by_name(
+                neoepitope.neofox_annotations.annotations, "MixMHCpred_WT_rank"))
+            self.assertIsNotNone(EpitopeHelper.get_annotation_by_name(
+                neoepitope.neofox_annotations.annotations, "PRIME_score"))
+        for neoepitope in neoepitopes[4:]:
+            self.assertIsNotNone(EpitopeHelper.get_annotation_by_name(
+                neoepitope.neofox_annotations.annotations, "MixMHC2pred_WT_rank"))
+
+    def test_neoepitope_without_mhc(self):
+        with self.assertRaises(ValueError):
+            self.annotator.get_mhc_binding_annotations_multiple([self._get_neoepitope("DILVIDQTR", "DILVTDQTR")])
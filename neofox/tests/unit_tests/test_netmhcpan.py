@@ -0,0 +1,370 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import tempfile
+from unittest import TestCase
+
+from neofox.MHC_predictors.netmhcpan.netmhcIIpan_prediction import NetMhcIIPanPredictor
+from neofox.MHC_predictors.netmhcpan.netmhcpan_prediction import NetMhcPanPredictor
+from neofox.MHC_predictors.netmhcpan.combine_netmhcpan_pred_multiple_binders import BestAndMultipleBinder
+from neofox.model.factories import MhcFactory
+from neofox.model.mhc_parser import MhcParser
+from neofox.model.neoantigen import Neoantigen, PredictedEpitope
+from neofox.references.references import NETMHCPAN_MODE_SEQUENCE, NETMHCPAN_MODE_PEPTIDE
+from neofox.tests.fake_classes import FakeHlaDatabase, FakeDependenciesConfiguration, FakeUniprot
+
+NETMHCPAN_OUTPUT = """
+# NetMHCpan version 4.1b
+
+HLA-A02:01 : Distance to training data  0.000 (using nearest neighbor HLA-A02:01)
+---------------------------------------------------------------------------------------------------------------------------
+ Pos         MHC        Peptide      Core Of Gp Gl Ip Il        Icore        Identity  Score_EL %Rank_EL Score_BA %Rank_BA  Aff(nM) BindLevel
+---------------------------------------------------------------------------------------------------------------------------
+   1 HLA-A*02:01      NLVPMVATV NLVPMVATV  0  0  0  0  0    NLVPMVATV            seq1 0.9120020    0.034 0.753221    0.052    21.49 <= SB
+   2 HLA-A*02:01      LVPMVATVQ LVPMVATVQ  0  0  0  0  0    LVPMVATVQ            seq1 0.0012340    8.000 0.034526   20.123 12345.67
+   1 HLA-A*02:01      NLVPMVATA NLVPMVATA  0  0  0  0  0    NLVPMVATA            seq2 0.5120020    0.834 0.553221    1.052   121.49 <= WB
+---------------------------------------------------------------------------------------------------------------------------
+
+Protein seq1. Allele HLA-A*02:01. Number of high binders 1. Number of weak binders 0. Number of peptides 2
+"""
+
+
+class FakeRunner:
+
+    def __init__(self, output):
+        self.output = output
+        self.commands = []
+
+    def run_command(self, cmd, print_log=True, **kwargs):
+        self.commands.append(cmd)
+        return self.output, ""
+
+
+class FakeNetMhcPanRunner:
+    """
+    Mimics netMHCpan over FASTA or peptide input with scores that only depend on the peptide and the allele
+    """
+
+    def __init__(self):
+        self.commands = []
+        self.peptides = []
+
+    def run_command(self, cmd, print_log=True, **kwargs):
+        self.commands.append(cmd)
+        alleles = cmd[cmd.index("-a") + 1].split(",")
+        if "-p" in cmd:
+            with open(cmd[cmd.index("-p") + 1]) as f:
+                peptides = [("PEPLIST", 0, p) for p in f.read().split()]
+        else:
+            with open(cmd[cmd.index("-f") + 1]) as f:
+                sequences = [s for s in f.read().split(">") if s]
+            lengths = [int(length) for length in cmd[-1].replace("-l ", "").split(",")]
+            peptides = []
+            for record in sequences:
+                identity, sequence = record.split("\n")[0], "".join(record.split("\n")[1:])
+                peptides.extend((identity, start, sequence[start:start + length])
+                                for length in lengths for start in range(len(sequence) - length + 1))
+        self.peptides.extend(p for _, _, p in peptides)
+        lines = []
+        for allele in alleles:
+            for identity, start, peptide in peptides:
+                score = sum(ord(aa) * (i + 1) for i, aa in enumerate(peptide + allele)) % 1000
+                lines.append("{} {} {} {} 0 0 0 0 0 {} {} 0.1 {} 0.1 1.0 {}".format(
+                    start + 1, allele.replace("HLA-A", "HLA-A*"), peptide, peptide, peptide, identity,
+                    score / 100, score * 10.0))
+        return "\n".join(lines), ""
+
+
+class TestNetMhcPanPredictor(TestCase):
+
+    def setUp(self):
+        self.runner = FakeRunner(NETMHCPAN_OUTPUT)
+        self.netmhcpan = NetMhcPanPredictor(
+            runner=self.runner, configuration=FakeDependenciesConfiguration(), blastp_runner=None,
+            mhc_parser=MhcParser.get_mhc_parser(FakeHlaDatabase()))
+
+    def test_parse_output_by_sequence(self):
+        predictions = self.netmhcpan._parse_netmhcpan_output_by_sequence(NETMHCPAN_OUTPUT)
+        self.assertEqual(["seq1", "seq2"], list(predictions.keys()))
+        self.assertEqual(["NLVPMVATV", "LVPMVATVQ"], [p.mutated_peptide for p in predictions["seq1"]])
+        self.assertEqual(["NLVPMVATA"], [p.mutated_peptide for p in predictions["seq2"]])
+        self.assertEqual(121.49, predictions["seq2"][0].affinity_mutated)
+        self.assertEqual(0.834, predictions["seq2"][0].rank_mutated)
+        self.assertEqual("HLA-A*02:01", predictions["seq2"][0].allele_mhc_i.name)
+        # the same epitopes are returned when ignoring the sequence identifiers
+        self.assertEqual(
+            predictions["seq1"] + predictions["seq2"], self.netmhcpan._parse_netmhcpan_output(NETMHCPAN_OUTPUT))
+
+    def test_multiple_sequences_single_call(self):
+        predictions = self.netmhcpan.mhc_prediction_multiple_sequences(
+            available_alleles="HLA-A02:01", sequences=["NLVPMVATVQ", "NLVPMVATA", "NLVPMVATVQ", "NLVP"])
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertEqual(4, len(predictions))
+        self.assertEqual(["NLVPMVATV", "LVPMVATVQ"], [p.mutated_peptide for p in predictions[0]])
+        self.assertEqual(["NLVPMVATA"], [p.mutated_peptide for p in predictions[1]])
+        # repeated sequences get equal but independent predictions
+        self.assertEqual(predictions[0], predictions[2])
+        self.assertIsNot(predictions[0][0], predictions[2][0])
+        # sequences without predictions get an empty list
+        self.assertEqual([], predictions[3])
+
+    def test_multiple_sequences_no_sequences(self):
+        self.assertEqual([], self.netmhcpan.mhc_prediction_multiple_sequences(
+            available_alleles="HLA-A02:01", sequences=[]))
+        self.assertEqual(0, len(self.runner.commands))
+
+    def test_predictions_multiple_neoantigens(self):
+        neoantigens = [
+            Neoantigen(mutated_xmer="NLVPMVATVQ", wild_type_xmer="NLVPMVATA"),
+            Neoantigen(mutated_xmer="NLVPMVATVQ"),
+        ]
+        predictions = self.netmhcpan.get_predictions_multiple_neoantigens(
+            available_alleles="HLA-A02:01", neoantigens=neoantigens)
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertEqual(2, len(predictions))
+        mutated, wild_type = predictions[0]
+        self.assertEqual(["NLVPMVATV", "LVPMVATVQ"], [p.mutated_peptide for p in mutated])
+        self.assertEqual(["NLVPMVATA"], [p.mutated_peptide for p in wild_type])
+        mutated, wild_type = predictions[1]
+        self.assertEqual(["NLVPMVATV", "LVPMVATVQ"], [p.mutated_peptide for p in mutated])
+        self.assertIsNone(wild_type)
+
+    def test_paired_predictions_multiple_neoantigens(self):
+        neoantigens = [
+            Neoantigen(mutated_xmer="NLVPMVATVQ", wild_type_xmer="NLVPMVATAQ", position=[9]),
+            Neoantigen(mutated_xmer="NLVPMVATVQ", wild_type_xmer="NLVPMVATAQ", position=[2]),
+        ]
+        best_multiple = BestAndMultipleBinder(
+            runner=self.runner, configuration=FakeDependenciesConfiguration(), blastp_runner=None,
+            mhc_parser=MhcParser.get_mhc_parser(FakeHlaDatabase()))
+        predictions = self.netmhcpan.get_prediction_tables_multiple_neoantigens(
+            available_alleles="HLA-A02:01", neoantigens=neoantigens)
+        paired = best_multiple.get_paired_predictions_multiple_neoantigens(
+            neoantigens, predictions, FakeUniprot(peptides={"LVPMVATVQ"}))
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertEqual(["NLVPMVATV"], paired[0].peptide.tolist())
+        self.assertEqual(["NLVPMVATA"], paired[0].wild_type_peptide.tolist())
+        # the second neoantigen has its mutation in the peptide present in the proteome
+        self.assertEqual(["NLVPMVATV"], paired[1].peptide.tolist())
+
+        mhc1_alleles = MhcFactory.build_mhc1_alleles(["HLA-A*02:01"], FakeHlaDatabase())
+        best_multiple.run(neoantigens[0], mhc1_alleles, {"HLA-A02:01"}, FakeUniprot(peptides={"LVPMVATVQ"}),
+                          paired_predictions=paired[0])
+        self.assertEqual("NLVPMVATV", best_multiple.best_epitope_by_rank.mutated_peptide)
+        self.assertEqual("NLVPMVATA", best_multiple.best_epitope_by_rank.wild_type_peptide)
+        self.assertEqual(121.49, best_multiple.best_epitope_by_rank.affinity_wild_type)
+
+    def test_peptide_mode(self):
+        neoantigens = [
+            Neoantigen(mutated_xmer="DEVLGEPSQDILVTDQTRLEATISPET", wild_type_xmer="DEVLGEPSQDILVIDQTRLEATISPET",
+                       position=[14]),
+            Neoantigen(mutated_xmer="DEVLGEPSQDILVTDQTRLEA"),
+        ]
+        uniprot = FakeUniprot(peptides={"QDILVTDQT", "DEVLGEPSQ"})
+        mhc1_alleles = MhcFactory.build_mhc1_alleles(["HLA-A*02:01", "HLA-A*01:01"], FakeHlaDatabase())
+        available_alleles = {"HLA-A02:01", "HLA-A01:01"}
+        results = {}
+        for name, mode, cache_folder in [
+                (NETMHCPAN_MODE_SEQUENCE, NETMHCPAN_MODE_SEQUENCE, None),
+                (NETMHCPAN_MODE_PEPTIDE, NETMHCPAN_MODE_PEPTIDE, None),
+                ("cached_sequence", NETMHCPAN_MODE_SEQUENCE, tempfile.mkdtemp()),
+                ("cached_peptide", NETMHCPAN_MODE_PEPTIDE, tempfile.mkdtemp())]:
+            configuration = FakeDependenciesConfiguration()
+            configuration.netmhcpan_mode = mode
+            configuration.cache_folder = cache_folder
+            runner = FakeNetMhcPanRunner()
+            best_multiple = BestAndMultipleBinder(
+                runner=runner, configuration=configuration, blastp_runner=None,
+                mhc_parser=MhcParser.get_mhc_parser(FakeHlaDatabase()))
+            predictions = best_multiple.get_predictions_multiple_neoantigens(
+                neoantigens, mhc1_alleles, available_alleles, uniprot)
+            paired = best_multiple.get_paired_predictions_multiple_neoantigens(neoantigens, predictions, uniprot)
+            self.assertEqual(1, len(runner.commands))
+            # the cache keeps the input mode of netmhcpan
+            self.assertIn("-p" if mode == NETMHCPAN_MODE_PEPTIDE else "-f", runner.commands[0])
+            results[name] = ([p.to_epitopes() for p in paired], runner.peptides)
+
+        # the same epitopes are predicted predicting fewer peptides
+        self.assertEqual(results[NETMHCPAN_MODE_SEQUENCE][0], results[NETMHCPAN_MODE_PEPTIDE][0])
+        self.assertEqual(results[NETMHCPAN_MODE_SEQUENCE], results["cached_sequence"])
+        self.assertEqual(results[NETMHCPAN_MODE_PEPTIDE], results["cached_peptide"])
+        self.assertLess(len(results[NETMHCPAN_MODE_PEPTIDE][1]), len(results[NETMHCPAN_MODE_SEQUENCE][1]))
+        # neither peptides in the proteome nor their WT peptides are predicted
+        self.assertNotIn("QDILVTDQT", results[NETMHCPAN_MODE_PEPTIDE][1])
+        self.assertNotIn("QDILVIDQT", results[NETMHCPAN_MODE_PEPTIDE][1])
+        self.assertIn("SQDILVIDQ", results[NETMHCPAN_MODE_PEPTIDE][1])
+        self.assertTrue(all(p.wild_type_peptide for p in results[NETMHCPAN_MODE_PEPTIDE][0][0]))
+
+    def test_set_wt_scores_single_call(self):
+        runner = FakeNetMhcPanRunner()
+        netmhcpan = NetMhcPanPredictor(
+            runner=runner, configuration=FakeDependenciesConfiguration(), blastp_runner=None,
+            mhc_parser=MhcParser.get_mhc_parser(FakeHlaDatabase()))
+        alleles = MhcFactory.build_mhc1_alleles(["HLA-A*02:01", "HLA-A*01:01"], FakeHlaDatabase())
+        predictions = [
+            PredictedEpitope(mutated_peptide="NLVPMVATV", wild_type_peptide="NLVPMVATA",
+                             allele_mhc_i=alleles[0].alleles[0]),
+            PredictedEpitope(mutated_peptide="NLVPMVATV", wild_type_peptide="NLVPMVATA",
+                             allele_mhc_i=alleles[0].alleles[1]),
+            PredictedEpitope(mutated_peptide="LVPMVATVQ", wild_type_peptide="LVPMVATAQ",
+                             allele_mhc_i=alleles[0].alleles[0]),
+            PredictedEpitope(mutated_peptide="VPMVATVQK", wild_type_peptide=None, allele_mhc_i=alleles[0].alleles[0]),
+        ]
+        netmhcpan.set_wt_netmhcpan_scores(predictions)
+        # all WT peptides are predicted with a single call
+        self.assertEqual(1, len(runner.commands))
+        self.assertIn("-p", runner.commands[0])
+        for p in predictions[0:3]:
+            wt_prediction = netmhcpan.mhc_prediction_peptide(
+                alleles=netmhcpan.mhc_parser.get_netmhcpan_representation(p.allele_mhc_i), sequence=p.wild_type_peptide)
+            self.assertEqual(wt_prediction.rank_mutated, p.rank_wild_type)
+            self.assertEqual(wt_prediction.affinity_mutated, p.affinity_wild_type)
+        self.assertIsNone(predictions[3].rank_wild_type)
+        self.assertIsNone(predictions[3].affinity_wild_type)
+
+    def test_cached_predictions(self):
+        configuration = FakeDependenciesConfiguration()
+        configuration.cache_folder = tempfile.mkdtemp()
+        netmhcpan = NetMhcPanPredictor(
+            runner=self.runner, configuration=configuration, blastp_runner=None,
+            mhc_parser=MhcParser.get_mhc_parser(FakeHlaDatabase()))
+        predictions = netmhcpan.mhc_prediction(available_alleles="HLA-A02:01", sequence="NLVPMVATVQ")
+        # the sequence is predicted over FASTA input as without cache
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertIn("-f", self.runner.commands[0])
+        self.assertEqual(["NLVPMVATV", "LVPMVATVQ"], [p.mutated_peptide for p in predictions])
+        self.assertEqual([1, 2], [p.position for p in predictions])
+
+        # cached predictions do not run netmhcpan
+        self.assertEqual(predictions, netmhcpan.mhc_prediction_multiple_sequences(
+            available_alleles="HLA-A02:01", sequences=["NLVPMVATVQ"])[0])
+        self.assertEqual(1, len(self.runner.commands))
+
+        # predictions in peptide mode are cached separately
+        self.assertEqual("NLVPMVATV", netmhcpan.mhc_prediction_peptide(
+            alleles="HLA-A02:01", sequence="NLVPMVATV").mutated_peptide)
+        self.assertEqual("NLVPMVATV", netmhcpan.mhc_prediction_peptide(
+            alleles="HLA-A02:01", sequence="NLVPMVATV").mutated_peptide)
+        self.assertEqual(2, len(self.runner.commands))
+        self.assertIn("-p", self.runner.commands[1])
+
+        # peptides without prediction are cached as well
+        self.assertIsNone(netmhcpan.mhc_prediction_peptide(alleles="HLA-A02:01", sequence="NLVPMVATQ"))
+        self.assertIsNone(netmhcpan.mhc_prediction_peptide(alleles="HLA-A02:01", sequence="NLVPMVATQ"))
+        self.assertEqual(3, len(self.runner.commands))
+
+    def test_cached_allele_representation(self):
+        # the alleles parsed from the output are indexed in the same representation as the input alleles
+        for predictions in [self.netmhcpan._run_sequences(["HLA-A02:01"], ["NLVPMVATVQ", "NLVPMVATA"]),
+                            self.netmhcpan._run_peptides(["HLA-A02:01"], ["NLVPMVATV", "LVPMVATVQ", "NLVPMVATA"])]:
+            self.assertEqual(
+                [("HLA-A02:01", "NLVPMVATV"), ("HLA-A02:01", "LVPMVATVQ"), ("HLA-A02:01", "NLVPMVATA")],
+                list(predictions.keys()))
+
+
+NETMHCIIPAN_OUTPUT = """
+# NetMHCIIpan version 4.3
+
+Number of analysed peptides 4
+--------------------------------------------------------------------------------------------------------------------------------------------
+ Pos           MHC              Peptide   Of        Core  Core_Rel Inverted        Identity      Score_EL %Rank_EL Exp_Bind  Score_BA %Rank_BA  Affinity(nM) BindLevel
+--------------------------------------------------------------------------------------------------------------------------------------------
+   1     DRB1_0101      ENPVVHFFKNIVTPR    3   VHFFKNIVT     0.853        0            seq1      0.589730     2.38       NA  0.610550     5.79         84.09 <=WB
+   2     DRB1_0101      NPVVHFFKNIVTPRA    2   VHFFKNIVT     0.650        0            seq1      0.189730    12.38       NA  0.410550    15.79        184.09
+   1     DRB1_0101      ENPVVHFFKNIVTPA    3   VHFFKNIVT     0.753        0            seq2      0.489730     4.38       NA  0.510550     7.79        104.09
+--------------------------------------------------------------------------------------------------------------------------------------------
+"""
+
+
+class TestNetMhcIIPanPredictor(TestCase):
+
+    def setUp(self):
+        self.runner = FakeRunner(NETMHCIIPAN_OUTPUT)
+        self.netmhc2pan = NetMhcIIPanPredictor(
+            runner=self.runner, configuration=FakeDependenciesConfiguration(), blastp_runner=None,
+            mhc_parser=MhcParser.get_mhc_parser(FakeHlaDatabase()))
+
+    def test_parse_output_by_sequence(self):
+        predictions = self.netmhc2pan._parse_netmhcpan_output_by_sequence(NETMHCIIPAN_OUTPUT)
+        self.assertEqual(["seq1", "seq2"], list(predictions.keys()))
+        self.assertEqual(["ENPVVHFFKNIVTPR", "NPVVHFFKNIVTPRA"], [p.mutated_peptide for p in predictions["seq1"]])
+        self.assertEqual(["ENPVVHFFKNIVTPA"], [p.mutated_peptide for p in predictions["seq2"]])
+        self.assertEqual(104.09, predictions["seq2"][0].affinity_mutated)
+        self.assertEqual(4.38, predictions["seq2"][0].rank_mutated)
+        self.assertEqual(
+            predictions["seq1"] + predictions["seq2"], self.netmhc2pan._parse_netmhcpan_output(NETMHCIIPAN_OUTPUT))
+
+    def test_predictions_multiple_neoantigens(self):
+        neoantigens = [
+            Neoantigen(mutated_xmer="ENPVVHFFKNIVTPRA", wild_type_xmer="ENPVVHFFKNIVTPA"),
+            Neoantigen(mutated_xmer="ENPVVH", wild_type_xmer="ENPVVA"),
+            Neoantigen(mutated_xmer="ENPVVHFFKNIVTPRA", wild_type_xmer="ENPVVA"),
+        ]
+        predictions = self.netmhc2pan.get_predictions_multiple_neoantigens(
+            neoantigens=neoantigens, patient_mhc2_isoforms=["DRB1_0101"], min_length=15)
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertEqual(3, len(predictions))
+        mutated, wild_type = predictions[0]
+        self.assertEqual(["ENPVVHFFKNIVTPR", "NPVVHFFKNIVTPRA"], [p.mutated_peptide for p in mutated])
+        self.assertEqual(["ENPVVHFFKNIVTPA"], [p.mutated_peptide for p in wild_type])
+        # xmers shorter than the minimum length are not predicted
+        self.assertEqual((None, None), predictions[1])
+        mutated, wild_type = predictions[2]
+        self.assertEqual(["ENPVVHFFKNIVTPR", "NPVVHFFKNIVTPRA"], [p.mutated_peptide for p in mutated])
+        self.assertIsNone(wild_type)
+
+    def test_cached_predictions(self):
+        configuration = FakeDependenciesConfiguration()
+        configuration.cache_folder = tempfile.mkdtemp()
+        netmhc2pan = NetMhcIIPanPredictor(
+            runner=self.runner, configuration=configuration, blastp_runner=None,
+            mhc_parser=MhcParser.get_mhc_parser(FakeHlaDatabase()))
+        predictions = netmhc2pan.mhc2_prediction_multiple_sequences(["DRB1_0101"], ["ENPVVHFFKNIVTPRA"])[0]
+        # the sequence is predicted over FASTA input as without cache
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertNotIn("-inptype", self.runner.commands[0])
+        self.assertEqual(["ENPVVHFFKNIVTPR", "NPVVHFFKNIVTPRA"], [p.mutated_peptide for p in predictions])
+        self.assertEqual(predictions, netmhc2pan.mhc2_prediction(["DRB1_0101"], "ENPVVHFFKNIVTPRA"))
+        self.assertEqual(1, len(self.runner.commands))
+
+    def test_cached_allele_representation(self):
+        # the isoforms parsed from the output are indexed in the same representation as the input isoforms
+        for predictions in [
+                self.netmhc2pan._run_sequences(["DRB1_0101"], ["ENPVVHFFKNIVTPRA", "ENPVVHFFKNIVTPA"]),
+                self.netmhc2pan._run_peptides(["DRB1_0101"], ["ENPVVHFFKNIVTPR", "ENPVVHFFKNIVTPA"])]:
+            self.assertIn(("DRB1_0101", "ENPVVHFFKNIVTPR"), predictions)
+            self.assertIn(("DRB1_0101", "ENPVVHFFKNIVTPA"), predictions)
+
+    def test_set_wt_scores_single_call(self):
+        isoform = MhcParser.get_mhc_parser(FakeHlaDatabase()).parse_mhc2_isoform("DRB1_0101")
+        predictions = [
+            PredictedEpitope(mutated_peptide="ENPVVHFFKNIVTPA", wild_type_peptide="ENPVVHFFKNIVTPR",
+                             isoform_mhc_i_i=isoform),
+            PredictedEpitope(mutated_peptide="NPVVHFFKNIVTPRC", wild_type_peptide="NPVVHFFKNIVTPRA",
+                             isoform_mhc_i_i=isoform),
+            PredictedEpitope(mutated_peptide="NPVVHFFKNIVTPRC", wild_type_peptide="NPVVHFFKNIVTPRD",
+                             isoform_mhc_i_i=isoform),
+        ]
+        self.netmhc2pan.set_wt_netmhcpan_scores(predictions)
+        # all WT peptides are predicted with a single call
+        self.assertEqual(1, len(self.runner.commands))
+        self.assertEqual(2.38, predictions[0].rank_wild_type)
+        self.assertEqual(84.09, predictions[0].affinity_wild_type)
+        self.assertEqual(12.38, predictions[1].rank_wild_type)
+        self.assertEqual(184.09, predictions[1].affinity_wild_type)
+        self.assertIsNone(predictions[2].rank_wild_type)
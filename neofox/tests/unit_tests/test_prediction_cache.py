@@ -0,0 +1,187 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import sys
+import tempfile
+from unittest import TestCase
+
+from neofox.helpers import prediction_cache
+from neofox.helpers.prediction_cache import PredictionCache, PREDICTION_CACHE_FILE
+from neofox.model.neoantigen import PredictedEpitope
+
+PREDICTOR = "predictor"
+VERSION = "1.0"
+
+
+class FakePredictor:
+
+    def __init__(self, missing_peptides=()):
+        self.calls = []
+        self.missing_peptides = missing_peptides
+
+    def run(self, alleles, peptides):
+        self.calls.append((list(alleles), list(peptides)))
+        return {
+            (a, p): PredictedEpitope(mutated_peptide=p, rank_mutated=float(len(p)), affinity_mutated=1.0)
+            for a in alleles for p in peptides if p not in self.missing_peptides
+        }
+
+
+class FakeSequencePredictor(FakePredictor):
+
+    def __init__(self, lengths, missing_peptides=()):
+        super().__init__(missing_peptides=missing_peptides)
+        self.lengths = lengths
+
+    def run(self, alleles, sequences):
+        self.calls.append((list(alleles), list(sequences)))
+        return {
+            (a, sequence[i:i + length]): PredictedEpitope(
+                mutated_peptide=sequence[i:i + length], position=i + 1, rank_mutated=float(length))
+            for a in alleles for sequence in sequences for length in self.lengths
+            for i in range(len(sequence) - length + 1) if sequence[i:i + length] not in self.missing_peptides
+        }
+
+
+class TestPredictionCache(TestCase):
+
+    def setUp(self):
+        self.cache_folder = tempfile.mkdtemp()
+        self.cache = PredictionCache(self.cache_folder)
+
+    def test_no_cache_folder(self):
+        self.assertIsNone(PredictionCache.get_prediction_cache(None))
+        self.assertIsNone(PredictionCache.get_prediction_cache(""))
+
+    def test_shared_cache(self):
+        cache = PredictionCache.get_prediction_cache(self.cache_folder)
+        self.assertIs(cache, PredictionCache.get_prediction_cache(self.cache_folder))
+        self.assertTrue(os.path.exists(os.path.join(self.cache_folder, PREDICTION_CACHE_FILE)))
+
+    def test_only_misses_are_predicted(self):
+        predictor = FakePredictor()
+        predictions = self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA", "PEPTIDEB"], predictor.run)
+        self.assertEqual(2, len(predictions))
+        self.assertEqual([(["A0201"], ["PEPTIDEA", "PEPTIDEB"])], predictor.calls)
+
+        predictions = self.cache.predict(
+            PREDICTOR, VERSION, ["A0201", "B0702"], ["PEPTIDEA", "PEPTIDEC"], predictor.run)
+        self.assertEqual(4, len(predictions))
+        self.assertEqual("PEPTIDEA", predictions[("A0201", "PEPTIDEA")].mutated_peptide)
+        # alleles missing different peptides are predicted separately
+        self.assertEqual([(["A0201"], ["PEPTIDEC"]), (["B0702"], ["PEPTIDEA", "PEPTIDEC"])], predictor.calls[1:])
+        self.assertEqual({PREDICTOR: 1}, self.cache.hits)
+        self.assertEqual({PREDICTOR: 5}, self.cache.misses)
+
+    def test_missing_predictions_are_cached(self):
+        predictor = FakePredictor(missing_peptides=["PEPTIDEB"])
+        predictions = self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA", "PEPTIDEB"], predictor.run)
+        self.assertIsNone(predictions[("A0201", "PEPTIDEB")])
+        predictions = self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEB"], predictor.run)
+        self.assertIsNone(predictions[("A0201", "PEPTIDEB")])
+        self.assertEqual(1, len(predictor.calls))
+
+    def test_versions_are_not_shared(self):
+        predictor = FakePredictor()
+        self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.cache.predict(PREDICTOR, "2.0", ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.cache.predict("another_predictor", VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.assertEqual(3, len(predictor.calls))
+
+    def test_persistence(self):
+        predictor = FakePredictor()
+        self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        another_cache = PredictionCache(self.cache_folder)
+        predictions = another_cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        another_cache.flush_statistics()
+        self.assertEqual(1, len(predictor.calls))
+        self.assertEqual(8.0, predictions[("A0201", "PEPTIDEA")].rank_mutated)
+        self.assertEqual([(PREDICTOR, 1, 1, 1)], self.cache.get_statistics())
+
+    def test_predict_sequences(self):
+        predictor = FakeSequencePredictor(lengths=[4, 5], missing_peptides=["SEQU"])
+        predictions = self.cache.predict_sequences(
+            PREDICTOR, VERSION, ["A0201", "B0702"], ["SEQUENCE", "SEQ", "SEQUENCE"], lengths=[4, 5],
+            run=predictor.run)
+        # the whole sequences are sent to the predictor
+        self.assertEqual([(["A0201", "B0702"], ["SEQUENCE"])], predictor.calls)
+        self.assertEqual(3, len(predictions))
+        self.assertEqual(
+            ["EQUE", "QUEN", "UENC", "ENCE", "SEQUE", "EQUEN", "QUENC", "UENCE"],
+            [p.mutated_peptide for p in predictions[0]][0:8])
+        self.assertEqual([2, 3, 4, 5, 1, 2, 3, 4], [p.position for p in predictions[0]][0:8])
+        self.assertEqual(16, len(predictions[0]))
+        self.assertEqual([], predictions[1])
+        self.assertEqual(predictions[0], predictions[2])
+        self.assertIsNot(predictions[0][0], predictions[2][0])
+
+    def test_predict_sequences_only_sequences_with_misses(self):
+        predictor = FakeSequencePredictor(lengths=[4])
+        self.cache.predict_sequences(PREDICTOR, VERSION, ["A0201"], ["SEQUENCE"], lengths=[4], run=predictor.run)
+        predictions = self.cache.predict_sequences(
+            PREDICTOR, VERSION, ["A0201"], ["SEQUENCE", "ANOTHER"], lengths=[4], run=predictor.run)
+        self.assertEqual([(["A0201"], ["SEQUENCE"]), (["A0201"], ["ANOTHER"])], predictor.calls)
+        self.assertEqual(["SEQU", "EQUE", "QUEN", "UENC", "ENCE"], [p.mutated_peptide for p in predictions[0]])
+        self.assertEqual(["ANOT", "NOTH", "OTHE", "THER"], [p.mutated_peptide for p in predictions[1]])
+        self.assertEqual([1, 2, 3, 4], [p.position for p in predictions[1]])
+
+    def test_statistics_are_written_in_batches(self):
+        predictor = FakePredictor()
+        self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        for _ in range(3):
+            self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        # the hits are not written until the next flush
+        statistics = list(self.cache.connection.execute("SELECT predictor, hits, misses FROM statistics"))
+        self.assertEqual([(PREDICTOR, 0, 1)], statistics)
+        self.assertEqual([(PREDICTOR, 1, 3, 1)], self.cache.get_statistics())
+
+        original_interval = prediction_cache.STATISTICS_FLUSH_INTERVAL
+        prediction_cache.STATISTICS_FLUSH_INTERVAL = 2
+        try:
+            self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+            statistics = list(self.cache.connection.execute("SELECT predictor, hits, misses FROM statistics"))
+            self.assertEqual([(PREDICTOR, 3, 1)], statistics)
+            self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+            statistics = list(self.cache.connection.execute("SELECT predictor, hits, misses FROM statistics"))
+            self.assertEqual([(PREDICTOR, 5, 1)], statistics)
+        finally:
+            prediction_cache.STATISTICS_FLUSH_INTERVAL = original_interval
+
+    def test_statistics_of_one_predictor(self):
+        predictor = FakePredictor()
+        self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.cache.predict("another_predictor", VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.assertEqual([(PREDICTOR, 1, 0, 1)], self.cache.get_statistics(predictor=PREDICTOR))
+        self.assertEqual(2, len(self.cache.get_statistics()))
+
+    def test_invalidate(self):
+        predictor = FakePredictor()
+        self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.cache.predict("another_predictor", VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.assertEqual(1, self.cache.invalidate(predictor=PREDICTOR))
+        self.assertEqual([("another_predictor", 1, 0, 1)], self.cache.get_statistics())
+        self.assertEqual(1, self.cache.invalidate())
+        self.assertEqual([], self.cache.get_statistics())
+        self.cache.predict(PREDICTOR, VERSION, ["A0201"], ["PEPTIDEA"], predictor.run)
+        self.assertEqual(3, len(predictor.calls))
+
+    def test_version(self):
+        self.assertEqual("non_existing_binary", PredictionCache.get_version("non_existing_binary"))
+        version = PredictionCache.get_version(sys.executable)
+        self.assertTrue(version.startswith(os.path.realpath(sys.executable)))
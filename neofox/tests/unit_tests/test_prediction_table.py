@@ -0,0 +1,137 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+from unittest import TestCase
+
+from neofox.helpers.epitope_helper import EpitopeHelper
+from neofox.MHC_predictors.netmhcpan.prediction_table import PredictionTable
+from neofox.model.mhc_parser import MhcParser
+from neofox.tests.fake_classes import FakeHlaDatabase, FakeUniprot
+
+NETMHCPAN_OUTPUT = """
+# NetMHCpan version 4.1b
+---------------------------------------------------------------------------------------------------------------------------
+ Pos         MHC        Peptide      Core Of Gp Gl Ip Il        Icore        Identity  Score_EL %Rank_EL Score_BA %Rank_BA  Aff(nM) BindLevel
+---------------------------------------------------------------------------------------------------------------------------
+   1 HLA-A*02:01      NLVPMVATV NLVPMVATV  0  0  0  0  0    NLVPMVATV            seq1 0.9120020    0.034 0.753221    0.052    21.49 <= SB
+   2 HLA-A*02:01      LVPMVATVQ LVPMVATVQ  0  0  0  0  0    LVPMVATVQ            seq1 0.0012340    8.000 0.034526   20.123 12345.67
+   1 HLA-A*02:01     NLVPMVATVQ NLVPMVTVQ  0  6  1  0  0   NLVPMVATVQ            seq1 0.0012340    8.000 0.034526   20.123 12345.67
+   1 HLA-B*07:02      NLVPMVATV NLVPMVATV  0  0  0  0  0    NLVPMVATV            seq1 0.9120020    0.034 0.753221    0.052    21.49 <= SB
+   2 HLA-B*07:02      LVPMVATVQ LVPMVATVQ  0  0  0  0  0    LVPMVATVQ            seq1 0.0012340    3.000 0.034526   20.123   345.67
+   1 HLA-A*02:01      NLVPMVATA NLVPMVATA  0  0  0  0  0    NLVPMVATA            seq2 0.5120020    0.834 0.553221    1.052   121.49 <= WB
+   2 HLA-A*02:01      LVPMVATAQ LVPMVATAQ  0  0  0  0  0    LVPMVATAQ            seq2 0.0012340    9.000 0.034526   20.123 22345.67
+---------------------------------------------------------------------------------------------------------------------------
+"""
+
+
+class TestPredictionTable(TestCase):
+
+    def setUp(self):
+        self.mhc_parser = MhcParser.get_mhc_parser(FakeHlaDatabase())
+        self.table = PredictionTable.from_netmhcpan_output(NETMHCPAN_OUTPUT, self.mhc_parser)
+
+    def test_parse_output(self):
+        self.assertEqual(7, len(self.table))
+        # alleles are parsed once
+        self.assertEqual(["HLA-A*02:01", "HLA-B*07:02"], [a.name for a in self.table.alleles])
+        epitopes = self.table.to_epitopes()
+        self.assertEqual("NLVPMVATVQ", epitopes[2].mutated_peptide)
+        self.assertEqual("NLVPMVTVQ", epitopes[2].core)
+        self.assertEqual(1, epitopes[2].position)
+        self.assertEqual(12345.67, epitopes[2].affinity_mutated)
+        self.assertEqual(8.0, epitopes[2].rank_mutated)
+        self.assertEqual("HLA-A*02:01", epitopes[2].allele_mhc_i.name)
+        self.assertEqual(
+            {"Icore": "NLVPMVATVQ", "Of": "0", "Gp": "6", "Gl": "1"},
+            {a.name: a.value for a in epitopes[2].neofox_annotations.annotations})
+        # materialised epitopes do not share the allele
+        self.assertIsNot(epitopes[0].allele_mhc_i, epitopes[1].allele_mhc_i)
+
+    def test_split_by_identity(self):
+        tables = self.table.split_by_identity()
+        self.assertEqual(["seq1", "seq2"], list(tables.keys()))
+        self.assertEqual(5, len(tables["seq1"]))
+        self.assertEqual(["NLVPMVATA", "LVPMVATAQ"], [e.mutated_peptide for e in tables["seq2"].to_epitopes()])
+
+    def test_from_epitopes(self):
+        epitopes = self.table.to_epitopes()
+        self.assertEqual(epitopes, PredictionTable.from_epitopes(epitopes).to_epitopes())
+        self.assertEqual(0, len(PredictionTable.from_epitopes([])))
+
+    def test_filters_as_epitope_helper(self):
+        epitopes = self.table.to_epitopes()
+        self.assertEqual(
+            EpitopeHelper.filter_peptides_covering_snv(position_of_mutation=[10], predictions=epitopes),
+            self.table.filter_covering_mutation([10]).to_epitopes())
+        self.assertEqual(0, len(self.table.filter_covering_mutation([])))
+        uniprot = FakeUniprot(peptides={"NLVPMVATV", "NLVPMVATA"})
+        self.assertEqual(
+            EpitopeHelper.remove_peptides_in_proteome(predictions=epitopes, uniprot=uniprot),
+            self.table.filter_not_in_proteome(uniprot).to_epitopes())
+
+    def test_pair_as_epitope_helper(self):
+        tables = self.table.split_by_identity()
+        paired = tables["seq1"].pair(tables["seq2"])
+        self.assertEqual(
+            EpitopeHelper.pair_predictions(tables["seq1"].to_epitopes(), tables["seq2"].to_epitopes()),
+            paired.to_epitopes())
+        epitopes = paired.to_epitopes()
+        self.assertEqual("NLVPMVATA", epitopes[0].wild_type_peptide)
+        self.assertEqual(121.49, epitopes[0].affinity_wild_type)
+        self.assertEqual("LVPMVATAQ", epitopes[1].wild_type_peptide)
+        # predictions for other lengths or alleles are not paired
+        self.assertEqual("", epitopes[2].wild_type_peptide)
+        self.assertEqual("", epitopes[3].wild_type_peptide)
+        # the paired table is a new table
+        self.assertIsNone(tables["seq1"].wild_type_peptide[0])
+
+    def test_select_best_as_epitope_helper(self):
+        epitopes = self.table.to_epitopes()
+        self.assertEqual(EpitopeHelper.select_best_by_rank(epitopes), epitopes[self.table.select_best_by_rank()])
+        self.assertEqual(
+            EpitopeHelper.select_best_by_affinity(epitopes), epitopes[self.table.select_best_by_affinity()])
+        # ties are solved on the allele name
+        self.assertEqual("HLA-B*07:02", epitopes[self.table.select_best_by_rank()].allele_mhc_i.name)
+        ninemers = [1, 4, 6]
+        self.assertEqual(4, self.table.select_best_by_rank(ninemers))
+        self.assertIsNone(self.table.select_best_by_affinity([]))
+
+    def test_pair_multiple(self):
+        tables = self.table.split_by_identity()
+        paired = PredictionTable.pair_multiple([tables["seq1"], tables["seq1"]], [None, tables["seq2"]])
+        # tables without WT predictions are not paired
+        self.assertTrue(all(p is None for p in paired[0].wild_type_peptide))
+        self.assertEqual(tables["seq1"].pair(tables["seq2"]).to_epitopes(), paired[1].to_epitopes())
+
+    def test_pair_multiple_many_neoantigens(self):
+        tables = self.table.split_by_identity()
+        empty = PredictionTable.from_epitopes([])
+        # the keys of distant neoantigens do not collide
+        num_tables = 2 ** 16 + 2
+        paired = PredictionTable.pair_multiple(
+            [tables["seq1"]] * 2 + [empty] * (num_tables - 3) + [tables["seq1"]],
+            [None] * (num_tables - 1) + [tables["seq2"]])
+        self.assertTrue(all(p is None for p in paired[1].wild_type_peptide))
+        self.assertEqual(tables["seq1"].pair(tables["seq2"]).to_epitopes(), paired[-1].to_epitopes())
+
+    def test_filter_not_in_proteome_multiple(self):
+        tables = self.table.split_by_identity()
+        uniprot = FakeUniprot(peptides={"NLVPMVATV", "NLVPMVATA"})
+        filtered = PredictionTable.filter_not_in_proteome_multiple([tables["seq1"], tables["seq2"]], uniprot)
+        self.assertEqual(["LVPMVATVQ", "NLVPMVATVQ", "LVPMVATVQ"], filtered[0].peptide.tolist())
+        self.assertEqual(["LVPMVATAQ"], filtered[1].peptide.tolist())
@@ -0,0 +1,116 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import json
+import os
+import tempfile
+from unittest import TestCase
+import pandas as pd
+from neofox.helpers.results_writer import ResultsWriter
+from neofox.model.neoantigen import Annotation, Annotations, PredictedEpitope
+from neofox.tests.tools import get_random_neoantigen
+
+
+class ResultsWriterTest(TestCase):
+
+    def setUp(self) -> None:
+        self.neoantigens = [self._get_annotated_neoantigen(i) for i in range(5)]
+
+    def test_chunks_write_same_output_as_single_write(self):
+        single_folder = tempfile.mkdtemp()
+        with ResultsWriter(single_folder, "neofox", with_all_neoepitopes=True) as writer:
+            writer.write(self.neoantigens)
+        chunks_folder = tempfile.mkdtemp()
+        with ResultsWriter(chunks_folder, "neofox", with_all_neoepitopes=True) as writer:
+            writer.write(self.neoantigens[0:2])
+            writer.write(self.neoantigens[2:4])
+            writer.write(self.neoantigens[4:])
+
+        for file_name in ["neofox_neoantigen_candidates_annotated.tsv", "neofox_mhcI_epitope_candidates_annotated.tsv",
+                          "neofox_mhcII_epitope_candidates_annotated.tsv"]:
+            single_df = pd.read_csv(os.path.join(single_folder, file_name), sep="\t")
+            chunks_df = pd.read_csv(os.path.join(chunks_folder, file_name), sep="\t")
+            pd.testing.assert_frame_equal(single_df, chunks_df)
+        self.assertEqual(5, pd.read_csv(os.path.join(
+            chunks_folder, "neofox_neoantigen_candidates_annotated.tsv"), sep="\t").shape[0])
+
+        single_json = json.load(open(os.path.join(single_folder, "neofox_neoantigen_candidates_annotated.json")))
+        chunks_json = json.load(open(os.path.join(chunks_folder, "neofox_neoantigen_candidates_annotated.json")))
+        self.assertEqual(5, len(chunks_json))
+        self.assertEqual(single_json, chunks_json)
+
+    def test_missing_annotations_in_later_chunks(self):
+        self.neoantigens[3].neofox_annotations.annotations = self.neoantigens[3].neofox_annotations.annotations[1:]
+        folder = tempfile.mkdtemp()
+        with ResultsWriter(folder, "neofox", with_all_neoepitopes=False) as writer:
+            writer.write(self.neoantigens[0:2])
+            writer.write(self.neoantigens[2:])
+        df = pd.read_csv(os.path.join(folder, "neofox_neoantigen_candidates_annotated.tsv"), sep="\t")
+        self.assertEqual(5, df.shape[0])
+        self.assertTrue(pd.isna(df["first_annotation"][3]))
+        self.assertFalse(os.path.exists(os.path.join(folder, "neofox_mhcI_epitope_candidates_annotated.tsv")))
+        self.assertEqual(["neofox_neoantigen_candidates_annotated.json", "neofox_neoantigen_candidates_annotated.tsv"],
+                         sorted(os.listdir(folder)))
+
+    def test_new_annotations_in_later_chunks(self):
+        self.neoantigens[3].neofox_annotations.annotations.append(Annotation(name="third_annotation", value="3"))
+        single_folder = tempfile.mkdtemp()
+        with ResultsWriter(single_folder, "neofox", with_all_neoepitopes=False) as writer:
+            writer.write(self.neoantigens)
+        chunks_folder = tempfile.mkdtemp()
+        with ResultsWriter(chunks_folder, "neofox", with_all_neoepitopes=False) as writer:
+            writer.write(self.neoantigens[0:2])
+            writer.write(self.neoantigens[2:])
+        single_df = pd.read_csv(os.path.join(single_folder, "neofox_neoantigen_candidates_annotated.tsv"), sep="\t")
+        chunks_df = pd.read_csv(os.path.join(chunks_folder, "neofox_neoantigen_candidates_annotated.tsv"), sep="\t")
+        self.assertEqual("third_annotation", chunks_df.columns[-1])
+        pd.testing.assert_frame_equal(single_df, chunks_df[single_df.columns])
+        self.assertEqual([3], chunks_df.index[~chunks_df["third_annotation"].isna()].to_list())
+
+    def test_outputs_are_published_on_close(self):
+        folder = tempfile.mkdtemp()
+        with ResultsWriter(folder, "neofox", with_all_neoepitopes=True) as writer:
+            writer.write(self.neoantigens[0:2])
+            self.assertFalse(any(not f.endswith(".tmp") for f in os.listdir(folder)))
+            writer.write(self.neoantigens[2:])
+        self.assertEqual(["neofox_mhcII_epitope_candidates_annotated.tsv", "neofox_mhcI_epitope_candidates_annotated.tsv",
+                          "neofox_neoantigen_candidates_annotated.json", "neofox_neoantigen_candidates_annotated.tsv"],
+                         sorted(os.listdir(folder)))
+
+    def test_error_does_not_publish_outputs(self):
+        folder = tempfile.mkdtemp()
+        with self.assertRaises(ValueError):
+            with ResultsWriter(folder, "neofox", with_all_neoepitopes=True) as writer:
+                writer.write(self.neoantigens[0:2])
+                raise ValueError("failed annotation")
+        self.assertEqual([], os.listdir(folder))
+
+    def _get_annotated_neoantigen(self, index):
+        neoantigen = get_random_neoantigen()
+        neoantigen.neofox_annotations = Annotations(annotations=[
+            Annotation(name="first_annotation", value=str(index)),
+            Annotation(name="second_annotation", value=str(index * 2)),
+        ])
+        neoantigen.neoepitopes_mhc_i = [
+            PredictedEpitope(
+                mutated_peptide=neoantigen.mutated_xmer[0:9],
+                rank_mutated=float(index),
+                neofox_annotations=Annotations(annotations=[Annotation(name="epitope_annotation", value=str(index))])
+            )
+        ] if index % 2 == 0 else []
+        return neoantigen
@@ -16,14 +16,22 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import math
+import pickle
+import random
 from unittest import TestCase
 
+from distributed.protocol import serialize, deserialize
+
 from neofox.published_features.self_similarity.self_similarity import (
     SelfSimilarityCalculator,
 )
 
 
 class TestSelfSimilarity(TestCase):
+    def setUp(self):
+        random.seed(123)
+
     def test_get_self_similarity(self):
         result = SelfSimilarityCalculator().get_self_similarity(
             wt_peptide="DDD", mutated_peptide="DDD"
@@ -53,3 +61,66 @@ def test_rare_aminoacids(self):
             wt_peptide="DDD", mutated_peptide="DUD"
         )
         self.assertEqual(None, result)
+
+    def test_empty_peptide(self):
+        result = SelfSimilarityCalculator().get_self_similarity(
+            wt_peptide="", mutated_peptide="DDD"
+        )
+        self.assertEqual(None, result)
+
+    def test_k3_equals_sum_over_kmers(self):
+        s = SelfSimilarityCalculator()
+        aminoacids = list(s.k1.keys())
+        for _ in range(20):
+            f = "".join(random.choices(aminoacids, k=random.randint(1, 15)))
+            g = "".join(random.choices(aminoacids, k=random.randint(1, 15)))
+            expected = self._compute_k3_over_kmers(s, f, g)
+            self.assertAlmostEqual(expected, s._compute_k3(f, g), delta=expected * 1e-9)
+
+    def test_get_self_similarities(self):
+        s = SelfSimilarityCalculator()
+        aminoacids = list(s.k1.keys())
+        pairs = [("".join(random.choices(aminoacids, k=length)), "".join(random.choices(aminoacids, k=length)))
+                 for length in [9, 9, 10, 15, 9]]
+        pairs.append(("DUD", "DDD"))
+        pairs.append(pairs[0])
+        results = s.get_self_similarities(pairs)
+        self.assertEqual(len(pairs), len(results))
+        self.assertIsNone(results[5])
+        self.assertEqual(results[0], results[6])
+        for (mutated, wt), result in zip(pairs[:5], results):
+            self.assertEqual(result, SelfSimilarityCalculator().get_self_similarity(
+                mutated_peptide=mutated, wt_peptide=wt))
+            self.assertIn(mutated, s.self_kernels)
+            self.assertIn(wt, s.self_kernels)
+
+    def test_bounded_caches(self):
+        s = SelfSimilarityCalculator(cache_size=2)
+        pairs = [("AAAAA", "AAAAW"), ("DDDDD", "DDDDW"), ("EEEEE", "EEEEW")]
+        # the results of a batch larger than the caches are still returned
+        results = s.get_self_similarities(pairs)
+        self.assertEqual(
+            [SelfSimilarityCalculator().get_self_similarity(mutated_peptide=m, wt_peptide=w) for m, w in pairs],
+            results)
+        self.assertEqual(2, len(s.self_kernels))
+        self.assertEqual(2, len(s.self_similarities))
+
+    def test_serialization(self):
+        s = SelfSimilarityCalculator(cache_size=2)
+        pairs = [("AAAAA", "AAAAW"), ("DDDDD", "DDDDW")]
+        results = s.get_self_similarities(pairs)
+        for copy in [pickle.loads(pickle.dumps(s)), deserialize(*serialize(s))]:
+            # the caches are not serialized
+            self.assertEqual(0, len(copy.self_kernels))
+            self.assertEqual(2, copy.self_kernels.maxsize)
+            self.assertEqual(results, copy.get_self_similarities(pairs))
+            self.assertEqual(2, len(copy.self_similarities))
+
+    @staticmethod
+    def _compute_k3_over_kmers(s, f, g):
+        result = 0
+        for k in range(1, min(len(f), len(g)) + 1):
+            for i in range(len(f) - k + 1):
+                for j in range(len(g) - k + 1):
+                    result += math.prod(s.k1[f[i + l]][g[j + l]] for l in range(k))
+        return result
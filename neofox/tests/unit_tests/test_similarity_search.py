@@ -0,0 +1,140 @@
+#
+# Copyright (c) 2020-2030 Translational Oncology at the Medical Center of the Johannes Gutenberg-University Mainz gGmbH.
+#
+# This file is part of Neofox
+# (see https://github.com/tron-bioinformatics/neofox).
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import random
+from unittest import TestCase
+
+from Bio.Align import substitution_matrices
+
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
+from neofox.helpers import similarity_search
+from neofox.helpers.blastp_runner import BlastpRunner
+from neofox.helpers.similarity_search import SimilaritySearch
+from neofox.references.references import ALIGNMENT_ENGINE_IN_PROCESS
+from neofox.tests.fake_classes import FakeDependenciesConfiguration
+
+AMINOACIDS = "ACDEFGHIKLMNPQRSTVWY"
+
+
+class TestSimilaritySearch(TestCase):
+
+    def setUp(self):
+        random.seed(123)
+        self.database = ["".join(random.choices(AMINOACIDS, k=random.randint(8, 30))) for _ in range(300)]
+        self.similarity_search = SimilaritySearch(ProteomeIndex.build("\n".join(self.database)))
+        self.blosum = substitution_matrices.load("BLOSUM62")
+
+    def _is_seed(self, word, other_word):
+        return len(word) == 3 and len(other_word) == 3 and (
+            word == other_word or self._get_score(word, other_word) >= similarity_search.WORD_THRESHOLD)
+
+    def _get_best_segment(self, peptide, sequence):
+        """
+        Returns the best ungapped local alignment over all diagonals of the sequence with a 3-mer scoring at least
+        the word threshold against a 3-mer of the peptide
+        """
+        best = (0, None)
+        for shift in range(-len(peptide) + 1, len(sequence)):
+            pairs = [(i, shift + i) for i in range(len(peptide)) if 0 <= shift + i < len(sequence)]
+            if not any(self._is_seed(peptide[i:i + 3], sequence[j:j + 3]) for i, j in pairs):
+                continue
+            for start in range(len(pairs)):
+                for end in range(start + 1, len(pairs) + 1):
+                    score = sum(self.blosum[peptide[i], sequence[j]] for i, j in pairs[start:end])
+                    if score > best[0]:
+                        best = (score, (peptide[pairs[start][0]:pairs[end - 1][0] + 1],
+                                        sequence[pairs[start][1]:pairs[end - 1][1] + 1]))
+        return best
+
+    def _get_score(self, query, target):
+        return sum(self.blosum[q, t] for q, t in zip(query, target))
+
+    def test_hits_are_best_ungapped_segments(self):
+        for _ in range(10):
+            peptide = "".join(random.choices(AMINOACIDS, k=9))
+            hits = self.similarity_search.get_hits(peptide)
+            expected = [self._get_best_segment(peptide, s) for s in self.database]
+            expected_scores = sorted([score for score, _ in expected if score > 0], reverse=True)
+            self.assertEqual(expected_scores, [self._get_score(q, t) for q, t in hits])
+            for query, target in hits:
+                self.assertEqual(len(query), len(target))
+                self.assertIn(query, peptide)
+                self.assertTrue(any(target in s for s in self.database))
+
+    def test_exact_match(self):
+        peptide = self.database[10][0:8]
+        self.assertEqual((peptide, peptide), self.similarity_search.get_hits(peptide)[0])
+
+    def test_hits_are_limited(self):
+        peptide = self.database[10][0:8]
+        hits = self.similarity_search.get_hits(peptide)
+        original_max_target_sequences = similarity_search.MAX_TARGET_SEQUENCES
+        similarity_search.MAX_TARGET_SEQUENCES = 3
+        try:
+            self.assertEqual(hits[0:3], self.similarity_search.get_hits(peptide))
+        finally:
+            similarity_search.MAX_TARGET_SEQUENCES = original_max_target_sequences
+
+    def test_no_hits(self):
+        self.assertEqual([], SimilaritySearch(ProteomeIndex.build("AAAAAAAAAA")).get_hits("WWWWWWWWW"))
+
+    def test_similarity_as_blastp(self):
+        configuration = FakeDependenciesConfiguration()
+        configuration.alignment_engine = ALIGNMENT_ENGINE_IN_PROCESS
+        blastp_runner = BlastpRunner(
+            runner=None, configuration=configuration, database="some_database",
+            database_index=self.similarity_search.index)
+        for _ in range(5):
+            peptide = "".join(random.choices(AMINOACIDS, k=9))
+            # the hits are aligned and scored as the HSPs of BLASTP
+            expected = BlastpRunner.computeR(
+                [BlastpRunner.align(q, t) for q, t in self.similarity_search.get_hits(peptide)], a=26)
+            self.assertAlmostEqual(
+                expected, blastp_runner.calculate_similarity_database(peptide, a=26), delta=expected * 1e-9)
+
+    def test_alignment_scores_as_pairwise_aligner(self):
+        queries = []
+        targets = []
+        for _ in range(300):
+            query = "".join(random.choices(AMINOACIDS, k=random.randint(1, 15)))
+            shift = random.randint(0, 3)
+            # shifted targets are aligned with gaps, others without or with gaps for different lengths
+            target = random.choice([
+                ("".join(random.choices(AMINOACIDS, k=shift)) + query)[0:len(query)],
+                "".join(random.choices(AMINOACIDS, k=len(query))),
+                "".join(random.choices(AMINOACIDS, k=random.randint(1, 15))).lower()])
+            queries.append(query)
+            targets.append(target)
+        scores = similarity_search.get_alignment_scores(queries, targets)
+        self.assertEqual([BlastpRunner.align(q, t).score for q, t in zip(queries, targets)], scores.tolist())
+        self.assertTrue(any(s != self._get_score(q, t) for q, t, s in zip(queries, targets, scores)
+                            if len(q) == len(t)))
+        with self.assertRaises(ValueError):
+            similarity_search.get_alignment_scores(["AUA"], ["AYA"])
+
+    def test_recognition_probability_as_compute_r(self):
+        for _ in range(20):
+            alignments = [BlastpRunner.align(q, q[::-1]) for q in
+                          ["".join(random.choices(AMINOACIDS, k=9)) for _ in range(random.randint(0, 50))]]
+            for a in [26, 32]:
+                expected = BlastpRunner.computeR(alignments, a=a)
+                self.assertAlmostEqual(
+                    expected,
+                    similarity_search.compute_recognition_probability([al.score for al in alignments], a=a),
+                    delta=expected * 1e-12)
+        self.assertEqual(0.0, similarity_search.compute_recognition_probability([]))
@@ -16,8 +16,12 @@
 #
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.#
+import os
+import random
+import tempfile
 from unittest import TestCase
 
+from neofox.annotation_resources.uniprot.proteome_index import ProteomeIndex
 from neofox.annotation_resources.uniprot.uniprot import Uniprot
 import pkg_resources
 import neofox.tests
@@ -26,12 +30,14 @@
 class TestUniprot(TestCase):
     @classmethod
     def setUpClass(cls):
-        cls.uniprot = Uniprot(
-            pkg_resources.resource_filename(
-                neofox.tests.__name__,
-                "resources/uniprot_human_with_isoforms.first200linesfortesting.pickle",
-            )
+        proteome = pkg_resources.resource_filename(
+            neofox.tests.__name__,
+            "resources/uniprot_human_with_isoforms.first200linesfortesting.pickle",
         )
+        cls.index_prefix = os.path.join(tempfile.mkdtemp(), "proteome.index")
+        ProteomeIndex.build(Uniprot._load_proteome(proteome)).save(cls.index_prefix)
+        cls.uniprot = Uniprot(proteome, index=cls.index_prefix)
+        cls.uniprot_without_index = Uniprot(proteome, index=os.path.join(tempfile.mkdtemp(), "missing.index"))
 
     def test_sequence_not_in_uniprot(self):
         result = self.uniprot.is_sequence_not_in_uniprot("NOT_IN_UNIPROT")
@@ -40,3 +46,39 @@ def test_sequence_not_in_uniprot(self):
     def test_sequence_in_uniprot(self):
         result = self.uniprot.is_sequence_not_in_uniprot("LLEKVKAHEIAWLHGTI")
         self.assertEqual(False, result)
+
+    def test_sequences_not_in_uniprot(self):
+        sequences = ["NOT_IN_UNIPROT", "LLEKVKAHEIAWLHGTI", "LLEKVKA", "LLEKVKAHEIAWLHGTX", "PEPTIDE"]
+        self.assertEqual([True, False, False, True, True], self.uniprot.are_sequences_not_in_uniprot(sequences))
+        self.assertEqual(
+            [True, False, False, True, True], self.uniprot_without_index.are_sequences_not_in_uniprot(sequences))
+
+    def test_missing_index_is_not_built(self):
+        self.assertIsNone(self.uniprot_without_index.index)
+        self.assertTrue(self.uniprot_without_index.is_sequence_not_in_uniprot("NOT_IN_UNIPROT"))
+        self.assertFalse(self.uniprot_without_index.is_sequence_not_in_uniprot("LLEKVKAHEIAWLHGTI"))
+
+    def test_index_matches_exact_search(self):
+        proteome = bytes(self.uniprot.uniprot).decode("ascii")
+        random.seed(123)
+        for _ in range(500):
+            length = random.randint(1, 25)
+            start = random.randint(0, len(proteome) - length)
+            peptide = proteome[start:start + length]
+            if "\n" in peptide:
+                # NOTE: peptides never span several proteins
+                continue
+            mutated_peptide = peptide[:-1] + random.choice("ACDEFGHIKLMNPQRSTVWY")
+            for sequence in [peptide, mutated_peptide]:
+                self.assertEqual(proteome.find(sequence) < 0, self.uniprot.is_sequence_not_in_uniprot(sequence))
+
+    def test_saved_index(self):
+        self.assertTrue(ProteomeIndex.exists(self.index_prefix))
+        self.assertFalse(ProteomeIndex.exists(os.path.join(tempfile.mkdtemp(), "proteome.index")))
+        index = ProteomeIndex.load(self.index_prefix)
+        self.assertEqual(
+            [False, True, True], index.contains_multiple(["NOT_IN_UNIPROT", "LLEKVKAHEIAWLHGTI", "LLEKV"]))
+        # the memory mapped proteome is used when the index exists
+        uniprot = Uniprot("non_existing.pickle", index=self.index_prefix)
+        self.assertFalse(uniprot.is_sequence_not_in_uniprot("LLEKVKAHEIAWLHGTI"))
+        self.assertEqual(self.uniprot_without_index.uniprot.encode("ascii"), bytes(uniprot.uniprot))